@@ -0,0 +1,30 @@
+"""
+Cliente HTTP asíncrono compartido (httpx) para las llamadas de los agentes.
+
+Un cliente por event loop: reutiliza conexiones (keep-alive) entre requests del
+mismo proceso ASGI, y no se mezcla con loops efímeros (ej: async_to_sync bajo WSGI).
+"""
+import asyncio
+import os
+import weakref
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+_clientes: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """Cliente httpx del event loop actual (se crea la primera vez)"""
+    import httpx  # solo lo necesitan las vistas async; WSGI y la CLI no lo cargan
+
+    loop = asyncio.get_running_loop()
+    cliente = _clientes.get(loop)
+    if cliente is None or cliente.is_closed:
+        cliente = httpx.AsyncClient(
+            timeout=int(os.getenv('DEEPSEEK_TIMEOUT', '30')),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _clientes[loop] = cliente
+    return cliente
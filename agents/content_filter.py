@@ -8,6 +8,10 @@ import json
 import requests
 from dotenv import load_dotenv
 
+from pipelines.providers import limitar, limitar_async, estimar_tokens
+
+from .async_http import get_async_client
+
 load_dotenv()
 
 
@@ -47,12 +51,29 @@ class ContentFilter:
         except Exception as e:
             # En caso de error, ser conservador pero permitir continuar
             print(f"Error en filtro ético: {e}")
-            return {
-                'es_valida': True,
-                'razon': 'No se pudo validar, se permite continuar',
-                'valores_detectados': [],
-                'nivel_apropiado': 'desconocido'
-            }
+            return self._resultado_sin_validar()
+    
+    async def validar_moraleja_async(self, moraleja_input):
+        """Versión asíncrona de validar_moraleja (para vistas ASGI)"""
+        
+        prompt = self._build_validation_prompt(moraleja_input)
+        
+        try:
+            response = await self._call_deepseek_api_async(prompt)
+            return json.loads(response)
+            
+        except Exception as e:
+            print(f"Error en filtro ético: {e}")
+            return self._resultado_sin_validar()
+    
+    def _resultado_sin_validar(self):
+        """Resultado conservador cuando la API falla: se permite continuar"""
+        return {
+            'es_valida': True,
+            'razon': 'No se pudo validar, se permite continuar',
+            'valores_detectados': [],
+            'nivel_apropiado': 'desconocido'
+        }
     
     def _build_validation_prompt(self, moraleja):
         """Construye el prompt para el filtro ético"""
@@ -87,8 +108,8 @@ Responde ÚNICAMENTE con un JSON válido (sin markdown, sin explicaciones):
   "nivel_apropiado": "excelente/aceptable/rechazado"
 }}"""
     
-    def _call_deepseek_api(self, prompt):
-        """Llama a la API de Deepseek"""
+    def _build_request(self, prompt):
+        """Headers y payload de chat completion para Deepseek"""
         
         headers = {
             'Authorization': f'Bearer {self.api_key}',
@@ -111,15 +132,39 @@ Responde ÚNICAMENTE con un JSON válido (sin markdown, sin explicaciones):
             'max_tokens': 500
         }
         
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            json=data,
-            timeout=int(os.getenv('DEEPSEEK_TIMEOUT', '30'))
-        )
+        return headers, data
+    
+    def _call_deepseek_api(self, prompt):
+        """Llama a la API de Deepseek"""
         
-        response.raise_for_status()
-        result = response.json()
+        headers, data = self._build_request(prompt)
+        with limitar('deepseek', estimar_tokens(prompt, data['max_tokens'])) as uso:
+            response = requests.post(
+                self.api_url,
+                headers=headers,
+                json=data,
+                timeout=int(os.getenv('DEEPSEEK_TIMEOUT', '30'))
+            )
+            
+            response.raise_for_status()
+            result = response.json()
+            uso.unidades = result.get('usage', {}).get('total_tokens', uso.unidades)
+        return self._extraer_contenido(result)
+    
+    async def _call_deepseek_api_async(self, prompt):
+        """Llama a la API de Deepseek sin bloquear el event loop"""
+        
+        headers, data = self._build_request(prompt)
+        async with limitar_async('deepseek', estimar_tokens(prompt, data['max_tokens'])) as uso:
+            response = await get_async_client().post(self.api_url, headers=headers, json=data)
+            
+            response.raise_for_status()
+            result = response.json()
+            uso.unidades = result.get('usage', {}).get('total_tokens', uso.unidades)
+        return self._extraer_contenido(result)
+    
+    def _extraer_contenido(self, result):
+        """Extrae el texto de la respuesta de chat completion"""
         
         # Extraer el contenido de la respuesta
         content = result['choices'][0]['message']['content'].strip()
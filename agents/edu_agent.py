@@ -3,6 +3,8 @@ Agente educativo principal (EduAgent)
 Integra el filtro ético y el motor de preferencias
 """
 
+from asgiref.sync import sync_to_async
+
 from .content_filter import ContentFilter
 from .preference_engine import PreferenceEngine
 
@@ -45,6 +47,14 @@ class EduAgent:
         
         return sugerencias
     
+    async def obtener_sugerencias_async(self, n=5):
+        """Versión asíncrona de obtener_sugerencias (para vistas ASGI)"""
+        if not self.profile:
+            return self._get_sugerencias_genericas(n)
+        
+        historial = await sync_to_async(lambda: self.profile.user.interacciones.all())()
+        return await self.preference_engine.generar_sugerencias_async(self.profile, historial, n=n)
+    
     def validar_moraleja(self, moraleja):
         """
         Valida que una moraleja sea apropiada.
@@ -57,6 +67,10 @@ class EduAgent:
         """
         return self.content_filter.validar_moraleja(moraleja)
     
+    async def validar_moraleja_async(self, moraleja):
+        """Versión asíncrona de validar_moraleja (para vistas ASGI)"""
+        return await self.content_filter.validar_moraleja_async(moraleja)
+    
     def registrar_interaccion(self, moraleja, razon, valores, seleccionada=False):
         """
         Registra la interacción del usuario con una sugerencia.
@@ -6,8 +6,13 @@ Usa Deepseek para analizar perfil y historial del usuario
 import os
 import json
 import requests
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
 
+from pipelines.providers import limitar, limitar_async, estimar_tokens
+
+from .async_http import get_async_client
+
 load_dotenv()
 
 
@@ -45,6 +50,25 @@ class PreferenceEngine:
             print(f"Error generando sugerencias: {e}")
             return self._get_sugerencias_default()
     
+    async def generar_sugerencias_async(self, perfil_usuario, historial_interacciones, n=5):
+        """
+        Versión asíncrona de generar_sugerencias (para vistas ASGI).
+        
+        El prompt recorre el historial (consulta a la base de datos), así que se arma
+        en un hilo con sync_to_async; solo la llamada HTTP corre en el event loop.
+        """
+        
+        prompt = await sync_to_async(self._build_suggestion_prompt)(perfil_usuario, historial_interacciones, n)
+        
+        try:
+            response = await self._call_deepseek_api_async(prompt)
+            resultado = json.loads(response)
+            return resultado.get('sugerencias', [])
+            
+        except Exception as e:
+            print(f"Error generando sugerencias: {e}")
+            return self._get_sugerencias_default()
+    
     def _build_suggestion_prompt(self, perfil, historial, n):
         """Construye el prompt para generar sugerencias basadas solo en valores pendientes"""
         
@@ -96,8 +120,8 @@ Responde ÚNICAMENTE con un JSON válido (sin markdown):
   ]
 }}"""
     
-    def _call_deepseek_api(self, prompt):
-        """Llama a la API de Deepseek"""
+    def _build_request(self, prompt):
+        """Headers y payload de chat completion para Deepseek"""
         
         headers = {
             'Authorization': f'Bearer {self.api_key}',
@@ -120,15 +144,39 @@ Responde ÚNICAMENTE con un JSON válido (sin markdown):
             'max_tokens': 1000
         }
         
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            json=data,
-            timeout=int(os.getenv('DEEPSEEK_TIMEOUT', '30'))
-        )
+        return headers, data
+    
+    def _call_deepseek_api(self, prompt):
+        """Llama a la API de Deepseek"""
+        
+        headers, data = self._build_request(prompt)
+        with limitar('deepseek', estimar_tokens(prompt, data['max_tokens'])) as uso:
+            response = requests.post(
+                self.api_url,
+                headers=headers,
+                json=data,
+                timeout=int(os.getenv('DEEPSEEK_TIMEOUT', '30'))
+            )
+            
+            response.raise_for_status()
+            result = response.json()
+            uso.unidades = result.get('usage', {}).get('total_tokens', uso.unidades)
+        return self._extraer_contenido(result)
+    
+    async def _call_deepseek_api_async(self, prompt):
+        """Llama a la API de Deepseek sin bloquear el event loop"""
         
-        response.raise_for_status()
-        result = response.json()
+        headers, data = self._build_request(prompt)
+        async with limitar_async('deepseek', estimar_tokens(prompt, data['max_tokens'])) as uso:
+            response = await get_async_client().post(self.api_url, headers=headers, json=data)
+            
+            response.raise_for_status()
+            result = response.json()
+            uso.unidades = result.get('usage', {}).get('total_tokens', uso.unidades)
+        return self._extraer_contenido(result)
+    
+    def _extraer_contenido(self, result):
+        """Extrae el texto de la respuesta de chat completion"""
         
         # Extraer el contenido de la respuesta
         content = result['choices'][0]['message']['content'].strip()
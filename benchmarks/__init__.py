@@ -0,0 +1,13 @@
+"""
+Benchmarks de los pipelines sin gastar en APIs.
+
+- fake_providers: servidores HTTP locales que imitan a Deepseek, ElevenLabs y Gemini
+  (latencia, tasa de error y tamaño de respuesta configurables, deterministas por semilla)
+- etapa: mide una sola etapa (o el flujo completo de main.py) en un proceso aparte
+- run_benchmarks: orquesta las mediciones y guarda benchmarks/results/<git sha>.json
+- render: fixtures sintéticos y barrido de parámetros de render de Pipeline 4
+- import_time: tiempo de import en frío de pipelines, main.py y la app Django
+
+Uso:
+    python -m benchmarks.run_benchmarks --escenas 6 --latencia 0.2 --repeticiones 3
+"""
@@ -0,0 +1,115 @@
+"""
+Mide una etapa en un proceso propio (así el pico de RSS y el CPU no se mezclan
+con otras etapas ni con los servidores falsos).
+
+Imprime en la última línea un JSON con:
+    wall        segundos de reloj de la etapa
+    cpu         segundos de CPU del proceso durante la etapa (todos los hilos)
+    rss_mb      pico de RSS del proceso (incluye imports)
+    rss_base_mb RSS antes de ejecutar la etapa (imports ya hechos)
+    bytes       tamaño de las salidas de la etapa
+
+Uso (lo llama run_benchmarks; las credenciales/URLs llegan por entorno):
+    python -m benchmarks.etapa guion  --runs-dir /tmp/bench --run-id abc --moraleja "ser honesto"
+    python -m benchmarks.etapa audio  --runs-dir /tmp/bench --run-id abc
+    python -m benchmarks.etapa e2e    --runs-dir /tmp/bench --moraleja "ser honesto" [--stream]
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+from pathlib import Path
+
+ETAPAS_AISLADAS = ("guion", "audio", "imagen", "video")
+
+
+def _rss_mb() -> float:
+    # En Linux ru_maxrss viene en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _tamano(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _preparar(args):
+    """Importa y construye lo necesario ANTES de medir. Devuelve (ejecutar, salida)."""
+    from pipelines import Pipeline1Guion, Pipeline2Audio, Pipeline3Imagen, Pipeline4Video, Guion, RunManifest
+
+    if args.etapa == "e2e":
+        import main as orquestador
+        output = f"bench_{int(time.time() * 1000)}.mp4"
+        argv = ["main.py", args.moraleja, "--runs-dir", args.runs_dir, "--output", output]
+        if args.stream:
+            argv.append("--stream")
+
+        def ejecutar():
+            sys.argv = argv
+            codigo = orquestador.main()
+            if codigo != 0:
+                raise RuntimeError(f"main.py terminó con código {codigo}")
+
+        return ejecutar, Path(args.runs_dir), Path("assets/outputs") / output
+
+    if args.etapa == "guion":
+        manifest = RunManifest.crear(args.moraleja, run_id=args.run_id, base_dir=args.runs_dir)
+        pipeline = Pipeline1Guion()
+        return (lambda: pipeline.generar(args.moraleja, manifest=manifest)), manifest.guion_path, None
+
+    manifest = RunManifest.cargar(args.run_id, base_dir=args.runs_dir)
+    guion = Guion.cargar(manifest.guion_path)
+    if args.etapa == "audio":
+        pipeline = Pipeline2Audio()
+        return (lambda: pipeline.generar(guion, manifest=manifest)), manifest.voices_dir, None
+    if args.etapa == "imagen":
+        pipeline = Pipeline3Imagen()
+        return (lambda: pipeline.generar(guion, manifest=manifest)), manifest.images_dir, None
+
+    salida = manifest.dir / "video"
+    pipeline = Pipeline4Video(output_dir=str(salida))
+    return (lambda: pipeline.generar(guion, output_name="bench.mp4", manifest=manifest)), salida, None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mide una etapa de los pipelines")
+    parser.add_argument("etapa", choices=ETAPAS_AISLADAS + ("e2e",))
+    parser.add_argument("--runs-dir", required=True)
+    parser.add_argument("--run-id", default="bench")
+    parser.add_argument("--moraleja", default="medir antes de optimizar")
+    parser.add_argument("--stream", action="store_true", help="e2e con --stream")
+    args = parser.parse_args()
+
+    ejecutar, salida, extra = _preparar(args)
+    rss_base = _rss_mb()
+
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    ejecutar()
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    resultado = {
+        "wall": round(wall, 4),
+        "cpu": round(cpu, 4),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_base_mb": round(rss_base, 1),
+        "bytes": _tamano(salida) + (_tamano(extra) if extra and extra.exists() else 0),
+    }
+
+    if args.etapa == "e2e":
+        # Contadores por span del report.json del run (llamadas, segundos, bytes por proveedor)
+        reportes = sorted(Path(args.runs_dir).glob("*/report.json"), key=lambda p: p.stat().st_mtime)
+        if reportes:
+            resultado["contadores"] = json.loads(reportes[-1].read_text(encoding="utf-8"))["contadores"]
+        if extra and extra.exists():
+            extra.unlink()  # el MP4 va a assets/outputs/; no dejar basura
+
+    print(json.dumps(resultado))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""
+Servidores falsos de Deepseek, ElevenLabs y Gemini para benchmarks.
+
+Responden con el mismo formato que las APIs reales, así los pipelines corren sin
+cambios apuntando a ellos con variables de entorno:
+
+    DEEPSEEK_API_URL     -> http://127.0.0.1:<puerto>/v1/chat/completions
+    ELEVENLABS_BASE_URL  -> http://127.0.0.1:<puerto>
+    GEMINI_BASE_URL      -> http://127.0.0.1:<puerto>
+
+Las respuestas son deterministas (misma semilla -> mismos bytes):
+  - Deepseek: un guion válido con N escenas (JSON normal o streaming SSE)
+  - ElevenLabs: MP3 de frames silenciosos, con duración proporcional al texto
+  - Gemini: PNG de ruido (incompresible, así el tamaño es predecible)
+
+Uso standalone (imprime en la primera línea un JSON con las variables de entorno):
+    python -m benchmarks.fake_providers --latencia 0.2 --tasa-error 0.05
+"""
+import argparse
+import base64
+import json
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from pipelines.fallback import MP3_FRAME_SILENCIO, MP3_FRAME_SEGUNDOS
+
+PERSONAJES = ("Lucas", "Sofia", "Carlos", "Juan", "Martina")
+ESCENARIOS = ("parque", "habitación", "bosque", "hospital", "colegio", "calle")
+EMOCIONES = ("curioso", "feliz", "sorprendido", "pensativo", "emocionado")
+
+# Frame MP3 silencioso (~26 ms): el mismo que usa el respaldo de audio de Pipeline 2
+_MP3_FRAME = MP3_FRAME_SILENCIO
+_MP3_FRAME_SEGUNDOS = MP3_FRAME_SEGUNDOS
+
+
+@dataclass
+class FakeConfig:
+    """Parámetros de los servidores falsos"""
+    latencia: float = 0.0           # segundos antes de responder (todas las APIs)
+    jitter: float = 0.0             # +- segundos aleatorios (deterministas) sobre la latencia
+    tasa_error: float = 0.0         # probabilidad de HTTP 500 en ElevenLabs y Gemini
+    tasa_error_deepseek: float = 0.0
+    escenas: int = 6
+    chars_dialogo: int = 120        # largo de cada texto de diálogo
+    chars_por_segundo: float = 15.0 # velocidad de "lectura" del TTS falso
+    audio_kb: int = 0               # si > 0, tamaño fijo de cada MP3 (ignora chars_por_segundo)
+    imagen_lado: int = 1024         # PNG de imagen_lado x imagen_lado
+    chunk_chars: int = 24           # caracteres por evento SSE en streaming
+    delay_chunk: float = 0.0        # segundos entre eventos SSE
+    semilla: int = 1234
+
+
+# --------------------------------------------------------------------------- #
+# Payloads
+# --------------------------------------------------------------------------- #
+def guion_falso(escenas: int, chars_dialogo: int, semilla: int) -> Dict[str, Any]:
+    """Guion válido según guion_schema, determinista por semilla"""
+    rnd = random.Random(semilla)
+    relleno = "y todos aprendieron algo nuevo ese día "
+    lista = []
+    for i in range(escenas):
+        personaje = PERSONAJES[i % len(PERSONAJES)]
+        otro = PERSONAJES[(i + 1) % len(PERSONAJES)]
+        escenario = rnd.choice(ESCENARIOS)
+        texto = f"Escena {i + 1}: {otro}, mira lo que pasó en el {escenario}, "
+        texto = (texto + relleno * (chars_dialogo // len(relleno) + 1))[:chars_dialogo].rstrip() + "."
+        lista.append({
+            "numero_escena": i + 1,
+            "sonido_fondo": f"sonidos del {escenario}",
+            "imagen_descripcion": f"{personaje} y {otro} conversando en el {escenario}",
+            "dialogo": {"personaje": personaje, "texto": texto, "emocion": rnd.choice(EMOCIONES)},
+        })
+    return {
+        "guion": {
+            "metadata": {
+                "titulo": "Cuento de benchmark",
+                "leccion": "medir antes de optimizar",
+                "duracion_estimada": f"{escenas} minutos",
+                "personajes": [
+                    {"nombre": p, "tipo_voz": "neutra", "edad_aproximada": "7 años", "caracteristicas": "personaje de prueba"}
+                    for p in PERSONAJES
+                ],
+            },
+            "escenas": lista,
+        }
+    }
+
+
+def mp3_silencioso(segundos: float = 0.0, kb: int = 0) -> bytes:
+    """MP3 válido hecho de frames silenciosos (por duración o por tamaño en KB)"""
+    if kb > 0:
+        frames = max(1, kb * 1024 // len(_MP3_FRAME))
+    else:
+        frames = max(1, round(segundos / _MP3_FRAME_SEGUNDOS))
+    return _MP3_FRAME * frames
+
+
+@lru_cache(maxsize=8)
+def png_ruido(lado: int, semilla: int) -> bytes:
+    """PNG RGB de ruido determinista (~3 * lado^2 bytes)"""
+    rnd = random.Random(semilla)
+    fila = 1 + 3 * lado
+    crudo = bytearray(rnd.randbytes(fila * lado))
+    crudo[::fila] = bytes(lado)  # filtro 0 al inicio de cada fila
+
+    def chunk(tipo: bytes, datos: bytes) -> bytes:
+        return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos))
+
+    ihdr = struct.pack(">IIBBBBB", lado, lado, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(bytes(crudo), 1)) + chunk(b"IEND", b"")
+
+
+# --------------------------------------------------------------------------- #
+# Servidores
+# --------------------------------------------------------------------------- #
+class _FakeHandler(BaseHTTPRequestHandler):
+    """Handler base: latencia, errores inyectados y lectura del body"""
+    protocol_version = "HTTP/1.1"
+    proveedor = ""
+
+    def log_message(self, format, *args):  # silencioso: el ruido en stdout distorsiona las mediciones
+        pass
+
+    @property
+    def config(self) -> FakeConfig:
+        return self.server.config
+
+    def _leer_json(self) -> Dict[str, Any]:
+        largo = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(largo) if largo else b""
+        try:
+            return json.loads(cuerpo) if cuerpo else {}
+        except json.JSONDecodeError:
+            return {}
+
+    def _esperar_y_fallar(self, tasa_error: float) -> bool:
+        """Aplica la latencia; devuelve True (y responde 500) si toca inyectar un error"""
+        with self.server.lock:
+            jitter = self.server.rnd.uniform(-self.config.jitter, self.config.jitter)
+            falla = self.server.rnd.random() < tasa_error
+        time.sleep(max(0.0, self.config.latencia + jitter))
+        if falla:
+            self._responder(500, b'{"error": "fallo inyectado"}', "application/json")
+        return falla
+
+    def _responder(self, status: int, cuerpo: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        with self.server.lock:
+            self.server.llamadas += 1
+            self.server.bytes_enviados += len(cuerpo)
+
+
+class _DeepseekHandler(_FakeHandler):
+    def do_POST(self):
+        payload = self._leer_json()
+        if self._esperar_y_fallar(self.config.tasa_error_deepseek):
+            return
+        c = self.config
+        contenido = json.dumps(guion_falso(c.escenas, c.chars_dialogo, c.semilla), ensure_ascii=False)
+
+        if not payload.get("stream"):
+            respuesta = {"choices": [{"index": 0, "message": {"role": "assistant", "content": contenido}}]}
+            self._responder(200, json.dumps(respuesta, ensure_ascii=False).encode("utf-8"), "application/json")
+            return
+
+        # Streaming SSE con chunked transfer, como la API real
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        enviados = 0
+        for i in range(0, len(contenido), c.chunk_chars):
+            delta = contenido[i:i + c.chunk_chars]
+            evento = json.dumps({"choices": [{"index": 0, "delta": {"content": delta}}]}, ensure_ascii=False)
+            enviados += self._escribir_chunk(f"data: {evento}\n\n".encode("utf-8"))
+            if c.delay_chunk:
+                time.sleep(c.delay_chunk)
+        enviados += self._escribir_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        with self.server.lock:
+            self.server.llamadas += 1
+            self.server.bytes_enviados += enviados
+
+    def _escribir_chunk(self, datos: bytes) -> int:
+        self.wfile.write(f"{len(datos):x}\r\n".encode("ascii") + datos + b"\r\n")
+        self.wfile.flush()
+        return len(datos)
+
+
+class _ElevenLabsHandler(_FakeHandler):
+    def do_POST(self):
+        payload = self._leer_json()
+        if self._esperar_y_fallar(self.config.tasa_error):
+            return
+        texto = payload.get("text", "")
+        segundos = len(texto) / self.config.chars_por_segundo
+        self._responder(200, mp3_silencioso(segundos, self.config.audio_kb), "audio/mpeg")
+
+
+class _GeminiHandler(_FakeHandler):
+    def do_POST(self):
+        self._leer_json()
+        if self._esperar_y_fallar(self.config.tasa_error):
+            return
+        png = png_ruido(self.config.imagen_lado, self.config.semilla)
+        respuesta = {
+            "candidates": [{
+                "content": {
+                    "role": "model",
+                    "parts": [
+                        {"text": "Imagen generada"},
+                        {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(png).decode("ascii")}},
+                    ],
+                },
+                "finishReason": "STOP",
+            }]
+        }
+        self._responder(200, json.dumps(respuesta).encode("utf-8"), "application/json")
+
+
+class FakeProviders:
+    """
+    Levanta los tres servidores falsos en hilos (puertos efímeros por defecto).
+
+    Uso:
+        with FakeProviders(FakeConfig(latencia=0.2)) as fakes:
+            os.environ.update(fakes.env())
+    """
+
+    HANDLERS = {"deepseek": _DeepseekHandler, "elevenlabs": _ElevenLabsHandler, "gemini": _GeminiHandler}
+
+    def __init__(self, config: FakeConfig | None = None, host: str = "127.0.0.1", puerto_base: int = 0):
+        self.config = config or FakeConfig()
+        self.host = host
+        self.puerto_base = puerto_base
+        self.servidores: Dict[str, ThreadingHTTPServer] = {}
+
+    def __enter__(self) -> "FakeProviders":
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.detener()
+
+    def iniciar(self) -> None:
+        for i, (nombre, handler) in enumerate(self.HANDLERS.items()):
+            puerto = self.puerto_base + i if self.puerto_base else 0
+            servidor = ThreadingHTTPServer((self.host, puerto), handler)
+            servidor.daemon_threads = True
+            servidor.config = self.config
+            servidor.lock = threading.Lock()
+            servidor.rnd = random.Random(f"{self.config.semilla}-{nombre}")
+            servidor.llamadas = 0
+            servidor.bytes_enviados = 0
+            threading.Thread(target=servidor.serve_forever, name=f"fake-{nombre}", daemon=True).start()
+            self.servidores[nombre] = servidor
+
+    def detener(self) -> None:
+        for servidor in self.servidores.values():
+            servidor.shutdown()
+            servidor.server_close()
+        self.servidores.clear()
+
+    def url(self, nombre: str) -> str:
+        host, puerto = self.servidores[nombre].server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def env(self) -> Dict[str, str]:
+        """Variables de entorno que apuntan los pipelines a estos servidores"""
+        return {
+            "DEEPSEEK_API_KEY": "fake",
+            "DEEPSEEK_API_URL": self.url("deepseek") + "/v1/chat/completions",
+            "ELEVENLABS_API_KEY": "fake",
+            "ELEVENLABS_BASE_URL": self.url("elevenlabs"),
+            "GEMINI_API_KEY": "fake",
+            "GEMINI_BASE_URL": self.url("gemini"),
+        }
+
+    def estadisticas(self) -> Dict[str, Dict[str, int]]:
+        return {
+            nombre: {"llamadas": s.llamadas, "bytes": s.bytes_enviados}
+            for nombre, s in self.servidores.items()
+        }
+
+
+def agregar_argumentos(parser: argparse.ArgumentParser) -> None:
+    """Flags de FakeConfig (compartidos con run_benchmarks)"""
+    d = FakeConfig()
+    parser.add_argument("--latencia", type=float, default=d.latencia, help="Segundos antes de cada respuesta")
+    parser.add_argument("--jitter", type=float, default=d.jitter, help="Variación +- de la latencia (segundos)")
+    parser.add_argument("--tasa-error", type=float, default=d.tasa_error, help="Probabilidad de HTTP 500 en TTS e imágenes")
+    parser.add_argument("--tasa-error-deepseek", type=float, default=d.tasa_error_deepseek, help="Probabilidad de HTTP 500 en Deepseek")
+    parser.add_argument("--escenas", type=int, default=d.escenas, help="Escenas del guion falso")
+    parser.add_argument("--chars-dialogo", type=int, default=d.chars_dialogo, help="Largo de cada diálogo")
+    parser.add_argument("--audio-kb", type=int, default=d.audio_kb, help="Tamaño fijo de cada MP3 (0 = según el texto)")
+    parser.add_argument("--imagen-lado", type=int, default=d.imagen_lado, help="Lado en px de cada PNG")
+    parser.add_argument("--delay-chunk", type=float, default=d.delay_chunk, help="Segundos entre eventos SSE")
+    parser.add_argument("--semilla", type=int, default=d.semilla)
+
+
+def config_desde_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latencia=args.latencia,
+        jitter=args.jitter,
+        tasa_error=args.tasa_error,
+        tasa_error_deepseek=args.tasa_error_deepseek,
+        escenas=args.escenas,
+        chars_dialogo=args.chars_dialogo,
+        audio_kb=args.audio_kb,
+        imagen_lado=args.imagen_lado,
+        delay_chunk=args.delay_chunk,
+        semilla=args.semilla,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidores falsos de Deepseek, ElevenLabs y Gemini")
+    agregar_argumentos(parser)
+    parser.add_argument("--puerto", type=int, default=0, help="Puerto base (deepseek, +1 elevenlabs, +2 gemini); 0 = efímeros")
+    args = parser.parse_args()
+
+    config = config_desde_args(args)
+    with FakeProviders(config, puerto_base=args.puerto) as fakes:
+        # Primera línea: JSON con el entorno (run_benchmarks la lee para apuntar los pipelines)
+        print(json.dumps({"env": fakes.env(), "config": asdict(config)}), flush=True)
+        try:
+            # Termina al cerrarse stdin (proceso padre) o con Ctrl+C
+            sys.stdin.read()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,139 @@
+"""
+Benchmark de arranque en frío: cuánto cuesta importar cada punto de entrada.
+
+Cada medición es un intérprete nuevo (`python -X importtime -c "import ..."`), así
+que no hay módulos en caché de sys.modules. Se reporta:
+  - wall: tiempo total del proceso (mediana de N repeticiones, incluye el arranque
+    de Python)
+  - import_ms: costo acumulado del import según -X importtime
+  - modulos: cuántos módulos quedaron cargados
+  - pesados: cuáles de los SDKs pesados (moviepy, PIL, elevenlabs, google.genai,
+    httpx, numpy) se cargaron
+
+Uso:
+    python -m benchmarks.import_time --repeticiones 5
+    python -m benchmarks.import_time --comparar benchmarks/results/imports_<sha>.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict
+
+from .run_benchmarks import RAIZ, RESULTS_DIR, _git
+
+PESADOS = ("moviepy", "PIL", "elevenlabs", "google.genai", "httpx", "numpy")
+
+_DJANGO = "import django; django.setup(); "
+
+# Nombre -> código que se ejecuta en el intérprete nuevo
+OBJETIVOS = {
+    "pipelines": "import pipelines",
+    "pipeline_guion": "import pipelines.pipeline_guion",
+    "pipeline_audio": "import pipelines.pipeline_audio",
+    "pipeline_imagen": "import pipelines.pipeline_imagen",
+    "pipeline_video": "import pipelines.pipeline_video",
+    "main": "import main",
+    "agents": "import agents",
+    "django_setup": _DJANGO.rstrip("; "),
+    "webapp.urls": _DJANGO + "import webapp.urls",
+}
+
+# Se imprime al final del proceso medido (en stdout; -X importtime escribe en stderr)
+_SONDA = (
+    "; import sys, json; print(json.dumps({'modulos': len(sys.modules), "
+    "'pesados': sorted(m for m in %r if m in sys.modules)}))" % (PESADOS,)
+)
+
+
+def _import_ms(stderr: str) -> float:
+    """Suma el acumulado (us) de los imports de nivel superior del reporte de -X importtime"""
+    total = 0
+    for linea in stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|", 2)
+        # Los de nivel superior no tienen sangría extra en el nombre
+        if acumulado.strip().isdigit() and not nombre.startswith("  "):
+            total += int(acumulado)
+    return round(total / 1000, 1)
+
+
+def medir(nombre: str, repeticiones: int) -> Dict[str, Any]:
+    """Importa el objetivo en `repeticiones` intérpretes nuevos"""
+    codigo = OBJETIVOS[nombre]
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings", "PYTHONDONTWRITEBYTECODE": "1"}
+    walls, imports = [], []
+    sonda: Dict[str, Any] = {}
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", codigo + _SONDA],
+            cwd=RAIZ, env=env, capture_output=True, text=True,
+        )
+        walls.append(time.perf_counter() - t0)
+        if proceso.returncode != 0:
+            error = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "sin salida"
+            return {"error": error}
+        imports.append(_import_ms(proceso.stderr))
+        sonda = json.loads(proceso.stdout.strip().splitlines()[-1])
+    return {
+        "wall": round(statistics.median(walls), 4),
+        "import_ms": statistics.median(imports),
+        **sonda,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tiempo de import en frío de los puntos de entrada")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Intérpretes por objetivo (se usa la mediana)")
+    parser.add_argument("--objetivos", default=",".join(OBJETIVOS), help="Objetivos separados por coma")
+    parser.add_argument("--output", help="Archivo de resultados (default: benchmarks/results/imports_<git sha>.json)")
+    parser.add_argument("--comparar", help="Resultados anteriores para mostrar la diferencia")
+    args = parser.parse_args()
+
+    anteriores = {}
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anteriores = json.load(f)["resultados"]
+
+    print(f"🧊 Import en frío ({args.repeticiones} repeticiones por objetivo)")
+    resultados = {}
+    for nombre in [o.strip() for o in args.objetivos.split(",") if o.strip()]:
+        if nombre not in OBJETIVOS:
+            raise ValueError(f"Objetivo desconocido: {nombre} (opciones: {', '.join(OBJETIVOS)})")
+        resultado = medir(nombre, args.repeticiones)
+        resultados[nombre] = resultado
+        if "error" in resultado:
+            print(f"   {nombre:<16} ❌ {resultado['error']}")
+            continue
+        delta = ""
+        previo = anteriores.get(nombre, {})
+        if "import_ms" in previo:
+            delta = f"  ({resultado['import_ms'] - previo['import_ms']:+.1f} ms)"
+        print(f"   {nombre:<16} {resultado['import_ms']:>8.1f} ms import  {resultado['wall'] * 1000:>7.0f} ms proceso  "
+              f"{resultado['modulos']:>5} módulos  {', '.join(resultado['pesados']) or '-'}{delta}")
+
+    commit = _git("rev-parse", "HEAD") or "sin-git"
+    reporte = {
+        "commit": commit,
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "repeticiones": args.repeticiones,
+        "resultados": resultados,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"imports_{commit[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    print(f"✅ Resultados guardados en: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
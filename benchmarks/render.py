@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks de render de Pipeline 4 (la única etapa limitada por CPU).
+
+1. Genera fixtures sintéticos de N escenas: guion, imágenes (degradado + número
+   de escena) y audios de tono de la duración indicada. No llama a ninguna API.
+2. Recorre la grilla escenas x segundos x resolución x fps x motor, midiendo cada
+   combinación en un proceso propio. El CPU incluye a ffmpeg (proceso hijo) y el
+   pico de memoria es el mayor entre Python y ffmpeg.
+
+Métrica principal: segundos de video por segundo de CPU (más alto = mejor).
+
+Uso:
+    python -m benchmarks.render --escenas 4,8,16 --segundos 5 --resoluciones 640x360,1280x720 \\
+        --fps 24 --motores compose,chain --preset veryfast
+"""
+import argparse
+import itertools
+import json
+import math
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .fake_providers import guion_falso
+from .run_benchmarks import RAIZ, RESULTS_DIR, _git
+
+
+def _lista(texto: str, tipo=str) -> List:
+    return [tipo(x.strip()) for x in texto.split(",") if x.strip()]
+
+
+def _resolucion(texto: str) -> tuple:
+    ancho, alto = texto.lower().split("x")
+    return int(ancho), int(alto)
+
+
+# --------------------------------------------------------------------------- #
+# Fixtures
+# --------------------------------------------------------------------------- #
+def generar_fixture(directorio: str | Path, escenas: int, segundos: float, lado: int = 1024) -> Path:
+    """
+    Crea guion.json, images/image_N.png y voices/dialogue_N.mp3 para N escenas.
+
+    Args:
+        directorio: Dónde crear el fixture (se reutiliza si ya existe completo)
+        escenas: Número de escenas
+        segundos: Duración del tono de cada "diálogo"
+        lado: Lado en px de las imágenes cuadradas (Gemini entrega 1024x1024)
+
+    Returns:
+        El directorio del fixture
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+    from moviepy import AudioClip
+
+    directorio = Path(directorio)
+    guion_path = directorio / "guion.json"
+    if guion_path.exists():
+        return directorio
+
+    images_dir = directorio / "images"
+    voices_dir = directorio / "voices"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    voices_dir.mkdir(parents=True, exist_ok=True)
+
+    gradiente = np.linspace(0, 255, lado, dtype=np.uint8)
+    for n in range(1, escenas + 1):
+        # Degradado distinto por escena para que el encoder no vea cuadros idénticos
+        pixeles = np.zeros((lado, lado, 3), dtype=np.uint8)
+        pixeles[..., 0] = gradiente[None, :]
+        pixeles[..., 1] = gradiente[:, None]
+        pixeles[..., 2] = (n * 37) % 256
+        imagen = Image.fromarray(pixeles)
+        ImageDraw.Draw(imagen).text((lado // 2, lado // 2), str(n), fill=(255, 255, 255))
+        imagen.save(images_dir / f"image_{n}.png")
+
+        frecuencia = 220 + 40 * n
+        tono = AudioClip(
+            lambda t, f=frecuencia: 0.2 * np.sin(2 * math.pi * f * np.asarray(t)),
+            duration=segundos,
+            fps=44100,
+        )
+        tono.write_audiofile(str(voices_dir / f"dialogue_{n}.mp3"), fps=44100, logger=None)
+
+    with open(guion_path, "w", encoding="utf-8") as f:
+        json.dump(guion_falso(escenas, 80, semilla=escenas), f, ensure_ascii=False, indent=2)
+    return directorio
+
+
+# --------------------------------------------------------------------------- #
+# Medición (en un proceso propio por combinación)
+# --------------------------------------------------------------------------- #
+def medir(fixture: Path, fps: int, resolucion: tuple | None, motor: str, preset: str, threads: int | None) -> Dict[str, Any]:
+    """Renderiza el fixture y devuelve tiempos, CPU (Python + ffmpeg) y pico de memoria"""
+    from pipelines import Pipeline4Video, Guion, RunReport
+
+    guion = Guion.cargar(fixture / "guion.json")
+    salida = Path(tempfile.mkdtemp(prefix="bench_render_"))
+    pipeline = Pipeline4Video(
+        output_dir=str(salida),
+        voices_dir=str(fixture / "voices"),
+        images_dir=str(fixture / "images"),
+        fps=fps,
+        resolucion=resolucion,
+        preset=preset,
+        motor=motor,
+        threads=threads,
+    )
+    reporte = RunReport("render")
+
+    propio0 = resource.getrusage(resource.RUSAGE_SELF)
+    hijos0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    with reporte.activo():
+        ruta = Path(pipeline.generar(guion, output_name="render.mp4"))
+    wall = time.perf_counter() - t0
+    propio1 = resource.getrusage(resource.RUSAGE_SELF)
+    hijos1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu_python = (propio1.ru_utime - propio0.ru_utime) + (propio1.ru_stime - propio0.ru_stime)
+    cpu_ffmpeg = (hijos1.ru_utime - hijos0.ru_utime) + (hijos1.ru_stime - hijos0.ru_stime)
+    cpu = cpu_python + cpu_ffmpeg
+    encode = next(s for s in reporte.spans if s.nombre == "ffmpeg.encode")
+    segundos_video = encode.atributos["segundos_video"]
+    bytes_salida = ruta.stat().st_size
+    shutil.rmtree(salida, ignore_errors=True)
+
+    return {
+        "segundos_video": segundos_video,
+        "wall": round(wall, 3),
+        "encode_wall": round(encode.duracion, 3),
+        "cpu": round(cpu, 3),
+        "cpu_python": round(cpu_python, 3),
+        "cpu_ffmpeg": round(cpu_ffmpeg, 3),
+        "video_s_por_cpu_s": round(segundos_video / cpu, 3) if cpu else None,
+        "tiempo_real_x": round(segundos_video / wall, 3) if wall else None,
+        # ru_maxrss en KB (Linux); para los hijos es el del hijo más grande
+        "rss_mb": round(propio1.ru_maxrss / 1024, 1),
+        "rss_ffmpeg_mb": round(hijos1.ru_maxrss / 1024, 1),
+        "bytes": bytes_salida,
+    }
+
+
+def _medir_en_subproceso(fixture: Path, fps: int, resolucion: str, motor: str, preset: str, threads: int | None) -> Dict[str, Any]:
+    cmd = [sys.executable, "-m", "benchmarks.render", "--_medir", str(fixture),
+           "--fps", str(fps), "--resoluciones", resolucion, "--motores", motor, "--preset", preset]
+    if threads:
+        cmd += ["--threads", str(threads)]
+    proceso = subprocess.run(cmd, cwd=RAIZ, capture_output=True, text=True)
+    lineas = proceso.stdout.strip().splitlines()
+    if proceso.returncode != 0 or not lineas:
+        raise RuntimeError(f"Falló el render ({resolucion}, {fps} fps, {motor}):\n{proceso.stderr[-2000:]}")
+    return json.loads(lineas[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de render de Pipeline 4")
+    parser.add_argument("--escenas", default="4,8", help="Número de escenas, separados por coma")
+    parser.add_argument("--segundos", default="5", help="Segundos de audio por escena, separados por coma")
+    parser.add_argument("--resoluciones", default="640x360,1280x720", help="ANCHOxALTO separados por coma, u 'original'")
+    parser.add_argument("--fps", default="24", help="FPS separados por coma")
+    parser.add_argument("--motores", default="compose,chain", help="Métodos de concatenación: compose, chain")
+    parser.add_argument("--preset", default="medium", help="Preset de x264")
+    parser.add_argument("--threads", type=int, help="Hilos de ffmpeg")
+    parser.add_argument("--lado-imagen", type=int, default=1024, help="Lado de las imágenes del fixture")
+    parser.add_argument("--fixtures-dir", help="Reutilizar fixtures en este directorio (default: temporal)")
+    parser.add_argument("--output", help="Archivo de resultados (default: benchmarks/results/render_<git sha>.json)")
+    parser.add_argument("--_medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._medir:
+        # Modo interno: una sola combinación, resultado JSON en la última línea
+        resolucion = None if args.resoluciones == "original" else _resolucion(args.resoluciones)
+        resultado = medir(Path(args._medir), int(args.fps), resolucion, args.motores, args.preset, args.threads)
+        print(json.dumps(resultado))
+        return 0
+
+    fixtures_dir = Path(args.fixtures_dir) if args.fixtures_dir else Path(tempfile.mkdtemp(prefix="bench_fixtures_"))
+    combinaciones = list(itertools.product(
+        _lista(args.escenas, int), _lista(args.segundos, float), _lista(args.resoluciones),
+        _lista(args.fps, int), _lista(args.motores),
+    ))
+    print(f"🎞️  Render benchmark: {len(combinaciones)} combinaciones (preset {args.preset})")
+
+    resultados = []
+    try:
+        for escenas, segundos, resolucion, fps, motor in combinaciones:
+            if motor == "chain" and resolucion == "original":
+                continue  # chain necesita clips del mismo tamaño; con 'original' no está garantizado
+            fixture = generar_fixture(fixtures_dir / f"{escenas}x{segundos:g}s_{args.lado_imagen}px",
+                                      escenas, segundos, args.lado_imagen)
+            medicion = _medir_en_subproceso(fixture, fps, resolucion, motor, args.preset, args.threads)
+            resultados.append({
+                "escenas": escenas, "segundos_escena": segundos, "resolucion": resolucion,
+                "fps": fps, "motor": motor, **medicion,
+            })
+            print(f"   {escenas:>3} esc x {segundos:g}s {resolucion:>10} {fps:>3}fps {motor:<7} "
+                  f"{medicion['video_s_por_cpu_s']} s-video/s-CPU  {medicion['tiempo_real_x']}x tiempo real  "
+                  f"rss={max(medicion['rss_mb'], medicion['rss_ffmpeg_mb']):.0f}MB")
+    finally:
+        if not args.fixtures_dir:
+            shutil.rmtree(fixtures_dir, ignore_errors=True)
+
+    commit = _git("rev-parse", "HEAD") or "sin-git"
+    reporte = {
+        "commit": commit,
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"preset": args.preset, "threads": args.threads, "lado_imagen": args.lado_imagen},
+        "resultados": resultados,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"render_{commit[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    print(f"✅ Resultados guardados en: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
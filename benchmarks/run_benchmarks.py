@@ -0,0 +1,171 @@
+"""
+Benchmark de punta a punta contra los servidores falsos.
+
+Para cada repetición crea un run nuevo (sin caché) y mide cada etapa aislada en
+su propio proceso (guion -> audio -> imagen -> video), y luego el flujo completo
+de main.py. Guarda benchmarks/results/<git sha>.json con las muestras y la
+mediana por etapa, para comparar entre commits en la misma máquina.
+
+Uso:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --escenas 8 --latencia 0.3 --tasa-error 0.05 --repeticiones 5
+    python -m benchmarks.run_benchmarks --etapas guion,e2e --stream
+    python -m benchmarks.run_benchmarks --comparar benchmarks/results/<otro sha>.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .etapa import ETAPAS_AISLADAS
+from .fake_providers import agregar_argumentos
+
+RAIZ = Path(__file__).resolve().parent.parent
+RESULTS_DIR = RAIZ / "benchmarks" / "results"
+METRICAS = ("wall", "cpu", "rss_mb", "bytes")
+DEPENDENCIAS = {"audio": ("guion",), "imagen": ("guion",), "video": ("guion", "audio", "imagen")}
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _iniciar_fakes(args) -> tuple:
+    """Levanta fake_providers en un proceso aparte (su CPU no cuenta en las mediciones)"""
+    cmd = [sys.executable, "-m", "benchmarks.fake_providers"]
+    for flag in ("latencia", "jitter", "tasa_error", "tasa_error_deepseek", "escenas",
+                 "chars_dialogo", "audio_kb", "imagen_lado", "delay_chunk", "semilla"):
+        cmd += [f"--{flag.replace('_', '-')}", str(getattr(args, flag))]
+    proceso = subprocess.Popen(cmd, cwd=RAIZ, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    primera = proceso.stdout.readline()
+    if not primera:
+        proceso.kill()
+        raise RuntimeError("No se pudieron iniciar los servidores falsos")
+    return proceso, json.loads(primera)["env"]
+
+
+def _medir(etapa: str, env: Dict[str, str], runs_dir: Path, run_id: str, args) -> Dict[str, Any]:
+    cmd = [sys.executable, "-m", "benchmarks.etapa", etapa, "--runs-dir", str(runs_dir),
+           "--run-id", run_id, "--moraleja", args.moraleja]
+    if args.stream and etapa == "e2e":
+        cmd.append("--stream")
+    proceso = subprocess.run(cmd, cwd=RAIZ, env=env, capture_output=True, text=True)
+    lineas = proceso.stdout.strip().splitlines()
+    if proceso.returncode != 0 or not lineas:
+        raise RuntimeError(f"La etapa '{etapa}' falló:\n{proceso.stdout[-2000:]}\n{proceso.stderr[-2000:]}")
+    return json.loads(lineas[-1])
+
+
+def _mediana(muestras: List[Dict[str, Any]]) -> Dict[str, float]:
+    return {m: round(statistics.median(s[m] for s in muestras), 4) for m in METRICAS}
+
+
+def comparar(actual: Dict[str, Any], anterior: Dict[str, Any]) -> str:
+    """Tabla de diferencias de medianas entre dos archivos de resultados"""
+    lineas = [f"{'etapa':<8} {'métrica':<8} {anterior['commit'][:8]:>12} {actual['commit'][:8]:>12} {'delta':>8}"]
+    for etapa, datos in actual["etapas"].items():
+        previo = anterior.get("etapas", {}).get(etapa)
+        if not previo:
+            continue
+        for m in METRICAS:
+            a, b = previo["mediana"][m], datos["mediana"][m]
+            delta = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            lineas.append(f"{etapa:<8} {m:<8} {a:>12} {b:>12} {delta:>8}")
+    if actual.get("config") != anterior.get("config"):
+        lineas.append("⚠️  Las configuraciones no coinciden: la comparación no es directa")
+    return "\n".join(lineas)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de los pipelines con proveedores falsos")
+    agregar_argumentos(parser)
+    parser.add_argument("--etapas", default="guion,audio,imagen,video,e2e",
+                        help="Etapas a medir, separadas por coma (guion,audio,imagen,video,e2e)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--stream", action="store_true", help="Medir e2e con main.py --stream")
+    parser.add_argument("--moraleja", default="medir antes de optimizar")
+    parser.add_argument("--output", help="Archivo de resultados (default: benchmarks/results/<git sha>.json)")
+    parser.add_argument("--comparar", help="Resultados de otro commit para comparar")
+    args = parser.parse_args()
+
+    etapas = [e.strip() for e in args.etapas.split(",") if e.strip()]
+    invalidas = set(etapas) - set(ETAPAS_AISLADAS) - {"e2e"}
+    if invalidas:
+        parser.error(f"Etapas desconocidas: {', '.join(sorted(invalidas))}")
+    # Cada etapa necesita las salidas de las anteriores en el run: se ejecutan sin registrarlas
+    necesarias = set(etapas)
+    for etapa in etapas:
+        necesarias.update(DEPENDENCIAS.get(etapa, ()))
+    aisladas = [e for e in ETAPAS_AISLADAS if e in necesarias]
+    medir = set(etapas)
+
+    commit = _git("rev-parse", "HEAD") or "sin-git"
+    sucio = bool(_git("status", "--porcelain", "--untracked-files=no"))
+
+    proceso, env_fakes = _iniciar_fakes(args)
+    env = {**os.environ, **env_fakes}
+    env.pop("METRICS_PROM_PATH", None)
+    muestras: Dict[str, List[Dict[str, Any]]] = {e: [] for e in etapas}
+    tmp = Path(tempfile.mkdtemp(prefix="bench_runs_"))
+
+    print(f"📏 Benchmark {commit[:8]}{' (cambios sin commit)' if sucio else ''}: "
+          f"{args.escenas} escenas, latencia {args.latencia}s, error {args.tasa_error}, {args.repeticiones} repeticiones")
+    try:
+        for rep in range(args.repeticiones):
+            run_id = f"rep{rep}"
+            for etapa in aisladas:
+                resultado = _medir(etapa, env, tmp / "aisladas", run_id, args)
+                if etapa in medir:
+                    muestras[etapa].append(resultado)
+                    print(f"   {rep + 1}/{args.repeticiones} {etapa:<7} {resultado['wall']:.2f}s "
+                          f"cpu={resultado['cpu']:.2f}s rss={resultado['rss_mb']:.0f}MB")
+            if "e2e" in medir:
+                resultado = _medir("e2e", env, tmp / f"e2e_{rep}", run_id, args)
+                muestras["e2e"].append(resultado)
+                print(f"   {rep + 1}/{args.repeticiones} e2e     {resultado['wall']:.2f}s "
+                      f"cpu={resultado['cpu']:.2f}s rss={resultado['rss_mb']:.0f}MB")
+    finally:
+        proceso.stdin.close()
+        proceso.wait(timeout=10)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    reporte = {
+        "commit": commit,
+        "sucio": sucio,
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "maquina": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {k: getattr(args, k) for k in (
+            "latencia", "jitter", "tasa_error", "tasa_error_deepseek", "escenas", "chars_dialogo",
+            "audio_kb", "imagen_lado", "delay_chunk", "semilla", "repeticiones", "stream")},
+        "etapas": {e: {"mediana": _mediana(m), "muestras": m} for e, m in muestras.items() if m},
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit[:12]}{'-sucio' if sucio else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    print(f"✅ Resultados guardados en: {output}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            print(comparar(reporte, json.load(f)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,5 +12,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Vistas async (httpx + sync_to_async) para generación y progreso
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+# Pipelines construidos al arrancar el worker, no en la primera generación
+# (solo las etapas de PRECALENTAR_PIPELINES; las demás en su primer uso)
+from django.conf import settings  # noqa: E402
+
+if settings.PRECALENTAR_PIPELINES:
+    from pipelines.registry import get_registry
+    get_registry().precalentar(settings.PRECALENTAR_PIPELINES)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -122,6 +123,45 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'assets' / 'outputs'
 
+# Runs de generación (manifest.json + guion, voces e imágenes por tarea)
+RUNS_ROOT = BASE_DIR / 'assets' / 'runs'
+
+# Progreso de las generaciones (ver webapp/progress.py)
+# BACKEND: 'sqlite' (compartido entre workers), 'memory' (solo este proceso) o
+# 'shm' (memoria compartida entre procesos de la misma máquina)
+PROGRESS_STORE = {
+    'BACKEND': os.getenv('PROGRESS_BACKEND', 'sqlite'),
+    'TTL': 24 * 3600,       # segundos que se conserva el progreso de una tarea
+    'MAX_ENTRIES': 1000,    # tope de tareas guardadas (se descartan las más viejas)
+    'OPTIONS': {'path': BASE_DIR / 'progress.sqlite3'},
+}
+if PROGRESS_STORE['BACKEND'] != 'sqlite':
+    PROGRESS_STORE['OPTIONS'] = {}
+
+# Generaciones simultáneas en segundo plano por proceso
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', '2'))
+
+# Control de admisión de generaciones (ver webapp/admission.py). Límites por proceso.
+ADMISSION = {
+    'MAX_CONCURRENT': PIPELINE_WORKERS,   # generaciones corriendo a la vez
+    'MAX_QUEUE': int(os.getenv('ADMISSION_MAX_QUEUE', '20')),  # esperando, en total
+    'MAX_QUEUE_ANONYMOUS': 5,             # parte de la cola que pueden ocupar los anónimos
+    'PER_HOUR': 6, 'BURST': 3,            # token bucket por usuario logueado
+    'PER_HOUR_ANONYMOUS': 2, 'BURST_ANONYMOUS': 1,  # token bucket por IP
+}
+
+# Etapas que se construyen al arrancar el worker (config/wsgi.py y asgi.py), separadas
+# por coma. Por defecto guion y audio; imagen y video importan google-genai/PIL y
+# moviepy, que pesan cientos de ms, así que se importan/construyen en su primer uso
+# salvo que se pidan acá. Vacío (o 0) = ninguna; 1 = las cuatro.
+_PRECALENTAR = os.getenv('PRECALENTAR_PIPELINES', 'guion,audio').strip()
+PRECALENTAR_PIPELINES = {'0': [], '1': ['guion', 'audio', 'imagen', 'video']}.get(
+    _PRECALENTAR, [etapa.strip() for etapa in _PRECALENTAR.split(',') if etapa.strip()]
+)
+
+# Variantes async de las vistas (las activa config/asgi.py; ver webapp/views_async.py)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS') == '1'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
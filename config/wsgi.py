@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Pipelines construidos al arrancar el worker, no en la primera generación
+# (solo las etapas de PRECALENTAR_PIPELINES; las demás en su primer uso)
+from django.conf import settings  # noqa: E402
+
+if settings.PRECALENTAR_PIPELINES:
+    from pipelines.registry import get_registry
+    get_registry().precalentar(settings.PRECALENTAR_PIPELINES)
@@ -4,19 +4,90 @@ Orquestador Principal - Generador de Cuentos Infantiles
 Ejecuta los 4 pipelines en secuencia para crear un video educativo completo.
 
 Flujo:
-1. Pipeline 1 (Guion): moraleja -> guion.json
-2. Pipeline 2 (Audio): guion.json -> dialogue_N.mp3
-3. Pipeline 3 (Imagen): guion.json -> image_N.png
+1. Pipeline 1 (Guion): moraleja -> Guion (checkpoint en el run)
+2. Pipeline 2 (Audio): Guion -> dialogue_N.mp3
+3. Pipeline 3 (Imagen): Guion -> image_N.png
 4. Pipeline 4 (Video): todos los assets -> cuento_final.mp4
 
+El guion se pasa en memoria entre pipelines. Cada ejecución es un "run" en
+assets/runs/<run_id>/ con su manifest.json, guion.json, voces e imágenes.
+
 Uso:
     python main.py "no hablar con extraños"
     python main.py "compartir con los demás" --output mi_cuento.mp4
+    python main.py "ser honesto" --stream   # audio/imágenes empiezan mientras se escribe el guion
+    python main.py --resume 1a2b3c4d        # reanuda un run, saltando lo ya generado
+    python main.py --batch moralejas.txt    # muchas historias (una moraleja por línea, o JSONL)
 """
 import sys
 import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from pipelines import Pipeline1Guion, Pipeline2Audio, Pipeline3Imagen, Pipeline4Video
+from typing import Any, Dict, List, Tuple
+import pipelines  # las etapas (moviepy, elevenlabs, genai) se importan recién al usarlas
+from pipelines import Guion, PlanExcedeLimites, PlanRender, RunManifest, RunReport
+from pipelines.instrumentation import submit_con_contexto
+from pipelines.providers import get_limiter
+from pipelines.registry import get_registry
+from pipelines.run_manifest import RUNS_DIR
+
+
+def _generar_con_streaming(
+    args, manifest: RunManifest, renditions: List[str] | None
+) -> Tuple[Guion, PlanRender | None]:
+    """
+    Ejecuta Pipeline 1 en streaming y despacha audio (Pipeline 2) e imagen (Pipeline 3)
+    de cada escena a un pool de hilos en cuanto el modelo la termina de escribir.
+
+    En cuanto están todos los audios se calcula el plan de render, igual que sin
+    streaming: si excede los límites del job se cancelan las imágenes que todavía
+    no empezaron y se corta ahí.
+    
+    Returns:
+        (el guion completo, el plan de render o None con --skip-video)
+    """
+    pipeline1 = pipelines.Pipeline1Guion()
+    pipeline2 = None if args.skip_audio else pipelines.Pipeline2Audio()
+    pipeline3 = None if args.skip_imagen else pipelines.Pipeline3Imagen()
+    
+    futuros_audio = []
+    futuros_imagen = []
+    plan = None
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        def on_escena(escena):
+            if pipeline2 is not None:
+                futuros_audio.append(submit_con_contexto(executor, pipeline2.generar_escena, escena, manifest))
+            if pipeline3 is not None:
+                futuros_imagen.append(submit_con_contexto(executor, pipeline3.generar_escena, escena, manifest))
+        
+        guion = pipeline1.generar(args.moraleja, on_escena=on_escena, manifest=manifest)
+        
+        # Propagar cualquier error de los hilos y cerrar la etapa de audio en el
+        # manifiesto (las escenas ya hechas se saltan)
+        for futuro in futuros_audio:
+            futuro.result()
+        if pipeline2 is not None:
+            pipeline2.generar(guion, manifest=manifest)
+        
+        if not args.skip_video:
+            try:
+                plan = pipelines.Pipeline4Video(renditions=renditions).planificar(guion, manifest=manifest)
+            except PlanExcedeLimites:
+                for futuro in futuros_imagen:
+                    futuro.cancel()
+                raise
+        
+        for futuro in futuros_imagen:
+            futuro.result()
+    
+    if pipeline3 is not None:
+        pipeline3.generar(guion, manifest=manifest)
+    
+    return guion, plan
 
 
 def main():
@@ -26,8 +97,19 @@ def main():
     )
     parser.add_argument(
         "moraleja",
+        nargs="?",
         help="La moraleja o lección de la historia (ej: 'no hablar con extraños')"
     )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Reanudar un run anterior: salta las etapas y escenas ya completas"
+    )
+    parser.add_argument(
+        "--runs-dir",
+        default=str(RUNS_DIR),
+        help=f"Directorio de los runs (default: {RUNS_DIR})"
+    )
     parser.add_argument(
         "--output",
         "-o",
@@ -49,58 +131,341 @@ def main():
         action="store_true",
         help="Saltar Pipeline 4 (útil para solo generar guion y assets)"
     )
+    parser.add_argument(
+        "--subtitulos-mp4",
+        action="store_true",
+        help="Agregar los subtítulos como pista del MP4 (los .vtt/.srt se generan siempre)"
+    )
+    parser.add_argument(
+        "--renditions",
+        help="Calidades del video a generar en una sola pasada, ej: 360p,720p,1080p (default: escalera de config/render.json)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Streaming del guion: genera audio e imagen de cada escena apenas el modelo la termina"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Hilos para audio/imágenes en modo --stream (default: 4)"
+    )
     parser.add_argument(
         "--guion-only",
         action="store_true",
         help="Solo ejecutar Pipeline 1 (solo generar guion.json)"
     )
+    parser.add_argument(
+        "--batch",
+        metavar="ARCHIVO",
+        help="Generar muchas historias: .txt con una moraleja por línea, o JSONL con 'moraleja' (o 'title') e 'id' opcional"
+    )
+    parser.add_argument(
+        "--batch-paralelo",
+        type=int,
+        default=4,
+        help="Historias en curso a la vez en modo --batch (default: 4)"
+    )
+    parser.add_argument(
+        "--video-workers",
+        type=int,
+        default=1,
+        help="Renders simultáneos en modo --batch; el encode es CPU intensivo (default: 1)"
+    )
+    parser.add_argument(
+        "--batch-report",
+        help="Resumen del batch en JSON (default: <runs-dir>/batch_<fecha>.json)"
+    )
     
     args = parser.parse_args()
     
+    if args.batch:
+        return _ejecutar_batch(args)
+    
+    if args.resume:
+        manifest = RunManifest.cargar(args.resume, base_dir=args.runs_dir)
+        args.moraleja = args.moraleja or manifest.moraleja
+    elif args.moraleja:
+        manifest = RunManifest.crear(args.moraleja, base_dir=args.runs_dir)
+    else:
+        parser.error("Indica una moraleja o --resume <run_id>")
+    
     print("=" * 70)
     print("🎨 GENERADOR DE CUENTOS INFANTILES EDUCATIVOS")
     print("=" * 70)
     print(f"Moraleja: '{args.moraleja}'")
     print(f"Output: {args.output}")
+    print(f"Run: {manifest.run_id} ({manifest.dir})")
+    if args.resume:
+        print(f"Estado previo: {manifest.resumen()}")
     print("=" * 70)
     print()
     
+    # Tiempos por etapa/escena/llamada externa -> assets/runs/<run_id>/report.json
+    reporte = RunReport(manifest.run_id)
     try:
-        # PIPELINE 1: Generar guion
-        print("PASO 1/4: Generando guion...")
-        pipeline1 = Pipeline1Guion()
-        guion = pipeline1.generar(args.moraleja, output_path="guion.json")
-        print()
-        
-        if args.guion_only:
-            print("✅ Guion generado. Proceso terminado (--guion-only activado).")
-            return 0
-        
-        # PIPELINE 2: Generar audio
-        if not args.skip_audio:
-            print("PASO 2/4: Generando audio de diálogos...")
-            pipeline2 = Pipeline2Audio()
-            audio_files = pipeline2.generar(guion_path="guion.json")
-            print()
-        else:
-            print("⏭️  PASO 2/4: Audio SALTADO (--skip-audio activado)")
-            print()
-        
-        # PIPELINE 3: Generar imágenes
-        if not args.skip_imagen:
-            print("PASO 3/4: Generando imágenes de escenas...")
-            pipeline3 = Pipeline3Imagen()
-            image_files = pipeline3.generar(guion_path="guion.json")
+        with reporte.activo():
+            return _ejecutar(args, manifest)
+    finally:
+        reporte.guardar(manifest.dir / "report.json")
+
+
+# --------------------------------------------------------------------------- #
+# Modo batch
+# --------------------------------------------------------------------------- #
+def _leer_batch(path: Path) -> List[Dict[str, Any]]:
+    """
+    Lee las historias del archivo de batch.
+    
+    - Texto: una moraleja por línea (se ignoran líneas vacías y las que empiezan con #)
+    - JSONL: un objeto por línea con "moraleja" (o "title") y opcionalmente "id"
+      (o "request_id"), que se usa como run_id
+    
+    El run_id es estable (el id, o un hash de la moraleja): correr el mismo archivo
+    otra vez reanuda o salta las historias ya hechas.
+    
+    Raises:
+        FileNotFoundError: Si el archivo no existe
+        ValueError: Si una línea JSON es inválida o no trae la moraleja
+    """
+    items = []
+    vistos = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for num_linea, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea or linea.startswith("#"):
+                continue
+            item_id = None
+            if linea.startswith("{"):
+                try:
+                    obj = json.loads(linea)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"{path}:{num_linea}: JSON inválido ({exc})") from exc
+                moraleja = (obj.get("moraleja") or obj.get("title") or "").strip()
+                item_id = obj.get("id") or obj.get("request_id")
+            else:
+                moraleja = linea
+            if not moraleja:
+                raise ValueError(f"{path}:{num_linea}: falta la moraleja")
+            
+            if item_id:
+                run_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(item_id))
+            else:
+                run_id = "b" + hashlib.sha1(moraleja.lower().encode("utf-8")).hexdigest()[:8]
+            if run_id in vistos:
+                print(f"⚠️  {path}:{num_linea}: historia repetida ({run_id}), se omite")
+                continue
+            vistos.add(run_id)
+            items.append({"linea": num_linea, "moraleja": moraleja, "run_id": run_id})
+    return items
+
+
+def _renditions(args) -> List[str] | None:
+    """Calidades pedidas con --renditions (None = la escalera de config/render.json)"""
+    return [r for r in args.renditions.split(",") if r] if args.renditions is not None else None
+
+
+def _pipeline_video_batch(args):
+    """
+    Pipeline 4 del batch: el del registro si no se pidieron opciones de video; si no, uno
+    con --renditions / --subtitulos-mp4 (compartido por todas las historias del batch)
+    """
+    if args.renditions is None and not args.subtitulos_mp4:
+        return get_registry().get("video")
+    return pipelines.Pipeline4Video(subtitulos_mp4=args.subtitulos_mp4, renditions=_renditions(args))
+
+
+def _historia_batch(
+    args,
+    item: Dict[str, Any],
+    pool_api: ThreadPoolExecutor,
+    pool_video: ThreadPoolExecutor,
+    pipeline4=None
+) -> Dict[str, Any]:
+    """Genera (o reanuda) una historia del batch. Devuelve su fila para el resumen."""
+    resultado = {**item, "estado": "completado", "error": None, "segundos": 0.0, "video": None, "usd": 0.0}
+    output_name = f"cuento_{item['run_id']}.mp4"
+    inicio = time.perf_counter()
+    
+    try:
+        manifest = RunManifest.cargar(item["run_id"], base_dir=args.runs_dir)
+    except FileNotFoundError:
+        manifest = RunManifest.crear(item["moraleja"], run_id=item["run_id"], base_dir=args.runs_dir)
+    
+    if args.guion_only:
+        requeridas = ["guion"]
+    else:
+        requeridas = ["guion"] + [etapa for etapa, saltar in
+                                  (("audio", args.skip_audio), ("imagen", args.skip_imagen), ("video", args.skip_video))
+                                  if not saltar]
+    if all(manifest.etapa_completa(etapa) for etapa in requeridas):
+        print(f"⏭️  [{item['run_id']}] Ya generada, se salta")
+        resultado["estado"] = "saltado"
+        resultado["video"] = str(manifest.salida_etapa("video") or "") or None
+        return resultado
+    
+    registro = get_registry()
+    reporte = RunReport(manifest.run_id)
+    try:
+        with reporte.activo():
+            print(f"▶️  [{item['run_id']}] {item['moraleja']}")
+            guion = registro.get("guion").generar(item["moraleja"], manifest=manifest)
+            
+            if not args.guion_only:
+                # Audio, imágenes y render van a pools compartidos: mientras una historia
+                # espera, las otras siguen con sus APIs
+                if not args.skip_audio:
+                    submit_con_contexto(pool_api, registro.get("audio").generar, guion, manifest).result()
+                
+                # Plan de render: si el video excede los límites del job, se corta antes de las imágenes
+                plan = None
+                if not args.skip_video:
+                    pipeline_video = pipeline4 or registro.get("video")
+                    plan = pipeline_video.planificar(guion, manifest=manifest)
+                
+                if not args.skip_imagen:
+                    submit_con_contexto(pool_api, registro.get("imagen").generar, guion, manifest).result()
+                
+                # El render espera turno en su propio pool (CPU)
+                if not args.skip_video:
+                    futuro = submit_con_contexto(
+                        pool_video, pipeline_video.generar, guion,
+                        output_name=output_name, manifest=manifest, plan=plan
+                    )
+                    resultado["video"] = futuro.result()
+        print(f"✅ [{item['run_id']}] Listo")
+    except Exception as e:
+        resultado["estado"] = "error"
+        resultado["error"] = f"{type(e).__name__}: {e}"
+        print(f"❌ [{item['run_id']}] {resultado['error']}")
+    finally:
+        reporte.guardar(manifest.dir / "report.json")
+        resultado["segundos"] = round(time.perf_counter() - inicio, 2)
+        resultado["usd"] = get_limiter().consumo(manifest.run_id)["usd"]
+    return resultado
+
+
+def _ejecutar_batch(args) -> int:
+    """Genera todas las historias del archivo de batch solapando etapas entre historias"""
+    if args.resume or args.moraleja:
+        print("❌ --batch no se combina con una moraleja ni con --resume")
+        return 2
+    try:
+        items = _leer_batch(Path(args.batch))
+        pipeline4 = None if args.skip_video or args.guion_only else _pipeline_video_batch(args)
+    except FileNotFoundError:
+        print(f"❌ No existe el archivo de batch: {args.batch}")
+        return 2
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    
+    print("=" * 70)
+    print("🎨 GENERADOR DE CUENTOS INFANTILES EDUCATIVOS - BATCH")
+    print("=" * 70)
+    print(f"Archivo: {args.batch} ({len(items)} historias)")
+    print(f"En paralelo: {args.batch_paralelo} historias, {args.video_workers} render(s)")
+    if args.stream:
+        print("⚠️  --stream se ignora en modo batch (el solapamiento es entre historias)")
+    print("=" * 70)
+    print()
+    
+    inicio = datetime.now()
+    t0 = time.perf_counter()
+    # Cada historia ocupa un hilo coordinador; audio/imagen van al pool de APIs y el render al de video
+    with ThreadPoolExecutor(max_workers=args.batch_paralelo, thread_name_prefix="historia") as pool_historias, \
+            ThreadPoolExecutor(max_workers=args.batch_paralelo * 2, thread_name_prefix="api") as pool_api, \
+            ThreadPoolExecutor(max_workers=args.video_workers, thread_name_prefix="video") as pool_video:
+        futuros = [pool_historias.submit(_historia_batch, args, item, pool_api, pool_video, pipeline4) for item in items]
+        filas = [futuro.result() for futuro in futuros]
+    duracion = time.perf_counter() - t0
+    
+    totales = {estado: sum(1 for f in filas if f["estado"] == estado) for estado in ("completado", "saltado", "error")}
+    resumen = {
+        "archivo": str(args.batch),
+        "inicio": inicio.isoformat(timespec="seconds"),
+        "segundos": round(duracion, 2),
+        "batch_paralelo": args.batch_paralelo,
+        "video_workers": args.video_workers,
+        "totales": totales,
+        "usd": round(sum(f["usd"] for f in filas), 6),
+        "historias": filas,
+    }
+    report_path = Path(args.batch_report) if args.batch_report else \
+        Path(args.runs_dir) / f"batch_{inicio.strftime('%Y%m%d-%H%M%S')}.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    
+    print()
+    print("=" * 70)
+    print(f"🎉 BATCH TERMINADO en {duracion:.1f}s: {totales['completado']} completadas, "
+          f"{totales['saltado']} saltadas, {totales['error']} con error")
+    print("=" * 70)
+    for fila in filas:
+        icono = {"completado": "✅", "saltado": "⏭️ ", "error": "❌"}[fila["estado"]]
+        print(f"  {icono} {fila['run_id']:<12} {fila['segundos']:>7.1f}s  {fila['moraleja'][:50]}")
+    print(f"  💰 Costo estimado de APIs: ${resumen['usd']:.4f}")
+    print(f"  📋 Resumen: {report_path}")
+    if totales["error"]:
+        print(f"  Para reintentar solo las que fallaron: python main.py --batch {args.batch}")
+    print("=" * 70)
+    return 1 if totales["error"] else 0
+
+
+def _ejecutar(args, manifest: RunManifest) -> int:
+    """Ejecuta los pipelines del run e imprime el resumen. Devuelve el código de salida."""
+    plan = None  # sin plan previo, Pipeline 4 lo calcula al renderizar
+    renditions = _renditions(args)
+    try:
+        if args.stream and not args.guion_only:
+            # PIPELINES 1-3 solapados: cada escena se despacha en cuanto se cierra en el streaming
+            print("PASOS 1-3/4: Generando guion en streaming + audio e imágenes por escena...")
+            guion, plan = _generar_con_streaming(args, manifest, renditions)
             print()
         else:
-            print("⏭️  PASO 3/4: Imágenes SALTADAS (--skip-imagen activado)")
+            # PIPELINE 1: Generar guion
+            print("PASO 1/4: Generando guion...")
+            pipeline1 = pipelines.Pipeline1Guion()
+            guion = pipeline1.generar(args.moraleja, manifest=manifest)
             print()
+            
+            if args.guion_only:
+                print("✅ Guion generado. Proceso terminado (--guion-only activado).")
+                return 0
+            
+            # PIPELINE 2: Generar audio
+            if not args.skip_audio:
+                print("PASO 2/4: Generando audio de diálogos...")
+                pipeline2 = pipelines.Pipeline2Audio()
+                audio_files = pipeline2.generar(guion, manifest=manifest)
+                print()
+            else:
+                print("⏭️  PASO 2/4: Audio SALTADO (--skip-audio activado)")
+                print()
+            
+            # Plan de render: con los audios ya se sabe cuánto dura el video y, si excede
+            # los límites del job, se corta antes de pagar las imágenes
+            if not args.skip_video:
+                plan = pipelines.Pipeline4Video(renditions=renditions).planificar(guion, manifest=manifest)
+                print()
+            
+            # PIPELINE 3: Generar imágenes
+            if not args.skip_imagen:
+                print("PASO 3/4: Generando imágenes de escenas...")
+                pipeline3 = pipelines.Pipeline3Imagen()
+                image_files = pipeline3.generar(guion, manifest=manifest)
+                print()
+            else:
+                print("⏭️  PASO 3/4: Imágenes SALTADAS (--skip-imagen activado)")
+                print()
         
         # PIPELINE 4: Ensamblar video
         if not args.skip_video:
             print("PASO 4/4: Ensamblando video final...")
-            pipeline4 = Pipeline4Video()
-            video_path = pipeline4.generar(guion_path="guion.json", output_name=args.output)
+            pipeline4 = pipelines.Pipeline4Video(subtitulos_mp4=args.subtitulos_mp4, renditions=renditions)
+            video_path = pipeline4.generar(guion, output_name=args.output, manifest=manifest, plan=plan)
             print()
         else:
             print("⏭️  PASO 4/4: Video SALTADO (--skip-video activado)")
@@ -111,21 +476,22 @@ def main():
         print("🎉 PROCESO COMPLETADO")
         print("=" * 70)
         print("Archivos generados:")
-        print(f"  📄 Guion: guion.json")
+        print(f"  📄 Guion: {manifest.guion_path}")
         
         if not args.skip_audio:
-            print(f"  🎵 Audio: assets/voices/dialogue_*.mp3")
+            print(f"  🎵 Audio: {manifest.voices_dir}/dialogue_*.mp3")
         
         if not args.skip_imagen:
-            print(f"  🖼️  Imágenes: assets/images/image_*.png")
+            print(f"  🖼️  Imágenes: {manifest.images_dir}/image_*.png")
         
         if not args.skip_video:
             print(f"  🎬 Video: assets/outputs/{args.output}")
+            print(f"  💬 Subtítulos: assets/outputs/{Path(args.output).stem}.vtt / .srt")
+            if pipeline4.escalera:
+                print(f"  📶 Renditions: assets/outputs/{Path(args.output).stem}.renditions.json")
         
-        print()
-        print("⚠️  NOTA: Los pipelines 2, 3 y 4 son placeholders.")
-        print("   Tus colegas deben implementar las APIs de TTS e imágenes.")
-        print("   Para video, instalar: pip install moviepy")
+        print(f"  ⏱️  Reporte de tiempos: {manifest.dir / 'report.json'}")
+        print(f"  💰 Costo estimado de APIs: ${get_limiter().consumo(manifest.run_id)['usd']:.4f}")
         print("=" * 70)
         
         return 0
@@ -142,6 +508,8 @@ def main():
         print("  1. Que DEEPSEEK_API_KEY esté configurada en .env")
         print("  2. Que tengas conexión a internet")
         print("  3. Los logs arriba para más detalles")
+        print()
+        print(f"Para reintentar sin repetir lo ya generado: python main.py --resume {manifest.run_id}")
         print("=" * 70)
         return 1
 
@@ -1,20 +1,67 @@
 """
 Pipelines para generación de cuentos infantiles
 
-Pipeline 1: Guion (texto) - deepseek_client.py -> guion.json
+Pipeline 1: Guion (texto) - Deepseek API -> Guion (checkpoint opcional en guion.json)
 Pipeline 2: Audio (voces) - TTS API -> dialogue_N.mp3
 Pipeline 3: Imagen (visual) - Image API -> image_N.png
 Pipeline 4: Video (ensamblaje) - MoviePy -> cuento_final.mp4
+
+Las clases de los pipelines se importan recién cuando se usan (requests, elevenlabs,
+google-genai/PIL y moviepy pesan cientos de ms): `import pipelines` solo carga el
+modelo del guion, el manifiesto, la instrumentación, el rate limiter y el plan de render.
 """
 
-from .pipeline_guion import Pipeline1Guion
-from .pipeline_audio import Pipeline2Audio
-from .pipeline_imagen import Pipeline3Imagen
-from .pipeline_video import Pipeline4Video
+import importlib
+
+from .guion_schema import validar_guion, normalizar_guion, GuionInvalidoError
+from .guion_model import Guion, Escena, Dialogo, Metadata, Personaje
+from .run_manifest import RunManifest
+from .instrumentation import RunReport, span
+from .providers import PresupuestoExcedido, get_limiter, limitar
+from .registry import PipelineRegistry, get_registry
+from .plan import PlanRender, PlanExcedeLimites
+
+# Nombre público -> módulo que lo define (se importa en el primer acceso)
+_PEREZOSOS = {
+    "Pipeline1Guion": ".pipeline_guion",
+    "Pipeline2Audio": ".pipeline_audio",
+    "Pipeline3Imagen": ".pipeline_imagen",
+    "Pipeline4Video": ".pipeline_video",
+}
 
 __all__ = [
     "Pipeline1Guion",
     "Pipeline2Audio",
     "Pipeline3Imagen",
     "Pipeline4Video",
+    "validar_guion",
+    "normalizar_guion",
+    "GuionInvalidoError",
+    "Guion",
+    "Escena",
+    "Dialogo",
+    "Metadata",
+    "Personaje",
+    "RunManifest",
+    "RunReport",
+    "span",
+    "PresupuestoExcedido",
+    "get_limiter",
+    "limitar",
+    "PipelineRegistry",
+    "get_registry",
+    "PlanRender",
+    "PlanExcedeLimites",
 ]
+
+
+def __getattr__(nombre):
+    if nombre in _PEREZOSOS:
+        valor = getattr(importlib.import_module(_PEREZOSOS[nombre], __name__), nombre)
+        globals()[nombre] = valor  # los siguientes accesos no pasan por acá
+        return valor
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_PEREZOSOS))
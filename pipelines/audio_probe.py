@@ -0,0 +1,115 @@
+"""
+Duración de un MP3 leyendo los encabezados de sus frames, sin ffmpeg.
+
+Cada frame MPEG de audio empieza con un encabezado de 4 bytes que dice su bitrate,
+sample rate y cuántas muestras trae; con eso se salta al siguiente frame sin
+decodificar nada. La duración es (frames * muestras por frame) / sample rate, exacta
+tanto para CBR como para VBR.
+
+Si el primer frame trae un encabezado Xing/Info (LAME) o VBRI con la cantidad de
+frames, se usa ese número y no hace falta recorrer el archivo.
+
+Para un diálogo de ElevenLabs (~100 KB) es del orden de 100 µs, contra las decenas
+de ms de levantar un proceso ffmpeg por archivo.
+"""
+import struct
+from pathlib import Path
+
+# Bitrates en kbps por [versión MPEG-1?][capa]; índice 0 = "free", 15 = inválido
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates por versión (bits del encabezado: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _frame(datos: bytes, pos: int) -> tuple | None:
+    """(largo del frame en bytes, muestras, sample rate) del encabezado en pos, o None"""
+    if pos + 4 > len(datos):
+        return None
+    b1, b2 = datos[pos + 1], datos[pos + 2]
+    if datos[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    capa = 4 - ((b1 >> 1) & 0x03)  # bits 3, 2, 1 -> capa I, II, III
+    indice_bitrate = b2 >> 4
+    indice_rate = (b2 >> 2) & 0x03
+    if version == 1 or capa == 4 or indice_bitrate in (0, 15) or indice_rate == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, capa)][indice_bitrate] * 1000
+    sample_rate = _SAMPLE_RATES[version][indice_rate]
+    padding = (b2 >> 1) & 0x01
+    if capa == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    muestras = 1152 if capa == 2 or mpeg1 else 576
+    return muestras // 8 * bitrate // sample_rate + padding, muestras, sample_rate
+
+
+def _saltar_id3(datos: bytes) -> int:
+    """Posición del primer byte después del tag ID3v2 (0 si no hay)"""
+    if len(datos) < 10 or datos[:3] != b"ID3":
+        return 0
+    # Tamaño "syncsafe": 4 bytes de 7 bits cada uno
+    tamano = (datos[6] << 21) | (datos[7] << 14) | (datos[8] << 7) | datos[9]
+    footer = 10 if datos[5] & 0x10 else 0
+    return 10 + tamano + footer
+
+
+def _frames_declarados(datos: bytes, pos: int, muestras: int) -> int | None:
+    """Frames totales según el encabezado Xing/Info o VBRI del primer frame, si lo tiene"""
+    b1, b3 = datos[pos + 1], datos[pos + 3]
+    mpeg1 = (b1 >> 3) & 0x03 == 3
+    mono = (b3 >> 6) == 3
+    # Xing/Info va después del side info, cuyo largo depende de versión y canales
+    lado = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = pos + 4 + lado
+    if datos[xing:xing + 4] in (b"Xing", b"Info") and len(datos) >= xing + 12:
+        flags = struct.unpack(">I", datos[xing + 4:xing + 8])[0]
+        if flags & 0x01:
+            return struct.unpack(">I", datos[xing + 8:xing + 12])[0]
+    vbri = pos + 36
+    if datos[vbri:vbri + 4] == b"VBRI" and len(datos) >= vbri + 18:
+        return struct.unpack(">I", datos[vbri + 14:vbri + 18])[0]
+    return None
+
+
+def duracion_mp3(path: str | Path) -> float | None:
+    """
+    Duración en segundos de un MP3 a partir de los encabezados de sus frames.
+
+    Returns:
+        Segundos, o None si el archivo no parece un MP3 (ej: WAV): usar ffmpeg
+    """
+    datos = Path(path).read_bytes()
+    pos = _saltar_id3(datos)
+
+    # Sincronizar con el primer frame válido (dos encabezados seguidos, para no
+    # confundir un 0xFF cualquiera con un frame)
+    while pos + 4 <= len(datos):
+        pos = datos.find(b"\xff", pos)
+        if pos < 0:
+            return None
+        frame = _frame(datos, pos)
+        if frame is not None and (pos + frame[0] >= len(datos) or _frame(datos, pos + frame[0]) is not None):
+            break
+        pos += 1
+    else:
+        return None
+
+    _, muestras, sample_rate = frame
+    declarados = _frames_declarados(datos, pos, muestras)
+    if declarados:
+        return declarados * muestras / sample_rate
+
+    total_muestras = 0
+    while frame is not None and frame[0] > 0:
+        total_muestras += frame[1]
+        pos += frame[0]
+        frame = _frame(datos, pos)
+    return total_muestras / sample_rate
@@ -0,0 +1,216 @@
+"""
+Reintentos con backoff y cadena de respaldos por escena (audio e imagen).
+
+Antes, si ElevenLabs o Gemini fallaban una vez, la escena quedaba como un archivo
+vacío y Pipeline 4 fallaba (o metía el archivo vacío en el video). Ahora cada escena
+recorre una cadena de pasos hasta que uno entrega un resultado:
+
+  1. primario:  el modelo normal, con reintentos y backoff exponencial (con jitter)
+  2. cache:     el mismo pedido ya generado antes (en cualquier run)
+  3. respaldo:  un modelo más barato/rápido, también con reintentos
+  4. stock:     un asset pre-renderizado (imagen por escenario) o silencio de la
+                duración estimada del diálogo; siempre existe
+
+Todo con un tiempo máximo por escena (config/fallbacks.json): cada llamada recibe
+como timeout lo que queda de ese tiempo (una llamada colgada no lo excede) y, cuando
+se acaba, no se reintenta más y se va directo al stock, así el video sale siempre y
+en tiempo acotado. Las escenas que usaron cache, respaldo o stock quedan anotadas en el
+manifiesto pero no como completas: al reanudar el run se vuelven a intentar.
+
+PresupuestoExcedido no se reintenta ni se cubre con respaldos: corta el job.
+"""
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
+
+from .instrumentation import span
+from .providers import PresupuestoExcedido
+
+FALLBACKS_PATH = Path("config/fallbacks.json")
+
+T = TypeVar("T")
+
+# Frame MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo: 417 bytes, 1152 muestras (~26 ms).
+# Con side info en cero el decodificador produce silencio.
+MP3_FRAME_SILENCIO = b"\xff\xfb\x90\x44" + bytes(413)
+MP3_FRAME_SEGUNDOS = 1152 / 44100
+
+
+class PersonajeSinVoz(ValueError):
+    """El personaje no tiene voz en voices.json: reintentar no lo arregla"""
+
+
+# Errores que no se arreglan reintentando. El resto (incluidas respuestas ilegibles
+# del proveedor, ej: JSONDecodeError) se reintenta.
+NO_REINTENTABLES = (PersonajeSinVoz,)
+
+
+def mp3_silencioso(segundos: float) -> bytes:
+    """MP3 válido hecho de frames silenciosos"""
+    return MP3_FRAME_SILENCIO * max(1, round(segundos / MP3_FRAME_SEGUNDOS))
+
+
+@dataclass(frozen=True, slots=True)
+class PoliticaReintentos:
+    intentos: int = 3
+    espera_inicial: float = 1.0
+    factor: float = 2.0
+    espera_maxima: float = 8.0
+    tiempo_maximo_escena: float = 90.0
+
+    def espera(self, intento: int) -> float:
+        """Backoff exponencial con jitter completo para el reintento número `intento` (desde 1)"""
+        tope = min(self.espera_maxima, self.espera_inicial * self.factor ** (intento - 1))
+        return random.uniform(0, tope)
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigRespaldos:
+    politica: PoliticaReintentos
+    cache_dir: Path
+    stock_dir: Path
+    audio: Dict[str, Any]
+    imagen: Dict[str, Any]
+
+    @classmethod
+    def desde_config(cls, path: str | Path = FALLBACKS_PATH) -> "ConfigRespaldos":
+        """Carga config/fallbacks.json (sin archivo: valores por defecto)"""
+        path = Path(path)
+        config: Dict[str, Any] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        reintentos = config.get("reintentos", {})
+        politica = PoliticaReintentos(
+            intentos=max(1, int(reintentos.get("intentos", 3))),
+            espera_inicial=float(reintentos.get("espera_inicial_s", 1.0)),
+            factor=float(reintentos.get("factor", 2.0)),
+            espera_maxima=float(reintentos.get("espera_maxima_s", 8.0)),
+            tiempo_maximo_escena=float(reintentos.get("tiempo_maximo_escena_s", 90.0)),
+        )
+        return cls(
+            politica=politica,
+            cache_dir=Path(config.get("cache_dir", "assets/cache")),
+            stock_dir=Path(config.get("stock_dir", "assets/stock")),
+            audio=dict(config.get("audio", {})),
+            imagen=dict(config.get("imagen", {})),
+        )
+
+
+class CacheContenido:
+    """Archivos direccionados por contenido: la clave es el hash del pedido"""
+
+    def __init__(self, directorio: str | Path, extension: str):
+        self.directorio = Path(directorio)
+        self.extension = extension
+
+    @staticmethod
+    def clave(*partes: str | bytes) -> str:
+        h = hashlib.sha256()
+        for parte in partes:
+            h.update(parte if isinstance(parte, bytes) else parte.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, clave: str) -> Path:
+        return self.directorio / clave[:2] / f"{clave}{self.extension}"
+
+    def leer(self, clave: str) -> bytes | None:
+        path = self._path(clave)
+        try:
+            datos = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        return datos or None
+
+    def guardar(self, clave: str, datos: bytes) -> None:
+        """Escritura atómica (nunca se lee un archivo a medias); un error no corta la escena"""
+        path = self._path(clave)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporal = path.with_suffix(f".{time.monotonic_ns()}.tmp")
+            temporal.write_bytes(datos)
+            temporal.replace(path)
+        except OSError as e:
+            print(f"      ⚠️  No se pudo guardar en cache: {e}")
+
+
+def reintentar(fn: Callable[[float], T | None], politica: PoliticaReintentos, limite: float, nombre: str) -> T | None:
+    """
+    Llama a fn hasta que devuelve algo distinto de None, con backoff entre intentos.
+
+    Args:
+        fn: Recibe el timeout en segundos para la llamada (lo que queda hasta limite)
+            y devuelve el resultado, None (sin resultado) o lanza una excepción
+        politica: Cantidad de intentos y esperas
+        limite: time.monotonic() a partir del cual no se reintenta más
+        nombre: Para los mensajes
+
+    Returns:
+        El resultado, o None si se agotaron los intentos o el tiempo
+
+    Raises:
+        PresupuestoExcedido: Siempre se propaga
+    """
+    with span("reintentos", paso=nombre) as s:
+        if time.monotonic() >= limite:
+            print(f"      ⏱️  {nombre}: se agotó el tiempo de la escena, se salta")
+            return None
+        for intento in range(1, politica.intentos + 1):
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                print(f"      ⏱️  {nombre}: se agotó el tiempo de la escena")
+                break
+            try:
+                resultado = fn(restante)
+                if resultado is not None:
+                    s.error = None  # los errores anteriores quedan en s.reintentos
+                    return resultado
+                motivo = "sin resultado"
+            except PresupuestoExcedido:
+                raise
+            except NO_REINTENTABLES as e:
+                s.error = str(e)
+                print(f"      ❌ {nombre}: {e}")
+                return None
+            except Exception as e:
+                s.error = motivo = str(e)
+            if intento == politica.intentos:
+                break
+            espera = politica.espera(intento)
+            if time.monotonic() + espera >= limite:
+                print(f"      ⏱️  {nombre}: sin tiempo para reintentar ({motivo})")
+                break
+            s.reintentos += 1
+            print(f"      🔁 {nombre}: {motivo}; reintento {intento}/{politica.intentos - 1} en {espera:.1f}s")
+            time.sleep(espera)
+        return None
+
+
+def con_respaldos(pasos: List[Tuple[str, Callable[[], T | None]]], escena: int) -> Tuple[str, T]:
+    """
+    Recorre los pasos en orden hasta que uno devuelve un resultado.
+
+    Args:
+        pasos: (nombre, función); la función devuelve None si ese paso no tiene resultado
+        escena: Número de escena (para los mensajes y el reporte)
+
+    Returns:
+        (nombre del paso que respondió, resultado)
+
+    Raises:
+        RuntimeError: Si ningún paso entregó resultado (el último paso debería ser el stock)
+    """
+    with span("respaldos", escena=escena) as s:
+        for i, (nombre, fn) in enumerate(pasos):
+            resultado = fn()
+            if resultado is not None:
+                s.atributos["origen"] = nombre
+                if i > 0:
+                    print(f"      🛟 Escena {escena}: se usó el respaldo '{nombre}'")
+                return nombre, resultado
+        raise RuntimeError(f"Escena {escena}: ningún paso de la cadena de respaldos entregó un resultado")
@@ -0,0 +1,165 @@
+"""
+Modelo en memoria del guion.
+
+Los pipelines reciben un objeto Guion en vez de una ruta a guion.json, así el
+orquestador (main.py, webapp) no escribe y relee el mismo JSON en cada etapa.
+Guardar el guion en disco queda como un checkpoint opcional (Guion.guardar).
+
+Las clases usan slots: no tienen __dict__ y ocupan menos memoria, y un error de
+tipeo en un atributo (escena.dialgo) falla en vez de crear un campo nuevo.
+"""
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .guion_schema import Elenco, normalizar_guion
+
+
+@dataclass(slots=True)
+class Personaje:
+    nombre: str
+    tipo_voz: str = ""
+    edad_aproximada: str = ""
+    caracteristicas: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Personaje":
+        return cls(
+            nombre=str(data.get("nombre") or ""),
+            tipo_voz=str(data.get("tipo_voz") or ""),
+            edad_aproximada=str(data.get("edad_aproximada") or ""),
+            caracteristicas=str(data.get("caracteristicas") or ""),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "nombre": self.nombre,
+            "tipo_voz": self.tipo_voz,
+            "edad_aproximada": self.edad_aproximada,
+            "caracteristicas": self.caracteristicas,
+        }
+
+
+@dataclass(slots=True)
+class Metadata:
+    titulo: str = "Sin título"
+    leccion: str = ""
+    duracion_estimada: str = ""
+    personajes: List[Personaje] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Metadata":
+        return cls(
+            titulo=data.get("titulo") or "Sin título",
+            leccion=data.get("leccion", ""),
+            duracion_estimada=data.get("duracion_estimada", ""),
+            personajes=[Personaje.from_dict(p) for p in data.get("personajes", []) if isinstance(p, dict)],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "titulo": self.titulo,
+            "leccion": self.leccion,
+            "duracion_estimada": self.duracion_estimada,
+            "personajes": [p.to_dict() for p in self.personajes],
+        }
+
+
+@dataclass(slots=True)
+class Dialogo:
+    personaje: str
+    texto: str
+    emocion: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"personaje": self.personaje, "texto": self.texto, "emocion": self.emocion}
+
+
+@dataclass(slots=True)
+class Escena:
+    numero_escena: int
+    imagen_descripcion: str
+    dialogo: Dialogo
+    sonido_fondo: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Escena":
+        """Crea una escena desde un dict ya validado por guion_schema"""
+        dialogo = data["dialogo"]
+        return cls(
+            numero_escena=data["numero_escena"],
+            imagen_descripcion=data["imagen_descripcion"],
+            dialogo=Dialogo(
+                personaje=dialogo["personaje"],
+                texto=dialogo["texto"],
+                emocion=dialogo.get("emocion", ""),
+            ),
+            sonido_fondo=data.get("sonido_fondo", ""),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "numero_escena": self.numero_escena,
+            "sonido_fondo": self.sonido_fondo,
+            "imagen_descripcion": self.imagen_descripcion,
+            "dialogo": self.dialogo.to_dict(),
+        }
+
+
+@dataclass(slots=True)
+class Guion:
+    metadata: Metadata
+    escenas: List[Escena]
+
+    @property
+    def titulo(self) -> str:
+        return self.metadata.titulo
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], elenco: Elenco | None = None) -> "Guion":
+        """
+        Construye el guion desde el JSON de Deepseek (con o sin el envoltorio "guion").
+
+        Args:
+            elenco: Personajes permitidos (None = los de config/voices.json)
+
+        Raises:
+            GuionInvalidoError: si el JSON tiene defectos irrecuperables
+        """
+        guion = normalizar_guion(data, elenco)["guion"]
+        return cls(
+            metadata=Metadata.from_dict(guion["metadata"]),
+            escenas=[Escena.from_dict(e) for e in guion["escenas"]],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "guion": {
+                "metadata": self.metadata.to_dict(),
+                "escenas": [e.to_dict() for e in self.escenas],
+            }
+        }
+
+    @classmethod
+    def cargar(cls, path: str | Path) -> "Guion":
+        """Carga un guion desde un archivo JSON"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def guardar(self, path: str | Path) -> Path:
+        """Guarda el guion como checkpoint JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+def resolver_guion(guion: "Guion | Dict[str, Any] | str | Path") -> Guion:
+    """Acepta un Guion, el dict del JSON o una ruta a guion.json"""
+    if isinstance(guion, Guion):
+        return guion
+    if isinstance(guion, dict):
+        return Guion.from_dict(guion)
+    return Guion.cargar(guion)
@@ -0,0 +1,394 @@
+"""
+Validación y reparación del guion generado por Deepseek.
+
+El esquema del guion se declara una sola vez (ESQUEMA_ESCENA, ESQUEMA_METADATA)
+y se compila al importar el módulo en funciones validadoras, de modo que validar
+un guion es solo recorrerlo una vez sin volver a interpretar el esquema.
+
+Reparaciones automáticas (defectos comunes del LLM):
+- Falta el envoltorio {"guion": ...} -> se agrega
+- numero_escena ausente, repetido o como string -> se renumera 1..N
+- Campos de texto con espacios, números o null (si son opcionales) -> se normalizan
+- Personajes con tilde o alias ("Sofía", "Abuelo Sabio") -> nombre canónico
+- dialogo como lista -> se usa el primer elemento
+
+Defectos irrecuperables (la escena queda "rota" y se debe re-preguntar):
+- dialogo.texto o dialogo.personaje vacíos o null
+- imagen_descripcion vacía
+- Personaje fuera del elenco permitido
+
+El elenco permitido son los personajes con voz en config/voices.json (con su "rol"
+para el prompt y sus "alias"): agregar una voz ahí agrega el personaje al guion.
+"""
+import json
+import os
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+VOICES_CONFIG_PATH = Path("config/voices.json")
+
+# Esquema declarativo: campo -> (tipo, requerido)
+ESQUEMA_DIALOGO = {
+    "personaje": (str, True),
+    "texto": (str, True),
+    "emocion": (str, False),
+}
+
+ESQUEMA_ESCENA = {
+    "numero_escena": (int, False),  # se renumera si falta
+    "sonido_fondo": (str, False),
+    "imagen_descripcion": (str, True),
+    "dialogo": (ESQUEMA_DIALOGO, True),
+}
+
+ESQUEMA_METADATA = {
+    "titulo": (str, False),
+    "leccion": (str, False),
+    "duracion_estimada": (str, False),
+}
+
+
+class GuionInvalidoError(ValueError):
+    """El guion no se puede reparar sin volver a llamar al LLM"""
+
+    def __init__(self, mensaje: str, errores: List[str] | None = None, escenas_rotas: List[int] | None = None):
+        super().__init__(mensaje)
+        self.errores = errores or []
+        self.escenas_rotas = escenas_rotas or []
+
+
+@dataclass
+class ResultadoValidacion:
+    """Resultado de validar un guion"""
+    data: Dict[str, Any]
+    reparaciones: List[str] = field(default_factory=list)
+    errores: List[str] = field(default_factory=list)
+    escenas_rotas: List[int] = field(default_factory=list)  # índices (0-based) en escenas
+
+    @property
+    def es_valido(self) -> bool:
+        return not self.escenas_rotas
+
+
+def _normalizar_clave(texto: str) -> str:
+    """Minúsculas y sin tildes, para comparar nombres"""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+
+@dataclass(frozen=True, slots=True)
+class Elenco:
+    """Personajes que puede usar el guion: los que tienen voz en config/voices.json"""
+    personajes: Tuple[str, ...]
+    roles: Dict[str, str]   # nombre -> descripción corta para el prompt
+    claves: Dict[str, str]  # nombre o alias normalizado -> nombre canónico
+
+    @classmethod
+    def desde_dict(cls, data: Dict[str, Any]) -> "Elenco":
+        personajes = data.get("characters") or {}
+        claves = {}
+        for nombre, voz in personajes.items():
+            claves[_normalizar_clave(nombre)] = nombre
+            for alias in voz.get("alias", []):
+                claves.setdefault(_normalizar_clave(alias), nombre)
+        return cls(
+            personajes=tuple(personajes),
+            roles={nombre: voz.get("rol", "") for nombre, voz in personajes.items()},
+            claves=claves,
+        )
+
+    @classmethod
+    def desde_config(cls, path: str | Path = VOICES_CONFIG_PATH) -> "Elenco":
+        """
+        Raises:
+            RuntimeError: Si voices.json no existe o no tiene personajes
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                elenco = cls.desde_dict(json.load(f))
+        except OSError as e:
+            raise RuntimeError(f"No se pudo leer el elenco de {path}: {e}") from e
+        if not elenco.personajes:
+            raise RuntimeError(f"{path} no define personajes (clave 'characters')")
+        return elenco
+
+    def canonizar(self, nombre: str) -> str | None:
+        """Nombre canónico de un personaje (acepta tildes y alias), o None si no es del elenco"""
+        return self.claves.get(_normalizar_clave(nombre))
+
+    def para_prompt(self) -> str:
+        """Ej: "Lucas (niño curioso, 7 años), Sofia (niña inteligente, 7 años)" """
+        return ", ".join(f"{p} ({self.roles[p]})" if self.roles[p] else p for p in self.personajes)
+
+
+_elencos: Dict[Path, Tuple[float, Elenco]] = {}
+_elencos_lock = threading.Lock()
+
+
+def get_elenco(path: str | Path = VOICES_CONFIG_PATH) -> Elenco:
+    """Elenco de voices.json, compartido por proceso y releído si el archivo cambió"""
+    path = Path(path)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError as e:
+        raise RuntimeError(f"No se pudo leer el elenco de {path}: {e}") from e
+    with _elencos_lock:
+        cacheado = _elencos.get(path)
+        if cacheado is not None and cacheado[0] == mtime:
+            return cacheado[1]
+    elenco = Elenco.desde_config(path)
+    with _elencos_lock:
+        _elencos[path] = (mtime, elenco)
+    return elenco
+
+
+# Un validador compilado recibe (valor, ruta, reparaciones, errores) y devuelve el valor reparado
+Validador = Callable[[Any, str, List[str], List[str]], Any]
+
+
+def _compilar_str(requerido: bool) -> Validador:
+    def validar(valor, ruta, reparaciones, errores):
+        if valor is None:
+            if requerido:
+                errores.append(f"{ruta} es null")
+            return ""
+        if not isinstance(valor, str):
+            if isinstance(valor, (int, float)):
+                reparaciones.append(f"{ruta} convertido a texto")
+                valor = str(valor)
+            else:
+                errores.append(f"{ruta} no es texto")
+                return ""
+        limpio = valor.strip()
+        if requerido and not limpio:
+            errores.append(f"{ruta} está vacío")
+        return limpio
+    return validar
+
+
+def _compilar_int() -> Validador:
+    def validar(valor, ruta, reparaciones, errores):
+        if isinstance(valor, bool):
+            return None
+        if isinstance(valor, int):
+            return valor
+        if isinstance(valor, float) and valor.is_integer():
+            reparaciones.append(f"{ruta} convertido a entero")
+            return int(valor)
+        if isinstance(valor, str) and valor.strip().isdigit():
+            reparaciones.append(f"{ruta} convertido a entero")
+            return int(valor.strip())
+        # Se deja en None para que la renumeración lo resuelva
+        return None
+    return validar
+
+
+def _compilar_objeto(esquema: Dict[str, Tuple[Any, bool]]) -> Validador:
+    """Compila un esquema de objeto en un único validador"""
+    campos = []
+    for nombre, (tipo, requerido) in esquema.items():
+        if isinstance(tipo, dict):
+            sub = _compilar_objeto(tipo)
+        elif tipo is int:
+            sub = _compilar_int()
+        else:
+            sub = _compilar_str(requerido)
+        campos.append((nombre, sub, requerido, isinstance(tipo, dict)))
+
+    def validar(valor, ruta, reparaciones, errores):
+        if isinstance(valor, list) and valor and isinstance(valor[0], dict):
+            reparaciones.append(f"{ruta} era lista, se usa el primer elemento")
+            valor = valor[0]
+        if not isinstance(valor, dict):
+            errores.append(f"{ruta} no es un objeto")
+            valor = {}
+        resultado = dict(valor)
+        for nombre, sub, requerido, es_objeto in campos:
+            if nombre not in valor and es_objeto and requerido:
+                errores.append(f"{ruta}.{nombre} falta")
+                resultado[nombre] = sub({}, f"{ruta}.{nombre}", [], [])
+                continue
+            resultado[nombre] = sub(valor.get(nombre), f"{ruta}.{nombre}", reparaciones, errores)
+        return resultado
+    return validar
+
+
+_validar_escena = _compilar_objeto(ESQUEMA_ESCENA)
+_validar_metadata = _compilar_objeto(ESQUEMA_METADATA)
+
+
+def _validar_escena_en(
+    escena: Any, indice: int, reparaciones: List[str], elenco: Elenco
+) -> Tuple[Dict[str, Any], List[str]]:
+    ruta = f"escenas[{indice}]"
+    errores: List[str] = []
+    escena = _validar_escena(escena, ruta, reparaciones, errores)
+
+    dialogo = escena["dialogo"]
+    if dialogo["personaje"]:
+        canonico = elenco.canonizar(dialogo["personaje"])
+        if canonico is None:
+            errores.append(f"{ruta}.dialogo.personaje desconocido: {dialogo['personaje']}")
+        elif canonico != dialogo["personaje"]:
+            reparaciones.append(f"{ruta}.dialogo.personaje '{dialogo['personaje']}' -> '{canonico}'")
+            dialogo["personaje"] = canonico
+    return escena, errores
+
+
+def validar_escena(escena: Any, indice: int, elenco: Elenco | None = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Valida y repara una escena suelta (por ejemplo, recibida en streaming).
+
+    El numero_escena se fija a indice + 1, igual que la renumeración de validar_guion,
+    para que la escena despachada temprano coincida con la del guion final.
+
+    Returns:
+        (escena reparada, lista de errores irrecuperables)
+    """
+    escena, errores = _validar_escena_en(escena, indice, [], elenco or get_elenco())
+    escena["numero_escena"] = indice + 1
+    return escena, errores
+
+
+def validar_guion(data: Any, elenco: Elenco | None = None) -> ResultadoValidacion:
+    """
+    Valida y repara un guion.
+
+    Args:
+        data: JSON del guion tal como lo devuelve Deepseek
+        elenco: Personajes permitidos (None = los de config/voices.json)
+
+    Returns:
+        ResultadoValidacion con el guion reparado y las escenas que no se pudieron reparar
+
+    Raises:
+        GuionInvalidoError: si la estructura general no es recuperable (sin escenas)
+    """
+    reparaciones: List[str] = []
+
+    if not isinstance(data, dict):
+        raise GuionInvalidoError("El guion no es un objeto JSON")
+
+    guion = data.get("guion")
+    if guion is None and "escenas" in data:
+        reparaciones.append("Se agregó el envoltorio 'guion'")
+        guion = data
+    if not isinstance(guion, dict):
+        raise GuionInvalidoError("Falta la clave 'guion'")
+
+    escenas = guion.get("escenas")
+    if not isinstance(escenas, list) or not escenas:
+        raise GuionInvalidoError("El guion no tiene escenas")
+
+    elenco = elenco or get_elenco()
+    metadata_errores: List[str] = []
+    metadata = _validar_metadata(guion.get("metadata") or {}, "metadata", reparaciones, metadata_errores)
+    if not metadata["titulo"]:
+        metadata["titulo"] = "Sin título"
+    personajes = metadata.get("personajes")
+    if not isinstance(personajes, list):
+        metadata["personajes"] = []
+
+    errores: List[str] = []
+    escenas_rotas: List[int] = []
+    escenas_validadas = []
+
+    for i, escena in enumerate(escenas):
+        escena, errores_escena = _validar_escena_en(escena, i, reparaciones, elenco)
+        if errores_escena:
+            errores.extend(errores_escena)
+            escenas_rotas.append(i)
+        escenas_validadas.append(escena)
+
+    # Renumerar si los números no son exactamente 1..N en orden
+    numeros = [e["numero_escena"] for e in escenas_validadas]
+    esperados = list(range(1, len(escenas_validadas) + 1))
+    if numeros != esperados:
+        reparaciones.append(f"numero_escena renumerado ({numeros} -> 1..{len(esperados)})")
+        for numero, escena in zip(esperados, escenas_validadas):
+            escena["numero_escena"] = numero
+
+    reparado = dict(guion)
+    reparado["metadata"] = metadata
+    reparado["escenas"] = escenas_validadas
+
+    return ResultadoValidacion(
+        data={"guion": reparado},
+        reparaciones=reparaciones,
+        errores=errores,
+        escenas_rotas=escenas_rotas,
+    )
+
+
+def normalizar_guion(data: Any, elenco: Elenco | None = None) -> Dict[str, Any]:
+    """
+    Valida un guion y devuelve la versión reparada, o falla si quedan escenas rotas.
+
+    Raises:
+        GuionInvalidoError: si el guion tiene defectos irrecuperables
+    """
+    resultado = validar_guion(data, elenco)
+    if not resultado.es_valido:
+        raise GuionInvalidoError(
+            f"Guion inválido: {'; '.join(resultado.errores)}",
+            errores=resultado.errores,
+            escenas_rotas=resultado.escenas_rotas,
+        )
+    return resultado.data
+
+
+def reparar_guion(
+    data: Any,
+    corregir: Callable[[ResultadoValidacion], Any],
+    max_reparaciones: int = 1,
+    elenco: Elenco | None = None,
+) -> Dict[str, Any]:
+    """
+    Valida un guion y, mientras queden escenas rotas, pide solo esas escenas de nuevo.
+
+    Args:
+        data: JSON del guion tal como lo devuelve Deepseek
+        corregir: Recibe el resultado con las escenas rotas y devuelve la respuesta del
+            LLM: {"escenas": [...]} con una escena por índice de escenas_rotas, en orden
+        max_reparaciones: Veces que se vuelve a preguntar como máximo
+
+    Returns:
+        El guion reparado
+
+    Raises:
+        GuionInvalidoError: si tras las correcciones siguen quedando escenas rotas
+    """
+    elenco = elenco or get_elenco()
+    resultado = validar_guion(data, elenco)
+    for reparacion in resultado.reparaciones:
+        print(f"   🔧 {reparacion}")
+
+    intentos = 0
+    while not resultado.es_valido and intentos < max_reparaciones:
+        intentos += 1
+        indices = resultado.escenas_rotas
+        print(f"   ⚠️  {len(indices)} escena(s) con errores, pidiendo corrección ({intentos}/{max_reparaciones})...")
+        respuesta = corregir(resultado)
+        corregidas = respuesta.get("escenas") if isinstance(respuesta, dict) else None
+        if not isinstance(corregidas, list):
+            print("   ⚠️  La corrección no trajo una lista 'escenas': se descarta")
+            continue
+        if len(corregidas) != len(indices):
+            print(f"   ⚠️  La corrección trajo {len(corregidas)} escena(s) en vez de {len(indices)}: se descarta")
+            continue
+
+        data = resultado.data
+        for i, escena in zip(indices, corregidas):
+            data["guion"]["escenas"][i] = escena
+        resultado = validar_guion(data, elenco)
+
+    if not resultado.es_valido:
+        raise GuionInvalidoError(
+            f"Guion inválido tras {intentos} corrección(es): {'; '.join(resultado.errores)}",
+            errores=resultado.errores,
+            escenas_rotas=resultado.escenas_rotas,
+        )
+    return resultado.data
@@ -0,0 +1,113 @@
+"""
+Parser incremental de JSON para el streaming del guion.
+
+Deepseek devuelve el guion como texto en trozos (deltas). Este parser recibe los
+trozos a medida que llegan y entrega cada elemento de "escenas" en cuanto su
+objeto se cierra, sin esperar al resto del documento. Así el audio y la imagen
+de la escena 1 pueden empezar mientras el modelo sigue escribiendo la escena 6.
+
+Solo se rastrea lo necesario: si estamos dentro de un string (y si el carácter
+anterior era un escape), la pila de contenedores abiertos y la última clave vista
+en cada objeto. El texto completo se conserva para el json.loads final y solo
+se une cuando se cierra una escena.
+"""
+import json
+from typing import Any, Dict, List
+
+
+class EscenasStreamParser:
+    """Detecta y parsea cada escena completa del array "escenas" a medida que llega"""
+
+    def __init__(self, clave_array: str = "escenas"):
+        self.clave_array = clave_array
+        self._partes: List[str] = []
+        self._pos = 0                    # caracteres ya procesados
+        self._en_string = False
+        self._escape = False
+        self._string_actual: List[str] = []
+        self._ultimo_string = ""
+        self._ultima_clave: str | None = None
+        # Pila de contenedores abiertos: (tipo '{' o '[', clave con la que se abrió)
+        self._pila: List[tuple] = []
+        self._profundidad_array: int | None = None
+        self._inicio_elemento: int | None = None
+        self.escenas_emitidas = 0
+
+    @property
+    def texto(self) -> str:
+        return "".join(self._partes)
+
+    def feed(self, trozo: str) -> List[Dict[str, Any]]:
+        """
+        Procesa un trozo de texto y devuelve las escenas que se completaron en él.
+
+        Args:
+            trozo: Fragmento del JSON (delta de la respuesta en streaming)
+
+        Returns:
+            Lista (posiblemente vacía) de escenas completas, en orden
+        """
+        if not trozo:
+            return []
+
+        base = self._pos
+        self._partes.append(trozo)
+        texto = None  # se construye solo si se completa una escena
+        completas = []
+
+        for offset, c in enumerate(trozo):
+            i = base + offset
+            if self._en_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_string = False
+                    self._ultimo_string = "".join(self._string_actual)
+                    continue
+                # Las claves son cortas: no hace falta guardar textos largos
+                if len(self._string_actual) < 32:
+                    self._string_actual.append(c)
+                continue
+
+            if c == '"':
+                self._en_string = True
+                self._string_actual = []
+            elif c == ":":
+                # El último string cerrado era una clave
+                self._ultima_clave = self._ultimo_string
+            elif c in "{[":
+                self._pila.append((c, self._ultima_clave))
+                self._ultima_clave = None
+                profundidad = len(self._pila)
+                if c == "[" and self._profundidad_array is None and self._pila[-1][1] == self.clave_array:
+                    self._profundidad_array = profundidad
+                elif c == "{" and self._profundidad_array is not None and profundidad == self._profundidad_array + 1:
+                    self._inicio_elemento = i
+            elif c in "}]":
+                profundidad = len(self._pila)
+                if (
+                    c == "}"
+                    and self._inicio_elemento is not None
+                    and self._profundidad_array is not None
+                    and profundidad == self._profundidad_array + 1
+                ):
+                    if texto is None:
+                        texto = self.texto
+                    completas.append(json.loads(texto[self._inicio_elemento:i + 1]))
+                    self._inicio_elemento = None
+                elif c == "]" and profundidad == self._profundidad_array:
+                    self._profundidad_array = -1  # array cerrado, no volver a detectarlo
+                if self._pila:
+                    self._pila.pop()
+            elif c == ",":
+                self._ultima_clave = None
+
+        self._pos = base + len(trozo)
+        self.escenas_emitidas += len(completas)
+        return completas
+
+    def resultado(self) -> Dict[str, Any]:
+        """Parsea el documento completo una vez terminado el streaming"""
+        return json.loads(self.texto)
@@ -0,0 +1,238 @@
+"""
+Instrumentación liviana: tiempos por etapa, escena y llamada externa.
+
+Uso:
+    reporte = RunReport(run_id="1a2b3c4d")
+    with reporte.activo():
+        with span("pipeline2.generar"):
+            ...
+            with span("elevenlabs.tts", escena=3) as s:
+                audio = ...
+                s.bytes += len(audio)
+    reporte.guardar("assets/runs/1a2b3c4d/report.json")
+
+Si no hay un reporte activo, span() no registra nada (costo casi nulo), así los
+pipelines se pueden usar solos sin cambiar nada.
+
+El reporte activo se guarda en un ContextVar. Los hilos nuevos no lo heredan
+solos: usar submit_con_contexto() para pasar trabajo a un ThreadPoolExecutor.
+
+Exportación Prometheus (opcional): si la variable de entorno METRICS_PROM_PATH
+apunta a un archivo, RunReport.guardar() también suma los contadores del run a
+los que ya tiene ese archivo, en formato de texto de Prometheus (para el textfile
+collector de node_exporter). Los contadores son acumulados: solo crecen, entre runs
+y entre procesos que comparten el archivo.
+"""
+import contextvars
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+_reporte_actual: contextvars.ContextVar["RunReport | None"] = contextvars.ContextVar("reporte_actual", default=None)
+
+
+@dataclass(slots=True)
+class Span:
+    """Un intervalo medido"""
+    nombre: str
+    atributos: Dict[str, Any] = field(default_factory=dict)
+    inicio: float = 0.0
+    duracion: float = 0.0
+    bytes: int = 0
+    cache_hit: bool = False
+    reintentos: int = 0
+    error: str | None = None
+    padre: str | None = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "nombre": self.nombre,
+            "inicio": round(self.inicio, 4),
+            "duracion": round(self.duracion, 4),
+        }
+        if self.padre:
+            data["padre"] = self.padre
+        if self.atributos:
+            data["atributos"] = self.atributos
+        if self.bytes:
+            data["bytes"] = self.bytes
+        if self.cache_hit:
+            data["cache_hit"] = True
+        if self.reintentos:
+            data["reintentos"] = self.reintentos
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+_span_actual: contextvars.ContextVar[Span | None] = contextvars.ContextVar("span_actual", default=None)
+
+
+class RunReport:
+    """Acumula spans y contadores de una ejecución. Seguro entre hilos."""
+
+    def __init__(self, run_id: str = ""):
+        self.run_id = run_id
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+        self.contadores: Dict[str, float] = {}
+
+    @contextmanager
+    def activo(self) -> Iterator["RunReport"]:
+        """Hace que este reporte sea el destino de span() en el contexto actual"""
+        token = _reporte_actual.set(self)
+        try:
+            yield self
+        finally:
+            _reporte_actual.reset(token)
+
+    def _registrar(self, s: Span) -> None:
+        with self._lock:
+            self.spans.append(s)
+            base = s.nombre
+            self.contadores[f"{base}.llamadas"] = self.contadores.get(f"{base}.llamadas", 0) + 1
+            self.contadores[f"{base}.segundos"] = self.contadores.get(f"{base}.segundos", 0.0) + s.duracion
+            if s.bytes:
+                self.contadores[f"{base}.bytes"] = self.contadores.get(f"{base}.bytes", 0) + s.bytes
+            if s.cache_hit:
+                self.contadores[f"{base}.cache_hits"] = self.contadores.get(f"{base}.cache_hits", 0) + 1
+            if s.reintentos:
+                self.contadores[f"{base}.reintentos"] = self.contadores.get(f"{base}.reintentos", 0) + s.reintentos
+            if s.error:
+                self.contadores[f"{base}.errores"] = self.contadores.get(f"{base}.errores", 0) + 1
+
+    def incrementar(self, contador: str, valor: float = 1) -> None:
+        with self._lock:
+            self.contadores[contador] = self.contadores.get(contador, 0) + valor
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.inicio)
+            contadores = dict(self.contadores)
+        return {
+            "run_id": self.run_id,
+            "duracion_total": round(time.perf_counter() - self._t0, 4),
+            "contadores": {k: round(v, 4) if isinstance(v, float) else v for k, v in sorted(contadores.items())},
+            "spans": [s.to_dict() for s in spans],
+        }
+
+    def guardar(self, path: str | Path) -> Path:
+        """Guarda el reporte JSON (y suma sus contadores a METRICS_PROM_PATH, si está definido)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+        prom_path = os.getenv("METRICS_PROM_PATH")
+        if prom_path:
+            with self._lock:
+                contadores = dict(self.contadores)
+            exportar_prometheus(contadores, prom_path)
+        return path
+
+
+# Métrica -> descripción para # HELP
+_AYUDA_PROMETHEUS = {
+    "llamadas": "Spans completados",
+    "segundos": "Segundos acumulados dentro de los spans",
+    "bytes": "Bytes transferidos o escritos",
+    "cache_hits": "Spans resueltos desde cache",
+    "reintentos": "Reintentos hechos",
+    "errores": "Spans que terminaron con error",
+}
+
+_LINEA_PROMETHEUS = re.compile(r'^(\w+)\{span="((?:[^"\\]|\\.)*)"\} (\S+)$')
+
+
+def _leer_prometheus(path: Path) -> Dict[tuple, float]:
+    """(métrica, etiqueta span) -> valor de un archivo escrito por exportar_prometheus"""
+    valores: Dict[tuple, float] = {}
+    try:
+        texto = path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return valores
+    for linea in texto.splitlines():
+        m = _LINEA_PROMETHEUS.match(linea)
+        if m:
+            valores[(m.group(1), m.group(2))] = float(m.group(3))
+    return valores
+
+
+def exportar_prometheus(contadores: Dict[str, float], path: str | Path, prefijo: str = "cuentos") -> None:
+    """
+    Suma los contadores de un run a los acumulados en el archivo de Prometheus.
+
+    Un lock de archivo serializa a los procesos que escriben (workers de la web, batch)
+    y la escritura es atómica con un temporal propio, así el collector nunca lee un
+    archivo a medias ni un proceso pisa lo que sumó otro.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f"{path.name}.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        valores = _leer_prometheus(path)
+        for clave, valor in contadores.items():
+            nombre, _, metrica = clave.rpartition(".")
+            etiqueta = nombre.replace("\\", "\\\\").replace('"', '\\"')
+            clave_prom = (f"{prefijo}_{metrica}_total", etiqueta)
+            valores[clave_prom] = valores.get(clave_prom, 0) + valor
+
+        lineas = []
+        for metrica in sorted({m for m, _ in valores}):
+            corta = metrica[len(prefijo) + 1:-len("_total")]
+            lineas.append(f"# HELP {metrica} {_AYUDA_PROMETHEUS.get(corta, corta)} (acumulado)")
+            lineas.append(f"# TYPE {metrica} counter")
+            for (m, etiqueta), valor in sorted(valores.items()):
+                if m == metrica:
+                    lineas.append(f'{metrica}{{span="{etiqueta}"}} {int(valor) if float(valor).is_integer() else round(valor, 6)}')
+
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text("\n".join(lineas) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def reporte_actual() -> RunReport | None:
+    return _reporte_actual.get()
+
+
+@contextmanager
+def span(nombre: str, **atributos: Any) -> Iterator[Span]:
+    """
+    Mide un bloque de código y lo registra en el reporte activo.
+
+    El Span entregado permite anotar bytes, cache_hit y reintentos.
+    Las excepciones se registran en el span y se vuelven a lanzar.
+    """
+    reporte = _reporte_actual.get()
+    padre = _span_actual.get()
+    s = Span(nombre=nombre, atributos=atributos, padre=padre.nombre if padre else None)
+    if reporte is None:
+        yield s
+        return
+
+    token = _span_actual.set(s)
+    t0 = time.perf_counter()
+    s.inicio = t0 - reporte._t0
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duracion = time.perf_counter() - t0
+        _span_actual.reset(token)
+        reporte._registrar(s)
+
+
+def submit_con_contexto(executor, fn, *args, **kwargs):
+    """executor.submit() propagando el reporte y el span activos al hilo"""
+    contexto = contextvars.copy_context()
+    return executor.submit(contexto.run, fn, *args, **kwargs)
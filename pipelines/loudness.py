@@ -0,0 +1,206 @@
+"""
+Sonoridad (loudness) de los audios, medida una vez por archivo y aplicada en la mezcla.
+
+Las voces, los sonidos ambientales y song.mp3 vienen con niveles muy distintos: con
+volúmenes fijos (bg_volume=0.3, music_volume=0.15) un bosque tranquilo casi no se oye
+y una calle ruidosa tapa el diálogo. En lugar de un segundo encode con loudnorm por
+video, se mide la sonoridad integrada de cada archivo (EBU R128, filtro ebur128 de
+ffmpeg), junto con su pico real (true peak), y en la mezcla se le aplica la ganancia
+que lo lleva al objetivo sin que su pico pase de sonoridad.pico_maximo_dbtp (así un
+audio con picos fuertes no satura al subirlo):
+
+  - voz:      al objetivo (config/render.json -> sonoridad.objetivo_lufs)
+  - ambiente: al objetivo y después * bg_volume
+  - música:   al objetivo y después * music_volume
+
+Así bg_volume y music_volume pasan a ser relativos a la voz (0.3 = unos 10 dB por
+debajo) y valen igual para cualquier archivo.
+
+Las mediciones quedan en un índice por directorio (<dir>/loudness.json, con tamaño y
+mtime de cada archivo): la biblioteca de sonidos se mide una sola vez para todos los
+videos, y las voces de un run una vez por run. Para medir la biblioteca de antemano:
+    python -m pipelines.loudness assets/background_sounds
+"""
+import json
+import os
+import re
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict
+
+INDICE_NOMBRE = "loudness.json"
+
+# ebur128 informa -70 LUFS (el piso del gate) para silencio: no hay nada que normalizar
+PISO_LUFS = -70.0
+
+_REGEX_INTEGRADA = re.compile(r"I:\s+(-?[\d.]+) LUFS")
+_REGEX_PICO = re.compile(r"Peak:\s+(-?[\d.]+|-inf) dBFS")
+
+
+@dataclass(frozen=True, slots=True)
+class Medicion:
+    lufs: float | None        # None = silencio
+    pico_dbtp: float | None   # true peak; None = silencio
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigSonoridad:
+    normalizar: bool = True
+    objetivo_lufs: float = -16.0
+    ganancia_maxima_db: float = 12.0
+    pico_maximo_dbtp: float = -1.0
+
+    @classmethod
+    def desde_dict(cls, data: Dict[str, Any]) -> "ConfigSonoridad":
+        return cls(
+            normalizar=bool(data.get("normalizar", True)),
+            objetivo_lufs=float(data.get("objetivo_lufs", -16.0)),
+            ganancia_maxima_db=float(data.get("ganancia_maxima_db", 12.0)),
+            pico_maximo_dbtp=float(data.get("pico_maximo_dbtp", -1.0)),
+        )
+
+    def ganancia(self, medicion: Medicion | None) -> float:
+        """Factor de volumen para un audio medido (1.0 si la normalización está apagada)"""
+        if not self.normalizar or medicion is None:
+            return 1.0
+        return ganancia(medicion, self.objetivo_lufs, self.ganancia_maxima_db, self.pico_maximo_dbtp)
+
+
+def medir(path: str | Path) -> Medicion:
+    """
+    Sonoridad integrada (LUFS) y true peak (dBTP) de un audio vía ffmpeg (filtro ebur128).
+
+    Raises:
+        RuntimeError: Si ffmpeg no lo pudo medir
+    """
+    from moviepy.config import FFMPEG_BINARY
+
+    comando = [
+        FFMPEG_BINARY, "-hide_banner", "-nostats", "-i", str(path),
+        "-af", "ebur128=framelog=quiet:peak=true", "-f", "null", "-",
+    ]
+    proceso = subprocess.run(comando, capture_output=True, text=True)
+    # El resumen va al final del stderr; la última "I:" / "Peak:" es la de todo el archivo
+    medidas = _REGEX_INTEGRADA.findall(proceso.stderr)
+    picos = _REGEX_PICO.findall(proceso.stderr)
+    if proceso.returncode != 0 or not medidas or not picos:
+        raise RuntimeError(f"ffmpeg no pudo medir la sonoridad de {path}: {proceso.stderr.strip()[-300:]}")
+    lufs = float(medidas[-1])
+    pico = float(picos[-1])  # "-inf" también se convierte
+    if lufs <= PISO_LUFS:
+        return Medicion(None, None)
+    return Medicion(lufs, pico if pico != float("-inf") else None)
+
+
+def ganancia(medicion: Medicion, objetivo_lufs: float, maxima_db: float, pico_maximo_dbtp: float) -> float:
+    """
+    Factor de volumen que lleva un audio al objetivo. Nunca sube más de maxima_db (un
+    audio casi mudo se quedaría en puro ruido) ni deja el pico por encima de
+    pico_maximo_dbtp (si hace falta, baja aunque esté por debajo del objetivo);
+    silencio: 1.0.
+    """
+    if medicion.lufs is None:
+        return 1.0
+    db = min(objetivo_lufs - medicion.lufs, maxima_db)
+    if medicion.pico_dbtp is not None:
+        db = min(db, pico_maximo_dbtp - medicion.pico_dbtp)
+    return 10 ** (db / 20)
+
+
+class IndiceSonoridad:
+    """Sonoridad medida de los archivos de un directorio, persistida en <dir>/loudness.json"""
+
+    def __init__(self, directorio: str | Path):
+        self.directorio = Path(directorio)
+        self.path = self.directorio / INDICE_NOMBRE
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}  # índice roto: se vuelve a medir
+
+    def medicion(self, path: str | Path) -> Medicion | None:
+        """
+        Sonoridad y pico de un archivo del directorio; se mide solo si es nuevo o
+        cambió. Si no se puede medir devuelve None (sin ganancia) y se reintenta la
+        próxima vez.
+        """
+        path = Path(path)
+        stat = path.stat()
+        with self._lock:
+            registro = self._data.get(path.name)
+        # Los registros sin pico son de antes de medirlo: se vuelven a medir
+        if (
+            registro is not None and "pico_dbtp" in registro
+            and (registro["bytes"], registro["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+        ):
+            return Medicion(registro["lufs"], registro["pico_dbtp"])
+
+        try:
+            medicion = medir(path)
+        except RuntimeError as e:
+            print(f"      ⚠️  {e}")
+            return None
+        with self._lock:
+            self._data[path.name] = {
+                "lufs": medicion.lufs,
+                "pico_dbtp": medicion.pico_dbtp,
+                "bytes": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            self._guardar()
+        return medicion
+
+    def _guardar(self) -> None:
+        """Escritura atómica; si el directorio es de solo lectura, queda en memoria"""
+        try:
+            tmp = self.path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"      ⚠️  No se pudo guardar {self.path}: {e}")
+
+
+_indices: Dict[Path, IndiceSonoridad] = {}
+_indices_lock = threading.Lock()
+
+
+def get_indice_sonoridad(directorio: str | Path) -> IndiceSonoridad:
+    """Índice compartido por proceso del directorio"""
+    directorio = Path(directorio).resolve()
+    with _indices_lock:
+        indice = _indices.get(directorio)
+        if indice is None:
+            indice = IndiceSonoridad(directorio)
+            _indices[directorio] = indice
+        return indice
+
+
+def medicion_de(path: str | Path) -> Medicion | None:
+    """Sonoridad y pico de un archivo, usando (y actualizando) el índice de su directorio"""
+    path = Path(path)
+    return get_indice_sonoridad(path.parent).medicion(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mide la sonoridad (LUFS) de los audios de un directorio")
+    parser.add_argument("directorio", help="Ej: assets/background_sounds")
+    args = parser.parse_args()
+
+    for archivo in sorted(Path(args.directorio).glob("*.mp3")):
+        medicion = medicion_de(archivo)
+        if medicion is None:
+            print(f"⚠️  {archivo.name}: no se pudo medir")
+        elif medicion.lufs is None:
+            print(f"🔇 {archivo.name}: silencio")
+        else:
+            pico = "-inf" if medicion.pico_dbtp is None else f"{medicion.pico_dbtp:.1f}"
+            print(f"🔊 {archivo.name}: {medicion.lufs:.1f} LUFS, pico {pico} dBTP")
@@ -2,97 +2,229 @@
 Pipeline 2: Generador de Audio (Voces)
 Genera archivos MP3 con las voces de los diálogos de cada escena usando ElevenLabs.
 
-Input: guion.json
+Input: Guion (objeto en memoria) o ruta a guion.json
 Output: assets/voices/dialogue_N.mp3 (uno por cada escena)
 """
 import json
+import math
 import os
+import time
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Tuple
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
 
+from .guion_model import Guion, Escena, resolver_guion
+from .run_manifest import RunManifest
+from .instrumentation import span
+from .providers import limitar
+from .audio_probe import duracion_mp3
+from .fallback import ConfigRespaldos, CacheContenido, PersonajeSinVoz, reintentar, con_respaldos, mp3_silencioso
+
 load_dotenv()
 
 
 class Pipeline2Audio:
     """Pipeline 2: Generador de audio para diálogos usando ElevenLabs"""
     
-    def __init__(self, output_dir: str = "assets/voices", config_path: str = "config/voices.json"):
+    def __init__(
+        self,
+        output_dir: str = "assets/voices",
+        config_path: str = "config/voices.json",
+        fallbacks_path: str = "config/fallbacks.json"
+    ):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize ElevenLabs client
-        self.client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+        # Initialize ElevenLabs client (ELEVENLABS_BASE_URL points it at another host, e.g. the benchmark fake)
+        base_url = os.getenv("ELEVENLABS_BASE_URL")
+        if base_url:
+            self.client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"), base_url=base_url)
+        else:
+            self.client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
         
         # Load voice configuration
-        with open(config_path, 'r') as f:
+        self.config_path = Path(config_path)
+        self.fallbacks_path = Path(fallbacks_path)
+        self.recargar_config()
+    
+    def recargar_config(self) -> None:
+        """Relee voices.json y fallbacks.json (se reemplazan enteros: seguro con hilos leyendo)"""
+        with open(self.config_path, 'r') as f:
             self.config = json.load(f)
+        respaldos = ConfigRespaldos.desde_config(self.fallbacks_path)
+        self._cache = CacheContenido(respaldos.cache_dir / "voces", ".mp3")
+        self.respaldos = respaldos
     
-    def generar(self, guion_path: str = "guion.json") -> List[str]:
+    def generar(
+        self,
+        guion: Guion | str = "guion.json",
+        manifest: RunManifest | None = None,
+        on_progreso: Callable[[int, int], None] | None = None
+    ) -> List[str]:
         """
         Genera archivos de audio MP3 para cada diálogo del guion.
         
         Args:
-            guion_path: Ruta al archivo guion.json generado por Pipeline 1
+            guion: Guion generado por Pipeline 1 (o ruta a un guion.json guardado)
+            manifest: Run al que pertenece la ejecución. Si se indica, los audios se
+                guardan en el directorio del run y se saltan las escenas ya completas.
+            on_progreso: Se llama con (escenas_hechas, total) después de cada escena
             
         Returns:
             Lista de rutas a los archivos de audio generados
         """
-        print(f"🎵 PIPELINE 2: Generando audio desde: {guion_path}...")
+        guion = resolver_guion(guion)
+        print(f"🎵 PIPELINE 2: Generando audio para: {guion.titulo}...")
         
-        # Leer guion
-        with open(guion_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        escenas = guion.escenas
         
-        guion = data.get("guion", {})
-        escenas = guion.get("escenas", [])
+        if manifest is not None:
+            if manifest.etapa_completa("audio"):
+                print(f"   ⏭️  Audio ya generado en el run {manifest.run_id}, se reutiliza")
+                return [str(manifest.salida_escena("audio", e.numero_escena)) for e in escenas]
+            manifest.iniciar_etapa("audio")
         
         archivos_generados = []
         
-        for escena in escenas:
-            num_escena = escena.get("numero_escena")
-            dialogo = escena.get("dialogo", {})
-            personaje = dialogo.get("personaje")
-            texto = dialogo.get("texto")
-            emocion = dialogo.get("emocion")
+        with span("pipeline2.generar", escenas=len(escenas)):
+            for i, escena in enumerate(escenas, 1):
+                archivos_generados.append(self.generar_escena(escena, manifest))
+                if on_progreso is not None:
+                    on_progreso(i, len(escenas))
+        
+        output_dir = manifest.voices_dir if manifest is not None else self.output_dir
+        print(f"✅ {len(archivos_generados)} archivos de audio generados en: {output_dir}")
+        
+        if manifest is not None:
+            pendientes = [e.numero_escena for e in escenas if not manifest.escena_completa("audio", e.numero_escena)]
+            if pendientes:
+                manifest.fallar_etapa("audio", f"Escenas sin audio o con respaldo: {pendientes}")
+            else:
+                manifest.completar_etapa("audio")
+        
+        return archivos_generados
+    
+    def generar_escena(self, escena: Escena, manifest: RunManifest | None = None) -> str:
+        """
+        Genera el audio de una sola escena (ya validada).
+        
+        Permite despachar escenas apenas llegan desde el streaming de Pipeline 1.
+        
+        Args:
+            escena: Escena del guion con numero_escena y dialogo
+            manifest: Run al que pertenece la ejecución (opcional)
+            
+        Returns:
+            Ruta al archivo de audio generado
+        """
+        num_escena = escena.numero_escena
+        personaje = escena.dialogo.personaje
+        texto = escena.dialogo.texto
+        emocion = escena.dialogo.emocion
+        output_dir = manifest.voices_dir if manifest is not None else self.output_dir
+        
+        with span("pipeline2.escena", escena=num_escena) as s:
+            if manifest is not None and manifest.escena_completa("audio", num_escena):
+                s.cache_hit = True
+                print(f"   ⏭️  Escena {num_escena}: audio ya generado")
+                return str(manifest.salida_escena("audio", num_escena))
             
             print(f"   Escena {num_escena}: {personaje} dice '{texto[:50]}...'")
             
-            # Generate audio for this dialogue
-            try:
-                output_file = self._generate_audio_for_dialogue(
-                    personaje, texto, emocion, num_escena
-                )
-                archivos_generados.append(str(output_file))
+            output_file = output_dir / f"dialogue_{num_escena}.mp3"
+            origen, audio = self._audio_con_respaldos(personaje, texto, emocion, num_escena)
+            with open(output_file, "wb") as f:
+                f.write(audio)
+            
+            # La duración queda en el manifiesto para el plan de render (sin ffmpeg)
+            if manifest is not None:
+                segundos = duracion_mp3(output_file)
+                if segundos is not None:
+                    manifest.registrar_duracion(output_file, segundos)
+            
+            # La cache guarda salidas del modelo normal: vale lo mismo que una generación nueva
+            if origen in ("primario", "cache"):
+                if manifest is not None:
+                    manifest.registrar_escena("audio", num_escena, output_file)
                 print(f"   ✅ Audio generado: {output_file.name}")
-            except Exception as e:
-                print(f"   ❌ Error generando audio para escena {num_escena}: {str(e)}")
-                # Create placeholder file to continue pipeline
-                output_file = self.output_dir / f"dialogue_{num_escena}.mp3"
-                output_file.touch()
-                archivos_generados.append(str(output_file))
+            else:
+                if manifest is not None:
+                    manifest.registrar_respaldo("audio", num_escena, output_file, origen)
+                print(f"   🛟 Audio de respaldo ({origen}): {output_file.name}")
+            
+            return str(output_file)
+    
+    def _audio_con_respaldos(self, personaje: str, texto: str, emocion: str | None, num_escena: int) -> Tuple[str, bytes]:
+        """
+        Cadena de respaldos del audio (ver fallback.py): modelo normal con reintentos,
+        cache, modelo de respaldo y, si todo falla, silencio de la duración estimada.
+        
+        Returns:
+            (origen, bytes MP3) con origen "primario", "cache", "respaldo" o "stock"
+        """
+        respaldos = self.respaldos
+        politica = respaldos.politica
+        limite = time.monotonic() + politica.tiempo_maximo_escena
+        default_settings = self.config["default_settings"]
+        modelo = default_settings["model"]
+        modelo_respaldo = respaldos.audio.get("modelo_respaldo")
+        voz = self.config["characters"].get(personaje, {}).get("voice_id", "")
+        clave = CacheContenido.clave(modelo, voz, texto, emocion or "", str(default_settings.get("speed")))
         
-        print(f"✅ {len(archivos_generados)} archivos de audio generados en: {self.output_dir}")
+        def primario(timeout: float):
+            audio = self._sintetizar(personaje, texto, emocion, modelo, num_escena, timeout)
+            self._cache.guardar(clave, audio)
+            return audio
         
-        return archivos_generados
+        # Los modelos rápidos de ElevenLabs no interpretan las etiquetas de emoción
+        pasos = [
+            ("primario", lambda: reintentar(primario, politica, limite, f"ElevenLabs {modelo}")),
+            ("cache", lambda: self._cache.leer(clave)),
+        ]
+        if modelo_respaldo and modelo_respaldo != modelo:
+            pasos.append(("respaldo", lambda: reintentar(
+                lambda timeout: self._sintetizar(personaje, texto, None, modelo_respaldo, num_escena, timeout),
+                politica, limite, f"ElevenLabs {modelo_respaldo}"
+            )))
+        pasos.append(("stock", lambda: mp3_silencioso(self._duracion_estimada(texto))))
+        return con_respaldos(pasos, num_escena)
     
-    def _generate_audio_for_dialogue(self, personaje: str, texto: str, emocion: str, num_escena: int) -> Path:
+    def _duracion_estimada(self, texto: str) -> float:
+        """Segundos que tardaría la voz en decir el texto (para el silencio de respaldo)"""
+        caracteres_por_segundo = float(self.respaldos.audio.get("caracteres_por_segundo", 14))
+        speed = float(self.config["default_settings"].get("speed", 1.0)) or 1.0
+        return max(1.0, len(texto) / (caracteres_por_segundo * speed))
+    
+    def _sintetizar(
+        self,
+        personaje: str,
+        texto: str,
+        emocion: str | None,
+        modelo: str,
+        num_escena: int,
+        timeout: float | None = None
+    ) -> bytes:
         """
         Genera audio para un diálogo específico usando ElevenLabs.
         
         Args:
             personaje: Nombre del personaje
             texto: Texto del diálogo
-            emocion: Emoción del personaje
+            emocion: Emoción del personaje (None: sin etiqueta)
+            modelo: Modelo de ElevenLabs
             num_escena: Número de escena
+            timeout: Segundos máximos de la llamada (None = el del cliente)
             
         Returns:
-            Path al archivo de audio generado
+            Bytes MP3
+            
+        Raises:
+            PersonajeSinVoz: Si el personaje no está en voices.json
         """
         # Get voice configuration for character
         if personaje not in self.config["characters"]:
-            raise ValueError(f"Personaje '{personaje}' no encontrado en la configuración de voces")
+            raise PersonajeSinVoz(f"Personaje '{personaje}' no encontrado en la configuración de voces")
         voice_config = self.config["characters"][personaje]
         default_settings = self.config["default_settings"]
         
@@ -100,25 +232,26 @@ class Pipeline2Audio:
         if emocion:
             texto = f"[{emocion}] {texto}"
         
-        # Generate audio using ElevenLabs
-        audio = self.client.text_to_speech.convert(
-            text=texto,
-            voice_id=voice_config["voice_id"],
-            model_id=default_settings["model"],
-            output_format=default_settings["output_format"],
-            voice_settings={
-                "speed": default_settings["speed"],
-                "language": "es",
-                "accent": "standard"
-            }
-        )
-        
-        # Save audio file
-        output_file = self.output_dir / f"dialogue_{num_escena}.mp3"
-        with open(output_file, "wb") as f:
-            f.write(b"".join(audio))
-        
-        return output_file
+        # Generate audio using ElevenLabs (the response is streamed, so consume it inside the span)
+        with span("elevenlabs.tts", escena=num_escena, caracteres=len(texto), modelo=modelo) as s, \
+                limitar("elevenlabs", len(texto)):
+            audio = b"".join(self.client.text_to_speech.convert(
+                text=texto,
+                voice_id=voice_config["voice_id"],
+                model_id=modelo,
+                output_format=default_settings["output_format"],
+                voice_settings={
+                    "speed": default_settings["speed"],
+                    "language": "es",
+                    "accent": "standard"
+                },
+                request_options={"timeout_in_seconds": math.ceil(timeout)} if timeout else None
+            ))
+            s.bytes = len(audio)
+        
+        if not audio:
+            raise RuntimeError("ElevenLabs devolvió un audio vacío")
+        return audio
 
 
 if __name__ == "__main__":
@@ -130,4 +263,4 @@ if __name__ == "__main__":
     args = parser.parse_args()
     
     pipeline = Pipeline2Audio(output_dir=args.output_dir)
-    pipeline.generar(guion_path=args.guion)
+    pipeline.generar(args.guion)
@@ -3,26 +3,45 @@ Pipeline 1: Generador de Guion
 Genera un guion infantil estructurado en JSON a partir de una moraleja.
 
 Input: moraleja (string)
-Output: guion.json
+Output: Guion (objeto en memoria), opcionalmente guardado en guion.json
 
 Usa la API de Deepseek para generar historias educativas con:
-- Personajes fijos: Lucas, Sofia, Abuelo Sabio
+- Personajes: los que tienen voz en config/voices.json
 - 5-8 escenas con diálogos y descripciones visuales
 - Estructura narrativa coherente
 """
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Callable
 import requests
 from dotenv import load_dotenv
 
+from .guion_schema import ResultadoValidacion, get_elenco, reparar_guion, validar_escena
+from .guion_stream import EscenasStreamParser
+from .guion_model import Guion, Escena
+from .run_manifest import RunManifest
+from .instrumentation import span
+from .providers import limitar, estimar_tokens
+
+# Tokens de salida que se reservan en el rate limit antes de conocer el consumo real
+TOKENS_SALIDA_ESTIMADOS = 2000
+
 load_dotenv()
 
 
 class Pipeline1Guion:
     """Pipeline 1: Generador de guiones infantiles usando Deepseek API"""
     
-    def __init__(self, api_key: str | None = None, api_url: str | None = None, timeout: int | None = None):
+    def __init__(
+        self,
+        api_key: str | None = None,
+        api_url: str | None = None,
+        timeout: int | None = None,
+        max_reparaciones: int = 1,
+        voices_path: str = "config/voices.json"
+    ):
+        self.max_reparaciones = max_reparaciones
+        self.voices_path = voices_path
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         self.api_url = api_url or os.getenv("DEEPSEEK_API_URL")
         timeout_env = timeout or os.getenv("DEEPSEEK_TIMEOUT")
@@ -63,7 +82,7 @@ class Pipeline1Guion:
             "  }\n"
             "}\n"
             "Reglas:\n"
-            "- Usar SOLO estos personajes: Lucas (niño curioso, 7 años), Sofia (niña inteligente, 7 años), Carlos (abuelo sabio, 70 años), Juan (adulto amable, 40 años), Martina (mujer adulta, 35 años).\n"
+            "- Usar SOLO estos personajes: " + get_elenco(self.voices_path).para_prompt() + ".\n"
             "- NO crear personajes adicionales a los mencionados previamente\n"
             "- Generar entre 5-8 escenas (pocas escenas, historia concisa).\n"
             "- Estructura sugerida: inicio (presentación), desarrollo (aprendizaje), cierre (moraleja).\n"
@@ -78,8 +97,44 @@ class Pipeline1Guion:
         
         return prompt_base
 
-    def _call_deepseek_api(self, prompt: str) -> Dict[str, Any]:
-        """Llama a la API de Deepseek con el prompt"""
+    def _build_repair_prompt(self, moraleja: str, guion: Dict[str, Any], indices: List[int], errores: List[str]) -> str:
+        """Construye un prompt corto que pide rehacer SOLO las escenas rotas"""
+        escenas = guion["guion"]["escenas"]
+        titulo = guion["guion"]["metadata"].get("titulo", "")
+        contexto = "\n".join(
+            f"- Escena {e['numero_escena']}: {e.get('imagen_descripcion', '')[:120]}"
+            for i, e in enumerate(escenas) if i not in indices
+        )
+        rotas = json.dumps([escenas[i] for i in indices], ensure_ascii=False)
+        return (
+            f"Historia \"{titulo}\" con moraleja \"{moraleja}\".\n"
+            f"Escenas correctas (contexto, no las devuelvas):\n{contexto}\n"
+            f"Estas escenas tienen errores: {rotas}\n"
+            f"Errores detectados: {'; '.join(errores)}\n"
+            "Corrige SOLO esas escenas manteniendo su numero_escena. Cada escena necesita "
+            "imagen_descripcion y un dialogo con personaje y texto no vacíos. "
+            f"Personajes permitidos: {', '.join(get_elenco(self.voices_path).personajes)}.\n"
+            "Devuelve únicamente un JSON de la forma {\"escenas\":[...]} con las escenas corregidas, en el mismo orden."
+        )
+
+    def _validar_y_reparar(self, moraleja: str, guion: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Valida el guion y, si hay escenas irrecuperables, re-pregunta a Deepseek solo por ellas.
+
+        Raises:
+            GuionInvalidoError: si tras los reintentos siguen quedando escenas rotas
+        """
+        def corregir(resultado: ResultadoValidacion) -> Dict[str, Any]:
+            indices = resultado.escenas_rotas
+            prompt = self._build_repair_prompt(moraleja, resultado.data, indices, resultado.errores)
+            with span("deepseek.reparacion", escenas=len(indices)) as s:
+                s.reintentos = 1
+                return self._call_deepseek_api(prompt)
+
+        return reparar_guion(guion, corregir, self.max_reparaciones, get_elenco(self.voices_path))
+
+    def _build_request(self, prompt: str, stream: bool = False) -> tuple:
+        """Headers y payload de chat completion para Deepseek"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -96,8 +151,21 @@ class Pipeline1Guion:
             "temperature": 0.7,
             "response_format": {"type": "json_object"}
         }
+        if stream:
+            payload["stream"] = True
+
+        return headers, payload
+
+    def _call_deepseek_api(self, prompt: str) -> Dict[str, Any]:
+        """Llama a la API de Deepseek con el prompt"""
+        headers, payload = self._build_request(prompt)
 
-        resp = requests.post(self.api_url, headers=headers, json=payload, timeout=self.timeout)
+        with span("deepseek.chat") as s, \
+                limitar("deepseek", estimar_tokens(prompt, TOKENS_SALIDA_ESTIMADOS)) as uso:
+            resp = requests.post(self.api_url, headers=headers, json=payload, timeout=self.timeout)
+            s.bytes = len(resp.content)
+            if resp.ok:
+                uso.unidades = resp.json().get("usage", {}).get("total_tokens", uso.unidades)
         if not resp.ok:
             raise RuntimeError(f"Error en Deepseek API {resp.status_code}: {resp.text}")
 
@@ -112,38 +180,148 @@ class Pipeline1Guion:
         except json.JSONDecodeError as exc:
             raise RuntimeError("No se pudo parsear la respuesta JSON de Deepseek") from exc
 
-    def generar(self, moraleja: str, output_path: str = "guion.json") -> Dict[str, Any]:
+    def _stream_deepseek_api(self, prompt: str, on_escena: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """
+        Llama a Deepseek en modo streaming (SSE) y despacha cada escena en cuanto se completa.
+
+        Args:
+            prompt: Prompt del guion
+            on_escena: Callback que recibe cada escena completa y válida
+
+        Returns:
+            El guion completo parseado (sin validar)
         """
-        Genera un guion a partir de una moraleja y lo guarda en JSON.
+        headers, payload = self._build_request(prompt, stream=True)
+
+        parser = EscenasStreamParser()
+        generado = 0
+        with span("deepseek.chat_stream") as s, \
+                limitar("deepseek", estimar_tokens(prompt, TOKENS_SALIDA_ESTIMADOS)) as uso, \
+                requests.post(self.api_url, headers=headers, json=payload, timeout=self.timeout, stream=True) as resp:
+            if not resp.ok:
+                raise RuntimeError(f"Error en Deepseek API {resp.status_code}: {resp.text}")
+
+            for linea in resp.iter_lines(decode_unicode=True):
+                # Formato SSE: "data: {...}" y "data: [DONE]" al final
+                if not linea or not linea.startswith("data:"):
+                    continue
+                s.bytes += len(linea)
+                datos = linea[len("data:"):].strip()
+                if datos == "[DONE]":
+                    break
+                try:
+                    evento = json.loads(datos)
+                    delta = evento["choices"][0].get("delta", {}).get("content") or ""
+                except (json.JSONDecodeError, KeyError, IndexError) as exc:
+                    raise RuntimeError("Evento de streaming inesperado de Deepseek API") from exc
+
+                generado += len(delta)
+                try:
+                    escenas = parser.feed(delta)
+                except json.JSONDecodeError as exc:
+                    raise RuntimeError("No se pudo parsear una escena del streaming de Deepseek") from exc
+                for escena in escenas:
+                    on_escena(escena)
+
+            # El stream no trae "usage": se estima con lo que generó el modelo
+            uso.unidades = estimar_tokens(prompt) + generado // 3
+
+        try:
+            return parser.resultado()
+        except json.JSONDecodeError as exc:
+            raise RuntimeError("No se pudo parsear la respuesta JSON de Deepseek") from exc
+
+    def generar(
+        self,
+        moraleja: str,
+        output_path: str | None = None,
+        on_escena: Callable[[Escena], None] | None = None,
+        manifest: RunManifest | None = None
+    ) -> Guion:
+        """
+        Genera un guion a partir de una moraleja.
         
         Args:
             moraleja: La moraleja de la historia (ej: "no hablar con extraños")
-            output_path: Ruta donde guardar el guion.json (default: "guion.json")
+            output_path: Si se indica, guarda un checkpoint del guion en ese JSON
+            on_escena: Si se indica, se usa streaming y se llama con cada escena
+                validada en cuanto el modelo la termina de escribir. Las escenas
+                que necesiten corrección se despachan después de repararlas.
+            manifest: Run al que pertenece la ejecución. Si el guion ya está en el
+                run se reutiliza (sin llamar a Deepseek); si no, se guarda ahí.
             
         Returns:
-            El guion generado como diccionario Python
+            El guion generado (objeto Guion, listo para pasar a los demás pipelines)
         """
         if not moraleja or not moraleja.strip():
             raise ValueError("La moraleja debe ser un texto no vacío")
 
+        if manifest is not None and manifest.etapa_completa("guion"):
+            with span("pipeline1.generar") as s:
+                s.cache_hit = True
+                guion = Guion.cargar(manifest.guion_path)
+            print(f"⏭️  PIPELINE 1: Guion ya generado en el run {manifest.run_id}: {guion.titulo}")
+            if on_escena is not None:
+                for escena in guion.escenas:
+                    on_escena(escena)
+            return guion
+
         print(f"🎨 PIPELINE 1: Generando guion para moraleja: '{moraleja}'...")
+        if manifest is not None:
+            manifest.iniciar_etapa("guion")
         
-        prompt = self._build_prompt(moraleja.strip())
-        guion = self._call_deepseek_api(prompt)
+        try:
+            with span("pipeline1.generar"):
+                guion = self._generar_guion(moraleja, on_escena)
+        except Exception as e:
+            if manifest is not None:
+                manifest.fallar_etapa("guion", e)
+            raise
         
-        # Guardar guion en archivo JSON
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(guion, f, ensure_ascii=False, indent=2)
+        if manifest is not None:
+            guion.guardar(manifest.guion_path)
+            manifest.completar_etapa("guion", [manifest.guion_path])
         
-        print(f"✅ Guion generado y guardado en: {output_path}")
+        if output_path:
+            guion.guardar(output_path)
+            print(f"✅ Guion generado y guardado en: {output_path}")
+        else:
+            print("✅ Guion generado")
         
         # Mostrar resumen
-        if "guion" in guion and "metadata" in guion["guion"]:
-            metadata = guion["guion"]["metadata"]
-            num_escenas = len(guion["guion"].get("escenas", []))
-            print(f"   Título: {metadata.get('titulo', 'N/A')}")
-            print(f"   Escenas: {num_escenas}")
-            print(f"   Duración estimada: {metadata.get('duracion_estimada', 'N/A')}")
+        print(f"   Título: {guion.metadata.titulo}")
+        print(f"   Escenas: {len(guion.escenas)}")
+        print(f"   Duración estimada: {guion.metadata.duracion_estimada or 'N/A'}")
+        
+        return guion
+
+    def _generar_guion(self, moraleja: str, on_escena: Callable[[Escena], None] | None) -> Guion:
+        """Llama a Deepseek (normal o en streaming) y devuelve el guion validado"""
+        prompt = self._build_prompt(moraleja.strip())
+        elenco = get_elenco(self.voices_path)
+        if on_escena is None:
+            data = self._call_deepseek_api(prompt)
+            guion = Guion.from_dict(self._validar_y_reparar(moraleja.strip(), data), elenco)
+        else:
+            recibidas: List[Dict[str, Any]] = []
+            despachadas = set()
+
+            def despachar(escena_cruda: Dict[str, Any]) -> None:
+                indice = len(recibidas)
+                recibidas.append(escena_cruda)
+                escena, errores = validar_escena(escena_cruda, indice, elenco)
+                if not errores:
+                    print(f"   📨 Escena {escena['numero_escena']} lista, despachando...")
+                    despachadas.add(indice)
+                    on_escena(Escena.from_dict(escena))
+
+            data = self._stream_deepseek_api(prompt, despachar)
+            guion = Guion.from_dict(self._validar_y_reparar(moraleja.strip(), data), elenco)
+
+            # Despachar las escenas que llegaron rotas y fueron reparadas
+            for indice, escena in enumerate(guion.escenas):
+                if indice not in despachadas:
+                    on_escena(escena)
         
         return guion
 
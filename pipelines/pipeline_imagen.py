@@ -2,16 +2,31 @@
 Pipeline 3: Generador de Imágenes
 Genera imágenes PNG para cada escena del guion usando Gemini API.
 
-Input: guion.json
+Input: Guion (objeto en memoria) o ruta a guion.json
 Output: assets/images/image_N.png (una por cada escena)
 
 Usa gemini-2.0-flash-preview-image-generation para generar imágenes consistentes
 basadas en las descripciones de characters.json
+
+Hojas de referencia: la primera vez que un personaje aparece se genera (o se carga)
+una imagen canónica suya y se adjunta a cada escena donde aparece, en lugar de
+describirlo entero en el prompt. Gemini copia la referencia en vez de reinventar al
+personaje en cada escena, y el prompt queda mucho más corto.
+  - assets/characters/<Nombre>.png: referencia manual (se usa tal cual si existe)
+  - assets/characters/.cache/<Nombre>_<hash>.png: generada; el hash cambia si cambia
+    la descripción del personaje o el estilo, y entonces se regenera
 """
+import hashlib
 import json
+import math
 import os
+import re
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Any, List
+from types import MappingProxyType
+from typing import Dict, Any, List, Callable, Tuple
 from datetime import datetime
 from PIL import Image
 from io import BytesIO
@@ -19,42 +34,126 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+from .guion_model import Guion, Escena, resolver_guion
+from .run_manifest import RunManifest
+from .instrumentation import span
+from .providers import limitar, PresupuestoExcedido
+from .scene_index import get_scene_index, normalizar_texto
+from .fallback import ConfigRespaldos, CacheContenido, reintentar, con_respaldos
+
 load_dotenv()
 
+# Gemini mantiene bien hasta 3 imágenes de referencia por pedido; el resto de los
+# personajes de la escena se describen con texto como antes
+MAX_REFERENCIAS = 3
+
+# Tras un fallo generando una referencia (ej: 429, timeout), las escenas que siguen no
+# la vuelven a pedir durante este tiempo; después se reintenta (la instancia es del proceso)
+REFERENCIA_REINTENTO_S = 300
+
+# Imagen lisa (crema claro) si no hay ningún asset de stock: el video sale igual
+TAMANO_STOCK = (1024, 1024)
+COLOR_STOCK = (250, 243, 224)
+
+
+@dataclass(frozen=True, slots=True)
+class FragmentosPrompt:
+    """Partes fijas del prompt de imagen, compiladas al cargar characters.json"""
+    estilo: tuple            # "Style: ...", "Art style: ..."
+    cierre: tuple            # "Lighting: ...", "Colors: ...", aviso infantil
+    personajes: MappingProxyType  # nombre -> "- descripción completa"
+    nombres: tuple           # en el orden del config
+    por_clave: MappingProxyType   # nombre normalizado (minúsculas, sin tildes) -> nombre
+    regex_nombres: re.Pattern | None
+
+    def personajes_en(self, texto: str) -> List[str]:
+        """Personajes mencionados en el texto (sin importar mayúsculas ni tildes), en orden del config"""
+        if self.regex_nombres is None:
+            return []
+        encontrados = {self.por_clave[clave] for clave in self.regex_nombres.findall(normalizar_texto(texto))}
+        return [n for n in self.nombres if n in encontrados]
+
+
+def _a_png(image_data: bytes) -> bytes:
+    """Decodifica la imagen (falla si no es una imagen válida) y la re-codifica como PNG"""
+    buffer = BytesIO()
+    Image.open(BytesIO(image_data)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
 
 class Pipeline3Imagen:
     """Pipeline 3: Generador de imágenes para escenas usando Gemini"""
     
-    def __init__(self, output_dir: str = "assets/images"):
+    def __init__(
+        self,
+        output_dir: str = "assets/images",
+        characters_path: str = "config/characters.json",
+        scenes_path: str = "config/scenes.json",
+        referencias_dir: str = "assets/characters",
+        usar_referencias: bool = True,
+        fallbacks_path: str = "config/fallbacks.json"
+    ):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.referencias_dir = Path(referencias_dir)
+        self.usar_referencias = usar_referencias
+        # nombre de archivo de la referencia -> bytes PNG (solo las que se pudieron generar;
+        # las que fallaron esperan en _referencias_fallidas antes de reintentarse)
+        self._referencias: Dict[str, bytes] = {}
+        self._referencias_fallidas: Dict[str, float] = {}  # clave -> time.monotonic() del fallo
+        self._referencias_locks: Dict[str, threading.Lock] = {}
+        self._referencias_lock = threading.Lock()
         
         # Inicializar cliente Gemini
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise RuntimeError("GEMINI_API_KEY no está configurada. Revisa tu archivo .env")
         
-        self.client = genai.Client(api_key=api_key)
+        # GEMINI_BASE_URL permite apuntar a otro host (ej: el servidor falso de benchmarks/)
+        base_url = os.getenv('GEMINI_BASE_URL')
+        if base_url:
+            self.client = genai.Client(api_key=api_key, http_options=types.HttpOptions(base_url=base_url))
+        else:
+            self.client = genai.Client(api_key=api_key)
         self.model = 'gemini-2.0-flash-preview-image-generation'
         
         # Cargar descripciones de personajes
-        self.characters = self._load_characters()
-        self.animation_style = self.characters.get('animation_style', {})
-        self.scene_guidelines = self.characters.get('scene_guidelines', {})
+        self.characters_path = Path(characters_path)
+        self.scenes_path = Path(scenes_path)
+        self.fallbacks_path = Path(fallbacks_path)
+        self._stock: Dict[Path, bytes] = {}
+        self.recargar_config()
+    
+    def recargar_config(self) -> None:
+        """Relee characters.json (recompila los fragmentos del prompt) y fallbacks.json"""
+        respaldos = ConfigRespaldos.desde_config(self.fallbacks_path)
+        self._cache = CacheContenido(respaldos.cache_dir / "imagenes", ".png")
+        self.respaldos = respaldos
+        self._stock = {}
+        characters = self._load_characters()
+        fragmentos = self._compilar_fragmentos(characters)
+        self.animation_style = characters.get('animation_style', {})
+        self.scene_guidelines = characters.get('scene_guidelines', {})
+        self.characters = characters
+        # Las referencias que fallaron se vuelven a intentar; las del disco siguen valiendo
+        with self._referencias_lock:
+            self._referencias_fallidas = {}
+        # Una sola asignación: los hilos que arman prompts ven el config viejo o el nuevo, nunca mezclados
+        self._fragmentos = fragmentos
     
     def _load_characters(self) -> Dict[str, Any]:
         """Carga las descripciones de personajes desde characters.json"""
-        characters_path = Path("config/characters.json")
+        characters_path = self.characters_path
         if not characters_path.exists():
-            print("⚠️  Advertencia: config/characters.json no encontrado")
+            print(f"⚠️  Advertencia: {characters_path} no encontrado")
             return {}
         
         with open(characters_path, "r", encoding="utf-8") as f:
             return json.load(f)
     
-    def _build_character_description(self, character_name: str) -> str:
+    def _build_character_description(self, character_name: str, characters: Dict[str, Any] | None = None) -> str:
         """Construye descripción detallada de un personaje para el prompt"""
-        characters_data = self.characters.get('characters', {})
+        characters_data = (self.characters if characters is None else characters).get('characters', {})
         char_data = characters_data.get(character_name, {})
         
         if not char_data:
@@ -104,160 +203,374 @@ class Pipeline3Imagen:
         
         return "; ".join(description_parts)
     
-    def _build_image_prompt(self, escena: Dict[str, Any]) -> str:
-        """Construye el prompt para generar la imagen de una escena"""
-        descripcion = escena.get("imagen_descripcion", "")
-        dialogo = escena.get("dialogo", {})
-        personaje_hablando = dialogo.get("personaje", "")
-        sonido_fondo = escena.get("sonido_fondo", "")
-        
-        # Estilo de animación base
-        style_desc = self.animation_style.get('description', '')
-        art_chars = self.animation_style.get('art_characteristics', [])
-        
-        # Construir prompt
-        prompt_parts = []
-        
-        # Estilo artístico
-        prompt_parts.append(f"Style: {style_desc}")
+    def _compilar_fragmentos(self, characters: Dict[str, Any]) -> "FragmentosPrompt":
+        """Arma una sola vez (al cargar el config) todo lo del prompt que no depende de la escena"""
+        style_desc = characters.get('animation_style', {}).get('description', '')
+        art_chars = characters.get('animation_style', {}).get('art_characteristics', [])
+        estilo = [f"Style: {style_desc}"]
         if art_chars:
-            prompt_parts.append("Art style: " + "; ".join(art_chars[:3]))
+            estilo.append("Art style: " + "; ".join(art_chars[:3]))
         
-        # Escena principal
-        prompt_parts.append(f"Scene: {descripcion}")
+        guidelines = characters.get('scene_guidelines', {})
+        cierre = []
+        if guidelines.get('lighting'):
+            cierre.append(f"Lighting: {guidelines['lighting']}")
+        if guidelines.get('color_palette'):
+            cierre.append(f"Colors: {guidelines['color_palette']}")
+        # Importante: para niños
+        cierre.append("Child-friendly, educational, safe for ages 5-8")
         
-        # Personajes (extraer de la descripción o del diálogo)
-        # Intentar identificar personajes mencionados
-        characters_in_scene = []
-        all_char_names = list(self.characters.get('characters', {}).keys())
+        nombres = tuple(characters.get('characters', {}).keys())
+        por_clave = {normalizar_texto(n): n for n in nombres}
+        return FragmentosPrompt(
+            estilo=tuple(estilo),
+            cierre=tuple(cierre),
+            personajes=MappingProxyType({n: f"- {self._build_character_description(n, characters)}" for n in nombres}),
+            nombres=nombres,
+            por_clave=MappingProxyType(por_clave),
+            regex_nombres=re.compile(r"\b(" + "|".join(map(re.escape, por_clave)) + r")\b") if por_clave else None,
+        )
+    
+    def _personajes_en_escena(self, escena: Escena) -> List[str]:
+        """Personajes mencionados en la descripción o que hablan en la escena"""
+        return self._fragmentos.personajes_en(f"{escena.imagen_descripcion} {escena.dialogo.personaje}")
+    
+    def _build_image_prompt(self, escena: Escena, con_referencia: List[str] = ()) -> str:
+        """
+        Construye el prompt para generar la imagen de una escena.
         
-        text_to_search = (descripcion + " " + personaje_hablando).lower()
-        for char_name in all_char_names:
-            if char_name.lower() in text_to_search:
-                characters_in_scene.append(char_name)
+        Args:
+            escena: Escena del guion
+            con_referencia: Personajes cuya imagen de referencia se adjunta al pedido, en
+                el orden de las imágenes; de esos solo va el nombre, no la descripción
+        """
+        fragmentos = self._fragmentos
+        prompt_parts = [*fragmentos.estilo, f"Scene: {escena.imagen_descripcion}"]
         
-        # Agregar descripciones de personajes
-        if characters_in_scene:
+        en_escena = self._personajes_en_escena(escena)
+        if en_escena:
             prompt_parts.append("Characters in scene:")
-            for char in characters_in_scene:
-                char_desc = self._build_character_description(char)
-                prompt_parts.append(f"- {char_desc}")
-        
-        # Ambiente basado en sonido de fondo
-        if sonido_fondo:
-            location_map = {
-                'park': 'outdoor park setting',
-                'parque': 'outdoor park setting',
-                'forest': 'forest setting with trees',
-                'bosque': 'forest setting with trees',
-                'hospital': 'hospital or medical setting',
-                'school': 'school or classroom setting',
-                'colegio': 'school or classroom setting',
-                'street': 'street or urban setting',
-                'calle': 'street or urban setting'
-            }
-            
-            for key, desc in location_map.items():
-                if key in sonido_fondo.lower():
-                    prompt_parts.append(f"Setting: {desc}")
-                    break
+            for nombre in en_escena:
+                if nombre in con_referencia:
+                    i = con_referencia.index(nombre) + 1
+                    prompt_parts.append(f"- {nombre}: exactly as in reference image {i}")
+                else:
+                    prompt_parts.append(fragmentos.personajes[nombre])
         
-        # Guidelines de escena
-        lighting = self.scene_guidelines.get('lighting', '')
-        color_palette = self.scene_guidelines.get('color_palette', '')
+        # Ambiente: el mismo escenario que usa Pipeline 4 para el sonido de fondo
+        escenario = get_scene_index(self.scenes_path).clasificar_escena(escena)
+        if escenario is not None and escenario.setting:
+            prompt_parts.append(f"Setting: {escenario.setting}")
         
-        if lighting:
-            prompt_parts.append(f"Lighting: {lighting}")
-        if color_palette:
-            prompt_parts.append(f"Colors: {color_palette}")
+        prompt_parts.extend(fragmentos.cierre)
+        return ". ".join(prompt_parts)
+    
+    def _prompt_referencia(self, nombre: str) -> str:
+        """Prompt de la hoja de referencia: el personaje solo, de cuerpo entero y fondo liso"""
+        fragmentos = self._fragmentos
+        return ". ".join([
+            *fragmentos.estilo,
+            f"Character reference sheet: {fragmentos.personajes[nombre].removeprefix('- ')}",
+            "Single character, full body, front view, neutral standing pose",
+            "Plain white background, no other characters, no text",
+            "Child-friendly, safe for ages 5-8",
+        ])
+    
+    def _archivo_referencia(self, nombre: str) -> Path:
+        """Referencia manual si existe; si no, la generada para la descripción actual"""
+        manual = self.referencias_dir / f"{nombre}.png"
+        if manual.exists():
+            return manual
+        huella = hashlib.sha1(self._prompt_referencia(nombre).encode("utf-8")).hexdigest()[:10]
+        return self.referencias_dir / ".cache" / f"{nombre}_{huella}.png"
+    
+    def referencia(self, nombre: str) -> bytes | None:
+        """
+        Imagen canónica del personaje (PNG). Se lee o genera una sola vez por proceso:
+        si varias escenas la piden a la vez, una la genera y las demás esperan. Un
+        fallo no queda cacheado: se vuelve a intentar pasados REFERENCIA_REINTENTO_S.
         
-        # Importante: para niños
-        prompt_parts.append("Child-friendly, educational, safe for ages 5-8")
+        Returns:
+            Bytes PNG, o None si no se pudo generar (la escena usa la descripción en texto)
+        """
+        archivo = self._archivo_referencia(nombre)
+        clave = str(archivo)
+        with self._referencias_lock:
+            if clave in self._referencias or self._fallo_reciente(clave):
+                return self._referencias.get(clave)
+            lock = self._referencias_locks.setdefault(clave, threading.Lock())
         
-        return ". ".join(prompt_parts)
+        with lock:
+            with self._referencias_lock:
+                if clave in self._referencias or self._fallo_reciente(clave):
+                    return self._referencias.get(clave)
+            with span("pipeline3.referencia", personaje=nombre) as s:
+                if archivo.exists():
+                    s.cache_hit = True
+                    datos = archivo.read_bytes()
+                else:
+                    print(f"\n   🧍 Generando hoja de referencia de {nombre}...")
+                    prompt = self._prompt_referencia(nombre)
+                    politica = self.respaldos.politica
+                    datos = self._guardar_referencia(reintentar(
+                        lambda timeout: self._generate_image(prompt, timeout=timeout), politica,
+                        time.monotonic() + politica.tiempo_maximo_escena, f"Referencia de {nombre}"
+                    ), archivo)
+            with self._referencias_lock:
+                if datos is None:
+                    self._referencias_fallidas[clave] = time.monotonic()
+                else:
+                    self._referencias[clave] = datos
+                    self._referencias_fallidas.pop(clave, None)
+            return datos
+    
+    def _fallo_reciente(self, clave: str) -> bool:
+        """Llamar con self._referencias_lock tomado"""
+        fallo = self._referencias_fallidas.get(clave)
+        return fallo is not None and time.monotonic() - fallo < REFERENCIA_REINTENTO_S
     
-    def _generate_image(self, prompt: str) -> bytes:
-        """Genera una imagen usando Gemini API"""
+    def _guardar_referencia(self, image_data: bytes | None, archivo: Path) -> bytes | None:
+        """Normaliza a PNG y guarda en el cache de referencias"""
+        if not image_data:
+            return None
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=[prompt],
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE'],  # CRÍTICO: ambas modalidades
-                )
-            )
-            
-            # Extraer imagen de la respuesta
-            for part in response.candidates[0].content.parts:
-                if part.inline_data is not None:
-                    return part.inline_data.data
-            
-            print("      ⚠️  No se encontró imagen en la respuesta")
+            png = _a_png(image_data)
+            archivo.parent.mkdir(parents=True, exist_ok=True)
+            temporal = archivo.with_suffix(".tmp")
+            temporal.write_bytes(png)
+            temporal.replace(archivo)
+            print(f"      ✅ Referencia guardada: {archivo}")
+            return png
+        except Exception as e:
+            print(f"      ❌ Error guardando referencia: {str(e)}")
             return None
+    
+    def generar_referencias(self, nombres: List[str] | None = None) -> Dict[str, str]:
+        """
+        Genera (o verifica) las hojas de referencia de los personajes indicados.
+        
+        Returns:
+            Nombre -> ruta de la referencia, solo de las que quedaron disponibles
+        """
+        nombres = self._fragmentos.nombres if nombres is None else nombres
+        return {n: str(self._archivo_referencia(n)) for n in nombres if self.referencia(n)}
+    
+    def _referencias_escena(self, escena: Escena) -> List[tuple]:
+        """(nombre, PNG) de los personajes de la escena con referencia disponible"""
+        if not self.usar_referencias:
+            return []
+        referencias = []
+        for nombre in self._personajes_en_escena(escena):
+            if len(referencias) == MAX_REFERENCIAS:
+                break
+            datos = self.referencia(nombre)
+            if datos:
+                referencias.append((nombre, datos))
+        return referencias
+    
+    def _generate_image(
+        self, prompt: str, referencias: List[bytes] = (), modelo: str | None = None, timeout: float | None = None
+    ) -> bytes | None:
+        """
+        Genera una imagen usando Gemini API (con imágenes de referencia opcionales).
+        timeout: segundos máximos de la llamada (None = sin límite del cliente).
+        Devuelve None si la llamada falla o la respuesta no trae imagen.
+        """
+        modelo = modelo or self.model
+        with span("gemini.imagen", modelo=modelo, referencias=len(referencias)) as s:
+            try:
+                partes = [types.Part.from_bytes(data=datos, mime_type="image/png") for datos in referencias]
+                with limitar("gemini", 1):
+                    response = self.client.models.generate_content(
+                        model=modelo,
+                        contents=[*partes, prompt],
+                        config=types.GenerateContentConfig(
+                            response_modalities=['TEXT', 'IMAGE'],  # CRÍTICO: ambas modalidades
+                            # El timeout de HttpOptions va en milisegundos
+                            http_options=types.HttpOptions(timeout=math.ceil(timeout * 1000)) if timeout else None,
+                        )
+                    )
+                
+                # Extraer imagen de la respuesta
+                for part in response.candidates[0].content.parts:
+                    if part.inline_data is not None:
+                        s.bytes = len(part.inline_data.data)
+                        return part.inline_data.data
+                
+                s.error = "respuesta sin imagen"
+                print("      ⚠️  No se encontró imagen en la respuesta")
+                return None
+                
+            except PresupuestoExcedido:
+                raise
+            except Exception as e:
+                s.error = str(e)
+                print(f"      ❌ Error generando imagen: {str(e)}")
+                return None
+    
+    def generar_escena(self, escena: Escena, manifest: RunManifest | None = None) -> str | None:
+        """
+        Genera la imagen de una sola escena (ya validada).
+        
+        Permite despachar escenas apenas llegan desde el streaming de Pipeline 1.
+        
+        Args:
+            escena: Escena del guion con numero_escena e imagen_descripcion
+            manifest: Run al que pertenece la ejecución (opcional)
             
-        except Exception as e:
-            print(f"      ❌ Error generando imagen: {str(e)}")
+        Returns:
+            Ruta a la imagen (generada o de respaldo), o None si no se pudo guardar
+        """
+        with span("pipeline3.escena", escena=escena.numero_escena) as s:
+            if manifest is not None and manifest.escena_completa("imagen", escena.numero_escena):
+                s.cache_hit = True
+                print(f"\n   ⏭️  Escena {escena.numero_escena}: imagen ya generada")
+                return str(manifest.salida_escena("imagen", escena.numero_escena))
+            return self._generar_escena(escena, manifest)
+    
+    def _generar_escena(self, escena: Escena, manifest: RunManifest | None) -> str | None:
+        num_escena = escena.numero_escena
+        descripcion = escena.imagen_descripcion
+        
+        output_dir = manifest.images_dir if manifest is not None else self.output_dir
+        output_file = output_dir / f"image_{num_escena}.png"
+        
+        print(f"\n   🎬 Escena {num_escena}...")
+        print(f"      {descripcion[:80]}...")
+        
+        # Referencias de los personajes (se generan la primera vez) y prompt corto
+        referencias = self._referencias_escena(escena)
+        prompt = self._build_image_prompt(escena, [nombre for nombre, _ in referencias])
+        
+        # Generar imagen (con reintentos y respaldos, ver fallback.py)
+        origen, png = self._imagen_con_respaldos(escena, prompt, [datos for _, datos in referencias])
+        
+        try:
+            output_file.write_bytes(png)
+        except OSError as e:
+            print(f"      ❌ Error guardando imagen: {str(e)}")
             return None
+        
+        # La cache guarda salidas del modelo normal: vale lo mismo que una generación nueva
+        if origen in ("primario", "cache"):
+            if manifest is not None:
+                manifest.registrar_escena("imagen", num_escena, output_file)
+            print(f"      ✅ Imagen guardada: {output_file.name}")
+        else:
+            if manifest is not None:
+                manifest.registrar_respaldo("imagen", num_escena, output_file, origen)
+            print(f"      🛟 Imagen de respaldo ({origen}): {output_file.name}")
+        return str(output_file)
     
-    def generar(self, guion_path: str = "guion.json") -> List[str]:
+    def _imagen_con_respaldos(self, escena: Escena, prompt: str, referencias: List[bytes]) -> Tuple[str, bytes]:
+        """
+        Cadena de respaldos de la imagen: modelo normal con reintentos, cache del mismo
+        prompt, modelo de respaldo y, si todo falla, la imagen de stock del escenario.
+        
+        Returns:
+            (origen, bytes PNG) con origen "primario", "cache", "respaldo" o "stock"
+        """
+        respaldos = self.respaldos
+        politica = respaldos.politica
+        limite = time.monotonic() + politica.tiempo_maximo_escena
+        modelo_respaldo = respaldos.imagen.get("modelo_respaldo")
+        clave = CacheContenido.clave(self.model, prompt, *referencias)
+        
+        def generar_con(modelo: str, timeout: float):
+            image_data = self._generate_image(prompt, referencias, modelo, timeout)
+            # Una respuesta que no decodifica como imagen cuenta como fallo (se reintenta)
+            return _a_png(image_data) if image_data else None
+        
+        def primario(timeout: float):
+            png = generar_con(self.model, timeout)
+            if png is not None:
+                self._cache.guardar(clave, png)
+            return png
+        
+        pasos = [
+            ("primario", lambda: reintentar(primario, politica, limite, f"Gemini {self.model}")),
+            ("cache", lambda: self._cache.leer(clave)),
+        ]
+        if modelo_respaldo and modelo_respaldo != self.model:
+            pasos.append(("respaldo", lambda: reintentar(
+                lambda timeout: generar_con(modelo_respaldo, timeout), politica, limite, f"Gemini {modelo_respaldo}"
+            )))
+        pasos.append(("stock", lambda: self._imagen_stock(escena)))
+        return con_respaldos(pasos, escena.numero_escena)
+    
+    def _imagen_stock(self, escena: Escena) -> bytes:
+        """
+        Imagen pre-renderizada del escenario de la escena: stock_dir/<escenario>.png,
+        si no stock_dir/default.png, y si no hay ninguna una imagen lisa.
+        """
+        stock_dir = self.respaldos.stock_dir
+        escenario = get_scene_index(self.scenes_path).clasificar_escena(escena)
+        candidatos = [stock_dir / f"{escenario.nombre}.png"] if escenario is not None else []
+        candidatos.append(stock_dir / "default.png")
+        for path in candidatos:
+            if path not in self._stock and path.exists():
+                self._stock[path] = _a_png(path.read_bytes())
+            if path in self._stock:
+                return self._stock[path]
+        buffer = BytesIO()
+        Image.new("RGB", TAMANO_STOCK, COLOR_STOCK).save(buffer, format="PNG")
+        return buffer.getvalue()
+    
+    def generar(
+        self,
+        guion: Guion | str = "guion.json",
+        manifest: RunManifest | None = None,
+        on_progreso: Callable[[int, int], None] | None = None
+    ) -> List[str]:
         """
         Genera imágenes PNG para cada escena del guion.
         
         Args:
-            guion_path: Ruta al archivo guion.json generado por Pipeline 1
+            guion: Guion generado por Pipeline 1 (o ruta a un guion.json guardado)
+            manifest: Run al que pertenece la ejecución. Si se indica, las imágenes se
+                guardan en el directorio del run y se saltan las escenas ya completas.
+            on_progreso: Se llama con (escenas_hechas, total) después de cada escena
             
         Returns:
             Lista de rutas a las imágenes generadas
         """
-        print(f"🖼️  PIPELINE 3: Generando imágenes desde: {guion_path}...")
-        
-        # Leer guion
-        with open(guion_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        guion = resolver_guion(guion)
+        print("🖼️  PIPELINE 3: Generando imágenes...")
         
-        guion = data.get("guion", {})
-        escenas = guion.get("escenas", [])
-        metadata = guion.get("metadata", {})
-        titulo = metadata.get("titulo", "Sin título")
+        escenas = guion.escenas
+        titulo = guion.titulo
         
         print(f"   📖 Título: {titulo}")
         print(f"   🎬 Total escenas: {len(escenas)}")
         
+        if manifest is not None:
+            if manifest.etapa_completa("imagen"):
+                print(f"   ⏭️  Imágenes ya generadas en el run {manifest.run_id}, se reutilizan")
+                return [str(manifest.salida_escena("imagen", e.numero_escena)) for e in escenas]
+            manifest.iniciar_etapa("imagen")
+        
         archivos_generados = []
         exitos = 0
         
-        for escena in escenas:
-            num_escena = escena.get("numero_escena")
-            descripcion = escena.get("imagen_descripcion", "")
-            
-            output_file = self.output_dir / f"image_{num_escena}.png"
-            
-            print(f"\n   🎬 Escena {num_escena}...")
-            print(f"      {descripcion[:80]}...")
-            
-            # Construir prompt
-            prompt = self._build_image_prompt(escena)
-            
-            # Generar imagen
-            image_data = self._generate_image(prompt)
-            
-            if image_data:
-                # Guardar imagen
-                try:
-                    image = Image.open(BytesIO(image_data))
-                    image.save(output_file)
-                    archivos_generados.append(str(output_file))
+        with span("pipeline3.generar", escenas=len(escenas)):
+            for i, escena in enumerate(escenas, 1):
+                ruta = self.generar_escena(escena, manifest)
+                if on_progreso is not None:
+                    on_progreso(i, len(escenas))
+                if ruta is None:
+                    continue
+                archivos_generados.append(ruta)
+                if manifest is None or manifest.escena_completa("imagen", escena.numero_escena):
                     exitos += 1
-                    print(f"      ✅ Imagen guardada: {output_file.name}")
-                except Exception as e:
-                    print(f"      ❌ Error guardando imagen: {str(e)}")
-            else:
-                # Crear placeholder si falla
-                output_file.touch()
-                archivos_generados.append(str(output_file))
-                print(f"      ⚠️  Placeholder creado")
         
-        print(f"\n✅ {exitos}/{len(escenas)} imágenes generadas exitosamente en: {self.output_dir}")
+        output_dir = manifest.images_dir if manifest is not None else self.output_dir
+        print(f"\n✅ {exitos}/{len(escenas)} imágenes generadas exitosamente en: {output_dir}")
+        
+        if manifest is not None:
+            if exitos == len(escenas):
+                manifest.completar_etapa("imagen")
+            else:
+                manifest.fallar_etapa("imagen", f"{len(escenas) - exitos} escena(s) sin imagen o con respaldo")
         
         return archivos_generados
 
@@ -269,8 +582,16 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Pipeline 3: Generar imágenes desde guion")
     parser.add_argument("guion", nargs="?", default="guion.json", help="Archivo guion.json")
     parser.add_argument("--output", "-o", default="assets/images", help="Directorio de salida")
+    parser.add_argument("--sin-referencias", action="store_true",
+                        help="No adjuntar hojas de referencia (describir personajes solo con texto)")
+    parser.add_argument("--solo-referencias", action="store_true",
+                        help="Generar las hojas de referencia de todos los personajes y salir")
     args = parser.parse_args()
     
-    pipeline = Pipeline3Imagen(output_dir=args.output)
-    pipeline.generar(args.guion)
+    pipeline = Pipeline3Imagen(output_dir=args.output, usar_referencias=not args.sin_referencias)
+    if args.solo_referencias:
+        for nombre, ruta in pipeline.generar_referencias().items():
+            print(f"   {nombre}: {ruta}")
+    else:
+        pipeline.generar(args.guion)
 
@@ -3,24 +3,57 @@ Pipeline 4: Ensamblador de Video
 Combina imágenes, audio de diálogos y sonidos de fondo en un video MP4 final.
 
 Input: 
-  - guion.json
+  - Guion (objeto en memoria) o ruta a guion.json
   - assets/voices/dialogue_N.mp3
   - assets/images/image_N.png
   - assets/background_sounds/*.mp3
   
-Output: assets/outputs/cuento_final.mp4
+Output: assets/outputs/cuento_final.mp4 (y, con una escalera de renditions,
+        cuento_final_360p.mp4 ... + cuento_final.renditions.json)
 
 Usa MoviePy para ensamblar el video escena por escena.
 """
-import json
+import math
 import os
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Sequence
 
 from moviepy import (
     ImageClip, AudioFileClip, CompositeAudioClip, 
     concatenate_videoclips, vfx, afx
 )
+from proglog import ProgressBarLogger
+
+from .guion_model import Guion, Escena, resolver_guion
+from .run_manifest import RunManifest
+from .instrumentation import span
+from .scene_index import get_scene_index
+from .plan import ConfigRender, PlanRender, EscenaPlan, planificar
+from .subtitles import generar_cues, escribir_subtitulos, incrustar_subtitulos
+from .renditions import seleccionar, escribir_renditions, ruta_indice, leer_indice
+from .loudness import medicion_de
+from .previews import TAMANOS, generar_previews, leer_previews, ruta_indice as ruta_previews
+
+
+class _LoggerProgreso(ProgressBarLogger):
+    """Traduce las barras de progreso de MoviePy a on_progreso(cuadros_hechos, total)"""
+    
+    def __init__(self, on_progreso: Callable[[int, int], None]):
+        super().__init__()
+        self.on_progreso = on_progreso
+        self._ultimo_pct = -1
+    
+    def bars_callback(self, bar, attr, value, old_value=None):
+        # "frame_index" es la barra de cuadros del encode de video (la de audio es "chunk")
+        if bar != "frame_index" or attr != "index":
+            return
+        total = self.bars[bar].get("total") or 0
+        if not total:
+            return
+        pct = (value + 1) * 100 // total
+        if pct != self._ultimo_pct:  # a lo más 100 llamadas por video
+            self._ultimo_pct = pct
+            self.on_progreso(min(value + 1, total), total)
 
 
 class Pipeline4Video:
@@ -31,94 +64,234 @@ class Pipeline4Video:
         output_dir: str = "assets/outputs",
         voices_dir: str = "assets/voices",
         images_dir: str = "assets/images",
-        sounds_dir: str = "assets/background_sounds"
+        sounds_dir: str = "assets/background_sounds",
+        fps: int = 24,
+        resolucion: tuple[int, int] | None = None,
+        preset: str = "medium",
+        motor: str = "compose",
+        threads: int | None = None,
+        scenes_path: str = "config/scenes.json",
+        render_config_path: str = "config/render.json",
+        subtitulos_mp4: bool = False,
+        renditions: Sequence[str] | None = None
     ):
+        """
+        Args:
+            fps: Cuadros por segundo del video final
+            resolucion: (ancho, alto) al que se escalan las imágenes; None = tamaño original
+            preset: Preset de x264 (ultrafast ... veryslow): velocidad vs tamaño del archivo
+            motor: Método de concatenación de MoviePy. "compose" admite escenas de tamaños
+                distintos; "chain" es más rápido pero exige que todas midan lo mismo
+                (usar junto con resolucion)
+            threads: Hilos de ffmpeg para el encode (None = default de ffmpeg)
+            scenes_path: Palabras clave de escenarios -> sonido ambiental
+            render_config_path: Límites por job y coeficientes de estimación (ver plan.py)
+            subtitulos_mp4: Además de los .vtt/.srt al lado del video, agregar los
+                subtítulos como pista dentro del MP4 (sin re-encodear)
+            renditions: Calidades a generar en una sola pasada (ej: ["360p", "720p"],
+                definidas en render.json); None = la escalera de render.json, [] = un
+                solo archivo. Ver renditions.py
+        """
+        if motor not in ("compose", "chain"):
+            raise ValueError(f"Motor de render desconocido: {motor} (usar 'compose' o 'chain')")
         self.output_dir = Path(output_dir)
         self.voices_dir = Path(voices_dir)
         self.images_dir = Path(images_dir)
         self.sounds_dir = Path(sounds_dir)
+        self.fps = fps
+        self.resolucion = resolucion
+        self.preset = preset
+        self.motor = motor
+        self.threads = threads
+        self.scenes_path = Path(scenes_path)
+        self.render_config_path = Path(render_config_path)
+        self.subtitulos_mp4 = subtitulos_mp4
+        self.renditions = renditions
+        self.recargar_config()
         
         self.output_dir.mkdir(parents=True, exist_ok=True)
     
+    def recargar_config(self) -> None:
+        """Relee render.json (límites y coeficientes del plan, escalera de renditions)"""
+        config = ConfigRender.desde_config(self.render_config_path)
+        self.escalera = config.escalera if self.renditions is None else seleccionar(config.renditions, self.renditions)
+        self.render_config = config
+    
+    def planificar(
+        self,
+        guion: Guion | str = "guion.json",
+        manifest: RunManifest | None = None,
+        fade_duration: float = 0.5,
+        dialog_delay: float = 0.8
+    ) -> PlanRender:
+        """
+        Calcula el timeline y el costo estimado del render a partir de los audios
+        (ver plan.py) y verifica los límites del job. Se puede llamar apenas termina
+        Pipeline 2, antes de generar las imágenes.
+        
+        Args:
+            guion: Guion generado por Pipeline 1 (o ruta a un guion.json guardado)
+            manifest: Run al que pertenece la ejecución (lee sus audios y guarda plan.json)
+            fade_duration: Duración del fade in/out en segundos
+            dialog_delay: Tiempo de silencio antes del diálogo en segundos
+            
+        Returns:
+            El plan, para pasarlo a generar()
+            
+        Raises:
+            PlanExcedeLimites: Si el video planificado supera los límites del job
+        """
+        guion = resolver_guion(guion)
+        voices_dir = manifest.voices_dir if manifest is not None else self.voices_dir
+        images_dir = manifest.images_dir if manifest is not None else self.images_dir
+        config = self.render_config
+        with span("pipeline4.plan", escenas=len(guion.escenas)) as s:
+            plan = planificar(
+                guion, voices_dir, images_dir, self.fps, self.resolucion, self.preset,
+                fade_duration, dialog_delay, config, manifest, self.escalera
+            )
+            s.atributos.update(segundos_video=plan.duracion_total, cpu_estimado=plan.cpu_segundos)
+        if manifest is not None:
+            plan.guardar(manifest.dir / "plan.json")
+        print(f"📐 Plan de render: {plan.resumen()}")
+        if plan.omitidas:
+            print(f"   ⚠️  Escenas sin audio (no van en el video): {list(plan.omitidas)}")
+        plan.verificar(config.limites)
+        return plan
+    
     def generar(
         self, 
-        guion_path: str = "guion.json", 
+        guion: Guion | str = "guion.json", 
         output_name: str = "cuento_final.mp4",
         fade_duration: float = 0.5,
         dialog_delay: float = 0.8,
         bg_volume: float = 0.3,
-        music_volume: float = 0.15
+        music_volume: float = 0.15,
+        manifest: RunManifest | None = None,
+        on_progreso: Callable[[int, int], None] | None = None,
+        plan: PlanRender | None = None
     ) -> str:
         """
         Ensambla el video final combinando todos los assets.
         
         Args:
-            guion_path: Ruta al archivo guion.json
+            guion: Guion generado por Pipeline 1 (o ruta a un guion.json guardado)
             output_name: Nombre del video de salida
             fade_duration: Duración del fade in/out en segundos
             dialog_delay: Tiempo de silencio antes del diálogo en segundos
-            bg_volume: Volumen del audio de fondo ambiental (0.0-1.0)
-            music_volume: Volumen de la música de fondo general (0.0-1.0)
+            bg_volume: Volumen del audio de fondo ambiental (0.0-1.0); con la normalización
+                de render.json activada, relativo a la voz (ver loudness.py)
+            music_volume: Volumen de la música de fondo general (0.0-1.0), ídem
+            manifest: Run al que pertenece la ejecución. Si se indica, se leen los
+                assets del directorio del run y se salta el render si ya está hecho.
+            on_progreso: Se llama con (cuadros_codificados, total) durante el encode
+            plan: Resultado de planificar() para este guion; si falta (o se hizo con otro
+                fade/delay) se calcula acá
             
         Returns:
-            Ruta al video generado
+            Ruta al video generado (los subtítulos quedan al lado: .vtt y .srt)
+            
+        Raises:
+            PlanExcedeLimites: Si el video supera los límites del job (no se renderiza)
         """
-        print(f"🎬 PIPELINE 4: Ensamblando video desde: {guion_path}...")
-        
-        # Leer guion
-        with open(guion_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        guion = resolver_guion(guion)
+        output_path = self.output_dir / output_name
         
-        guion = data.get("guion", {})
-        metadata = guion.get("metadata", {})
-        escenas = guion.get("escenas", [])
-        titulo = metadata.get("titulo", "Sin título")
+        if plan is None or (plan.fade_duration, plan.dialog_delay) != (fade_duration, dialog_delay):
+            plan = None
+        
+        if manifest is None:
+            with span("pipeline4.generar", escenas=len(guion.escenas)):
+                plan = plan or self.planificar(guion, None, fade_duration, dialog_delay)
+                return self._ensamblar(guion, plan, output_path, bg_volume, music_volume, on_progreso)
+        
+        if manifest.etapa_completa("video") and manifest.salida_etapa("video") == output_path.resolve():
+            with span("pipeline4.generar", escenas=len(guion.escenas)) as s:
+                s.cache_hit = True
+            print(f"⏭️  PIPELINE 4: Video ya generado en el run {manifest.run_id}: {output_path}")
+            return str(output_path)
+        
+        manifest.iniciar_etapa("video")
+        try:
+            with span("pipeline4.generar", escenas=len(guion.escenas)):
+                plan = plan or self.planificar(guion, manifest, fade_duration, dialog_delay)
+                ruta = self._ensamblar(guion, plan, output_path, bg_volume, music_volume, on_progreso)
+        except Exception as e:
+            manifest.fallar_etapa("video", e)
+            raise
+        manifest.completar_etapa("video", [ruta, *self._archivos_extra(Path(ruta))])
+        return ruta
+    
+    def _ensamblar(
+        self,
+        guion: Guion,
+        plan: PlanRender,
+        output_path: Path,
+        bg_volume: float,
+        music_volume: float,
+        on_progreso: Callable[[int, int], None] | None = None
+    ) -> str:
+        """Render del video según el plan (ver generar para la descripción de los parámetros)"""
+        fade_duration = plan.fade_duration
+        dialog_delay = plan.dialog_delay
+        print("🎬 PIPELINE 4: Ensamblando video...")
         
-        output_path = self.output_dir / output_name
+        escenas = guion.escenas
+        titulo = guion.titulo
         
         print(f"   Título: {titulo}")
         print(f"   Total escenas: {len(escenas)}")
         print(f"   Configuración: fade={fade_duration}s, delay={dialog_delay}s, bg_vol={bg_volume}, music_vol={music_volume}")
         
         clips_escenas = []
+        incluidas: List[EscenaPlan] = []
         duracion_total = 0
         
         for escena in escenas:
-            num = escena["numero_escena"]
+            num = escena.numero_escena
             print(f"\n   🎬 Procesando Escena {num}...")
             
+            escena_plan = plan.escena(num)
+            if escena_plan is None:
+                print("      ⚠️  Escena sin audio en el plan, se omite")
+                continue
+            
             # Rutas de archivos
-            image_path = self.images_dir / f"image_{num}.png"
-            dialogue_path = self.voices_dir / f"dialogue_{num}.mp3"
+            image_path = Path(escena_plan.imagen)
+            dialogue_path = Path(escena_plan.audio)
             
-            # Verificar que existan los archivos necesarios
-            if not image_path.exists():
+            # Verificar que existan los archivos necesarios (los vacíos son placeholders de
+            # versiones anteriores, que MoviePy no puede abrir)
+            if not image_path.exists() or image_path.stat().st_size == 0:
                 print(f"      ⚠️  Imagen no encontrada: {image_path}")
                 continue
             
-            if not dialogue_path.exists():
+            if not dialogue_path.exists() or dialogue_path.stat().st_size == 0:
                 print(f"      ⚠️  Audio de diálogo no encontrado: {dialogue_path}")
                 continue
             
-            # Cargar audio de voz para obtener duración
-            voice_audio = AudioFileClip(str(dialogue_path))
-            # Duración total: delay + voz + fade out
-            duration = dialog_delay + voice_audio.duration + fade_duration
+            # Duración total (del plan): delay + voz + fade out
+            voice_audio = AudioFileClip(str(dialogue_path)).with_volume_scaled(self._ganancia(dialogue_path, "voz"))
+            duration = escena_plan.duracion
             
             # Crear clip de imagen con esa duración
             image_clip = ImageClip(str(image_path), duration=duration)
+            if self.resolucion:
+                image_clip = image_clip.resized(new_size=self.resolucion)
             
             # Aplicar fade in al inicio y fade out al final
             image_clip = image_clip.with_effects([vfx.FadeIn(fade_duration), vfx.FadeOut(fade_duration)])
             
             # Buscar y cargar sonido de fondo AMBIENTAL basado en el ESCENARIO
-            imagen_descripcion = escena.get("imagen_descripcion", "")
-            bg_sound_path = self._get_background_sound(imagen_descripcion)
+            imagen_descripcion = escena.imagen_descripcion
+            bg_sound_path = self._get_background_sound(escena)
             
-            if bg_sound_path and Path(bg_sound_path).exists():
+            if bg_sound_path:
                 print(f"      🎵 Sonido ambiental: {Path(bg_sound_path).name} (escenario: {imagen_descripcion[:40]}...)")
                 # Cargar audio de fondo ambiental
-                bg_audio = AudioFileClip(bg_sound_path).with_volume_scaled(bg_volume)
+                bg_audio = AudioFileClip(bg_sound_path).with_volume_scaled(
+                    bg_volume * self._ganancia(bg_sound_path, "ambiente")
+                )
                 # El fondo empieza desde el inicio y dura toda la escena
                 bg_audio_clip = bg_audio.subclipped(0, min(bg_audio.duration, duration))
                 # Aplicar fade in/out al audio de fondo
@@ -141,6 +314,7 @@ class Pipeline4Video:
             # Asignar audio al clip
             image_clip = image_clip.with_audio(final_audio)
             clips_escenas.append(image_clip)
+            incluidas.append(escena_plan)
             
             duracion_total += duration
             print(f"      ✅ Escena {num} procesada ({duration:.2f}s)")
@@ -150,13 +324,15 @@ class Pipeline4Video:
         
         # Concatenar todas las escenas
         print(f"\n   📦 Concatenando {len(clips_escenas)} escenas...")
-        video_final = concatenate_videoclips(clips_escenas, method="compose")
+        video_final = concatenate_videoclips(clips_escenas, method=self.motor)
         
         # 🎵 AGREGAR MÚSICA DE FONDO A TODO EL VIDEO
         song_path = self.sounds_dir / "song.mp3"
         if song_path.exists():
             print(f"   🎶 Agregando música de fondo a todo el video: {song_path.name}")
-            music_audio = AudioFileClip(str(song_path)).with_volume_scaled(music_volume)
+            music_audio = AudioFileClip(str(song_path)).with_volume_scaled(
+                music_volume * self._ganancia(song_path, "música")
+            )
             
             # Hacer loop de la música si el video es más largo
             if music_audio.duration < duracion_total:
@@ -179,17 +355,39 @@ class Pipeline4Video:
             video_final = video_final.with_audio(final_audio_with_music)
             print(f"      ✅ Música de fondo agregada (volumen: {music_volume})")
         else:
-            print(f"   ⚠️  No se encontró song.mp3, video sin música de fondo")
+            print("   ⚠️  No se encontró song.mp3, video sin música de fondo")
         
         # Exportar video
         print(f"\n   💾 Exportando video a: {output_path}")
-        video_final.write_videofile(
-            str(output_path),
-            fps=24,
-            codec='libx264',
-            audio_codec='aac',
-            preset='medium'
-        )
+        logger = _LoggerProgreso(on_progreso) if on_progreso is not None else "bar"
+        # Los clips de MoviePy son perezosos: casi todo el costo del render se mide aquí
+        with span(
+            "ffmpeg.encode", escenas=len(clips_escenas), segundos_video=round(duracion_total, 2),
+            cpu_estimado=plan.cpu_segundos, bytes_estimados=plan.bytes_estimados
+        ) as s:
+            if self.escalera:
+                # Una sola pasada por los cuadros compuestos para todas las calidades
+                videos = escribir_renditions(
+                    video_final, output_path, self.escalera, self.fps, self.preset, self.threads, logger
+                )
+                s.atributos["renditions"] = [p.name for p in videos]
+                s.bytes = sum(p.stat().st_size for p in videos)
+                print(f"   📶 Renditions: {', '.join(p.name for p in videos)}")
+            else:
+                ruta_indice(output_path).unlink(missing_ok=True)  # de un render anterior con escalera
+                video_final.write_videofile(
+                    str(output_path),
+                    fps=self.fps,
+                    codec='libx264',
+                    audio_codec='aac',
+                    preset=self.preset,
+                    threads=self.threads,
+                    logger=logger
+                )
+                s.bytes = output_path.stat().st_size
+        
+        self._subtitular(guion, incluidas, dialog_delay, output_path)
+        self._previews(incluidas, output_path)
         
         print(f"\n✅ Video generado exitosamente: {output_path}")
         print(f"   📊 Duración total: {duracion_total:.2f} segundos ({duracion_total/60:.1f} minutos)")
@@ -197,67 +395,87 @@ class Pipeline4Video:
         
         return str(output_path)
     
-    def _get_background_sound(self, imagen_descripcion: str) -> str | None:
+    def _ganancia(self, path: str | Path, rol: str) -> float:
+        """
+        Factor de volumen que lleva el audio a la sonoridad objetivo de render.json, sin
+        pasar el pico máximo. La medición se hace una vez por archivo y queda en
+        <dir>/loudness.json.
         """
-        Busca el archivo de sonido de fondo apropiado según la descripción de la imagen/escena.
+        sonoridad = self.render_config.sonoridad
+        if not sonoridad.normalizar:
+            return 1.0
+        with span("pipeline4.sonoridad", archivo=Path(path).name, rol=rol) as s:
+            medicion = medicion_de(path)
+            factor = sonoridad.ganancia(medicion)
+            lufs = medicion.lufs if medicion is not None else None
+            s.atributos.update(
+                lufs=lufs, pico_dbtp=medicion.pico_dbtp if medicion is not None else None,
+                ganancia_db=round(20 * math.log10(factor), 1)
+            )
+        if lufs is not None and abs(factor - 1) > 0.01:
+            print(f"      🔊 {rol}: {lufs:.1f} LUFS -> {20 * math.log10(factor):+.1f} dB")
+        return factor
+    
+    def _subtitular(self, guion: Guion, incluidas: List[EscenaPlan], dialog_delay: float, output_path: Path) -> None:
+        """Escribe los .vtt/.srt del video y, si está activado, los agrega como pista al MP4"""
+        with span("pipeline4.subtitulos", escenas=len(incluidas)) as s:
+            cues = generar_cues(guion, incluidas, dialog_delay)
+            rutas = escribir_subtitulos(cues, output_path)
+            print(f"   💬 Subtítulos: {rutas['vtt'].name}, {rutas['srt'].name} ({len(cues)} cues)")
+            if self.subtitulos_mp4 and cues:
+                videos = self._renditions_generadas(output_path) or [output_path]
+                try:
+                    for video in videos:
+                        incrustar_subtitulos(video, rutas["srt"])
+                except RuntimeError as e:
+                    # El MP4 ya está renderizado y los .vtt/.srt escritos: no se pierde el video por esto
+                    s.error = str(e)
+                    print(f"   ⚠️  No se pudo agregar la pista de subtítulos al MP4: {e}")
+                    return
+                s.bytes = sum(v.stat().st_size for v in videos)
+                print("   💬 Pista de subtítulos agregada al MP4")
+    
+    def _previews(self, incluidas: List[EscenaPlan], output_path: Path) -> None:
+        """Póster y miniatura desde la imagen de la primera escena (ver previews.py)"""
+        with span("pipeline4.previews") as s:
+            try:
+                indice = generar_previews(incluidas[0].imagen, output_path)
+            except Exception as e:
+                # Sin póster la página sigue funcionando: no se pierde el video por esto
+                s.error = str(e)
+                print(f"   ⚠️  No se pudieron generar el póster y la miniatura: {e}")
+                return
+            print(f"   🖼️  Póster y miniatura: {indice['poster']['webp']}, {indice['thumb']['webp']}")
+    
+    @staticmethod
+    def _renditions_generadas(output_path: Path) -> List[Path]:
+        """Videos de la escalera de renditions del último render (vacía si fue un solo archivo)"""
+        indice = leer_indice(output_path)
+        if indice is None:
+            return []
+        return [output_path.with_name(r["archivo"]) for r in indice["renditions"]]
+    
+    def _archivos_extra(self, output_path: Path) -> List[Path]:
+        """Lo que queda al lado del video principal: subtítulos, otras renditions, previews e índices"""
+        extra = [output_path.with_suffix(".vtt"), output_path.with_suffix(".srt"), ruta_indice(output_path)]
+        extra += [p for p in self._renditions_generadas(output_path) if p != output_path]
+        previews = leer_previews(output_path)
+        if previews is not None:
+            extra.append(ruta_previews(output_path))
+            extra += [output_path.with_name(previews[t][f]) for t in TAMANOS for f in ("webp", "jpg")]
+        return [p for p in extra if p.exists()]
+    
+    def _get_background_sound(self, escena: Escena) -> str | None:
+        """
+        Busca el archivo de sonido de fondo apropiado según el escenario de la escena
+        (ver pipelines/scene_index.py y config/scenes.json).
         
-        Args:
-            imagen_descripcion: Descripción de la imagen (escenario) del guion
-            
         Returns:
             Ruta al archivo de audio o None si no se encuentra
         """
-        # Mapeo de palabras clave de ESCENARIOS a archivos de sonido disponibles
-        # Basado en los archivos en assets/background_sounds/
-        mapeo_escenarios = {
-            # Parque
-            "parque": "park.mp3",
-            "park": "park.mp3",
-            "columpio": "park.mp3",
-            "plaza": "park.mp3",
-            
-            # Bosque/Naturaleza
-            "bosque": "forest.mp3",
-            "forest": "forest.mp3",
-            "árbol": "forest.mp3",
-            "árboles": "forest.mp3",
-            "naturaleza": "forest.mp3",
-            
-            # Hospital
-            "hospital": "hospital.mp3",
-            "médico": "hospital.mp3",
-            "doctor": "hospital.mp3",
-            "clínica": "hospital.mp3",
-            
-            # Escuela/Colegio
-            "escuela": "school.mp3",
-            "school": "school.mp3",
-            "colegio": "school.mp3",
-            "clase": "school.mp3",
-            "aula": "school.mp3",
-            "salón": "school.mp3",
-            
-            # Calle
-            "calle": "street.mp3",
-            "street": "street.mp3",
-            "ciudad": "street.mp3",
-            "vereda": "street.mp3",
-            "acera": "street.mp3",
-        }
-        
-        if not imagen_descripcion:
-            return None
-        
-        descripcion_lower = imagen_descripcion.lower()
-        
-        # Buscar coincidencia con las palabras clave de escenarios
-        for keyword, filename in mapeo_escenarios.items():
-            if keyword in descripcion_lower:
-                filepath = self.sounds_dir / filename
-                if filepath.exists():
-                    return str(filepath)
-        
-        return None
+        indice = get_scene_index(self.scenes_path)
+        sonido = indice.sonido(indice.clasificar_escena(escena), self.sounds_dir)
+        return str(sonido) if sonido else None
 
     def generar_test(self, output_name: str = "sample_final.mp4", fade_duration: float = 0.5, dialog_delay: float = 0.8) -> str:
         """
@@ -276,7 +494,7 @@ class Pipeline4Video:
         Returns:
             Ruta al video generado
         """
-        print(f"🎬 PIPELINE 4 TEST: Generando video de prueba con samples...")
+        print("🎬 PIPELINE 4 TEST: Generando video de prueba con samples...")
         print(f"   Fade duration: {fade_duration}s | Dialog delay: {dialog_delay}s")
         
         output_path = self.output_dir / output_name
@@ -395,11 +613,22 @@ if __name__ == "__main__":
     parser.add_argument("--guion", "-g", default="guion.json", help="Archivo guion.json")
     parser.add_argument("--output", "-o", default="cuento_final.mp4", help="Nombre del video")
     parser.add_argument("--test", action="store_true", help="Modo TEST: genera video con archivos sample")
+    parser.add_argument("--fps", type=int, default=24, help="Cuadros por segundo (default: 24)")
+    parser.add_argument("--resolucion", help="ANCHOxALTO, ej: 1280x720 (default: tamaño de las imágenes)")
+    parser.add_argument("--preset", default="medium", help="Preset de x264 (default: medium)")
+    parser.add_argument("--motor", choices=["compose", "chain"], default="compose", help="Método de concatenación")
+    parser.add_argument("--subtitulos-mp4", action="store_true", help="Agregar los subtítulos como pista del MP4")
+    parser.add_argument("--renditions", help="Calidades a generar en una pasada, ej: 360p,720p,1080p (default: render.json)")
     args = parser.parse_args()
     
-    pipeline = Pipeline4Video()
+    resolucion = tuple(int(x) for x in args.resolucion.lower().split("x")) if args.resolucion else None
+    pipeline = Pipeline4Video(
+        fps=args.fps, resolucion=resolucion, preset=args.preset, motor=args.motor,
+        subtitulos_mp4=args.subtitulos_mp4,
+        renditions=[r for r in args.renditions.split(",") if r] if args.renditions is not None else None
+    )
     
     if args.test:
         pipeline.generar_test(output_name="sample_final.mp4")
     else:
-        pipeline.generar(guion_path=args.guion, output_name=args.output)
+        pipeline.generar(args.guion, output_name=args.output)
@@ -0,0 +1,265 @@
+"""
+Plan de render de Pipeline 4: timeline exacto y costo estimado, antes de renderizar.
+
+La duración de cada escena es dialog_delay + voz + fade, así que en cuanto existen
+los audios (después de Pipeline 2, antes de pagar las imágenes) se conoce el video
+entero: cuándo empieza cada escena, cuántos cuadros tiene y, con los coeficientes de
+config/render.json, cuántos segundos de CPU y cuántos MB va a costar el render.
+
+Con el plan se aplican los límites por job (config/render.json -> limites): si un
+guion sale demasiado largo, el job falla con PlanExcedeLimites antes de generar
+imágenes y de ocupar un worker de render. Pipeline 4 recibe el plan y usa sus
+duraciones en lugar de volver a medir cada audio. Las duraciones salen de los
+encabezados de los frames MP3 (audio_probe.py, sin lanzar ffmpeg) y quedan
+guardadas en el manifiesto del run.
+
+Los coeficientes de estimación son aproximados; para calibrarlos en una máquina:
+    python -m benchmarks.render --preset medium
+(segundos de video por segundo de CPU) y comparar con los atributos cpu_estimado /
+bytes_estimados del span ffmpeg.encode en report.json.
+"""
+import json
+import struct
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .guion_model import Guion
+from .audio_probe import duracion_mp3
+from .renditions import Rendition, escalera_efectiva, seleccionar
+from .loudness import ConfigSonoridad
+from .run_manifest import RunManifest
+
+RENDER_CONFIG_PATH = Path("config/render.json")
+
+_PNG_FIRMA = b"\x89PNG\r\n\x1a\n"
+
+
+class PlanExcedeLimites(RuntimeError):
+    """El video planificado supera los límites de duración, CPU o tamaño del job"""
+
+
+@dataclass(frozen=True, slots=True)
+class LimitesRender:
+    """None = sin límite"""
+    max_segundos_video: float | None = None
+    max_cpu_segundos: float | None = None
+    max_mb: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigRender:
+    limites: LimitesRender
+    cpu_por_megapixel_cuadro: Dict[str, float]
+    kbps_video_por_megapixel: float
+    kbps_audio: float
+    resolucion_imagen: Tuple[int, int]
+    renditions: Dict[str, Rendition]
+    escalera: Tuple[Rendition, ...]  # renditions que se generan por defecto (vacía = un solo archivo)
+    sonoridad: ConfigSonoridad
+
+    @classmethod
+    def desde_config(cls, path: str | Path = RENDER_CONFIG_PATH) -> "ConfigRender":
+        """
+        Carga config/render.json (sin archivo: sin límites y coeficientes por defecto)
+
+        Raises:
+            ValueError: Si la escalera nombra una rendition que no está definida
+        """
+        path = Path(path)
+        config: Dict[str, Any] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        limites = config.get("limites", {})
+        estimacion = config.get("estimacion", {})
+        renditions = {nombre: Rendition.desde_dict(nombre, r) for nombre, r in config.get("renditions", {}).items()}
+        return cls(
+            limites=LimitesRender(
+                max_segundos_video=limites.get("max_segundos_video"),
+                max_cpu_segundos=limites.get("max_cpu_segundos"),
+                max_mb=limites.get("max_mb"),
+            ),
+            cpu_por_megapixel_cuadro=dict(estimacion.get("cpu_segundos_por_megapixel_cuadro", {"medium": 0.018})),
+            kbps_video_por_megapixel=float(estimacion.get("kbps_video_por_megapixel", 400)),
+            kbps_audio=float(estimacion.get("kbps_audio", 128)),
+            resolucion_imagen=tuple(estimacion.get("resolucion_imagen", (1024, 1024))),
+            renditions=renditions,
+            escalera=seleccionar(renditions, config.get("escalera", [])),
+            sonoridad=ConfigSonoridad.desde_dict(config.get("sonoridad", {})),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class EscenaPlan:
+    numero: int
+    imagen: str
+    audio: str
+    voz: float       # segundos de diálogo
+    inicio: float    # segundo del video en que empieza la escena
+    duracion: float  # delay + voz + fade
+
+
+@dataclass(frozen=True, slots=True)
+class PlanRender:
+    escenas: Tuple[EscenaPlan, ...]
+    omitidas: Tuple[int, ...]  # escenas sin audio: el render las salta
+    fps: int
+    ancho: int
+    alto: int
+    preset: str
+    fade_duration: float
+    dialog_delay: float
+    duracion_total: float
+    cuadros: int
+    cpu_segundos: float
+    bytes_estimados: int
+    renditions: Tuple[str, ...] = ()  # calidades a generar, de menor a mayor (vacía = un solo archivo)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def desde_dict(cls, data: Dict[str, Any]) -> "PlanRender":
+        return cls(**{
+            **data,
+            "escenas": tuple(EscenaPlan(**e) for e in data["escenas"]),
+            "omitidas": tuple(data["omitidas"]),
+            "renditions": tuple(data.get("renditions", ())),
+        })
+
+    def guardar(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def escena(self, numero: int) -> EscenaPlan | None:
+        return next((e for e in self.escenas if e.numero == numero), None)
+
+    def excesos(self, limites: LimitesRender) -> List[str]:
+        """Descripción de cada límite superado (vacía si el plan entra en los límites)"""
+        excesos = []
+        if limites.max_segundos_video is not None and self.duracion_total > limites.max_segundos_video:
+            excesos.append(f"duración {self.duracion_total:.0f}s > {limites.max_segundos_video:.0f}s")
+        if limites.max_cpu_segundos is not None and self.cpu_segundos > limites.max_cpu_segundos:
+            excesos.append(f"CPU estimado {self.cpu_segundos:.0f}s > {limites.max_cpu_segundos:.0f}s")
+        if limites.max_mb is not None and self.bytes_estimados > limites.max_mb * 1024 * 1024:
+            excesos.append(f"tamaño estimado {self.bytes_estimados / 1024 / 1024:.1f} MB > {limites.max_mb:.0f} MB")
+        return excesos
+
+    def verificar(self, limites: LimitesRender) -> None:
+        """
+        Raises:
+            PlanExcedeLimites: Si el plan supera algún límite
+        """
+        excesos = self.excesos(limites)
+        if excesos:
+            raise PlanExcedeLimites("El video excede los límites del job: " + "; ".join(excesos))
+
+    def resumen(self) -> str:
+        calidades = f" en {'/'.join(self.renditions)}" if self.renditions else ""
+        return (
+            f"{len(self.escenas)} escenas, {self.duracion_total:.1f}s de video ({self.cuadros} cuadros "
+            f"{self.ancho}x{self.alto}@{self.fps}{calidades}), ~{self.cpu_segundos:.0f}s de CPU, "
+            f"~{self.bytes_estimados / 1024 / 1024:.1f} MB"
+        )
+
+
+def duracion_audio(path: str | Path, manifest: RunManifest | None = None) -> float:
+    """
+    Duración en segundos de un audio: de los encabezados MP3 (ver audio_probe.py) o, si
+    no es MP3, de los metadatos vía ffmpeg. Con manifest, se mide una vez por archivo
+    y queda guardada en manifest.json.
+    """
+    if manifest is not None:
+        segundos = manifest.duracion_cacheada(path)
+        if segundos is not None:
+            return segundos
+    segundos = duracion_mp3(path)
+    if segundos is None:
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+        segundos = float(ffmpeg_parse_infos(str(path), decode_file=False)["duration"])
+    if manifest is not None:
+        manifest.registrar_duracion(path, segundos)
+    return segundos
+
+
+def tamano_png(path: str | Path) -> Tuple[int, int] | None:
+    """(ancho, alto) del encabezado IHDR de un PNG, o None si no existe o no es PNG"""
+    try:
+        with open(path, "rb") as f:
+            cabecera = f.read(24)
+    except OSError:
+        return None
+    if len(cabecera) < 24 or not cabecera.startswith(_PNG_FIRMA):
+        return None
+    return struct.unpack(">II", cabecera[16:24])
+
+
+def planificar(
+    guion: Guion,
+    voices_dir: Path,
+    images_dir: Path,
+    fps: int,
+    resolucion: Tuple[int, int] | None,
+    preset: str,
+    fade_duration: float,
+    dialog_delay: float,
+    config: ConfigRender,
+    manifest: RunManifest | None = None,
+    renditions: Sequence[Rendition] = (),
+) -> PlanRender:
+    """
+    Calcula el timeline del video y estima su costo de render.
+
+    Las imágenes pueden no existir todavía (plan después de Pipeline 2): para el
+    tamaño se usa entonces config.resolucion_imagen. Con manifest, las duraciones de
+    los audios se leen (y guardan) en el manifiesto del run. Con renditions, el costo
+    es la suma de los encodes de cada calidad (ver renditions.py).
+    """
+    escenas = []
+    omitidas = []
+    inicio = 0.0
+    ancho, alto = resolucion or (0, 0)
+    for escena in guion.escenas:
+        num = escena.numero_escena
+        audio = voices_dir / f"dialogue_{num}.mp3"
+        imagen = images_dir / f"image_{num}.png"
+        if not audio.exists() or audio.stat().st_size == 0:
+            omitidas.append(num)
+            continue
+        voz = duracion_audio(audio, manifest)
+        duracion = dialog_delay + voz + fade_duration
+        escenas.append(EscenaPlan(num, str(imagen), str(audio), round(voz, 4), round(inicio, 4), round(duracion, 4)))
+        inicio += duracion
+        if resolucion is None:
+            # "compose" centra las escenas en un lienzo del tamaño de la más grande
+            w, h = tamano_png(imagen) or config.resolucion_imagen
+            ancho, alto = max(ancho, w), max(alto, h)
+
+    cuadros = round(inicio * fps)
+    escalera = escalera_efectiva(renditions, ancho, alto) if renditions and alto else []
+    if escalera:
+        megapixeles = sum(w * h for _, w, h in escalera) / 1_000_000
+    else:
+        megapixeles = ancho * alto / 1_000_000
+    por_cuadro = config.cpu_por_megapixel_cuadro.get(preset) or max(config.cpu_por_megapixel_cuadro.values())
+    kbps = config.kbps_video_por_megapixel * megapixeles + config.kbps_audio * max(1, len(escalera))
+    return PlanRender(
+        escenas=tuple(escenas),
+        omitidas=tuple(omitidas),
+        fps=fps,
+        ancho=ancho,
+        alto=alto,
+        preset=preset,
+        fade_duration=fade_duration,
+        dialog_delay=dialog_delay,
+        duracion_total=round(inicio, 4),
+        cuadros=cuadros,
+        cpu_segundos=round(cuadros * megapixeles * por_cuadro, 1),
+        bytes_estimados=int(inicio * kbps * 1000 / 8),
+        renditions=tuple(r.nombre for r, _, _ in escalera),
+    )
@@ -0,0 +1,105 @@
+"""
+Póster y miniatura del video, sacados de las imágenes de escena (sin decodificar video).
+
+La imagen de la primera escena ya es, salvo el fade, el primer cuadro del video: de
+ella salen dos tamaños, cada uno en WebP y en JPEG (para navegadores sin WebP):
+
+  - poster: para el atributo poster del <video> (la página no baja el MP4 para mostrarlo)
+  - thumb:  para las tarjetas de la portada
+
+Los archivos llevan el hash de la imagen de origen en el nombre
+(<video>_thumb.<hash>.webp), así nunca cambian de contenido y se pueden servir con
+cache de un año (immutable). <video>.previews.json los lista; si la imagen no cambió,
+no se vuelven a generar.
+
+Uso suelto (ej: para los videos de ejemplo):
+    python -m pipelines.previews assets/images/image_1.png assets/outputs/ejemplo_honesto.mp4
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+# Nombre -> ancho máximo en píxeles
+TAMANOS = {"poster": 960, "thumb": 320}
+CALIDAD_WEBP = 80
+CALIDAD_JPEG = 85
+PATRON_NOMBRE = r"^[\w-]+_(poster|thumb)\.[0-9a-f]{12}\.(webp|jpg)$"
+
+
+def ruta_indice(video_path: str | Path) -> Path:
+    video_path = Path(video_path)
+    return video_path.with_name(f"{video_path.stem}.previews.json")
+
+
+def leer_previews(video_path: str | Path) -> Dict[str, Any] | None:
+    """Índice de previews de un video, o None si no tiene"""
+    path = ruta_indice(video_path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _vigentes(indice: Dict[str, Any] | None, huella: str, directorio: Path) -> bool:
+    if indice is None or indice.get("fuente") != huella:
+        return False
+    return all(
+        (directorio / indice[nombre][formato]).exists()
+        for nombre in TAMANOS
+        for formato in ("webp", "jpg")
+    )
+
+
+def generar_previews(imagen_path: str | Path, video_path: str | Path) -> Dict[str, Any]:
+    """
+    Escribe el póster y la miniatura del video a partir de una imagen de escena.
+
+    Args:
+        imagen_path: Imagen de la primera escena del video
+        video_path: Video al que pertenecen (los archivos quedan a su lado)
+
+    Returns:
+        El índice: {"fuente": hash, "poster": {"webp", "jpg", "ancho", "alto"}, "thumb": {...}}
+    """
+    imagen_path, video_path = Path(imagen_path), Path(video_path)
+    directorio = video_path.parent
+    huella = hashlib.sha256(imagen_path.read_bytes()).hexdigest()[:12]
+    indice = leer_previews(video_path)
+    if _vigentes(indice, huella, directorio):
+        return indice
+
+    from PIL import Image
+
+    indice = {"fuente": huella}
+    with Image.open(imagen_path) as original:
+        original = original.convert("RGB")
+        for nombre, ancho_max in TAMANOS.items():
+            copia = original.copy()
+            copia.thumbnail((ancho_max, ancho_max * original.height // original.width), Image.LANCZOS)
+            base = f"{video_path.stem}_{nombre}.{huella}"
+            copia.save(directorio / f"{base}.webp", "WEBP", quality=CALIDAD_WEBP, method=6)
+            copia.save(directorio / f"{base}.jpg", "JPEG", quality=CALIDAD_JPEG, optimize=True, progressive=True)
+            indice[nombre] = {"webp": f"{base}.webp", "jpg": f"{base}.jpg", "ancho": copia.width, "alto": copia.height}
+
+    # Los de una imagen anterior ya no se referencian
+    for nombre in TAMANOS:
+        for viejo in directorio.glob(f"{video_path.stem}_{nombre}.*"):
+            if huella not in viejo.name:
+                viejo.unlink(missing_ok=True)
+    with open(ruta_indice(video_path), "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False, indent=2)
+    return indice
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Genera póster y miniatura de un video desde una imagen de escena")
+    parser.add_argument("imagen", help="Imagen de la primera escena")
+    parser.add_argument("video", help="Video al que pertenecen (ej: assets/outputs/video_x.mp4)")
+    args = parser.parse_args()
+
+    indice = generar_previews(args.imagen, args.video)
+    for nombre in TAMANOS:
+        print(f"🖼️  {nombre}: {indice[nombre]['webp']}, {indice[nombre]['jpg']} ({indice[nombre]['ancho']}x{indice[nombre]['alto']})")
@@ -0,0 +1,291 @@
+"""
+Rate limiting y presupuesto de las APIs externas (Deepseek, ElevenLabs, Gemini).
+
+Cada proveedor tiene dos token buckets, configurados en config/providers.json:
+  - requests_por_segundo: llamadas por segundo
+  - unidades_por_minuto: tokens (Deepseek), caracteres (ElevenLabs) o imágenes (Gemini)
+
+Los buckets viven en un archivo SQLite (modo WAL, BEGIN IMMEDIATE), así que el límite
+es global entre hilos y procesos de la misma máquina: pipelines en paralelo, workers
+de la webapp y main.py comparten la misma cuota.
+
+El mismo archivo guarda el libro de consumo por job: llamadas, errores, unidades y
+costo estimado en USD por proveedor. El job es el run_id del RunReport activo (ver
+instrumentation.py); las llamadas fuera de un run (ej: el filtro ético) se anotan
+con job "". Si presupuesto_usd_por_job está definido, una llamada que lo excede se
+rechaza con PresupuestoExcedido antes de gastar.
+
+Desde código async (limitar_async) las lecturas y escrituras del SQLite corren en un
+hilo (asyncio.to_thread): un BEGIN IMMEDIATE que espera el lock de otro proceso no
+frena al resto de las requests del event loop. Solo la espera del rate limit es
+un asyncio.sleep.
+
+Uso:
+    with limitar("elevenlabs", len(texto)) as uso:
+        audio = cliente.convert(...)
+    with limitar("deepseek", estimar_tokens(prompt)) as uso:
+        resp = requests.post(...)
+        uso.unidades = resp.json()["usage"]["total_tokens"]  # el real, si se conoce
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator
+
+from .instrumentation import reporte_actual
+
+CONFIG_PATH = Path("config/providers.json")
+LEDGER_PATH = Path("assets/providers.sqlite3")
+
+
+class PresupuestoExcedido(RuntimeError):
+    """El job ya gastó su presupuesto_usd_por_job"""
+
+
+@dataclass(slots=True)
+class Uso:
+    """Consumo de una llamada; unidades se puede corregir con el valor real"""
+    proveedor: str
+    unidades: float
+    espera: float = 0.0
+
+
+def estimar_tokens(texto: str, max_tokens: int = 0) -> int:
+    """Estimación gruesa de tokens (~3 caracteres por token en español) más la salida máxima"""
+    return len(texto) // 3 + max_tokens
+
+
+class ProviderLimiter:
+    """Token buckets por proveedor y libro de consumo por job, en un SQLite compartido"""
+
+    def __init__(
+        self,
+        path: str | Path = LEDGER_PATH,
+        providers: Dict[str, Dict[str, Any]] | None = None,
+        presupuesto_usd_por_job: float | None = None,
+    ):
+        self.path = Path(path)
+        self.providers = providers or {}
+        self.presupuesto_usd_por_job = presupuesto_usd_por_job
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conexion()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " proveedor TEXT NOT NULL, tipo TEXT NOT NULL, tokens REAL NOT NULL,"
+            " actualizado REAL NOT NULL, PRIMARY KEY (proveedor, tipo))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS consumo ("
+            " job_id TEXT NOT NULL, proveedor TEXT NOT NULL, llamadas INTEGER NOT NULL,"
+            " errores INTEGER NOT NULL, unidades REAL NOT NULL, usd REAL NOT NULL,"
+            " espera REAL NOT NULL, actualizado REAL NOT NULL, PRIMARY KEY (job_id, proveedor))"
+        )
+
+    @classmethod
+    def desde_config(cls, config_path: str | Path = CONFIG_PATH) -> "ProviderLimiter":
+        """Lee config/providers.json (sin archivo: sin límites, solo libro de consumo)"""
+        config_path = Path(config_path)
+        if not config_path.exists():
+            print(f"⚠️  Advertencia: {config_path} no encontrado, APIs sin rate limit")
+            return cls()
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(
+            path=config.get("ledger_path") or LEDGER_PATH,
+            providers=config.get("providers", {}),
+            presupuesto_usd_por_job=config.get("presupuesto_usd_por_job"),
+        )
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ #
+    # Rate limit
+    # ------------------------------------------------------------------ #
+    def _buckets(self, proveedor: str, unidades: float) -> list[tuple[str, float, float, float]]:
+        """(tipo, capacidad, tasa por segundo, costo) de cada bucket del proveedor"""
+        config = self.providers.get(proveedor)
+        if not config:
+            return []
+        buckets = []
+        rps = config.get("requests_por_segundo")
+        if rps:
+            buckets.append(("requests", max(1.0, rps), rps, 1.0))
+        upm = config.get("unidades_por_minuto")
+        if upm:
+            # Una llamada más grande que el bucket entero lo vacía (si no, esperaría para siempre)
+            buckets.append(("unidades", upm, upm / 60, min(unidades, upm)))
+        return buckets
+
+    def _intentar(self, proveedor: str, unidades: float) -> float:
+        """Toma los tokens si alcanzan (devuelve 0) o devuelve cuántos segundos esperar"""
+        buckets = self._buckets(proveedor, unidades)
+        if not buckets:
+            return 0.0
+        conn = self._conexion()
+        # BEGIN IMMEDIATE toma el lock de escritura antes de leer: read-modify-write atómico entre procesos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ahora = time.time()
+            nuevos = []
+            espera = 0.0
+            for tipo, capacidad, tasa, costo in buckets:
+                fila = conn.execute(
+                    "SELECT tokens, actualizado FROM buckets WHERE proveedor = ? AND tipo = ?",
+                    (proveedor, tipo),
+                ).fetchone()
+                tokens = capacidad if fila is None else min(capacidad, fila[0] + (ahora - fila[1]) * tasa)
+                if tokens < costo:
+                    espera = max(espera, (costo - tokens) / tasa)
+                nuevos.append((tipo, tokens - costo))
+            if espera > 0:
+                conn.execute("ROLLBACK")
+                return espera
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (proveedor, tipo, tokens, actualizado) VALUES (?, ?, ?, ?)",
+                [(proveedor, tipo, tokens, ahora) for tipo, tokens in nuevos],
+            )
+            conn.execute("COMMIT")
+            return 0.0
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def adquirir(self, proveedor: str, unidades: float = 1) -> float:
+        """Bloquea hasta que el proveedor admita la llamada. Devuelve los segundos esperados."""
+        esperado = 0.0
+        while (espera := self._intentar(proveedor, unidades)) > 0:
+            time.sleep(espera)
+            esperado += espera
+        return esperado
+
+    async def adquirir_async(self, proveedor: str, unidades: float = 1) -> float:
+        """Como adquirir(), pero sin bloquear el event loop (ni en el SQLite ni en la espera)"""
+        esperado = 0.0
+        while (espera := await asyncio.to_thread(self._intentar, proveedor, unidades)) > 0:
+            await asyncio.sleep(espera)
+            esperado += espera
+        return esperado
+
+    # ------------------------------------------------------------------ #
+    # Libro de consumo
+    # ------------------------------------------------------------------ #
+    def registrar(self, job_id: str, proveedor: str, unidades: float, espera: float = 0.0, error: bool = False) -> None:
+        """Suma una llamada al consumo del job (y a los contadores del RunReport activo)"""
+        usd = unidades * self.providers.get(proveedor, {}).get("usd_por_unidad", 0.0)
+        self._conexion().execute(
+            "INSERT INTO consumo (job_id, proveedor, llamadas, errores, unidades, usd, espera, actualizado)"
+            " VALUES (?, ?, 1, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (job_id, proveedor) DO UPDATE SET"
+            " llamadas = llamadas + 1, errores = errores + excluded.errores,"
+            " unidades = unidades + excluded.unidades, usd = usd + excluded.usd,"
+            " espera = espera + excluded.espera, actualizado = excluded.actualizado",
+            (job_id, proveedor, int(error), unidades, usd, espera, time.time()),
+        )
+
+        reporte = reporte_actual()
+        if reporte is not None:
+            unidad = self.providers.get(proveedor, {}).get("unidad", "unidades")
+            reporte.incrementar(f"{proveedor}.{unidad}", unidades)
+            reporte.incrementar(f"{proveedor}.usd", usd)
+            if espera:
+                reporte.incrementar(f"{proveedor}.espera_rate_limit_s", espera)
+
+    def consumo(self, job_id: str) -> Dict[str, Any]:
+        """Consumo del job por proveedor, más el total en USD"""
+        filas = self._conexion().execute(
+            "SELECT proveedor, llamadas, errores, unidades, usd, espera FROM consumo WHERE job_id = ?",
+            (job_id,),
+        ).fetchall()
+        proveedores = {
+            proveedor: {
+                "llamadas": llamadas,
+                "errores": errores,
+                "unidades": unidades,
+                "unidad": self.providers.get(proveedor, {}).get("unidad", "unidades"),
+                "usd": round(usd, 6),
+                "espera_s": round(espera, 3),
+            }
+            for proveedor, llamadas, errores, unidades, usd, espera in filas
+        }
+        return {"proveedores": proveedores, "usd": round(sum(p["usd"] for p in proveedores.values()), 6)}
+
+    def _verificar_presupuesto(self, job_id: str) -> None:
+        if not job_id or self.presupuesto_usd_por_job is None:
+            return
+        gastado = self.consumo(job_id)["usd"]
+        if gastado >= self.presupuesto_usd_por_job:
+            raise PresupuestoExcedido(
+                f"El run {job_id} ya gastó ${gastado:.4f} (presupuesto ${self.presupuesto_usd_por_job:.4f})"
+            )
+
+    # ------------------------------------------------------------------ #
+    # Uso desde los pipelines
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def llamada(self, proveedor: str, unidades: float = 1) -> Iterator[Uso]:
+        """Espera turno, ejecuta el bloque y anota el consumo (las llamadas fallidas no suman unidades)"""
+        job_id = _job_actual()
+        self._verificar_presupuesto(job_id)
+        uso = Uso(proveedor, unidades, espera=self.adquirir(proveedor, unidades))
+        try:
+            yield uso
+        except BaseException:
+            self.registrar(job_id, proveedor, 0, espera=uso.espera, error=True)
+            raise
+        self.registrar(job_id, proveedor, uso.unidades, espera=uso.espera)
+
+    @asynccontextmanager
+    async def llamada_async(self, proveedor: str, unidades: float = 1) -> AsyncIterator[Uso]:
+        """Como llamada(), para código async (el SQLite se usa desde un hilo)"""
+        job_id = _job_actual()
+        await asyncio.to_thread(self._verificar_presupuesto, job_id)
+        uso = Uso(proveedor, unidades, espera=await self.adquirir_async(proveedor, unidades))
+        try:
+            yield uso
+        except BaseException:
+            await asyncio.to_thread(self.registrar, job_id, proveedor, 0, espera=uso.espera, error=True)
+            raise
+        await asyncio.to_thread(self.registrar, job_id, proveedor, uso.unidades, espera=uso.espera)
+
+
+def _job_actual() -> str:
+    reporte = reporte_actual()
+    return reporte.run_id if reporte is not None else ""
+
+
+_limiter: ProviderLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> ProviderLimiter:
+    """Limiter del proceso, configurado con config/providers.json"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = ProviderLimiter.desde_config()
+        return _limiter
+
+
+def limitar(proveedor: str, unidades: float = 1):
+    """Atajo de get_limiter().llamada(...)"""
+    return get_limiter().llamada(proveedor, unidades)
+
+
+def limitar_async(proveedor: str, unidades: float = 1):
+    """Atajo de get_limiter().llamada_async(...)"""
+    return get_limiter().llamada_async(proveedor, unidades)
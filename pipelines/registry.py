@@ -0,0 +1,126 @@
+"""
+Registro de instancias de los pipelines, compartidas por todo el proceso.
+
+Construir un pipeline no es gratis: Pipeline2Audio crea el cliente de ElevenLabs y
+lee voices.json, Pipeline3Imagen crea el cliente de Gemini y lee characters.json,
+y todos hacen mkdir. Como los pipelines no guardan estado por ejecución (el run
+llega siempre por argumento: manifest, on_progreso), una sola instancia por etapa
+se puede usar desde varios hilos a la vez.
+
+El registro construye cada instancia la primera vez que se pide (o al precalentar,
+al arrancar el worker) y, en cada get(), compara el mtime de sus archivos de
+configuración: si cambiaron, llama a recargar_config() sin reconstruir los clientes.
+
+Uso:
+    registro = get_registry()
+    registro.precalentar(("guion", "audio"))  # al arrancar (opcional)
+    registro.get("audio").generar(guion, manifest=manifest)
+"""
+import importlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List
+
+ETAPAS = ("guion", "audio", "imagen", "video")
+
+
+# Etapa -> (módulo, clase). El módulo se importa recién al construir esa etapa,
+# así un proceso que solo genera guiones no carga moviepy ni los SDKs de TTS/imagen.
+_CLASES = {
+    "guion": (".pipeline_guion", "Pipeline1Guion"),
+    "audio": (".pipeline_audio", "Pipeline2Audio"),
+    "imagen": (".pipeline_imagen", "Pipeline3Imagen"),
+    "video": (".pipeline_video", "Pipeline4Video"),
+}
+
+
+def _fabrica_default(etapa: str) -> Callable[[], Any]:
+    modulo, clase = _CLASES[etapa]
+    return getattr(importlib.import_module(modulo, __package__), clase)
+
+
+def _archivos_config(pipeline: Any) -> List[Path]:
+    """Archivos de configuración que usa una instancia (los que tienen recargar_config)"""
+    return [
+        Path(getattr(pipeline, atributo))
+        for atributo in ("config_path", "characters_path", "fallbacks_path", "render_config_path")
+        if getattr(pipeline, atributo, None) is not None
+    ]
+
+
+def _mtime(path: Path) -> float | None:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class PipelineRegistry:
+    """Una instancia por etapa, construida una vez y recargada si cambia su config"""
+
+    def __init__(self, fabricas: Dict[str, Callable[[], Any]] | None = None):
+        # Sin fábricas explícitas se usan las clases de los pipelines (importadas al usarlas)
+        self._fabricas = fabricas if fabricas is not None else {etapa: None for etapa in _CLASES}
+        self._instancias: Dict[str, Any] = {}
+        self._mtimes: Dict[str, Dict[Path, float | None]] = {}
+        # Un lock por etapa: construir el video (moviepy) no frena un get("guion") de otro hilo
+        self._locks = {etapa: threading.Lock() for etapa in self._fabricas}
+
+    def get(self, etapa: str) -> Any:
+        """
+        Instancia compartida del pipeline de la etapa ("guion", "audio", "imagen", "video").
+
+        Raises:
+            ValueError: Si la etapa no existe
+            RuntimeError: Si el pipeline no se puede construir (ej: falta una API key)
+        """
+        if etapa not in self._fabricas:
+            raise ValueError(f"Etapa desconocida: {etapa} (opciones: {', '.join(self._fabricas)})")
+
+        with self._locks[etapa]:
+            pipeline = self._instancias.get(etapa)
+            if pipeline is None:
+                fabrica = self._fabricas[etapa] or _fabrica_default(etapa)
+                pipeline = fabrica()
+                self._instancias[etapa] = pipeline
+                self._mtimes[etapa] = {p: _mtime(p) for p in _archivos_config(pipeline)}
+                return pipeline
+
+            mtimes = self._mtimes[etapa]
+            actuales = {p: _mtime(p) for p in mtimes}
+            if actuales != mtimes:
+                print(f"🔄 Configuración de '{etapa}' modificada, recargando...")
+                pipeline.recargar_config()
+                self._mtimes[etapa] = actuales
+            return pipeline
+
+    def precalentar(self, etapas: Iterable[str] = ETAPAS) -> List[str]:
+        """
+        Construye por adelantado las instancias indicadas. Una etapa que falla (ej: sin
+        API key) no impide arrancar: se avisa y se vuelve a intentar en el primer get().
+
+        Returns:
+            Las etapas que quedaron listas
+        """
+        listas = []
+        for etapa in etapas:
+            try:
+                self.get(etapa)
+                listas.append(etapa)
+            except Exception as e:
+                print(f"⚠️  No se pudo precalentar el pipeline '{etapa}': {e}")
+        return listas
+
+
+_registro: PipelineRegistry | None = None
+_registro_lock = threading.Lock()
+
+
+def get_registry() -> PipelineRegistry:
+    """Registro del proceso"""
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = PipelineRegistry()
+        return _registro
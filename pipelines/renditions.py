@@ -0,0 +1,199 @@
+"""
+Escalera de renditions: varias calidades del mismo video en una sola pasada de render.
+
+Los mismos cuentos se ven en celulares con mala conexión y en proyectores de aula.
+Renderizar el video una vez por calidad repetiría todo el trabajo caro (decodificar
+imágenes y audios, fades, composición, mezcla); acá se hace una sola vez:
+
+  - el audio mezclado se codifica una vez a AAC y se copia (-c:a copy) a cada salida
+  - los cuadros compuestos se mandan una sola vez a un único ffmpeg, que los reparte
+    con split y escala cada copia (scale=-2:alto) antes de su encode x264
+
+Cada rendition usa CRF con tope de bitrate (maxrate/bufsize), así los cuadros fáciles
+no gastan bytes de más y los difíciles no superan lo que aguanta la conexión. Las
+renditions más altas que las imágenes originales se omiten (escalar para arriba solo
+agrega bytes).
+
+Junto al video queda <video>.renditions.json con las calidades generadas, para que
+quien entrega el video elija una (ver elegir_rendition). La rendition más alta se
+escribe con el nombre normal del video; las demás como <video>_<nombre>.mp4.
+
+Configuración: config/render.json -> renditions (calidades disponibles) y escalera
+(las que se generan por defecto; vacía = un solo archivo, como siempre).
+"""
+import json
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+BITRATE_AUDIO = "128k"
+
+
+@dataclass(frozen=True, slots=True)
+class Rendition:
+    nombre: str
+    alto: int
+    crf: int = 23
+    maxrate_kbps: int | None = None
+
+    @classmethod
+    def desde_dict(cls, nombre: str, data: Dict[str, Any]) -> "Rendition":
+        return cls(
+            nombre=nombre,
+            alto=int(data["alto"]),
+            crf=int(data.get("crf", 23)),
+            maxrate_kbps=data.get("maxrate_kbps"),
+        )
+
+
+def seleccionar(disponibles: Dict[str, Rendition], nombres: Iterable[str]) -> Tuple[Rendition, ...]:
+    """
+    Renditions pedidas por nombre, de menor a mayor alto.
+
+    Raises:
+        ValueError: Si algún nombre no está en config/render.json
+    """
+    desconocidas = [n for n in nombres if n not in disponibles]
+    if desconocidas:
+        raise ValueError(
+            f"Renditions desconocidas: {', '.join(desconocidas)} (opciones: {', '.join(disponibles)})"
+        )
+    return tuple(sorted({disponibles[n] for n in nombres}, key=lambda r: r.alto))
+
+
+def escalera_efectiva(renditions: Sequence[Rendition], ancho: int, alto: int) -> List[Tuple[Rendition, int, int]]:
+    """
+    (rendition, ancho, alto) que realmente se generan para un video de ancho x alto:
+    sin las que escalarían para arriba (si no queda ninguna, una sola al tamaño
+    original con la calidad de la más chica). Los lados quedan pares, como los exige
+    yuv420p.
+    """
+    escalera = [r for r in renditions if r.alto <= alto]
+    if not escalera and renditions:
+        chica = renditions[0]
+        escalera = [Rendition(f"{alto - alto % 2}p", alto - alto % 2, chica.crf, chica.maxrate_kbps)]
+    return [(r, round(ancho * r.alto / alto / 2) * 2, r.alto) for r in escalera]
+
+
+def ruta_rendition(output_path: Path, rendition: Rendition, principal: bool) -> Path:
+    return output_path if principal else output_path.with_name(f"{output_path.stem}_{rendition.nombre}{output_path.suffix}")
+
+
+def ruta_indice(output_path: str | Path) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}.renditions.json")
+
+
+def escribir_renditions(
+    clip,
+    output_path: Path,
+    renditions: Sequence[Rendition],
+    fps: int,
+    preset: str,
+    threads: int | None = None,
+    logger: Any = "bar",
+) -> List[Path]:
+    """
+    Codifica el clip (ya compuesto, con su audio mezclado) en todas las renditions
+    recorriendo sus cuadros una sola vez, y escribe el índice <video>.renditions.json.
+
+    Args:
+        clip: Clip final de MoviePy (todas las escenas del mismo tamaño)
+        output_path: Ruta del video principal (la rendition más alta)
+        renditions: Calidades a generar (ver seleccionar)
+        logger: Logger de proglog para la barra de cuadros ("bar", None o uno propio)
+
+    Returns:
+        Las rutas de los videos generados, de menor a mayor calidad
+
+    Raises:
+        RuntimeError: Si ffmpeg falla
+    """
+    from moviepy.config import FFMPEG_BINARY
+
+    ancho, alto = clip.size
+    escalera = escalera_efectiva(renditions, ancho, alto)
+    rutas = [ruta_rendition(output_path, r, i == len(escalera) - 1) for i, (r, _, _) in enumerate(escalera)]
+
+    # Audio: se mezcla y codifica una sola vez para todas las salidas
+    audio_path = None
+    if clip.audio is not None:
+        audio_path = output_path.with_name(f"{output_path.stem}.audio.tmp.m4a")
+        clip.audio.write_audiofile(str(audio_path), fps=44100, codec="aac", bitrate=BITRATE_AUDIO, logger=None)
+
+    ramas = "".join(f"[s{i}]" for i in range(len(escalera)))
+    escalas = ";".join(f"[s{i}]scale=-2:{h}[v{i}]" for i, (_, _, h) in enumerate(escalera))
+    comando = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{ancho}x{alto}", "-pix_fmt", "rgb24",
+        "-r", str(fps), "-i", "-",
+    ]
+    if audio_path is not None:
+        comando += ["-i", str(audio_path)]
+    comando += ["-filter_complex", f"[0:v]split={len(escalera)}{ramas};{escalas}"]
+    for i, ((rendition, _, _), ruta) in enumerate(zip(escalera, rutas)):
+        comando += ["-map", f"[v{i}]"]
+        if audio_path is not None:
+            comando += ["-map", "1:a", "-c:a", "copy"]
+        comando += ["-c:v", "libx264", "-preset", preset, "-crf", str(rendition.crf), "-pix_fmt", "yuv420p"]
+        if rendition.maxrate_kbps:
+            comando += ["-maxrate", f"{rendition.maxrate_kbps}k", "-bufsize", f"{2 * rendition.maxrate_kbps}k"]
+        if threads:
+            comando += ["-threads", str(threads)]
+        comando += ["-movflags", "+faststart", str(ruta)]
+
+    try:
+        proceso = subprocess.Popen(comando, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for cuadro in clip.iter_frames(fps=fps, dtype="uint8", logger=logger):
+                proceso.stdin.write(cuadro[:, :, :3].tobytes())
+        except BrokenPipeError:
+            pass  # ffmpeg terminó antes de tiempo: el error sale de su stderr
+        _, stderr = proceso.communicate()
+        if proceso.returncode != 0:
+            raise RuntimeError(f"ffmpeg falló al codificar las renditions: {stderr.decode(errors='replace').strip()[-500:]}")
+    finally:
+        if audio_path is not None:
+            audio_path.unlink(missing_ok=True)
+
+    indice = {
+        "fuente": {"ancho": ancho, "alto": alto},
+        "renditions": [
+            {
+                "nombre": r.nombre,
+                "archivo": ruta.name,
+                "ancho": w,
+                "alto": h,
+                "crf": r.crf,
+                "maxrate_kbps": r.maxrate_kbps,
+                "bytes": ruta.stat().st_size,
+            }
+            for (r, w, h), ruta in zip(escalera, rutas)
+        ],
+    }
+    with open(ruta_indice(output_path), "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False, indent=2)
+    return rutas
+
+
+def leer_indice(output_path: str | Path) -> Dict[str, Any] | None:
+    """Índice de renditions de un video, o None si se generó un solo archivo"""
+    path = ruta_indice(output_path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def elegir_rendition(indice: Dict[str, Any], calidad: str | None = None, ahorro_datos: bool = False) -> Dict[str, Any]:
+    """
+    Rendition a entregar: la pedida por nombre, la más chica si el cliente pide
+    ahorrar datos (header Save-Data) o, si no, la más alta.
+    """
+    renditions = indice["renditions"]
+    if calidad:
+        pedida = next((r for r in renditions if r["nombre"] == calidad), None)
+        if pedida is not None:
+            return pedida
+    return renditions[0] if ahorro_datos else renditions[-1]
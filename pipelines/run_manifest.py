@@ -0,0 +1,249 @@
+"""
+Manifiesto de ejecución (run) para reanudar pipelines sin repetir trabajo.
+
+Cada ejecución vive en assets/runs/<run_id>/:
+  - manifest.json   Estado de cada etapa y hash de cada salida
+  - guion.json      Checkpoint del guion (Pipeline 1)
+  - voices/         dialogue_N.mp3 (Pipeline 2)
+  - images/         image_N.png (Pipeline 3)
+  - report.json     Tiempos por etapa y escena (ver instrumentation.py)
+
+Si Pipeline 4 falla después de que el audio y las imágenes se generaron, al
+reanudar (main.py --resume <run_id> o "Reintentar" en la web) los pipelines
+ven en el manifiesto qué etapas y escenas ya están completas, verifican su
+hash y las saltan. Solo se vuelve a pagar por lo que realmente falta.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+RUNS_DIR = Path("assets/runs")
+
+ETAPAS = ("guion", "audio", "imagen", "video")
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _ahora() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class RunManifest:
+    """Registro persistente de las salidas de cada etapa de una ejecución"""
+
+    def __init__(self, run_id: str, base_dir: str | Path = RUNS_DIR, data: Dict[str, Any] | None = None):
+        self.run_id = run_id
+        self.dir = Path(base_dir) / run_id
+        self.path = self.dir / "manifest.json"
+        self._lock = threading.RLock()
+        self.data = data or {
+            "run_id": run_id,
+            "moraleja": "",
+            "creado": _ahora(),
+            "actualizado": _ahora(),
+            "etapas": {},
+        }
+
+    # ------------------------------------------------------------------ #
+    # Creación y carga
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def crear(cls, moraleja: str, run_id: str | None = None, base_dir: str | Path = RUNS_DIR) -> "RunManifest":
+        """Crea un run nuevo con su directorio"""
+        manifest = cls(run_id or uuid.uuid4().hex[:8], base_dir)
+        manifest.data["moraleja"] = moraleja
+        manifest.voices_dir.mkdir(parents=True, exist_ok=True)
+        manifest.images_dir.mkdir(parents=True, exist_ok=True)
+        manifest.guardar()
+        return manifest
+
+    @classmethod
+    def cargar(cls, run_id: str, base_dir: str | Path = RUNS_DIR) -> "RunManifest":
+        """
+        Carga el manifiesto de un run existente.
+
+        Raises:
+            FileNotFoundError: si el run no existe
+        """
+        path = Path(base_dir) / run_id / "manifest.json"
+        if not path.exists():
+            raise FileNotFoundError(f"No existe el run '{run_id}' ({path})")
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        manifest = cls(run_id, base_dir, data)
+        manifest.voices_dir.mkdir(parents=True, exist_ok=True)
+        manifest.images_dir.mkdir(parents=True, exist_ok=True)
+        return manifest
+
+    @property
+    def moraleja(self) -> str:
+        return self.data.get("moraleja", "")
+
+    @property
+    def voices_dir(self) -> Path:
+        return self.dir / "voices"
+
+    @property
+    def images_dir(self) -> Path:
+        return self.dir / "images"
+
+    @property
+    def guion_path(self) -> Path:
+        return self.dir / "guion.json"
+
+    def guardar(self) -> None:
+        """Escritura atómica: un corte a mitad de camino no deja un manifest.json roto"""
+        with self._lock:
+            self.data["actualizado"] = _ahora()
+            self.dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+    # ------------------------------------------------------------------ #
+    # Etapas y escenas
+    # ------------------------------------------------------------------ #
+    def _etapa(self, etapa: str) -> Dict[str, Any]:
+        return self.data["etapas"].setdefault(etapa, {"estado": "pendiente", "salidas": {}, "escenas": {}})
+
+    def _resolver(self, ruta: str) -> Path:
+        path = Path(ruta)
+        return path if path.is_absolute() else self.dir / path
+
+    def _relativa(self, path: str | Path) -> str:
+        path = Path(path)
+        try:
+            return str(path.resolve().relative_to(self.dir.resolve()))
+        except ValueError:
+            return str(path.resolve())
+
+    def _verificar(self, registro: Dict[str, Any]) -> bool:
+        path = self._resolver(registro["ruta"])
+        return path.exists() and path.stat().st_size > 0 and _sha256(path) == registro["sha256"]
+
+    def etapa_completa(self, etapa: str) -> bool:
+        """True si la etapa terminó y todas sus salidas siguen en disco sin cambios"""
+        with self._lock:
+            info = self.data["etapas"].get(etapa)
+            if not info or info.get("estado") != "completada":
+                return False
+            registros = list(info.get("salidas", {}).values()) + list(info.get("escenas", {}).values())
+        return all(self._verificar(r) for r in registros)
+
+    def escena_completa(self, etapa: str, num_escena: int) -> bool:
+        """True si la salida de esa escena ya se generó y su hash coincide"""
+        with self._lock:
+            registro = self.data["etapas"].get(etapa, {}).get("escenas", {}).get(str(num_escena))
+        return registro is not None and self._verificar(registro)
+
+    def salida_escena(self, etapa: str, num_escena: int) -> Path | None:
+        with self._lock:
+            registro = self.data["etapas"].get(etapa, {}).get("escenas", {}).get(str(num_escena))
+        return self._resolver(registro["ruta"]) if registro else None
+
+    def iniciar_etapa(self, etapa: str) -> None:
+        with self._lock:
+            info = self._etapa(etapa)
+            info["estado"] = "en_progreso"
+            info.pop("error", None)
+            self.guardar()
+
+    def registrar_escena(self, etapa: str, num_escena: int, path: str | Path) -> None:
+        """Registra (con hash) la salida de una escena. Seguro entre hilos."""
+        path = Path(path)
+        registro = {"ruta": self._relativa(path), "sha256": _sha256(path), "bytes": path.stat().st_size}
+        with self._lock:
+            info = self._etapa(etapa)
+            info["escenas"][str(num_escena)] = registro
+            info.get("respaldos", {}).pop(str(num_escena), None)
+            self.guardar()
+    
+    def registrar_respaldo(self, etapa: str, num_escena: int, path: str | Path, origen: str) -> None:
+        """
+        Anota que la salida de una escena vino de un respaldo (cache, modelo de respaldo
+        o stock; ver fallback.py). No cuenta como completa: al reanudar se reintenta.
+        """
+        with self._lock:
+            self._etapa(etapa).setdefault("respaldos", {})[str(num_escena)] = {
+                "ruta": self._relativa(path),
+                "origen": origen,
+            }
+            self.guardar()
+    
+    def respaldos(self, etapa: str) -> Dict[str, str]:
+        """Escena -> origen de las escenas de la etapa que quedaron con un respaldo"""
+        with self._lock:
+            registros = self.data["etapas"].get(etapa, {}).get("respaldos", {})
+            return {num: r["origen"] for num, r in registros.items()}
+
+    def duracion_cacheada(self, path: str | Path) -> float | None:
+        """Duración (s) guardada de un audio, si el archivo no cambió desde que se midió"""
+        path = Path(path)
+        with self._lock:
+            registro = self.data.get("duraciones", {}).get(self._relativa(path))
+        if registro is None:
+            return None
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (registro["bytes"], registro["mtime_ns"]):
+            return None
+        return registro["segundos"]
+    
+    def registrar_duracion(self, path: str | Path, segundos: float) -> None:
+        """Guarda la duración medida de un audio (se invalida si cambia tamaño o mtime)"""
+        path = Path(path)
+        stat = path.stat()
+        with self._lock:
+            self.data.setdefault("duraciones", {})[self._relativa(path)] = {
+                "segundos": segundos,
+                "bytes": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            self.guardar()
+    
+    def completar_etapa(self, etapa: str, salidas: List[str | Path] | None = None) -> None:
+        with self._lock:
+            info = self._etapa(etapa)
+            for salida in salidas or []:
+                path = Path(salida)
+                info["salidas"][path.name] = {
+                    "ruta": self._relativa(path),
+                    "sha256": _sha256(path),
+                    "bytes": path.stat().st_size,
+                }
+            info["estado"] = "completada"
+            self.guardar()
+
+    def fallar_etapa(self, etapa: str, error: Exception | str) -> None:
+        with self._lock:
+            info = self._etapa(etapa)
+            info["estado"] = "error"
+            info["error"] = str(error)
+            self.guardar()
+
+    def salida_etapa(self, etapa: str) -> Path | None:
+        """Primera salida registrada de la etapa (ej: el MP4 de la etapa video)"""
+        with self._lock:
+            salidas = self.data["etapas"].get(etapa, {}).get("salidas", {})
+            registro = next(iter(salidas.values()), None)
+        return self._resolver(registro["ruta"]) if registro else None
+
+    def resumen(self) -> str:
+        with self._lock:
+            return ", ".join(
+                f"{etapa}={self.data['etapas'].get(etapa, {}).get('estado', 'pendiente')}" for etapa in ETAPAS
+            )
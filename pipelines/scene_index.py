@@ -0,0 +1,118 @@
+"""
+Clasificación de escenas por escenario (parque, bosque, escuela, ...).
+
+Un solo índice, construido una vez desde config/scenes.json, que usan Pipeline 3
+(para el "Setting" del prompt de imagen) y Pipeline 4 (para el sonido ambiental),
+así ambos coinciden siempre en dónde ocurre cada escena.
+
+Todas las palabras clave se compilan en una sola expresión regular, sobre texto
+normalizado (minúsculas y sin tildes): "arbol", "Árbol" y "árboles" matchean igual,
+y la búsqueda es una pasada sobre el texto sin importar cuántas palabras haya.
+Las palabras matchean al inicio de una palabra del texto ("clase" encuentra
+"clases" pero "aula" no encuentra "jaula").
+
+Si un texto menciona varios escenarios gana el que aparece primero en el config.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .guion_model import Escena
+
+SCENES_PATH = Path("config/scenes.json")
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas y sin tildes (ñ -> n)"""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+@dataclass(frozen=True, slots=True)
+class Escenario:
+    nombre: str
+    sonido: str | None   # archivo en assets/background_sounds/
+    setting: str | None  # fragmento en inglés para el prompt de imagen
+
+
+class SceneIndex:
+    """Palabras clave -> escenario, con una regex compilada y existencia de sonidos cacheada"""
+
+    def __init__(self, escenarios: List[Escenario], palabras: Dict[str, int]):
+        """
+        Args:
+            escenarios: En orden de prioridad
+            palabras: Palabra clave (ya normalizada) -> índice en escenarios
+        """
+        self.escenarios = tuple(escenarios)
+        self._palabras = dict(palabras)
+        # Más largas primero: en la alternancia gana "arboles" antes que "arbol"
+        alternativas = sorted(self._palabras, key=len, reverse=True)
+        self._regex = re.compile(r"\b(?:" + "|".join(map(re.escape, alternativas)) + ")") if alternativas else None
+        self._sonidos: Dict[Tuple[Path, str], Path | None] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_config(cls, path: str | Path = SCENES_PATH) -> "SceneIndex":
+        """Carga config/scenes.json (sin archivo: índice vacío, nunca clasifica)"""
+        path = Path(path)
+        if not path.exists():
+            print(f"⚠️  Advertencia: {path} no encontrado")
+            return cls([], {})
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        escenarios = []
+        palabras: Dict[str, int] = {}
+        for i, (nombre, datos) in enumerate(config.get("escenarios", {}).items()):
+            escenarios.append(Escenario(nombre, datos.get("sonido"), datos.get("setting")))
+            for palabra in [nombre, *datos.get("palabras", [])]:
+                # Si una palabra aparece en dos escenarios, queda en el primero
+                palabras.setdefault(normalizar_texto(palabra).strip(), i)
+        return cls(escenarios, palabras)
+
+    def clasificar(self, texto: str | None) -> Escenario | None:
+        """Escenario de más prioridad mencionado en el texto, o None"""
+        if not texto or self._regex is None:
+            return None
+        indices = {self._palabras[m.group(0)] for m in self._regex.finditer(normalizar_texto(texto))}
+        return self.escenarios[min(indices)] if indices else None
+
+    def clasificar_escena(self, escena: Escena) -> Escenario | None:
+        """Por la descripción de la imagen y, si no alcanza, por el sonido_fondo del guion"""
+        return self.clasificar(escena.imagen_descripcion) or self.clasificar(escena.sonido_fondo)
+
+    def sonido(self, escenario: Escenario | None, sounds_dir: str | Path) -> Path | None:
+        """Archivo de sonido del escenario si existe en sounds_dir (el stat se hace una vez)"""
+        if escenario is None or not escenario.sonido:
+            return None
+        clave = (Path(sounds_dir), escenario.sonido)
+        with self._lock:
+            if clave not in self._sonidos:
+                path = clave[0] / escenario.sonido
+                self._sonidos[clave] = path if path.exists() else None
+            return self._sonidos[clave]
+
+
+_indices: Dict[Path, Tuple[float | None, SceneIndex]] = {}
+_indices_lock = threading.Lock()
+
+
+def get_scene_index(path: str | Path = SCENES_PATH) -> SceneIndex:
+    """Índice compartido del config; se reconstruye solo si el archivo cambió (mtime)"""
+    path = Path(path)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    with _indices_lock:
+        cacheado = _indices.get(path)
+        if cacheado is None or cacheado[0] != mtime:
+            cacheado = (mtime, SceneIndex.desde_config(path))
+            _indices[path] = cacheado
+        return cacheado[1]
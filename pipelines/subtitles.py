@@ -0,0 +1,126 @@
+"""
+Subtítulos de los diálogos (WebVTT y SRT) a partir del guion y el plan de render.
+
+El texto ya está en el guion y el plan sabe exactamente cuándo empieza cada escena y
+cuánto dura cada voz, así que los subtítulos salen sin tocar un solo cuadro: cada
+diálogo aparece desde inicio_escena + dialog_delay hasta que termina la voz.
+
+  - <video>.vtt  para el <track> del reproductor web
+  - <video>.srt  para reproductores de escritorio
+  - opcional: pista mov_text dentro del MP4 (ffmpeg -c copy, sin re-encodear)
+
+Los diálogos largos se parten en cues de hasta 2 líneas de 42 caracteres, con el
+tiempo de la voz repartido según la cantidad de caracteres de cada cue.
+"""
+import subprocess
+import textwrap
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from .guion_model import Guion
+from .plan import EscenaPlan
+
+CARACTERES_POR_LINEA = 42
+LINEAS_POR_CUE = 2
+
+
+@dataclass(frozen=True, slots=True)
+class Cue:
+    inicio: float
+    fin: float
+    texto: str
+    personaje: str
+
+
+def generar_cues(guion: Guion, escenas: Iterable[EscenaPlan], dialog_delay: float) -> List[Cue]:
+    """
+    Cues de los diálogos de las escenas, en el orden en que van en el video.
+
+    Args:
+        guion: Guion con los textos
+        escenas: Escenas del plan que efectivamente se renderizaron (las saltadas no
+            ocupan tiempo en el video)
+        dialog_delay: Silencio antes de cada diálogo
+    """
+    por_numero = {e.numero_escena: e for e in guion.escenas}
+    cues = []
+    inicio_escena = 0.0
+    for escena_plan in escenas:
+        dialogo = por_numero[escena_plan.numero].dialogo
+        lineas = textwrap.wrap(" ".join(dialogo.texto.split()), CARACTERES_POR_LINEA)
+        bloques = ["\n".join(lineas[i:i + LINEAS_POR_CUE]) for i in range(0, len(lineas), LINEAS_POR_CUE)]
+        total = sum(len(b) for b in bloques) or 1
+        t = inicio_escena + dialog_delay
+        for bloque in bloques:
+            duracion = escena_plan.voz * len(bloque) / total
+            cues.append(Cue(round(t, 3), round(t + duracion, 3), bloque, dialogo.personaje))
+            t += duracion
+        inicio_escena += escena_plan.duracion
+    return cues
+
+
+def _tiempo(segundos: float, separador: str) -> str:
+    milis = round(segundos * 1000)
+    horas, milis = divmod(milis, 3_600_000)
+    minutos, milis = divmod(milis, 60_000)
+    segs, milis = divmod(milis, 1000)
+    return f"{horas:02d}:{minutos:02d}:{segs:02d}{separador}{milis:03d}"
+
+
+def a_webvtt(cues: List[Cue]) -> str:
+    """WebVTT con el personaje como etiqueta de voz (<v Lucas>)"""
+    bloques = ["WEBVTT"]
+    for cue in cues:
+        texto = cue.texto.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        bloques.append(f"{_tiempo(cue.inicio, '.')} --> {_tiempo(cue.fin, '.')}\n<v {cue.personaje}>{texto}")
+    return "\n\n".join(bloques) + "\n"
+
+
+def a_srt(cues: List[Cue]) -> str:
+    return "".join(
+        f"{i}\n{_tiempo(cue.inicio, ',')} --> {_tiempo(cue.fin, ',')}\n{cue.texto}\n\n"
+        for i, cue in enumerate(cues, 1)
+    )
+
+
+def escribir_subtitulos(cues: List[Cue], video_path: str | Path) -> Dict[str, Path]:
+    """
+    Escribe <video>.vtt y <video>.srt junto al video.
+
+    Returns:
+        {"vtt": ruta, "srt": ruta}
+    """
+    video_path = Path(video_path)
+    rutas = {"vtt": video_path.with_suffix(".vtt"), "srt": video_path.with_suffix(".srt")}
+    rutas["vtt"].write_text(a_webvtt(cues), encoding="utf-8")
+    rutas["srt"].write_text(a_srt(cues), encoding="utf-8")
+    return rutas
+
+
+def incrustar_subtitulos(video_path: str | Path, srt_path: str | Path, idioma: str = "spa") -> None:
+    """
+    Agrega los subtítulos como pista mov_text (soft-subs) al MP4, copiando video y
+    audio tal cual (sin re-encodear). Reemplaza el archivo de forma atómica.
+
+    Raises:
+        RuntimeError: Si ffmpeg falla
+    """
+    from moviepy.config import FFMPEG_BINARY
+
+    video_path = Path(video_path)
+    temporal = video_path.with_name(f"{video_path.stem}.subs.tmp{video_path.suffix}")
+    comando = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-i", str(video_path), "-i", str(srt_path),
+        "-map", "0", "-map", "1",
+        "-c", "copy", "-c:s", "mov_text",
+        "-metadata:s:s:0", f"language={idioma}",
+        "-movflags", "+faststart",
+        str(temporal),
+    ]
+    proceso = subprocess.run(comando, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        temporal.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg no pudo agregar los subtítulos: {proceso.stderr.strip()[-500:]}")
+    temporal.replace(video_path)
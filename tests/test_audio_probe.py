@@ -0,0 +1,109 @@
+"""
+Duración de MP3 por encabezados (pipelines.audio_probe) contra lo que informa ffmpeg.
+
+Los archivos se arman acá mismo (frames MPEG-1 capa III a 44.1 kHz, 1152 muestras por
+frame), así que la duración esperada es frames * 1152 / 44100, que es la que da ffmpeg.
+Si ffprobe está instalado también se compara contra él.
+
+    python -m pytest tests/test_audio_probe.py
+"""
+import shutil
+import struct
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from pipelines.audio_probe import duracion_mp3
+
+SAMPLE_RATE = 44100
+MUESTRAS = 1152
+
+
+def _frame(kbps: int, padding: bool = False) -> bytes:
+    """Frame MPEG-1 capa III estéreo en silencio, de 128 o 160 kbps"""
+    indice = {128: 0x9, 160: 0xA}[kbps]
+    encabezado = bytes((0xFF, 0xFB, (indice << 4) | (0x02 if padding else 0x00), 0x44))
+    largo = 144 * kbps * 1000 // SAMPLE_RATE + padding
+    return encabezado + bytes(largo - 4)
+
+
+def _frame_xing(frames: int, etiqueta: bytes = b"Xing") -> bytes:
+    """Primer frame de un VBR de LAME: side info (32 bytes en estéreo) y el tag con los frames"""
+    frame = bytearray(_frame(128))
+    tag = etiqueta + struct.pack(">II", 0x01, frames)
+    frame[4 + 32:4 + 32 + len(tag)] = tag
+    return bytes(frame)
+
+
+def _id3(relleno: bytes) -> bytes:
+    """Tag ID3v2.3 con tamaño syncsafe"""
+    tamano = len(relleno)
+    syncsafe = bytes(((tamano >> 21) & 0x7F, (tamano >> 14) & 0x7F, (tamano >> 7) & 0x7F, tamano & 0x7F))
+    return b"ID3\x03\x00\x00" + syncsafe + relleno
+
+
+def _esperada(frames: int) -> float:
+    return frames * MUESTRAS / SAMPLE_RATE
+
+
+class DuracionMP3Test(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _archivo(self, nombre: str, datos: bytes) -> Path:
+        path = self.dir / nombre
+        path.write_bytes(datos)
+        return path
+
+    def test_cbr(self):
+        # Con frames de padding en el medio, como los que escribe cualquier encoder a 44.1 kHz
+        datos = b"".join(_frame(128, padding=i % 3 == 0) for i in range(200))
+        path = self._archivo("cbr.mp3", datos)
+        self.assertAlmostEqual(duracion_mp3(path), _esperada(200), places=6)
+
+    def test_vbr_con_xing(self):
+        # El frame Xing no cuenta: la duración sale de los frames que declara
+        audio = [_frame(128 if i % 2 else 160, padding=i % 5 == 0) for i in range(150)]
+        path = self._archivo("vbr.mp3", _frame_xing(len(audio)) + b"".join(audio))
+        self.assertAlmostEqual(duracion_mp3(path), _esperada(150), places=6)
+
+    def test_cbr_con_info(self):
+        audio = [_frame(128) for _ in range(80)]
+        path = self._archivo("info.mp3", _frame_xing(len(audio), b"Info") + b"".join(audio))
+        self.assertAlmostEqual(duracion_mp3(path), _esperada(80), places=6)
+
+    def test_con_id3(self):
+        # El tag trae bytes que parecen un encabezado de frame: no se tienen que contar
+        relleno = b"TIT2" + _frame(128)[:8] + bytes(500)
+        path = self._archivo("id3.mp3", _id3(relleno) + b"".join(_frame(128) for _ in range(120)))
+        self.assertAlmostEqual(duracion_mp3(path), _esperada(120), places=6)
+
+    def test_no_mp3(self):
+        path = self._archivo("audio.wav", b"RIFF" + bytes(40) + b"data" + bytes(1000))
+        self.assertIsNone(duracion_mp3(path))
+
+    @unittest.skipUnless(shutil.which("ffprobe"), "ffprobe no está instalado")
+    def test_igual_que_ffprobe(self):
+        audio = [_frame(128 if i % 2 else 160) for i in range(300)]
+        archivos = {
+            "cbr.mp3": b"".join(_frame(128, padding=i % 3 == 0) for i in range(300)),
+            "vbr.mp3": _frame_xing(len(audio)) + b"".join(audio),
+            "id3.mp3": _id3(bytes(300)) + b"".join(_frame(128) for _ in range(300)),
+        }
+        for nombre, datos in archivos.items():
+            with self.subTest(nombre):
+                path = self._archivo(nombre, datos)
+                salida = subprocess.run(
+                    ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+                    capture_output=True, text=True, check=True,
+                )
+                self.assertAlmostEqual(duracion_mp3(path), float(salida.stdout), delta=0.03)
+
+
+if __name__ == "__main__":
+    unittest.main()
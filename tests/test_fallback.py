@@ -0,0 +1,192 @@
+"""
+Reintentos y cadena de respaldos por escena (pipelines.fallback), con un reloj de
+mentira: las esperas del backoff no duermen, solo adelantan el reloj.
+
+    python -m pytest tests/test_fallback.py
+"""
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pipelines.audio_probe import duracion_mp3
+from pipelines.fallback import (
+    MP3_FRAME_SEGUNDOS,
+    CacheContenido,
+    PersonajeSinVoz,
+    PoliticaReintentos,
+    con_respaldos,
+    mp3_silencioso,
+    reintentar,
+)
+from pipelines.providers import PresupuestoExcedido
+
+POLITICA = PoliticaReintentos(intentos=3, espera_inicial=1.0, factor=2.0, espera_maxima=8.0)
+
+
+class _Reloj:
+    """Reemplaza al módulo time de fallback: sleep() adelanta monotonic()"""
+
+    def __init__(self, t: float = 100.0):
+        self.t = t
+        self.esperas = []
+
+    def monotonic(self) -> float:
+        return self.t
+
+    def monotonic_ns(self) -> int:
+        return int(self.t * 1e9)
+
+    def sleep(self, segundos: float) -> None:
+        self.esperas.append(segundos)
+        self.t += segundos
+
+
+class _Proveedor:
+    """fn de reintentar: responde en orden lo que se le pasa (las excepciones se lanzan)"""
+
+    def __init__(self, reloj: _Reloj, *respuestas, demora: float = 0.0):
+        self.reloj = reloj
+        self.respuestas = list(respuestas)
+        self.demora = demora
+        self.timeouts = []
+
+    def __call__(self, timeout: float):
+        self.timeouts.append(timeout)
+        self.reloj.t += self.demora
+        respuesta = self.respuestas.pop(0)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return respuesta
+
+
+class ReintentarTest(unittest.TestCase):
+    def setUp(self):
+        self.reloj = _Reloj()
+        for parche in (
+            mock.patch("pipelines.fallback.time", self.reloj),
+            # Sin jitter: cada espera es el tope del backoff
+            mock.patch("pipelines.fallback.random.uniform", lambda minimo, maximo: maximo),
+            mock.patch("sys.stdout", io.StringIO()),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _reintentar(self, fn, segundos: float = 90.0):
+        return reintentar(fn, POLITICA, self.reloj.t + segundos, "proveedor")
+
+    def test_reintenta_hasta_que_responde(self):
+        fn = _Proveedor(self.reloj, ConnectionError("503"), None, b"audio")
+        self.assertEqual(self._reintentar(fn), b"audio")
+        self.assertEqual(self.reloj.esperas, [1.0, 2.0])
+        self.assertEqual(len(fn.timeouts), 3)
+
+    def test_se_agotan_los_intentos(self):
+        fn = _Proveedor(self.reloj, TimeoutError(), TimeoutError(), TimeoutError(), b"nunca")
+        self.assertIsNone(self._reintentar(fn))
+        self.assertEqual(len(fn.timeouts), 3)
+        self.assertEqual(self.reloj.esperas, [1.0, 2.0])  # después del último no se espera
+
+    def test_personaje_sin_voz_no_se_reintenta(self):
+        fn = _Proveedor(self.reloj, PersonajeSinVoz("Martina no tiene voz"), b"nunca")
+        self.assertIsNone(self._reintentar(fn))
+        self.assertEqual(len(fn.timeouts), 1)
+        self.assertEqual(self.reloj.esperas, [])
+
+    def test_presupuesto_excedido_se_propaga(self):
+        fn = _Proveedor(self.reloj, ConnectionError("503"), PresupuestoExcedido("$5 de $5"), b"nunca")
+        with self.assertRaises(PresupuestoExcedido):
+            self._reintentar(fn)
+        self.assertEqual(len(fn.timeouts), 2)
+
+    def test_cada_llamada_recibe_lo_que_queda(self):
+        # Cada llamada tarda 15 s: 30 s de escena alcanzan para dos llamadas y una espera
+        fn = _Proveedor(self.reloj, TimeoutError(), TimeoutError(), b"nunca", demora=15.0)
+        self.assertIsNone(self._reintentar(fn, segundos=30.0))
+        self.assertEqual(fn.timeouts, [30.0, 14.0])
+        self.assertEqual(self.reloj.esperas, [1.0])
+
+    def test_no_reintenta_si_la_espera_pasa_el_limite(self):
+        fn = _Proveedor(self.reloj, TimeoutError(), b"nunca", demora=4.5)
+        self.assertIsNone(self._reintentar(fn, segundos=5.0))
+        self.assertEqual(len(fn.timeouts), 1)
+        self.assertEqual(self.reloj.esperas, [])
+
+    def test_tiempo_ya_agotado(self):
+        fn = _Proveedor(self.reloj, b"nunca")
+        self.assertIsNone(self._reintentar(fn, segundos=0))
+        self.assertEqual(fn.timeouts, [])
+
+
+class ConRespaldosTest(unittest.TestCase):
+    def _respaldos(self, pasos):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return con_respaldos(pasos, escena=3)
+
+    def test_primer_paso_que_responde(self):
+        llamados = []
+
+        def paso(nombre, resultado):
+            def fn():
+                llamados.append(nombre)
+                return resultado
+            return nombre, fn
+
+        pasos = [paso("primario", None), paso("cache", None), paso("respaldo", b"flash"), paso("stock", b"silencio")]
+        self.assertEqual(self._respaldos(pasos), ("respaldo", b"flash"))
+        self.assertEqual(llamados, ["primario", "cache", "respaldo"])
+
+    def test_stock_al_final(self):
+        reloj = _Reloj()
+        limite = reloj.t + 10
+        primario = _Proveedor(reloj, TimeoutError(), TimeoutError(), TimeoutError(), demora=6.0)
+        respaldo = _Proveedor(reloj, b"nunca")
+        with mock.patch("pipelines.fallback.time", reloj), contextlib.redirect_stdout(io.StringIO()):
+            pasos = [
+                ("primario", lambda: reintentar(primario, POLITICA, limite, "primario")),
+                ("cache", lambda: None),
+                ("respaldo", lambda: reintentar(respaldo, POLITICA, limite, "respaldo")),
+                ("stock", lambda: mp3_silencioso(2.0)),
+            ]
+            origen, audio = con_respaldos(pasos, escena=3)
+        # El primario gastó el tiempo de la escena: el respaldo ni se llama
+        self.assertEqual((origen, audio), ("stock", mp3_silencioso(2.0)))
+        self.assertEqual(len(primario.timeouts), 2)
+        self.assertEqual(respaldo.timeouts, [])
+
+    def test_presupuesto_excedido_corta_la_cadena(self):
+        def primario():
+            raise PresupuestoExcedido("$5 de $5")
+
+        with self.assertRaises(PresupuestoExcedido):
+            self._respaldos([("primario", primario), ("stock", lambda: self.fail("no se debería cubrir"))])
+
+    def test_sin_resultado(self):
+        with self.assertRaisesRegex(RuntimeError, "Escena 3: ningún paso"):
+            self._respaldos([("primario", lambda: None)])
+
+
+class StockYCacheTest(unittest.TestCase):
+    def test_silencio_de_la_duracion_pedida(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "silencio.mp3"
+            path.write_bytes(mp3_silencioso(2.0))
+            self.assertAlmostEqual(duracion_mp3(path), 2.0, delta=MP3_FRAME_SEGUNDOS)
+        self.assertEqual(mp3_silencioso(0), mp3_silencioso(MP3_FRAME_SEGUNDOS))  # al menos un frame
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CacheContenido(tmp, ".mp3")
+            clave = CacheContenido.clave("voz", "Lucas", "Hola")
+            self.assertNotEqual(clave, CacheContenido.clave("voz", "LucasHola"))
+            self.assertIsNone(cache.leer(clave))
+            cache.guardar(clave, b"audio")
+            self.assertEqual(cache.leer(clave), b"audio")
+            cache.guardar(clave, b"")  # un archivo vacío no cuenta como hit
+            self.assertIsNone(cache.leer(clave))
+
+
+if __name__ == "__main__":
+    unittest.main()
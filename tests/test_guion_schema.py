@@ -0,0 +1,151 @@
+"""
+Validación y reparación del guion (pipelines.guion_schema).
+
+    python -m pytest tests/test_guion_schema.py
+"""
+import contextlib
+import io
+import unittest
+from pathlib import Path
+
+from pipelines.guion_schema import Elenco, GuionInvalidoError, normalizar_guion, reparar_guion, validar_guion
+
+VOICES = Path(__file__).resolve().parent.parent / "config" / "voices.json"
+
+ELENCO = Elenco.desde_dict({
+    "characters": {
+        "Lucas": {"voice_id": "a", "rol": "niño curioso, 7 años"},
+        "Sofia": {"voice_id": "b", "rol": "niña inteligente, 7 años"},
+        "Carlos": {"voice_id": "c", "rol": "abuelo sabio, 70 años", "alias": ["Abuelo Sabio", "Abuelo"]},
+    }
+})
+
+
+def _escena(personaje="Lucas", texto="Hola", imagen="Lucas en el parque", numero=None):
+    escena = {"imagen_descripcion": imagen, "dialogo": {"personaje": personaje, "texto": texto}}
+    if numero is not None:
+        escena["numero_escena"] = numero
+    return escena
+
+
+def _guion(*escenas):
+    return {"guion": {"metadata": {"titulo": "Prueba"}, "escenas": list(escenas)}}
+
+
+def _silencioso(fn, *args, **kwargs):
+    """Corre fn sin ensuciar la salida de los tests; devuelve (resultado, salida)"""
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida):
+        return fn(*args, **kwargs), salida.getvalue()
+
+
+class ElencoTest(unittest.TestCase):
+    def test_config_del_repo(self):
+        elenco = Elenco.desde_config(VOICES)
+        self.assertIn("Carlos", elenco.personajes)
+        self.assertEqual(elenco.canonizar("Abuelo Sabio"), "Carlos")
+        self.assertIn("Carlos (abuelo sabio, 70 años)", elenco.para_prompt())
+
+    def test_sin_archivo(self):
+        with self.assertRaises(RuntimeError):
+            Elenco.desde_config(VOICES.with_name("no_existe.json"))
+
+    def test_canonizar(self):
+        self.assertEqual(ELENCO.canonizar(" sofía "), "Sofia")
+        self.assertEqual(ELENCO.canonizar("ABUELO"), "Carlos")
+        self.assertIsNone(ELENCO.canonizar("Martina"))
+
+
+class ValidarGuionTest(unittest.TestCase):
+    def test_alias_y_tildes(self):
+        resultado = validar_guion(_guion(_escena("Abuelo Sabio"), _escena("Sofía")), ELENCO)
+        self.assertTrue(resultado.es_valido)
+        personajes = [e["dialogo"]["personaje"] for e in resultado.data["guion"]["escenas"]]
+        self.assertEqual(personajes, ["Carlos", "Sofia"])
+        self.assertTrue(any("'Abuelo Sabio' -> 'Carlos'" in r for r in resultado.reparaciones))
+
+    def test_personaje_fuera_del_elenco(self):
+        resultado = validar_guion(_guion(_escena(), _escena("Martina")), ELENCO)
+        self.assertEqual(resultado.escenas_rotas, [1])
+        self.assertIn("desconocido: Martina", resultado.errores[0])
+
+    def test_campos_faltantes(self):
+        sin_imagen = {"dialogo": {"personaje": "Lucas", "texto": "Hola"}}
+        sin_dialogo = {"imagen_descripcion": "Un bosque"}
+        texto_null = _escena(texto=None)
+        resultado = validar_guion(_guion(_escena(), sin_imagen, sin_dialogo, texto_null), ELENCO)
+        self.assertEqual(resultado.escenas_rotas, [1, 2, 3])
+        self.assertIn("escenas[1].imagen_descripcion es null", resultado.errores)
+        self.assertIn("escenas[2].dialogo falta", resultado.errores)
+        self.assertIn("escenas[3].dialogo.texto es null", resultado.errores)
+
+    def test_reparaciones(self):
+        data = {"escenas": [_escena(numero="2"), {**_escena(), "dialogo": [_escena()["dialogo"]]}]}
+        resultado = validar_guion(data, ELENCO)
+        self.assertTrue(resultado.es_valido)
+        escenas = resultado.data["guion"]["escenas"]
+        self.assertEqual([e["numero_escena"] for e in escenas], [1, 2])
+        self.assertEqual(escenas[1]["dialogo"]["personaje"], "Lucas")
+        self.assertEqual(resultado.data["guion"]["metadata"]["titulo"], "Sin título")
+
+    def test_sin_escenas(self):
+        with self.assertRaises(GuionInvalidoError):
+            validar_guion({"guion": {"escenas": []}}, ELENCO)
+
+    def test_normalizar_falla_con_escenas_rotas(self):
+        with self.assertRaises(GuionInvalidoError) as ctx:
+            normalizar_guion(_guion(_escena(texto="")), ELENCO)
+        self.assertEqual(ctx.exception.escenas_rotas, [0])
+
+
+class RepararGuionTest(unittest.TestCase):
+    def test_corrige_solo_las_rotas(self):
+        pedidos = []
+
+        def corregir(resultado):
+            pedidos.append(list(resultado.escenas_rotas))
+            return {"escenas": [_escena("Sofia", "Ya está")]}
+
+        data = _guion(_escena(), _escena(texto=""), _escena())
+        reparado, _ = _silencioso(reparar_guion, data, corregir, 1, ELENCO)
+        self.assertEqual(pedidos, [[1]])
+        self.assertEqual(reparado["guion"]["escenas"][1]["dialogo"]["texto"], "Ya está")
+        self.assertEqual(reparado["guion"]["escenas"][1]["numero_escena"], 2)
+
+    def test_cantidad_equivocada_se_informa(self):
+        llamadas = []
+
+        def corregir(resultado):
+            llamadas.append(1)
+            return {"escenas": [_escena(), _escena()]}  # pidió una, vinieron dos
+
+        salida = io.StringIO()
+        with contextlib.redirect_stdout(salida), self.assertRaises(GuionInvalidoError):
+            reparar_guion(_guion(_escena(), _escena(texto="")), corregir, 2, ELENCO)
+        self.assertEqual(len(llamadas), 2)
+        self.assertIn("trajo 2 escena(s) en vez de 1", salida.getvalue())
+
+    def test_respuesta_sin_lista(self):
+        salida = io.StringIO()
+        with contextlib.redirect_stdout(salida), self.assertRaises(GuionInvalidoError):
+            reparar_guion(_guion(_escena(texto="")), lambda resultado: {"otra": 1}, 1, ELENCO)
+        self.assertIn("no trajo una lista 'escenas'", salida.getvalue())
+
+    def test_la_correccion_sigue_rota(self):
+        data = _guion(_escena(), _escena("Martina"))
+        with self.assertRaises(GuionInvalidoError) as ctx:
+            _silencioso(reparar_guion, data, lambda resultado: {"escenas": [_escena("Pedro")]}, 1, ELENCO)
+        self.assertEqual(ctx.exception.escenas_rotas, [1])
+        self.assertIn("tras 1 corrección(es)", str(ctx.exception))
+        self.assertIn("desconocido: Pedro", str(ctx.exception))
+
+    def test_sin_reparaciones_no_pregunta(self):
+        def corregir(resultado):
+            raise AssertionError("no debería volver a preguntar")
+
+        with self.assertRaises(GuionInvalidoError):
+            _silencioso(reparar_guion, _guion(_escena(texto="")), corregir, 0, ELENCO)
+
+
+if __name__ == "__main__":
+    unittest.main()
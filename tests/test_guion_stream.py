@@ -0,0 +1,107 @@
+"""
+Parser incremental del streaming del guion (pipelines.guion_stream).
+
+    python -m pytest tests/test_guion_stream.py
+"""
+import json
+import unittest
+
+from pipelines.guion_stream import EscenasStreamParser
+
+ESCENAS = [
+    {
+        "numero_escena": 1,
+        "imagen_descripcion": "Lucas dice \"hola\" y dibuja {llaves} y [corchetes]",
+        "dialogo": {"personaje": "Lucas", "texto": "¿Vamos al parque?\\n", "emocion": "feliz"},
+    },
+    {
+        "numero_escena": 2,
+        "imagen_descripcion": "Sofia en el colegio",
+        "dialogo": {"personaje": "Sofia", "texto": "Una barra \\ y una comilla \"", "emocion": "curiosa"},
+        "extra": {"capas": [{"a": [1, {"b": "}"}]}]},
+    },
+    {
+        "numero_escena": 3,
+        "imagen_descripcion": "El abuelo en la calle",
+        "dialogo": {"personaje": "Carlos", "texto": "Fin", "emocion": "tranquilo"},
+    },
+]
+
+DOCUMENTO = json.dumps(
+    {"guion": {"metadata": {"titulo": "Cuento", "personajes": [{"nombre": "Lucas"}]}, "escenas": ESCENAS}},
+    ensure_ascii=False,
+)
+
+
+def _alimentar(parser, trozos):
+    emitidas = []
+    for trozo in trozos:
+        emitidas.extend(parser.feed(trozo))
+    return emitidas
+
+
+class EscenasStreamParserTest(unittest.TestCase):
+    def test_documento_entero(self):
+        parser = EscenasStreamParser()
+        self.assertEqual(parser.feed(DOCUMENTO), ESCENAS)
+        self.assertEqual(parser.escenas_emitidas, 3)
+        self.assertEqual(parser.resultado()["guion"]["escenas"], ESCENAS)
+
+    def test_de_a_un_caracter(self):
+        # Los tokens (claves, escapes, comillas) quedan partidos entre trozos
+        parser = EscenasStreamParser()
+        self.assertEqual(_alimentar(parser, DOCUMENTO), ESCENAS)
+
+    def test_trozos_irregulares(self):
+        for tamano in (2, 3, 7, 16, 61):
+            with self.subTest(tamano=tamano):
+                trozos = [DOCUMENTO[i:i + tamano] for i in range(0, len(DOCUMENTO), tamano)]
+                self.assertEqual(_alimentar(EscenasStreamParser(), trozos), ESCENAS)
+
+    def test_escape_partido_justo_antes_de_la_comilla(self):
+        texto = '{"escenas": [{"t": "a\\'
+        parser = EscenasStreamParser()
+        self.assertEqual(parser.feed(texto), [])
+        self.assertEqual(parser.feed('"}"}, {"t": 1}]}'), [{"t": 'a"}'}, {"t": 1}])
+
+    def test_cada_escena_sale_cuando_se_cierra(self):
+        parser = EscenasStreamParser()
+        corte = DOCUMENTO.index('"numero_escena": 2')
+        self.assertEqual(parser.feed(DOCUMENTO[:corte]), ESCENAS[:1])
+        self.assertEqual(parser.feed(DOCUMENTO[corte:]), ESCENAS[1:])
+
+    def test_objetos_anidados_no_son_escenas(self):
+        # Un array "escenas" dentro de una escena no se confunde con el del guion
+        documento = '{"escenas": [{"escenas": [{"x": 1}], "y": {"z": [2]}}, {"n": 2}]}'
+        self.assertEqual(
+            _alimentar(EscenasStreamParser(), documento),
+            [{"escenas": [{"x": 1}], "y": {"z": [2]}}, {"n": 2}],
+        )
+
+    def test_clave_en_un_string_no_abre_el_array(self):
+        documento = '{"nota": "escenas", "otra": ["no"], "escenas": [{"n": 1}]}'
+        self.assertEqual(_alimentar(EscenasStreamParser(), documento), [{"n": 1}])
+
+    def test_ultimo_trozo_incompleto(self):
+        # El stream se corta a mitad de la escena 3: salen las dos completas y el
+        # documento final no se puede parsear
+        corte = DOCUMENTO.index('"numero_escena": 3') + 5
+        parser = EscenasStreamParser()
+        self.assertEqual(_alimentar(parser, [DOCUMENTO[:40], DOCUMENTO[40:corte]]), ESCENAS[:2])
+        with self.assertRaises(json.JSONDecodeError):
+            parser.resultado()
+
+    def test_escena_mal_formada(self):
+        # pipeline_guion convierte este error en RuntimeError
+        parser = EscenasStreamParser()
+        with self.assertRaises(json.JSONDecodeError):
+            parser.feed('{"escenas": [{"n": 1,}]}')
+
+    def test_trozo_vacio(self):
+        parser = EscenasStreamParser()
+        self.assertEqual(parser.feed(""), [])
+        self.assertEqual(parser.texto, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
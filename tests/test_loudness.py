@@ -0,0 +1,183 @@
+"""
+Sonoridad de los audios (pipelines.loudness): resumen de ebur128, ganancia con tope de
+true peak e índice de mediciones por directorio.
+
+    python -m pytest tests/test_loudness.py
+"""
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pipelines.loudness import (
+    INDICE_NOMBRE,
+    _REGEX_INTEGRADA,
+    _REGEX_PICO,
+    ConfigSonoridad,
+    IndiceSonoridad,
+    Medicion,
+    ganancia,
+    medir,
+)
+
+# stderr de ffmpeg -af ebur128=framelog=quiet:peak=true: si framelog no se respeta,
+# cada cuadro trae su propia "I:" antes del resumen
+STDERR = """\
+Input #0, mp3, from 'dialogue_1.mp3':
+  Duration: 00:00:03.24, start: 0.025057, bitrate: 128 kb/s
+[Parsed_ebur128_0 @ 0x55d0] t: 0.4       TARGET:-23 LUFS    M: -21.3 S:-120.7     I: -21.3 LUFS       LRA:   0.0 LU
+[Parsed_ebur128_0 @ 0x55d0] Summary:
+
+  Integrated loudness:
+    I:         -19.5 LUFS
+    Threshold: -29.9 LUFS
+
+  Loudness range:
+    LRA:         5.3 LU
+    Threshold: -39.9 LUFS
+    LRA low:   -23.6 LUFS
+    LRA high:  -18.3 LUFS
+
+  True peak:
+    Peak:       -0.4 dBFS
+"""
+
+STDERR_SILENCIO = """\
+[Parsed_ebur128_0 @ 0x55d0] Summary:
+
+  Integrated loudness:
+    I:         -70.0 LUFS
+    Threshold:   0.0 LUFS
+
+  True peak:
+    Peak:       -inf dBFS
+"""
+
+
+def _db(factor: float) -> float:
+    return 20 * math.log10(factor)
+
+
+class ResumenEbur128Test(unittest.TestCase):
+    def test_el_resumen_es_la_ultima_medida(self):
+        self.assertEqual(_REGEX_INTEGRADA.findall(STDERR), ["-21.3", "-19.5"])
+        self.assertEqual(_REGEX_PICO.findall(STDERR), ["-0.4"])
+
+    def test_silencio(self):
+        self.assertEqual(_REGEX_INTEGRADA.findall(STDERR_SILENCIO), ["-70.0"])
+        self.assertEqual(_REGEX_PICO.findall(STDERR_SILENCIO), ["-inf"])
+
+    @unittest.skipIf(importlib.util.find_spec("moviepy") is None, "moviepy no está instalado")
+    def test_medir(self):
+        for stderr, esperada in ((STDERR, Medicion(-19.5, -0.4)), (STDERR_SILENCIO, Medicion(None, None))):
+            with self.subTest(esperada=esperada):
+                proceso = subprocess.CompletedProcess([], 0, "", stderr)
+                with mock.patch("pipelines.loudness.subprocess.run", return_value=proceso):
+                    self.assertEqual(medir("dialogue_1.mp3"), esperada)
+        sin_pico = subprocess.CompletedProcess([], 0, "", STDERR.split("  True peak:")[0])
+        with mock.patch("pipelines.loudness.subprocess.run", return_value=sin_pico), \
+                self.assertRaisesRegex(RuntimeError, "no pudo medir la sonoridad"):
+            medir("dialogue_1.mp3")
+
+
+class GananciaTest(unittest.TestCase):
+    def test_al_objetivo(self):
+        self.assertAlmostEqual(_db(ganancia(Medicion(-22.0, -10.0), -16.0, 12.0, -1.0)), 6.0)
+        self.assertAlmostEqual(_db(ganancia(Medicion(-10.0, -1.5), -16.0, 12.0, -1.0)), -6.0)
+
+    def test_tope_de_ganancia(self):
+        self.assertAlmostEqual(_db(ganancia(Medicion(-40.0, -30.0), -16.0, 12.0, -1.0)), 12.0)
+
+    def test_tope_de_true_peak(self):
+        # Subir 6 dB dejaría el pico en +1 dBTP: sube solo hasta -1
+        self.assertAlmostEqual(_db(ganancia(Medicion(-22.0, -5.0), -16.0, 12.0, -1.0)), 4.0)
+        # Con el pico ya por encima del máximo baja, aunque esté por debajo del objetivo
+        self.assertAlmostEqual(_db(ganancia(Medicion(-20.0, 0.5), -16.0, 12.0, -1.0)), -1.5)
+
+    def test_sin_pico_medido(self):
+        self.assertAlmostEqual(_db(ganancia(Medicion(-22.0, None), -16.0, 12.0, -1.0)), 6.0)
+
+    def test_silencio(self):
+        self.assertEqual(ganancia(Medicion(None, None), -16.0, 12.0, -1.0), 1.0)
+
+
+class ConfigSonoridadTest(unittest.TestCase):
+    def test_desde_dict(self):
+        self.assertEqual(ConfigSonoridad.desde_dict({}), ConfigSonoridad())
+        config = ConfigSonoridad.desde_dict({"objetivo_lufs": "-14", "pico_maximo_dbtp": -2})
+        self.assertEqual((config.objetivo_lufs, config.pico_maximo_dbtp), (-14.0, -2.0))
+
+    def test_ganancia(self):
+        config = ConfigSonoridad(pico_maximo_dbtp=-2.0)
+        self.assertAlmostEqual(_db(config.ganancia(Medicion(-22.0, -5.0))), 3.0)
+        self.assertEqual(config.ganancia(None), 1.0)  # no se pudo medir
+        self.assertEqual(ConfigSonoridad(normalizar=False).ganancia(Medicion(-40.0, -30.0)), 1.0)
+
+
+class IndiceSonoridadTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.audio = self.dir / "bosque.mp3"
+        self.audio.write_bytes(b"audio")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _medir(self, medicion=Medicion(-20.0, -3.0)):
+        return mock.patch("pipelines.loudness.medir", return_value=medicion)
+
+    def test_mide_una_sola_vez(self):
+        with self._medir() as medir:
+            self.assertEqual(IndiceSonoridad(self.dir).medicion(self.audio), Medicion(-20.0, -3.0))
+            # Otro proceso: lo lee de loudness.json
+            self.assertEqual(IndiceSonoridad(self.dir).medicion(self.audio), Medicion(-20.0, -3.0))
+        self.assertEqual(medir.call_count, 1)
+        with open(self.dir / INDICE_NOMBRE, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["bosque.mp3"]["pico_dbtp"], -3.0)
+
+    def test_archivo_cambiado(self):
+        indice = IndiceSonoridad(self.dir)
+        with self._medir():
+            indice.medicion(self.audio)
+        stat = self.audio.stat()
+        os.utime(self.audio, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        with self._medir(Medicion(-30.0, -12.0)) as medir:
+            self.assertEqual(indice.medicion(self.audio), Medicion(-30.0, -12.0))
+        self.assertEqual(medir.call_count, 1)
+
+    def test_registro_sin_pico_se_vuelve_a_medir(self):
+        # loudness.json de antes de medir el true peak
+        stat = self.audio.stat()
+        viejo = {"bosque.mp3": {"lufs": -20.0, "bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns}}
+        (self.dir / INDICE_NOMBRE).write_text(json.dumps(viejo), encoding="utf-8")
+        with self._medir() as medir:
+            self.assertEqual(IndiceSonoridad(self.dir).medicion(self.audio), Medicion(-20.0, -3.0))
+        self.assertEqual(medir.call_count, 1)
+
+    def test_falla_al_medir(self):
+        indice = IndiceSonoridad(self.dir)
+        with mock.patch("pipelines.loudness.medir", side_effect=RuntimeError("ffmpeg no pudo medir")), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(indice.medicion(self.audio))
+        # No queda registrado: la próxima vez se reintenta
+        with self._medir() as medir:
+            self.assertEqual(indice.medicion(self.audio), Medicion(-20.0, -3.0))
+        self.assertEqual(medir.call_count, 1)
+
+    def test_indice_roto(self):
+        (self.dir / INDICE_NOMBRE).write_text("{no es json", encoding="utf-8")
+        with self._medir() as medir:
+            self.assertEqual(IndiceSonoridad(self.dir).medicion(self.audio), Medicion(-20.0, -3.0))
+        self.assertEqual(medir.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Modo batch de main.py: lectura del archivo, orden de las etapas de cada historia y el
+Pipeline 4 compartido.
+
+Las etapas son dobles que anotan lo que se les pide; no se llama a ninguna API.
+
+    python -m pytest tests/test_main_batch.py
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import main
+from pipelines import PlanExcedeLimites
+
+
+class _Etapa:
+    """Pipeline de mentira: anota (nombre, kwargs) en la lista compartida"""
+
+    def __init__(self, nombre: str, llamadas: list, error: Exception | None = None):
+        self.nombre = nombre
+        self.llamadas = llamadas
+        self.error = error
+
+    def generar(self, *args, **kwargs):
+        self.llamadas.append((self.nombre, kwargs))
+        return f"{self.nombre}.mp4" if self.nombre.startswith("video") else "guion"
+
+    def planificar(self, guion, manifest=None):
+        self.llamadas.append((f"{self.nombre}.plan", {}))
+        if self.error is not None:
+            raise self.error
+        return "plan"
+
+
+class _Registro:
+    def __init__(self, etapas):
+        self.etapas = etapas
+
+    def get(self, etapa):
+        return self.etapas[etapa]
+
+
+def _args(runs_dir: Path, **kwargs) -> argparse.Namespace:
+    return argparse.Namespace(**{
+        "runs_dir": runs_dir, "guion_only": False, "skip_audio": False, "skip_imagen": False,
+        "skip_video": False, "renditions": None, "subtitulos_mp4": False, **kwargs,
+    })
+
+
+class LeerBatchTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "historias.txt"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _leer(self, contenido: str):
+        self.path.write_text(contenido, encoding="utf-8")
+        with contextlib.redirect_stdout(io.StringIO()) as salida:
+            items = main._leer_batch(self.path)
+        return items, salida.getvalue()
+
+    def test_texto(self):
+        items, _ = self._leer("# cuentos de marzo\n\nCompartir es bueno\n   \n  Decir la verdad  \n#otro comentario\n")
+        self.assertEqual([(i["linea"], i["moraleja"]) for i in items], [(3, "Compartir es bueno"), (5, "Decir la verdad")])
+        self.assertTrue(all(i["run_id"].startswith("b") and len(i["run_id"]) == 9 for i in items))
+
+    def test_run_id_estable(self):
+        # Mismo archivo (o la misma moraleja con otras mayúsculas) -> mismo run_id: se reanuda
+        uno, _ = self._leer("Compartir es bueno\n")
+        otro, _ = self._leer("# otra vez\nCOMPARTIR ES BUENO\n")
+        self.assertEqual(uno[0]["run_id"], otro[0]["run_id"])
+
+    def test_jsonl(self):
+        items, _ = self._leer(
+            '{"id": "req 7/a", "moraleja": "Ser amable"}\n'
+            '{"request_id": "r-8", "title": "Cuidar el agua"}\n'
+            '{"moraleja": "Sin id"}\n'
+        )
+        self.assertEqual([i["run_id"] for i in items[:2]], ["req_7_a", "r-8"])
+        self.assertEqual(items[1]["moraleja"], "Cuidar el agua")
+        self.assertTrue(items[2]["run_id"].startswith("b"))
+
+    def test_repetidas_se_omiten(self):
+        items, salida = self._leer('Ser amable\nser amable\n{"id": "x", "moraleja": "A"}\n{"id": "x", "moraleja": "B"}\n')
+        self.assertEqual([(i["linea"], i["moraleja"]) for i in items], [(1, "Ser amable"), (3, "A")])
+        self.assertIn(":2: historia repetida", salida)
+        self.assertIn(":4: historia repetida (x)", salida)
+
+    def test_errores_con_numero_de_linea(self):
+        with self.assertRaisesRegex(ValueError, r"historias.txt:2: JSON inválido"):
+            self._leer('Ser amable\n{"moraleja": \n')
+        with self.assertRaisesRegex(ValueError, r"historias.txt:1: falta la moraleja"):
+            self._leer('{"id": "sin-moraleja"}\n')
+
+    def test_archivo_inexistente(self):
+        with self.assertRaises(FileNotFoundError):
+            main._leer_batch(self.path)
+        args = argparse.Namespace(resume=None, moraleja=None, batch=str(self.path))
+        with contextlib.redirect_stdout(io.StringIO()) as salida:
+            self.assertEqual(main._ejecutar_batch(args), 2)
+        self.assertIn("No existe el archivo de batch", salida.getvalue())
+
+
+class HistoriaBatchTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.runs_dir = Path(self._tmp.name)
+        self.llamadas = []
+        self.item = {"linea": 1, "moraleja": "Compartir es bueno", "run_id": "r1"}
+        limiter = mock.Mock()
+        limiter.consumo.return_value = {"usd": 0.0}
+        parche = mock.patch("main.get_limiter", return_value=limiter)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _registro(self, video_error: Exception | None = None) -> _Registro:
+        return _Registro({
+            nombre: _Etapa(nombre, self.llamadas, video_error if nombre == "video" else None)
+            for nombre in ("guion", "audio", "imagen", "video")
+        })
+
+    def _historia(self, registro: _Registro, pipeline4=None, **kwargs):
+        with mock.patch("main.get_registry", return_value=registro), \
+                ThreadPoolExecutor(2) as pool_api, ThreadPoolExecutor(1) as pool_video, \
+                contextlib.redirect_stdout(io.StringIO()):
+            return main._historia_batch(_args(self.runs_dir, **kwargs), self.item, pool_api, pool_video, pipeline4)
+
+    def _etapas(self):
+        return [nombre for nombre, _ in self.llamadas]
+
+    def test_planifica_antes_de_las_imagenes(self):
+        resultado = self._historia(self._registro())
+        self.assertEqual(resultado["estado"], "completado")
+        self.assertEqual(self._etapas(), ["guion", "audio", "video.plan", "imagen", "video"])
+        self.assertEqual(self.llamadas[-1][1]["plan"], "plan")
+        self.assertEqual(resultado["video"], "video.mp4")
+
+    def test_plan_excedido_no_paga_las_imagenes(self):
+        resultado = self._historia(self._registro(PlanExcedeLimites("duración 900s > 600s")))
+        self.assertEqual(resultado["estado"], "error")
+        self.assertIn("PlanExcedeLimites", resultado["error"])
+        self.assertEqual(self._etapas(), ["guion", "audio", "video.plan"])
+
+    def test_sin_video_no_planifica(self):
+        resultado = self._historia(self._registro(), skip_video=True)
+        self.assertEqual(resultado["estado"], "completado")
+        self.assertEqual(self._etapas(), ["guion", "audio", "imagen"])
+
+    def test_usa_el_pipeline4_del_batch(self):
+        # Con --renditions / --subtitulos-mp4 el batch arma su propio Pipeline 4
+        propio = _Etapa("video_batch", self.llamadas)
+        resultado = self._historia(self._registro(), pipeline4=propio)
+        self.assertEqual(self._etapas(), ["guion", "audio", "video_batch.plan", "imagen", "video_batch"])
+        self.assertEqual(resultado["video"], "video_batch.mp4")
+
+
+class PipelineVideoBatchTest(unittest.TestCase):
+    def test_sin_opciones_usa_el_registro(self):
+        registro = _Registro({"video": "del registro"})
+        with mock.patch("main.get_registry", return_value=registro):
+            self.assertEqual(main._pipeline_video_batch(_args(Path("runs"))), "del registro")
+
+    def test_con_opciones(self):
+        casos = [
+            ({"renditions": "360p,720p"}, {"subtitulos_mp4": False, "renditions": ["360p", "720p"]}),
+            ({"renditions": ""}, {"subtitulos_mp4": False, "renditions": []}),  # un solo archivo
+            ({"subtitulos_mp4": True}, {"subtitulos_mp4": True, "renditions": None}),
+        ]
+        for opciones, esperado in casos:
+            with self.subTest(**opciones), mock.patch("main.pipelines") as modulo:
+                main._pipeline_video_batch(_args(Path("runs"), **opciones))
+                modulo.Pipeline4Video.assert_called_once_with(**esperado)
+
+
+if __name__ == "__main__":
+    unittest.main()
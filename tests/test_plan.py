@@ -0,0 +1,200 @@
+"""
+Plan de render (pipelines.plan): timeline, escenas omitidas, costo estimado y límites.
+
+Los audios son MP3 armados con los frames de test_audio_probe, así la voz de cada
+escena dura exactamente frames * 1152 / 44100 segundos.
+
+    python -m pytest tests/test_plan.py
+"""
+import json
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pipelines.guion_model import Dialogo, Escena, Guion, Metadata
+from pipelines.plan import ConfigRender, LimitesRender, PlanExcedeLimites, PlanRender, planificar, tamano_png
+from pipelines.run_manifest import RunManifest
+
+from tests.test_audio_probe import MUESTRAS, SAMPLE_RATE, _frame
+
+RENDER = Path(__file__).resolve().parent.parent / "config" / "render.json"
+
+FPS = 24
+DELAY = 0.8
+FADE = 0.5
+
+
+def _guion(*numeros: int) -> Guion:
+    return Guion(Metadata(), [Escena(n, f"escena {n}", Dialogo("Lucas", f"Texto {n}")) for n in numeros])
+
+
+def _png(ancho: int, alto: int) -> bytes:
+    """Solo la firma y el IHDR: tamano_png no lee más"""
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", ancho, alto) + bytes(5)
+
+
+def _voz(frames: int) -> float:
+    return frames * MUESTRAS / SAMPLE_RATE
+
+
+class PlanificarTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.voices = self.dir / "voices"
+        self.images = self.dir / "images"
+        self.voices.mkdir()
+        self.images.mkdir()
+        self.config = ConfigRender.desde_config(RENDER)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _audio(self, num: int, frames: int) -> None:
+        (self.voices / f"dialogue_{num}.mp3").write_bytes(b"".join(_frame(128) for _ in range(frames)))
+
+    def _planificar(self, guion: Guion, resolucion=(1280, 720), preset="medium", **kwargs) -> PlanRender:
+        return planificar(
+            guion, self.voices, self.images, FPS, resolucion, preset, FADE, DELAY, self.config, **kwargs
+        )
+
+    def test_timeline(self):
+        self._audio(1, 100)
+        self._audio(2, 200)
+        plan = self._planificar(_guion(1, 2))
+        uno, dos = plan.escenas
+        self.assertAlmostEqual(uno.voz, _voz(100), places=4)
+        self.assertAlmostEqual(uno.duracion, DELAY + _voz(100) + FADE, places=4)
+        self.assertEqual(uno.inicio, 0)
+        self.assertAlmostEqual(dos.inicio, uno.duracion, places=4)
+        self.assertAlmostEqual(plan.duracion_total, uno.duracion + dos.duracion, places=3)
+        self.assertEqual(plan.cuadros, round(plan.duracion_total * FPS))
+        self.assertEqual(plan.omitidas, ())
+        self.assertEqual(plan.escena(2), dos)
+        self.assertIsNone(plan.escena(3))
+
+    def test_escenas_sin_audio_no_ocupan_tiempo(self):
+        self._audio(1, 100)
+        (self.voices / "dialogue_2.mp3").write_bytes(b"")  # la voz falló a mitad de escritura
+        self._audio(4, 100)
+        plan = self._planificar(_guion(1, 2, 3, 4))
+        self.assertEqual(plan.omitidas, (2, 3))
+        self.assertEqual([e.numero for e in plan.escenas], [1, 4])
+        self.assertAlmostEqual(plan.escenas[1].inicio, plan.escenas[0].duracion, places=4)
+
+    def test_costo(self):
+        self._audio(1, 400)
+        plan = self._planificar(_guion(1))
+        megapixeles = 1280 * 720 / 1_000_000
+        self.assertAlmostEqual(plan.cpu_segundos, round(plan.cuadros * megapixeles * 0.018, 1))
+        kbps = 400 * megapixeles + 128
+        # duracion_total está redondeada a 4 decimales: el estimado sale del total sin redondear
+        self.assertAlmostEqual(plan.bytes_estimados, plan.duracion_total * kbps * 1000 / 8, delta=100)
+
+    def test_preset_desconocido_usa_el_mas_caro(self):
+        self._audio(1, 400)
+        lento = self._planificar(_guion(1), preset="veryslow")
+        self.assertEqual(self._planificar(_guion(1), preset="placebo").cpu_segundos, lento.cpu_segundos)
+
+    def test_resolucion_de_las_imagenes(self):
+        # "compose": el lienzo es el de la imagen más grande; sin imagen todavía, la de config
+        self._audio(1, 10)
+        self._audio(2, 10)
+        (self.images / "image_1.png").write_bytes(_png(800, 600))
+        plan = self._planificar(_guion(1), resolucion=None)
+        self.assertEqual((plan.ancho, plan.alto), (800, 600))
+        plan = self._planificar(_guion(1, 2), resolucion=None)
+        self.assertEqual((plan.ancho, plan.alto), (1024, 1024))
+
+    def test_renditions(self):
+        self._audio(1, 400)
+        renditions = self.config.renditions
+        plan = self._planificar(_guion(1), renditions=(renditions["360p"], renditions["720p"], renditions["1080p"]))
+        # 1080p escalaría para arriba: no se genera ni se cobra
+        self.assertEqual(plan.renditions, ("360p", "720p"))
+        megapixeles = (640 * 360 + 1280 * 720) / 1_000_000
+        self.assertAlmostEqual(plan.cpu_segundos, round(plan.cuadros * megapixeles * 0.018, 1))
+        kbps = 400 * megapixeles + 128 * 2
+        self.assertAlmostEqual(plan.bytes_estimados, plan.duracion_total * kbps * 1000 / 8, delta=100)
+        self.assertIn("en 360p/720p", plan.resumen())
+
+    def test_duraciones_cacheadas_en_el_manifiesto(self):
+        self._audio(1, 100)
+        manifest = RunManifest.crear("moraleja", run_id="plan", base_dir=self.dir / "runs")
+        primero = self._planificar(_guion(1), manifest=manifest)
+        with mock.patch("pipelines.plan.duracion_mp3", side_effect=AssertionError("no debería medir")):
+            segundo = self._planificar(_guion(1), manifest=manifest)
+        self.assertEqual(primero.escenas, segundo.escenas)
+
+    def test_ida_y_vuelta(self):
+        self._audio(1, 100)
+        plan = self._planificar(_guion(1, 2), renditions=(self.config.renditions["360p"],))
+        path = plan.guardar(self.dir / "plan.json")
+        with open(path, "r", encoding="utf-8") as f:
+            self.assertEqual(PlanRender.desde_dict(json.load(f)), plan)
+
+
+class LimitesTest(unittest.TestCase):
+    def setUp(self):
+        self.plan = PlanRender(
+            escenas=(), omitidas=(), fps=FPS, ancho=1280, alto=720, preset="medium",
+            fade_duration=FADE, dialog_delay=DELAY, duracion_total=700.0, cuadros=16800,
+            cpu_segundos=250.0, bytes_estimados=50 * 1024 * 1024,
+        )
+
+    def test_dentro_de_los_limites(self):
+        limites = LimitesRender(max_segundos_video=700, max_cpu_segundos=250, max_mb=50)
+        self.assertEqual(self.plan.excesos(limites), [])
+        self.plan.verificar(limites)
+        self.plan.verificar(LimitesRender())
+
+    def test_excesos(self):
+        limites = LimitesRender(max_segundos_video=600, max_cpu_segundos=100, max_mb=40)
+        self.assertEqual(self.plan.excesos(limites), [
+            "duración 700s > 600s",
+            "CPU estimado 250s > 100s",
+            "tamaño estimado 50.0 MB > 40 MB",
+        ])
+        with self.assertRaisesRegex(PlanExcedeLimites, "excede los límites del job: duración 700s > 600s"):
+            self.plan.verificar(LimitesRender(max_segundos_video=600))
+
+
+class ConfigRenderTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_config_del_repo(self):
+        config = ConfigRender.desde_config(RENDER)
+        self.assertEqual(config.limites.max_segundos_video, 600)
+        self.assertIsNone(config.limites.max_cpu_segundos)
+        self.assertEqual(config.escalera, ())
+        self.assertEqual(config.sonoridad.pico_maximo_dbtp, -1)
+
+    def test_sin_archivo(self):
+        config = ConfigRender.desde_config(self.dir / "no_existe.json")
+        self.assertEqual(config.limites, LimitesRender())
+        self.assertEqual(config.resolucion_imagen, (1024, 1024))
+
+    def test_escalera_desconocida(self):
+        path = self.dir / "render.json"
+        path.write_text(json.dumps({"renditions": {"360p": {"alto": 360}}, "escalera": ["4k"]}), encoding="utf-8")
+        with self.assertRaisesRegex(ValueError, "Renditions desconocidas: 4k"):
+            ConfigRender.desde_config(path)
+
+    def test_tamano_png(self):
+        path = self.dir / "imagen.png"
+        path.write_bytes(_png(1024, 576))
+        self.assertEqual(tamano_png(path), (1024, 576))
+        path.write_bytes(b"GIF89a" + bytes(30))
+        self.assertIsNone(tamano_png(path))
+        self.assertIsNone(tamano_png(self.dir / "no_existe.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Póster y miniatura del video (pipelines.previews): nombres con hash e índice vigente.
+
+La generación de las imágenes necesita Pillow; sin Pillow solo corren los tests que no
+decodifican nada.
+
+    python -m pytest tests/test_previews.py
+"""
+import hashlib
+import importlib.util
+import json
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pipelines.previews import PATRON_NOMBRE, TAMANOS, _vigentes, generar_previews, leer_previews, ruta_indice
+
+
+class NombresTest(unittest.TestCase):
+    def test_patron(self):
+        for nombre in ("cuento_abc-1_poster.0123456789ab.webp", "video_thumb.0123456789ab.jpg"):
+            with self.subTest(nombre):
+                self.assertRegex(nombre, PATRON_NOMBRE)
+        # La vista sirve estos archivos con cache immutable: nada fuera del patrón
+        for nombre in (
+            "video_poster.0123456789ab.png",
+            "video_poster.0123456789AB.webp",
+            "video_poster.0123.webp",
+            "video_banner.0123456789ab.jpg",
+            "../video_thumb.0123456789ab.jpg",
+        ):
+            with self.subTest(nombre):
+                self.assertIsNone(re.match(PATRON_NOMBRE, nombre))
+
+    def test_ruta_indice(self):
+        self.assertEqual(ruta_indice("assets/outputs/cuento.mp4"), Path("assets/outputs/cuento.previews.json"))
+
+
+class IndiceTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.video = self.dir / "cuento.mp4"
+        self.imagen = self.dir / "image_1.png"
+        self.imagen.write_bytes(b"imagen de la escena 1")
+        self.huella = hashlib.sha256(self.imagen.read_bytes()).hexdigest()[:12]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _indice(self, huella: str) -> dict:
+        indice = {"fuente": huella}
+        for nombre in TAMANOS:
+            base = f"cuento_{nombre}.{huella}"
+            indice[nombre] = {"webp": f"{base}.webp", "jpg": f"{base}.jpg", "ancho": 1, "alto": 1}
+            (self.dir / f"{base}.webp").write_bytes(b"")
+            (self.dir / f"{base}.jpg").write_bytes(b"")
+        return indice
+
+    def test_sin_indice(self):
+        self.assertIsNone(leer_previews(self.video))
+        self.assertFalse(_vigentes(None, self.huella, self.dir))
+
+    def test_vigentes(self):
+        indice = self._indice(self.huella)
+        self.assertTrue(_vigentes(indice, self.huella, self.dir))
+        self.assertFalse(_vigentes(indice, "otra" * 3, self.dir))
+        (self.dir / indice["thumb"]["jpg"]).unlink()
+        self.assertFalse(_vigentes(indice, self.huella, self.dir))
+
+    def test_misma_imagen_no_regenera(self):
+        indice = self._indice(self.huella)
+        ruta_indice(self.video).write_text(json.dumps(indice), encoding="utf-8")
+        with mock.patch.dict("sys.modules", {"PIL": None}):  # importar Pillow fallaría
+            self.assertEqual(generar_previews(self.imagen, self.video), indice)
+
+    @unittest.skipIf(importlib.util.find_spec("PIL") is None, "Pillow no está instalado")
+    def test_imagen_nueva(self):
+        from PIL import Image
+
+        viejo = self._indice("0" * 12)
+        ruta_indice(self.video).write_text(json.dumps(viejo), encoding="utf-8")
+        Image.new("RGB", (1024, 768), "orange").save(self.imagen)
+        indice = generar_previews(self.imagen, self.video)
+        huella = hashlib.sha256(self.imagen.read_bytes()).hexdigest()[:12]
+        self.assertEqual(indice["fuente"], huella)
+        self.assertEqual((indice["poster"]["ancho"], indice["poster"]["alto"]), (960, 720))
+        self.assertEqual((indice["thumb"]["ancho"], indice["thumb"]["alto"]), (320, 240))
+        for nombre in TAMANOS:
+            for formato in ("webp", "jpg"):
+                self.assertRegex(indice[nombre][formato], PATRON_NOMBRE)
+                self.assertTrue((self.dir / indice[nombre][formato]).exists())
+                self.assertFalse((self.dir / viejo[nombre][formato]).exists())
+        self.assertEqual(leer_previews(self.video), indice)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,269 @@
+"""
+Stores de progreso de la webapp (webapp.progress): backends memory, sqlite y shm.
+
+    python -m pytest tests/test_progress.py
+"""
+import asyncio
+import importlib.util
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from multiprocessing import shared_memory
+from pathlib import Path
+from unittest import mock
+
+if importlib.util.find_spec("django") is None:
+    raise unittest.SkipTest("django no está instalado")
+
+from webapp.progress import MemoryProgressStore, SharedMemoryProgressStore, SQLiteProgressStore
+
+
+class _Contrato:
+    """Comportamiento común de los backends; cada subclase define crear()"""
+
+    def crear(self, ttl: float = 3600, max_entradas: int = 100):
+        raise NotImplementedError
+
+    def test_seq_sube_en_cada_cambio(self):
+        store = self.crear()
+        self.assertEqual(store.iniciar("t1", step="Empezando"), 1)
+        self.assertEqual(store.publicar("t1", progress=10), 2)
+        self.assertEqual(store.publicar("t1", progress=20, etapa="audio"), 3)
+        record = store.obtener("t1")
+        self.assertEqual((record.seq, record.progress, record.etapa, record.step), (3, 20, "audio", "Empezando"))
+
+    def test_reiniciar_no_vuelve_atras_el_seq(self):
+        # Un reintento reusa el task_id: el navegador con Last-Event-ID=3 tiene que ver el nuevo
+        store = self.crear()
+        store.iniciar("t1")
+        store.publicar("t1", status="error", error="falló")
+        self.assertEqual(store.iniciar("t1", step="Reintentando"), 3)
+        record = store.obtener("t1")
+        self.assertEqual((record.status, record.error, record.step), ("processing", "", "Reintentando"))
+
+    def test_tareas_independientes(self):
+        store = self.crear()
+        store.iniciar("t1")
+        store.iniciar("t2")
+        store.publicar("t2", progress=50)
+        self.assertEqual(store.obtener("t1").seq, 1)
+        self.assertEqual(store.obtener("t2").seq, 2)
+        self.assertIsNone(store.obtener("t3"))
+
+    def test_campo_desconocido(self):
+        store = self.crear()
+        with self.assertRaises(ValueError):
+            store.publicar("t1", porcentaje=10)
+        self.assertIsNone(store.obtener("t1"))
+
+    def test_estado_o_etapa_desconocidos(self):
+        store = self.crear()
+        store.iniciar("t1")
+        with self.assertRaisesRegex(ValueError, "Estado de progreso desconocido: 'done'"):
+            store.publicar("t1", status="done")
+        with self.assertRaisesRegex(ValueError, "Etapa de progreso desconocida: 'musica'"):
+            store.publicar("t1", etapa="musica")
+        self.assertEqual(store.obtener("t1").seq, 1)
+
+    def test_expira_por_ttl(self):
+        store = self.crear(ttl=0.05)
+        store.iniciar("t1")
+        self.assertIsNotNone(store.obtener("t1"))
+        time.sleep(0.1)
+        self.assertIsNone(store.obtener("t1"))
+
+    def test_tope_de_entradas(self):
+        store = self.crear(max_entradas=3)
+        for i in range(4):
+            store.iniciar(f"t{i}")
+            time.sleep(0.002)  # actualizado distinto para cada una
+        self.assertIsNone(store.obtener("t0"))
+        self.assertEqual([store.obtener(f"t{i}").task_id for i in range(1, 4)], ["t1", "t2", "t3"])
+
+    def test_esperar_timeout(self):
+        store = self.crear()
+        store.iniciar("t1")
+        inicio = time.monotonic()
+        record = store.esperar("t1", desde_seq=1, timeout=0.2, intervalo=0.02)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.19)
+        self.assertEqual(record.seq, 1)
+
+    def test_esperar_vuelve_con_el_cambio(self):
+        store = self.crear()
+        store.iniciar("t1")
+        threading.Timer(0.05, store.publicar, args=("t1",), kwargs={"progress": 40}).start()
+        inicio = time.monotonic()
+        record = store.esperar("t1", desde_seq=1, timeout=5, intervalo=0.02)
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assertEqual((record.seq, record.progress), (2, 40))
+
+    def test_esperar_ya_cambiado_no_espera(self):
+        store = self.crear()
+        store.iniciar("t1")
+        store.publicar("t1", progress=1)
+        inicio = time.monotonic()
+        self.assertEqual(store.esperar("t1", desde_seq=1, timeout=5).seq, 2)
+        self.assertLess(time.monotonic() - inicio, 1)
+
+    def test_esperar_tarea_inexistente(self):
+        self.assertIsNone(self.crear().esperar("nada", desde_seq=0, timeout=5))
+
+    def test_esperar_async(self):
+        store = self.crear()
+        store.iniciar("t1")
+
+        async def esperar():
+            asyncio.get_running_loop().call_later(0.05, store.publicar, "t1")
+            return await store.esperar_async("t1", desde_seq=1, timeout=5, intervalo=0.02)
+
+        self.assertEqual(asyncio.run(esperar()).seq, 2)
+
+
+class MemoryProgressStoreTest(_Contrato, unittest.TestCase):
+    def crear(self, ttl: float = 3600, max_entradas: int = 100):
+        return MemoryProgressStore(ttl=ttl, max_entradas=max_entradas)
+
+    def test_obtener_devuelve_una_copia(self):
+        store = self.crear()
+        store.iniciar("t1")
+        store.obtener("t1").progress = 99
+        self.assertEqual(store.obtener("t1").progress, 0)
+
+
+class SQLiteProgressStoreTest(_Contrato, unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "progreso.sqlite3"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def crear(self, ttl: float = 3600, max_entradas: int = 100):
+        return SQLiteProgressStore(self.path, ttl=ttl, max_entradas=max_entradas)
+
+    def test_compartido_entre_instancias(self):
+        # Dos workers con el mismo archivo ven los mismos seq
+        uno, otro = self.crear(), self.crear()
+        uno.iniciar("t1")
+        self.assertEqual(otro.publicar("t1", progress=30), 2)
+        self.assertEqual(uno.obtener("t1").progress, 30)
+
+
+class SharedMemoryProgressStoreTest(_Contrato, unittest.TestCase):
+    def setUp(self):
+        self.nombre = f"test_progreso_{uuid.uuid4().hex[:8]}"
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store._shm.close()
+        if self.stores:
+            # El store no registra el segmento en el resource_tracker (debe sobrevivir a
+            # los workers), así que se borra sin pasar por SharedMemory.unlink()
+            shared_memory._posixshmem.shm_unlink(self.stores[0]._shm._name)
+            self.stores[0]._lock_path.unlink(missing_ok=True)
+
+    def crear(self, ttl: float = 3600, max_entradas: int = 100):
+        store = SharedMemoryProgressStore(self.nombre, ttl=ttl, max_entradas=max_entradas)
+        self.stores.append(store)
+        return store
+
+    def _slot(self, store, task_id):
+        return store._buscar(task_id)[0]
+
+    def test_compartido_entre_instancias(self):
+        uno, otro = self.crear(), self.crear()
+        uno.iniciar("t1")
+        self.assertEqual(otro.publicar("t1", progress=30), 2)
+        self.assertEqual(uno.obtener("t1").progress, 30)
+
+    def test_reusa_el_slot_expirado(self):
+        store = self.crear(ttl=0.05, max_entradas=3)
+        for i in range(3):
+            store.iniciar(f"t{i}")
+        slots = {self._slot(store, f"t{i}") for i in range(3)}
+        time.sleep(0.1)
+        store.iniciar("nueva")
+        self.assertIn(self._slot(store, "nueva"), slots)
+        self.assertEqual(store.obtener("nueva").seq, 1)
+
+    def test_al_llenarse_desaloja_la_mas_vieja(self):
+        store = self.crear(max_entradas=4)
+        for i in range(4):
+            store.iniciar(f"t{i}")
+            time.sleep(0.002)
+        store.publicar("t0")  # t0 vuelve a ser reciente: la más vieja es t1
+        time.sleep(0.002)
+        slot_t1 = self._slot(store, "t1")
+        store.iniciar("t4")
+        self.assertIsNone(store.obtener("t1"))
+        self.assertEqual(self._slot(store, "t4"), slot_t1)
+        self.assertEqual([store.obtener(t).seq for t in ("t0", "t2", "t3", "t4")], [2, 1, 1, 1])
+
+    def test_el_indice_se_corrige_si_otro_proceso_ocupa_el_slot(self):
+        uno, otro = self.crear(ttl=0.05, max_entradas=1), self.crear(ttl=0.05, max_entradas=1)
+        uno.iniciar("vieja")
+        self.assertEqual(uno.obtener("vieja").seq, 1)  # queda en el índice de `uno`
+        time.sleep(0.1)
+        otro.iniciar("nueva")
+        self.assertIsNone(uno.obtener("vieja"))
+        self.assertNotIn("vieja", uno._indice)
+        self.assertEqual(uno.obtener("nueva").task_id, "nueva")
+
+    def test_buscar_una_tarea_desconocida_no_decodifica_slots(self):
+        store = self.crear(max_entradas=200)
+        for i in range(200):
+            store.iniciar(f"t{i}")
+        otro = self.crear(max_entradas=200)  # sin índice propio
+        presente = next(f"t{i}" for i in range(200) if store.obtener(f"t{i}") is not None)
+        with mock.patch.object(otro, "_leer", wraps=otro._leer) as leer:
+            self.assertIsNone(otro.obtener("desconocida"))
+            self.assertEqual(leer.call_count, 0)
+            self.assertEqual(otro.obtener(presente).task_id, presente)
+            self.assertEqual(otro.obtener(presente).task_id, presente)  # por el índice
+            self.assertEqual(leer.call_count, 2)
+
+    def test_lectura_durante_una_escritura(self):
+        store = self.crear()
+        store.iniciar("t1", step="paso 1")
+        slot = self._slot(store, "t1")
+        base = slot * store._TAMANO_SLOT
+        version = store._VERSION.unpack_from(store._shm.buf, base)[0]
+
+        # Un escritor de otro proceso deja el slot "a medio escribir" un momento
+        store._VERSION.pack_into(store._shm.buf, base, version | 1)
+        threading.Timer(0.02, store._VERSION.pack_into, args=(store._shm.buf, base, version)).start()
+        with mock.patch.object(store, "_REINTENTOS_LECTURA", 10_000_000):
+            self.assertEqual(store.obtener("t1").step, "paso 1")
+
+    def test_escritor_muerto_a_mitad_de_escritura(self):
+        # La versión queda impar para siempre: el lector termina leyendo con el lock
+        store = self.crear()
+        store.iniciar("t1")
+        base = self._slot(store, "t1") * store._TAMANO_SLOT
+        store._VERSION.pack_into(store._shm.buf, base, 7)
+        self.assertEqual(store.obtener("t1").seq, 1)
+        self.assertEqual(store.publicar("t1"), 2)
+        self.assertEqual(store._VERSION.unpack_from(store._shm.buf, base)[0] % 2, 0)
+
+    def test_lecturas_consistentes_con_un_escritor_concurrente(self):
+        store = self.crear()
+        store.iniciar("t1", step="paso 1", progress=1)
+        listo = threading.Event()
+
+        def escribir():
+            for n in range(2, 500):
+                store.publicar("t1", step=f"paso {n}", progress=n % 256)
+            listo.set()
+
+        threading.Thread(target=escribir).start()
+        while not listo.is_set():
+            record = store.obtener("t1")
+            self.assertEqual(record.step, f"paso {record.seq}")
+            self.assertEqual(record.progress, record.seq % 256)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Rate limit y presupuesto de las APIs (pipelines.providers), contra un ledger temporal.
+
+    python -m pytest tests/test_providers.py
+"""
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pipelines.instrumentation import RunReport
+from pipelines.providers import PresupuestoExcedido, ProviderLimiter
+
+PROVIDERS = {
+    "api": {"requests_por_segundo": 2, "unidades_por_minuto": 60, "usd_por_unidad": 0.01, "unidad": "tokens"},
+    "libre": {"usd_por_unidad": 0.5},
+}
+
+
+class _Reloj:
+    """time.time() controlado por el test"""
+
+    def __init__(self, t: float = 1000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+class ProviderLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.ledger = Path(self._tmp.name) / "providers.sqlite3"
+        self.reloj = _Reloj()
+        parche = mock.patch("pipelines.providers.time.time", self.reloj)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _limiter(self, presupuesto=None) -> ProviderLimiter:
+        return ProviderLimiter(self.ledger, PROVIDERS, presupuesto_usd_por_job=presupuesto)
+
+    def test_bucket_de_requests(self):
+        limiter = self._limiter()
+        # Capacidad = 2 requests: las dos primeras pasan, la tercera espera medio segundo
+        self.assertEqual(limiter._intentar("api", 1), 0)
+        self.assertEqual(limiter._intentar("api", 1), 0)
+        self.assertAlmostEqual(limiter._intentar("api", 1), 0.5)
+        # Un rechazo no consume: a los 0.5 s hay un token
+        self.reloj.t += 0.5
+        self.assertEqual(limiter._intentar("api", 1), 0)
+
+    def test_bucket_de_unidades(self):
+        limiter = self._limiter()
+        self.assertEqual(limiter._intentar("api", 50), 0)
+        self.reloj.t += 1  # +1 request y +1 unidad (60 por minuto)
+        # Quedan 11 unidades: para 20 faltan 9, a 1 unidad por segundo
+        self.assertAlmostEqual(limiter._intentar("api", 20), 9)
+
+    def test_el_bucket_no_pasa_su_capacidad(self):
+        limiter = self._limiter()
+        limiter._intentar("api", 60)
+        self.reloj.t += 3600  # una hora sin llamadas no acumula más de 60 unidades
+        self.assertEqual(limiter._intentar("api", 60), 0)
+        self.reloj.t += 1
+        self.assertAlmostEqual(limiter._intentar("api", 2), 1)
+
+    def test_llamada_mas_grande_que_el_bucket(self):
+        # 1000 unidades con un bucket de 60: lo vacía entero en lugar de esperar para siempre
+        limiter = self._limiter()
+        self.assertEqual(limiter._intentar("api", 1000), 0)
+        self.reloj.t += 1
+        self.assertAlmostEqual(limiter._intentar("api", 1000), 59)
+
+    def test_proveedor_sin_limites(self):
+        limiter = self._limiter()
+        for _ in range(100):
+            self.assertEqual(limiter._intentar("libre", 10_000), 0)
+
+    def test_compartido_entre_instancias(self):
+        # Otro proceso (otra conexión al mismo archivo) ve los tokens consumidos
+        self._limiter()._intentar("api", 60)
+        self.assertAlmostEqual(self._limiter()._intentar("api", 30), 30)
+
+    def test_libro_de_consumo(self):
+        limiter = self._limiter()
+        reporte = RunReport("run1")
+        with reporte.activo():
+            with limiter.llamada("api", 10) as uso:
+                uso.unidades = 12
+            with self.assertRaises(ValueError), limiter.llamada("api", 5):
+                raise ValueError("falla")
+        consumo = limiter.consumo("run1")
+        self.assertEqual(consumo["proveedores"]["api"]["llamadas"], 2)
+        self.assertEqual(consumo["proveedores"]["api"]["errores"], 1)
+        self.assertEqual(consumo["proveedores"]["api"]["unidades"], 12)  # la fallida no suma
+        self.assertAlmostEqual(consumo["usd"], 0.12)
+        self.assertEqual(reporte.contadores["api.tokens"], 12)
+
+    def test_presupuesto_excedido(self):
+        limiter = self._limiter(presupuesto=1.0)
+        with RunReport("run1").activo():
+            with limiter.llamada("libre", 1):
+                pass  # $0.50
+            with limiter.llamada("libre", 1):
+                pass  # $1.00: llega justo al presupuesto
+            with self.assertRaises(PresupuestoExcedido):
+                with limiter.llamada("libre", 1):
+                    self.fail("no se debería llamar con el presupuesto gastado")
+        self.assertEqual(limiter.consumo("run1")["proveedores"]["libre"]["llamadas"], 2)
+
+    def test_presupuesto_es_por_job(self):
+        limiter = self._limiter(presupuesto=0.5)
+        with RunReport("run1").activo(), limiter.llamada("libre", 1):
+            pass
+        with RunReport("run2").activo(), limiter.llamada("libre", 1):
+            pass
+        # Fuera de un run (job "") no hay presupuesto
+        for _ in range(3):
+            with limiter.llamada("libre", 1):
+                pass
+
+    def test_async_no_usa_el_sqlite_desde_el_event_loop(self):
+        limiter = self._limiter(presupuesto=1.0)
+        hilos = set()
+        originales = {nombre: getattr(limiter, nombre) for nombre in ("_intentar", "registrar", "_verificar_presupuesto")}
+
+        def espiar(nombre):
+            def fn(*args, **kwargs):
+                hilos.add(threading.get_ident())
+                return originales[nombre](*args, **kwargs)
+            return fn
+
+        async def llamar():
+            with RunReport("run1").activo():
+                async with limiter.llamada_async("api", 5) as uso:
+                    uso.unidades = 7
+            return threading.get_ident()
+
+        with mock.patch.multiple(limiter, **{nombre: espiar(nombre) for nombre in originales}):
+            hilo_loop = asyncio.run(llamar())
+        self.assertTrue(hilos)
+        self.assertNotIn(hilo_loop, hilos)
+        self.assertEqual(limiter.consumo("run1")["proveedores"]["api"]["unidades"], 7)
+
+    def test_async_espera_el_rate_limit(self):
+        limiter = self._limiter()
+        limiter._intentar("api", 1)
+        limiter._intentar("api", 1)
+        esperas = []
+
+        async def dormir(segundos):
+            esperas.append(segundos)
+            self.reloj.t += segundos
+
+        async def llamar():
+            async with limiter.llamada_async("api", 1) as uso:
+                return uso.espera
+
+        with mock.patch("pipelines.providers.asyncio.sleep", dormir):
+            espera = asyncio.run(llamar())
+        self.assertEqual(len(esperas), 1)
+        self.assertAlmostEqual(espera, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Registro de pipelines (pipelines.registry): una instancia por etapa, construcción en
+paralelo entre etapas y recarga de la configuración.
+
+    python -m pytest tests/test_registry.py
+"""
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pipelines.registry import PipelineRegistry
+
+
+class _Pipeline:
+    def __init__(self, config_path: Path | None = None):
+        self.config_path = config_path
+        self.recargas = 0
+
+    def recargar_config(self) -> None:
+        self.recargas += 1
+
+
+class PipelineRegistryTest(unittest.TestCase):
+    def test_una_instancia_por_etapa(self):
+        construidas = []
+
+        def fabrica():
+            construidas.append(1)
+            time.sleep(0.05)  # varios hilos piden la etapa mientras se construye
+            return _Pipeline()
+
+        registro = PipelineRegistry({"guion": fabrica})
+        with ThreadPoolExecutor(8) as pool:
+            instancias = list(pool.map(lambda _: registro.get("guion"), range(8)))
+        self.assertEqual(len(construidas), 1)
+        self.assertTrue(all(i is instancias[0] for i in instancias))
+
+    def test_construir_una_etapa_no_bloquea_las_otras(self):
+        construyendo = threading.Event()
+        seguir = threading.Event()
+
+        def video_lento():
+            construyendo.set()
+            seguir.wait(5)
+            return _Pipeline()
+
+        registro = PipelineRegistry({"guion": _Pipeline, "video": video_lento})
+        with ThreadPoolExecutor(1) as pool:
+            video = pool.submit(registro.get, "video")
+            self.assertTrue(construyendo.wait(5))
+            try:
+                inicio = time.monotonic()
+                registro.get("guion")
+                self.assertLess(time.monotonic() - inicio, 1)
+            finally:
+                seguir.set()
+            self.assertIsInstance(video.result(), _Pipeline)
+
+    def test_falla_al_construir_se_reintenta(self):
+        intentos = []
+
+        def fabrica():
+            intentos.append(1)
+            if len(intentos) == 1:
+                raise RuntimeError("falta ELEVENLABS_API_KEY")
+            return _Pipeline()
+
+        registro = PipelineRegistry({"audio": fabrica})
+        with self.assertRaises(RuntimeError):
+            registro.get("audio")
+        self.assertIsInstance(registro.get("audio"), _Pipeline)
+
+    def test_etapa_desconocida(self):
+        with self.assertRaisesRegex(ValueError, "Etapa desconocida: musica"):
+            PipelineRegistry({"guion": _Pipeline}).get("musica")
+
+    def test_recarga_si_cambia_la_config(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Path(tmp) / "voices.json"
+            config.write_text("{}", encoding="utf-8")
+            registro = PipelineRegistry({"audio": lambda: _Pipeline(config)})
+            pipeline = registro.get("audio")
+            registro.get("audio")
+            self.assertEqual(pipeline.recargas, 0)
+            stat = config.stat()
+            os.utime(config, (stat.st_atime, stat.st_mtime + 10))
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertIs(registro.get("audio"), pipeline)
+            registro.get("audio")
+            self.assertEqual(pipeline.recargas, 1)
+
+    def test_precalentar(self):
+        def sin_key():
+            raise RuntimeError("falta GEMINI_API_KEY")
+
+        registro = PipelineRegistry({"guion": _Pipeline, "audio": _Pipeline, "imagen": sin_key, "video": _Pipeline})
+        with contextlib.redirect_stdout(io.StringIO()) as salida:
+            self.assertEqual(registro.precalentar(("guion", "audio", "imagen")), ["guion", "audio"])
+        self.assertIn("No se pudo precalentar el pipeline 'imagen'", salida.getvalue())
+        self.assertNotIn("video", registro._instancias)
+
+
+if __name__ == "__main__":
+    unittest.main()
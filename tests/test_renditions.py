@@ -0,0 +1,94 @@
+"""
+Escalera de renditions (pipelines.renditions): selección, tamaños y elección al entregar.
+
+    python -m pytest tests/test_renditions.py
+"""
+import unittest
+from pathlib import Path
+
+from pipelines.renditions import (
+    Rendition,
+    elegir_rendition,
+    escalera_efectiva,
+    ruta_indice,
+    ruta_rendition,
+    seleccionar,
+)
+
+DISPONIBLES = {
+    "360p": Rendition("360p", 360, 26, 700),
+    "720p": Rendition("720p", 720, 23, 2500),
+    "1080p": Rendition("1080p", 1080, 22, 5000),
+}
+
+
+class SeleccionarTest(unittest.TestCase):
+    def test_ordena_por_alto_sin_repetidas(self):
+        escalera = seleccionar(DISPONIBLES, ["1080p", "360p", "1080p"])
+        self.assertEqual([r.nombre for r in escalera], ["360p", "1080p"])
+
+    def test_desconocidas(self):
+        with self.assertRaisesRegex(ValueError, "Renditions desconocidas: 4k, 240p"):
+            seleccionar(DISPONIBLES, ["720p", "4k", "240p"])
+
+    def test_desde_dict(self):
+        self.assertEqual(Rendition.desde_dict("480p", {"alto": "480"}), Rendition("480p", 480, 23, None))
+
+
+class EscaleraEfectivaTest(unittest.TestCase):
+    ESCALERA = seleccionar(DISPONIBLES, DISPONIBLES)
+
+    def test_16_9(self):
+        self.assertEqual(
+            [(r.nombre, w, h) for r, w, h in escalera_efectiva(self.ESCALERA, 1920, 1080)],
+            [("360p", 640, 360), ("720p", 1280, 720), ("1080p", 1920, 1080)],
+        )
+
+    def test_sin_escalar_para_arriba(self):
+        # Imágenes cuadradas de 1024: 1080p agrandaría
+        self.assertEqual(
+            [(r.nombre, w, h) for r, w, h in escalera_efectiva(self.ESCALERA, 1024, 1024)],
+            [("360p", 360, 360), ("720p", 720, 720)],
+        )
+
+    def test_lados_pares(self):
+        # 1000x750 a 360 de alto da 480 exacto; 999x750 da 479.52 -> 480
+        for ancho in (1000, 999, 1001):
+            with self.subTest(ancho=ancho):
+                (_, w, h), *_ = escalera_efectiva(self.ESCALERA, ancho, 750)
+                self.assertEqual((w % 2, h % 2), (0, 0))
+
+    def test_video_mas_chico_que_todas(self):
+        # Una sola, al tamaño original (par) y con la calidad de la más chica
+        (rendition, w, h), = escalera_efectiva(self.ESCALERA, 427, 241)
+        self.assertEqual((rendition.nombre, w, h), ("240p", 426, 240))
+        self.assertEqual((rendition.crf, rendition.maxrate_kbps), (26, 700))
+
+    def test_sin_renditions(self):
+        self.assertEqual(escalera_efectiva((), 1920, 1080), [])
+
+
+class RutasTest(unittest.TestCase):
+    def test_nombres(self):
+        video = Path("assets/outputs/cuento.mp4")
+        self.assertEqual(ruta_rendition(video, DISPONIBLES["1080p"], principal=True), video)
+        self.assertEqual(ruta_rendition(video, DISPONIBLES["360p"], principal=False).name, "cuento_360p.mp4")
+        self.assertEqual(ruta_indice(video).name, "cuento.renditions.json")
+
+
+class ElegirRenditionTest(unittest.TestCase):
+    INDICE = {"renditions": [{"nombre": "360p"}, {"nombre": "720p"}, {"nombre": "1080p"}]}
+
+    def test_por_defecto_la_mas_alta(self):
+        self.assertEqual(elegir_rendition(self.INDICE)["nombre"], "1080p")
+
+    def test_ahorro_de_datos(self):
+        self.assertEqual(elegir_rendition(self.INDICE, ahorro_datos=True)["nombre"], "360p")
+
+    def test_pedida_por_nombre(self):
+        self.assertEqual(elegir_rendition(self.INDICE, "720p", ahorro_datos=True)["nombre"], "720p")
+        self.assertEqual(elegir_rendition(self.INDICE, "4k")["nombre"], "1080p")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Subtítulos de los diálogos (pipelines.subtitles): tiempos de los cues y formato VTT/SRT.
+
+    python -m pytest tests/test_subtitles.py
+"""
+import contextlib
+import importlib.util
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pipelines.guion_model import Dialogo, Escena, Guion, Metadata
+from pipelines.plan import EscenaPlan
+from pipelines.subtitles import Cue, a_srt, a_webvtt, escribir_subtitulos, generar_cues
+
+DELAY = 0.8
+
+
+def _guion(*dialogos) -> Guion:
+    return Guion(Metadata(), [
+        Escena(num, f"escena {num}", Dialogo(personaje, texto))
+        for num, (personaje, texto) in enumerate(dialogos, 1)
+    ])
+
+
+def _escena_plan(numero: int, inicio: float, voz: float) -> EscenaPlan:
+    return EscenaPlan(numero, f"image_{numero}.png", f"dialogue_{numero}.mp3", voz, inicio, DELAY + voz + 0.5)
+
+
+class GenerarCuesTest(unittest.TestCase):
+    def test_un_cue_por_dialogo_corto(self):
+        guion = _guion(("Lucas", "Hola"), ("Sofia", "Chau"))
+        escenas = [_escena_plan(1, 0, 2.0), _escena_plan(2, 3.3, 1.5)]
+        self.assertEqual(generar_cues(guion, escenas, DELAY), [
+            Cue(0.8, 2.8, "Hola", "Lucas"),
+            Cue(4.1, 5.6, "Chau", "Sofia"),
+        ])
+
+    def test_escenas_saltadas_no_ocupan_tiempo(self):
+        # La escena 2 no tiene audio: la 3 va en el video justo después de la 1
+        guion = _guion(("Lucas", "Uno"), ("Sofia", "Dos"), ("Carlos", "Tres"))
+        escenas = [_escena_plan(1, 0, 2.0), _escena_plan(3, 3.3, 1.0)]
+        cues = generar_cues(guion, escenas, DELAY)
+        self.assertEqual([c.texto for c in cues], ["Uno", "Tres"])
+        self.assertEqual((cues[1].inicio, cues[1].fin, cues[1].personaje), (4.1, 5.1, "Carlos"))
+
+    def test_dialogo_largo_se_parte(self):
+        # 5 palabras por línea de 42: 7 líneas, 4 cues (el último con una línea corta)
+        texto = " ".join(["palabra"] * 32)
+        cues = generar_cues(_guion(("Lucas", texto)), [_escena_plan(1, 0, 9.0)], DELAY)
+        self.assertEqual(len(cues), 4)
+        for cue in cues:
+            lineas = cue.texto.split("\n")
+            self.assertLessEqual(len(lineas), 2)
+            self.assertTrue(all(len(linea) <= 42 for linea in lineas))
+        # Contiguos, y la voz entera repartida entre ellos
+        self.assertEqual(cues[0].inicio, DELAY)
+        self.assertEqual([a.fin for a in cues[:-1]], [b.inicio for b in cues[1:]])
+        self.assertAlmostEqual(cues[-1].fin, DELAY + 9.0, places=3)
+        self.assertGreater(cues[0].fin - cues[0].inicio, cues[-1].fin - cues[-1].inicio)
+
+    def test_espacios_del_texto(self):
+        cues = generar_cues(_guion(("Lucas", "  Hola\n   mundo ")), [_escena_plan(1, 0, 1.0)], DELAY)
+        self.assertEqual(cues[0].texto, "Hola mundo")
+
+
+class FormatoTest(unittest.TestCase):
+    CUES = [
+        Cue(0.8, 2.8, "¿Vamos <ya> & ahora?", "Lucas"),
+        Cue(3661.5, 3662.0005, "Primera línea\nsegunda línea", "Sofia"),
+    ]
+
+    def test_webvtt(self):
+        self.assertEqual(a_webvtt(self.CUES), (
+            "WEBVTT\n\n"
+            "00:00:00.800 --> 00:00:02.800\n<v Lucas>¿Vamos &lt;ya&gt; &amp; ahora?\n\n"
+            "01:01:01.500 --> 01:01:02.000\n<v Sofia>Primera línea\nsegunda línea\n"
+        ))
+
+    def test_srt(self):
+        self.assertEqual(a_srt(self.CUES), (
+            "1\n00:00:00,800 --> 00:00:02,800\n¿Vamos <ya> & ahora?\n\n"
+            "2\n01:01:01,500 --> 01:01:02,000\nPrimera línea\nsegunda línea\n\n"
+        ))
+
+    def test_sin_cues(self):
+        self.assertEqual(a_webvtt([]), "WEBVTT\n")
+        self.assertEqual(a_srt([]), "")
+
+    def test_escribir_junto_al_video(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            rutas = escribir_subtitulos(self.CUES, Path(tmp) / "cuento.mp4")
+            self.assertEqual({r.name for r in rutas.values()}, {"cuento.vtt", "cuento.srt"})
+            self.assertEqual(rutas["srt"].read_text(encoding="utf-8"), a_srt(self.CUES))
+
+
+@unittest.skipIf(importlib.util.find_spec("moviepy") is None, "moviepy no está instalado")
+class SubtitularTest(unittest.TestCase):
+    def test_falla_de_la_pista_no_tira_el_video(self):
+        from pipelines.pipeline_video import Pipeline4Video
+
+        pipeline = Pipeline4Video.__new__(Pipeline4Video)
+        pipeline.subtitulos_mp4 = True
+        with tempfile.TemporaryDirectory() as tmp:
+            video = Path(tmp) / "cuento.mp4"
+            video.write_bytes(b"mp4")
+            with mock.patch("pipelines.pipeline_video.incrustar_subtitulos", side_effect=RuntimeError("ffmpeg")), \
+                    contextlib.redirect_stdout(io.StringIO()) as salida:
+                pipeline._subtitular(_guion(("Lucas", "Hola")), [_escena_plan(1, 0, 1.0)], DELAY, video)
+            self.assertTrue(video.with_suffix(".srt").exists())
+            self.assertIn("No se pudo agregar la pista de subtítulos", salida.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
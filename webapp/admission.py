@@ -0,0 +1,220 @@
+"""
+Control de admisión de generaciones de video.
+
+Cada generación son cuatro etapas de APIs pagas más un encode pesado en CPU, así que
+antes de encolar una se pasa por tres filtros:
+  - Token bucket por cliente (usuario logueado o IP): limita cuántas generaciones
+    puede pedir cada uno por hora, con una ráfaga inicial.
+  - Profundidad de cola: si hay demasiadas esperando se rechaza con Retry-After
+    en vez de aceptar trabajo que no se va a atender en un tiempo razonable.
+  - Carriles de prioridad: los usuarios logueados pasan delante de los anónimos, y
+    los anónimos solo pueden ocupar una parte de la cola.
+
+El tope global de concurrencia es el número de hilos trabajadores (MAX_CONCURRENT):
+nunca corren más generaciones a la vez, sin importar cuántas se pidan.
+
+Los límites son por proceso (con N workers de gunicorn/uvicorn el tope real es N
+veces el configurado).
+"""
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+
+CARRIL_PRIORITARIO = 0  # usuarios logueados
+CARRIL_NORMAL = 1       # anónimos
+
+logger = logging.getLogger(__name__)
+
+
+class AdmisionRechazada(Exception):
+    """La generación no se admite ahora; retry_after = segundos sugeridos de espera"""
+
+    def __init__(self, motivo: str, retry_after: int):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = max(1, int(retry_after))
+
+
+@dataclass(slots=True)
+class _Bucket:
+    tokens: float
+    actualizado: float
+
+
+class AdmissionController:
+    """Token bucket por cliente + cola con prioridad atendida por un pool de hilos"""
+
+    def __init__(
+        self,
+        max_concurrentes: int = 2,
+        max_cola: int = 20,
+        max_cola_anonimos: int = 5,
+        por_hora: float = 6,
+        rafaga: int = 3,
+        por_hora_anonimos: float = 2,
+        rafaga_anonimos: int = 1,
+        max_clientes: int = 10000,
+        duracion_estimada: float = 180.0,
+    ):
+        if max_concurrentes < 1:
+            raise ValueError("max_concurrentes debe ser al menos 1")
+        self.max_concurrentes = max_concurrentes
+        self.max_cola = max_cola
+        self.max_cola_anonimos = min(max_cola_anonimos, max_cola)
+        self._limites = {
+            CARRIL_PRIORITARIO: (por_hora / 3600, rafaga),
+            CARRIL_NORMAL: (por_hora_anonimos / 3600, rafaga_anonimos),
+        }
+        self.max_clientes = max_clientes
+
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._cola: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._turno = itertools.count()
+        self._en_cola = {CARRIL_PRIORITARIO: 0, CARRIL_NORMAL: 0}
+        self._activos = 0
+        # Media móvil de la duración de una generación, para estimar Retry-After
+        self._duracion_media = duracion_estimada
+        self._hilos: list[threading.Thread] = []
+
+    # ------------------------------------------------------------------ #
+    # Admisión
+    # ------------------------------------------------------------------ #
+    def verificar(self, clave: str, prioritario: bool) -> None:
+        """
+        Consume un token del cliente. Llamar antes de gastar en nada (ni siquiera
+        la validación ética, que también llama a Deepseek).
+
+        Raises:
+            AdmisionRechazada: Si el cliente agotó su cuota
+        """
+        carril = CARRIL_PRIORITARIO if prioritario else CARRIL_NORMAL
+        tasa, rafaga = self._limites[carril]
+        ahora = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(clave, None) or _Bucket(tokens=rafaga, actualizado=ahora)
+            bucket.tokens = min(rafaga, bucket.tokens + (ahora - bucket.actualizado) * tasa)
+            bucket.actualizado = ahora
+            # Reinsertar al final: el OrderedDict queda ordenado por último uso
+            self._buckets[clave] = bucket
+            while len(self._buckets) > self.max_clientes:
+                self._buckets.popitem(last=False)
+            if bucket.tokens < 1:
+                faltan = (1 - bucket.tokens) / tasa if tasa > 0 else 3600
+                raise AdmisionRechazada(
+                    "Alcanzaste el límite de videos por hora. Intenta más tarde.", math.ceil(faltan)
+                )
+            bucket.tokens -= 1
+
+    def enviar(self, fn: Callable[..., Any], *args, prioritario: bool = False) -> None:
+        """
+        Encola fn(*args) en el carril que corresponde.
+
+        Raises:
+            AdmisionRechazada: Si la cola (o la parte de los anónimos) está llena
+        """
+        carril = CARRIL_PRIORITARIO if prioritario else CARRIL_NORMAL
+        with self._lock:
+            total = sum(self._en_cola.values())
+            lleno = total >= self.max_cola or (
+                carril == CARRIL_NORMAL and self._en_cola[CARRIL_NORMAL] >= self.max_cola_anonimos
+            )
+            if lleno:
+                raise AdmisionRechazada(
+                    "Hay muchos cuentos generándose en este momento. Intenta en unos minutos.",
+                    self._estimar_espera(total),
+                )
+            self._en_cola[carril] += 1
+            self._cola.put((carril, next(self._turno), fn, args))
+            self._arrancar_hilos()
+
+    def estado(self) -> Dict[str, Any]:
+        """Snapshot para logs/monitoreo"""
+        with self._lock:
+            return {
+                "activos": self._activos,
+                "en_cola": self._en_cola[CARRIL_PRIORITARIO] + self._en_cola[CARRIL_NORMAL],
+                "en_cola_prioritarios": self._en_cola[CARRIL_PRIORITARIO],
+                "en_cola_anonimos": self._en_cola[CARRIL_NORMAL],
+                "duracion_media": round(self._duracion_media, 1),
+                "clientes": len(self._buckets),
+            }
+
+    # ------------------------------------------------------------------ #
+    # Pool de trabajadores
+    # ------------------------------------------------------------------ #
+    def _estimar_espera(self, en_cola: int) -> int:
+        rondas = en_cola / self.max_concurrentes + 1
+        return math.ceil(rondas * self._duracion_media)
+
+    def _arrancar_hilos(self) -> None:
+        # Se llama con el lock tomado; los hilos se crean la primera vez que hacen falta
+        while len(self._hilos) < self.max_concurrentes:
+            hilo = threading.Thread(
+                target=self._trabajar, name=f"pipelines_{len(self._hilos)}", daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def _trabajar(self) -> None:
+        while True:
+            carril, _, fn, args = self._cola.get()
+            with self._lock:
+                self._en_cola[carril] -= 1
+                self._activos += 1
+            inicio = time.monotonic()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Falló una tarea admitida")
+            finally:
+                duracion = time.monotonic() - inicio
+                with self._lock:
+                    self._activos -= 1
+                    self._duracion_media = 0.8 * self._duracion_media + 0.2 * duracion
+                self._cola.task_done()
+
+
+def clave_cliente(request, user) -> str:
+    """Clave del token bucket: el usuario si está logueado, si no la IP"""
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def crear_admission_controller(config: Dict[str, Any]) -> AdmissionController:
+    """
+    Construye el controlador desde un dict como settings.ADMISSION:
+        {'MAX_CONCURRENT': 2, 'MAX_QUEUE': 20, 'MAX_QUEUE_ANONYMOUS': 5,
+         'PER_HOUR': 6, 'BURST': 3, 'PER_HOUR_ANONYMOUS': 2, 'BURST_ANONYMOUS': 1}
+    """
+    return AdmissionController(
+        max_concurrentes=config.get("MAX_CONCURRENT", 2),
+        max_cola=config.get("MAX_QUEUE", 20),
+        max_cola_anonimos=config.get("MAX_QUEUE_ANONYMOUS", 5),
+        por_hora=config.get("PER_HOUR", 6),
+        rafaga=config.get("BURST", 3),
+        por_hora_anonimos=config.get("PER_HOUR_ANONYMOUS", 2),
+        rafaga_anonimos=config.get("BURST_ANONYMOUS", 1),
+    )
+
+
+_controller: AdmissionController | None = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Controlador del proceso, configurado con settings.ADMISSION"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = crear_admission_controller(settings.ADMISSION)
+        return _controller
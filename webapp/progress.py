@@ -0,0 +1,519 @@
+"""
+Store de progreso de las generaciones: acotado, con expiración y backend configurable.
+
+Cada tarea es un ProgressRecord de campos fijos (nada de dicts arbitrarios que
+crecen). El store garantiza dos límites:
+  - TTL: las tareas sin actualizar por más de TTL segundos se borran
+  - MAX_ENTRIES: si hay más tareas que el tope, se descartan las más viejas
+
+Backends (settings.PROGRESS_STORE['BACKEND']):
+  - "memory"  En el proceso. Rápido, pero cada worker ve solo sus tareas.
+  - "sqlite"  Archivo SQLite en modo WAL, compartido entre workers (default).
+  - "shm"     Memoria compartida con slots de tamaño fijo, compartida entre los
+              procesos de la misma máquina (ej: workers de gunicorn). Los textos
+              largos se truncan al ancho del slot.
+
+Cada publicación sube un contador seq. El endpoint SSE espera a que seq cambie y
+manda el record nuevo (el id del evento es seq, así el navegador reanuda con
+Last-Event-ID).
+"""
+import asyncio
+import fcntl
+import hashlib
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields, replace
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+from django.conf import settings
+
+ESTADOS = ("processing", "completed", "error")
+ESTADOS_FINALES = ("completed", "error")
+ETAPAS = ("", "guion", "audio", "imagen", "video")
+
+
+@dataclass(slots=True)
+class ProgressRecord:
+    """Progreso de una tarea (campos fijos)"""
+    task_id: str
+    seq: int = 0
+    status: str = "processing"
+    progress: int = 0
+    step: str = ""
+    etapa: str = ""
+    hechas: int = 0          # escenas (o cuadros, en video) hechas de la etapa actual
+    total: int = 0
+    video_id: str = ""
+    moraleja: str = ""
+    error: str = ""
+    resultado_url: str = ""
+    actualizado: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+_CAMPOS = frozenset(f.name for f in fields(ProgressRecord)) - {"task_id", "seq", "actualizado"}
+
+
+def _validar_campos(campos: Dict[str, Any]) -> None:
+    desconocidos = set(campos) - _CAMPOS
+    if desconocidos:
+        raise ValueError(f"Campos de progreso desconocidos: {', '.join(sorted(desconocidos))}")
+    if "status" in campos and campos["status"] not in ESTADOS:
+        raise ValueError(f"Estado de progreso desconocido: {campos['status']!r} (opciones: {', '.join(ESTADOS)})")
+    if "etapa" in campos and campos["etapa"] not in ETAPAS:
+        raise ValueError(f"Etapa de progreso desconocida: {campos['etapa']!r} (opciones: {', '.join(ETAPAS)})")
+
+
+class ProgressStore(ABC):
+    """Interfaz común de los backends"""
+
+    def __init__(self, ttl: float = 24 * 3600, max_entradas: int = 1000):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+
+    @abstractmethod
+    def iniciar(self, task_id: str, **campos: Any) -> int:
+        """Crea (o reinicia) el progreso de una tarea. Devuelve el seq."""
+
+    @abstractmethod
+    def publicar(self, task_id: str, **campos: Any) -> int:
+        """Actualiza campos del record de la tarea y sube seq. Devuelve el seq nuevo."""
+
+    @abstractmethod
+    def obtener(self, task_id: str) -> ProgressRecord | None:
+        """Record actual de la tarea, o None si no existe o expiró"""
+
+    def esperar(self, task_id: str, desde_seq: int, timeout: float, intervalo: float = 0.25) -> ProgressRecord | None:
+        """
+        Espera a que la tarea tenga un seq mayor a desde_seq (o a que se acabe el timeout).
+
+        Es un sondeo local al store (barato): los navegadores ya no sondean al servidor.
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            record = self.obtener(task_id)
+            if record is None or record.seq > desde_seq or time.monotonic() >= limite:
+                return record
+            time.sleep(intervalo)
+
+    async def esperar_async(self, task_id: str, desde_seq: int, timeout: float, intervalo: float = 0.5) -> ProgressRecord | None:
+        """
+        Como esperar(), pero cede el event loop entre sondeos: miles de conexiones SSE
+        en un proceso ASGI no ocupan un hilo cada una. obtener() corre en un hilo (en
+        sqlite es un SELECT que puede esperar el lock de otro worker), igual que en
+        views_async.progreso_api.
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            record = await asyncio.to_thread(self.obtener, task_id)
+            if record is None or record.seq > desde_seq or time.monotonic() >= limite:
+                return record
+            await asyncio.sleep(intervalo)
+
+    def _expirado(self, record: ProgressRecord, ahora: float) -> bool:
+        return record.actualizado < ahora - self.ttl
+
+
+# --------------------------------------------------------------------------- #
+# Backend en memoria
+# --------------------------------------------------------------------------- #
+class MemoryProgressStore(ProgressStore):
+    """OrderedDict por antigüedad de actualización; esperar() usa una Condition (sin sondeo)"""
+
+    def __init__(self, ttl: float = 24 * 3600, max_entradas: int = 1000):
+        super().__init__(ttl, max_entradas)
+        self._records: "OrderedDict[str, ProgressRecord]" = OrderedDict()
+        self._cambio = threading.Condition()
+
+    def _guardar(self, record: ProgressRecord) -> int:
+        # Llamar con self._cambio tomado
+        ahora = time.time()
+        record.actualizado = ahora
+        self._records[record.task_id] = record
+        self._records.move_to_end(record.task_id)
+        # Los más viejos quedan al principio: expirar y recortar desde ahí
+        while self._records:
+            task_id, viejo = next(iter(self._records.items()))
+            if len(self._records) > self.max_entradas or self._expirado(viejo, ahora):
+                del self._records[task_id]
+            else:
+                break
+        self._cambio.notify_all()
+        return record.seq
+
+    def iniciar(self, task_id: str, **campos: Any) -> int:
+        _validar_campos(campos)
+        with self._cambio:
+            previo = self._records.get(task_id)
+            return self._guardar(ProgressRecord(task_id=task_id, seq=(previo.seq if previo else 0) + 1, **campos))
+
+    def publicar(self, task_id: str, **campos: Any) -> int:
+        _validar_campos(campos)
+        with self._cambio:
+            previo = self._records.get(task_id) or ProgressRecord(task_id=task_id)
+            return self._guardar(replace(previo, seq=previo.seq + 1, **campos))
+
+    def obtener(self, task_id: str) -> ProgressRecord | None:
+        with self._cambio:
+            record = self._records.get(task_id)
+            if record is None or self._expirado(record, time.time()):
+                return None
+            return replace(record)
+
+    def esperar(self, task_id: str, desde_seq: int, timeout: float, intervalo: float = 0.25) -> ProgressRecord | None:
+        with self._cambio:
+            self._cambio.wait_for(
+                lambda: (r := self._records.get(task_id)) is None or r.seq > desde_seq,
+                timeout=timeout,
+            )
+        return self.obtener(task_id)
+
+
+# --------------------------------------------------------------------------- #
+# Backend SQLite
+# --------------------------------------------------------------------------- #
+class SQLiteProgressStore(ProgressStore):
+    """Una fila de columnas fijas por tarea. Seguro entre hilos y entre procesos."""
+
+    def __init__(self, path: str | Path, ttl: float = 24 * 3600, max_entradas: int = 1000):
+        super().__init__(ttl, max_entradas)
+        self.path = Path(path)
+        self._local = threading.local()
+        self._columnas = [f.name for f in fields(ProgressRecord)]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conexion().execute(
+            "CREATE TABLE IF NOT EXISTS progreso_tareas ("
+            " task_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, status TEXT NOT NULL,"
+            " progress INTEGER NOT NULL, step TEXT NOT NULL, etapa TEXT NOT NULL,"
+            " hechas INTEGER NOT NULL, total INTEGER NOT NULL, video_id TEXT NOT NULL,"
+            " moraleja TEXT NOT NULL, error TEXT NOT NULL, resultado_url TEXT NOT NULL,"
+            " actualizado REAL NOT NULL)"
+        )
+        self._conexion().execute("CREATE INDEX IF NOT EXISTS progreso_tareas_actualizado ON progreso_tareas (actualizado)")
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _leer(self, conn: sqlite3.Connection, task_id: str) -> ProgressRecord | None:
+        fila = conn.execute(
+            f"SELECT {', '.join(self._columnas)} FROM progreso_tareas WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return ProgressRecord(*fila) if fila else None
+
+    def _escribir(self, task_id: str, construir) -> int:
+        conn = self._conexion()
+        # BEGIN IMMEDIATE toma el lock de escritura antes de leer: read-modify-write atómico entre procesos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record = construir(self._leer(conn, task_id))
+            record.actualizado = time.time()
+            conn.execute(
+                f"INSERT OR REPLACE INTO progreso_tareas ({', '.join(self._columnas)}) "
+                f"VALUES ({', '.join('?' * len(self._columnas))})",
+                astuple_record(record),
+            )
+            conn.execute("DELETE FROM progreso_tareas WHERE actualizado < ?", (record.actualizado - self.ttl,))
+            conn.execute(
+                "DELETE FROM progreso_tareas WHERE task_id IN ("
+                " SELECT task_id FROM progreso_tareas ORDER BY actualizado DESC LIMIT -1 OFFSET ?)",
+                (self.max_entradas,),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return record.seq
+
+    def iniciar(self, task_id: str, **campos: Any) -> int:
+        _validar_campos(campos)
+        return self._escribir(
+            task_id, lambda previo: ProgressRecord(task_id=task_id, seq=(previo.seq if previo else 0) + 1, **campos)
+        )
+
+    def publicar(self, task_id: str, **campos: Any) -> int:
+        _validar_campos(campos)
+
+        def construir(previo):
+            previo = previo or ProgressRecord(task_id=task_id)
+            return replace(previo, seq=previo.seq + 1, **campos)
+
+        return self._escribir(task_id, construir)
+
+    def obtener(self, task_id: str) -> ProgressRecord | None:
+        record = self._leer(self._conexion(), task_id)
+        if record is None or self._expirado(record, time.time()):
+            return None
+        return record
+
+
+def astuple_record(record: ProgressRecord) -> tuple:
+    """Valores del record en el orden de las columnas (sin la copia profunda de dataclasses.astuple)"""
+    return tuple(getattr(record, f.name) for f in fields(ProgressRecord))
+
+
+# --------------------------------------------------------------------------- #
+# Backend de memoria compartida
+# --------------------------------------------------------------------------- #
+def _abrir_shm(nombre: str, **kwargs) -> shared_memory.SharedMemory:
+    """
+    Abre el segmento sin que el resource_tracker lo borre al salir el proceso: es
+    compartido por todos los workers y debe sobrevivir a cualquiera de ellos.
+    """
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False, **kwargs)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=nombre, **kwargs)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedMemoryProgressStore(ProgressStore):
+    """
+    Tabla hash de slots de tamaño fijo en multiprocessing.shared_memory.
+
+    La capacidad es max_entradas slots. Cada tarea vive en una ventana de SONDEO
+    slots a partir de su hash: al llenarse la ventana, una tarea nueva ocupa el slot
+    expirado o más viejo de ella. Así buscar una tarea desconocida o expirada (lo
+    que hace el SSE cada medio segundo) recorre a lo sumo SONDEO slots, y cada
+    proceso recuerda en qué slot vio cada tarea.
+
+    Las escrituras se serializan con flock sobre un archivo de lock, así varios
+    procesos pueden compartir el segmento. Las lecturas no toman el lock: cada slot
+    empieza con un contador de versión que el escritor deja impar mientras escribe;
+    el lector relee hasta ver la misma versión par antes y después.
+    """
+
+    # Contador de versión del slot (impar = escribiendo)
+    _VERSION = struct.Struct("<I")
+    # task_id, seq, status, progress, etapa, hechas, total, actualizado,
+    # video_id, step, moraleja, error, resultado_url
+    _FORMATO = struct.Struct("<16s I B B B I I d 24s 96s 160s 200s 64s")
+    _TEXTOS = {"task_id": 16, "video_id": 24, "step": 96, "moraleja": 160, "error": 200, "resultado_url": 64}
+    _TAMANO_SLOT = _VERSION.size + _FORMATO.size
+    # Cambia si cambia el formato del slot: un segmento viejo no se reinterpreta
+    _VERSION_FORMATO = 2
+    SONDEO = 32
+    _REINTENTOS_LECTURA = 100
+
+    def __init__(self, nombre: str = "cuentos_progreso", ttl: float = 24 * 3600, max_entradas: int = 1000):
+        super().__init__(ttl, max_entradas)
+        tamano = self._TAMANO_SLOT * max_entradas
+        segmento = f"{nombre}_v{self._VERSION_FORMATO}"
+        try:
+            self._shm = _abrir_shm(segmento, create=True, size=tamano)
+        except FileExistsError:
+            self._shm = _abrir_shm(segmento)
+            if self._shm.size < tamano:
+                raise RuntimeError(
+                    f"El segmento compartido '{segmento}' tiene {self._shm.size} bytes y se necesitan {tamano}; "
+                    "cambiaste MAX_ENTRIES con procesos corriendo"
+                )
+        self._lock_path = Path(tempfile.gettempdir()) / f"{nombre}.lock"
+        self._lock_thread = threading.Lock()
+        # task_id -> slot donde este proceso la vio por última vez (se verifica al leer)
+        self._indice: Dict[str, int] = {}
+
+    # -- codificación --------------------------------------------------------
+    @staticmethod
+    def _texto(valor: str, ancho: int) -> bytes:
+        datos = valor.encode("utf-8")[:ancho]
+        # No cortar un carácter multibyte a la mitad
+        return datos.decode("utf-8", errors="ignore").encode("utf-8")
+
+    def _clave(self, task_id: str) -> bytes:
+        """task_id tal como queda en el slot (truncado y con relleno de ceros)"""
+        return self._texto(task_id, self._TEXTOS["task_id"]).ljust(self._TEXTOS["task_id"], b"\0")
+
+    def _empaquetar(self, r: ProgressRecord) -> bytes:
+        t = self._TEXTOS
+        return self._FORMATO.pack(
+            self._texto(r.task_id, t["task_id"]), r.seq & 0xFFFFFFFF, ESTADOS.index(r.status),
+            max(0, min(r.progress, 255)), ETAPAS.index(r.etapa), r.hechas, r.total, r.actualizado,
+            self._texto(r.video_id, t["video_id"]), self._texto(r.step, t["step"]),
+            self._texto(r.moraleja, t["moraleja"]), self._texto(r.error, t["error"]),
+            self._texto(r.resultado_url, t["resultado_url"]),
+        )
+
+    @staticmethod
+    def _record(campos: tuple) -> ProgressRecord | None:
+        (task_id, seq, status, progress, etapa, hechas, total, actualizado,
+         video_id, step, moraleja, error, resultado_url) = campos
+        if not task_id.strip(b"\0") or status >= len(ESTADOS) or etapa >= len(ETAPAS):
+            return None
+        texto = lambda b: b.rstrip(b"\0").decode("utf-8", errors="ignore")
+        return ProgressRecord(
+            task_id=texto(task_id), seq=seq, status=ESTADOS[status], progress=progress,
+            step=texto(step), etapa=ETAPAS[etapa], hechas=hechas, total=total,
+            video_id=texto(video_id), moraleja=texto(moraleja), error=texto(error),
+            resultado_url=texto(resultado_url), actualizado=actualizado,
+        )
+
+    # -- slots ---------------------------------------------------------------
+    def _slots(self, task_id: str):
+        """Ventana de sondeo lineal desde el hash de la tarea"""
+        inicio = int.from_bytes(hashlib.blake2b(task_id.encode("utf-8"), digest_size=8).digest(), "little")
+        for i in range(min(self.SONDEO, self.max_entradas)):
+            yield (inicio + i) % self.max_entradas
+
+    def _leer(self, slot: int, bloqueado: bool = False) -> ProgressRecord | None:
+        """
+        Record del slot. Sin el lock (bloqueado=False) se relee si un escritor lo
+        estaba cambiando; con el lock tomado no hay escritores y se lee directo.
+        """
+        base = slot * self._TAMANO_SLOT
+        buf = self._shm.buf
+        if bloqueado:
+            return self._record(self._FORMATO.unpack_from(buf, base + self._VERSION.size))
+        for _ in range(self._REINTENTOS_LECTURA):
+            antes = self._VERSION.unpack_from(buf, base)[0]
+            if antes % 2 == 0:
+                campos = self._FORMATO.unpack_from(buf, base + self._VERSION.size)
+                if self._VERSION.unpack_from(buf, base)[0] == antes:
+                    return self._record(campos)
+            time.sleep(0)  # ceder al escritor
+        # Escritor muy lento o que murió a mitad de escritura: leer con el lock
+        with self._bloqueo():
+            return self._leer(slot, bloqueado=True)
+
+    def _grabar(self, slot: int, record: ProgressRecord) -> None:
+        """Escribe el slot (llamar con el lock tomado)"""
+        base = slot * self._TAMANO_SLOT
+        buf = self._shm.buf
+        version = self._VERSION.unpack_from(buf, base)[0] | 1
+        self._VERSION.pack_into(buf, base, version)
+        buf[base + self._VERSION.size:base + self._TAMANO_SLOT] = self._empaquetar(record)
+        self._VERSION.pack_into(buf, base, (version + 1) & 0xFFFFFFFF)
+
+    def _buscar(self, task_id: str, bloqueado: bool = False) -> Tuple[int | None, ProgressRecord | None]:
+        clave = self._clave(task_id)
+        ancho = self._TEXTOS["task_id"]
+        buf = self._shm.buf
+        slot = self._indice.get(task_id)
+        if slot is not None:
+            record = self._leer(slot, bloqueado)
+            if record is not None and self._clave(record.task_id) == clave:
+                return slot, record
+            self._indice.pop(task_id, None)  # otra tarea ocupó el slot
+
+        for slot in self._slots(task_id):
+            inicio = slot * self._TAMANO_SLOT + self._VERSION.size
+            guardada = bytes(buf[inicio:inicio + ancho])
+            if not guardada.strip(b"\0"):
+                return None, None  # un slot vacío corta la cadena de sondeo
+            if guardada != clave:
+                continue
+            # Solo se decodifica el slot de la tarea (y se relee si estaba a medio escribir)
+            record = self._leer(slot, bloqueado)
+            if record is not None and self._clave(record.task_id) == clave:
+                if len(self._indice) >= self.max_entradas:
+                    self._indice.clear()
+                self._indice[task_id] = slot
+                return slot, record
+        return None, None
+
+    def _slot_libre(self, task_id: str, ahora: float) -> int:
+        """Primer slot vacío o expirado en la ventana de la tarea; si no hay, el más viejo de ella"""
+        mas_viejo, fecha_mas_vieja = None, float("inf")
+        for slot in self._slots(task_id):
+            record = self._leer(slot, bloqueado=True)
+            if record is None or self._expirado(record, ahora):
+                return slot
+            if record.actualizado < fecha_mas_vieja:
+                mas_viejo, fecha_mas_vieja = slot, record.actualizado
+        return mas_viejo
+
+    @contextmanager
+    def _bloqueo(self) -> Iterator[None]:
+        with self._lock_thread, open(self._lock_path, "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _escribir(self, task_id: str, construir) -> int:
+        with self._bloqueo():
+            ahora = time.time()
+            slot, previo = self._buscar(task_id, bloqueado=True)
+            if slot is None:
+                slot = self._slot_libre(task_id, ahora)
+            record = construir(previo)
+            record.actualizado = ahora
+            self._grabar(slot, record)
+            self._indice[task_id] = slot
+            return record.seq
+
+    def iniciar(self, task_id: str, **campos: Any) -> int:
+        _validar_campos(campos)
+        return self._escribir(
+            task_id, lambda previo: ProgressRecord(task_id=task_id, seq=(previo.seq if previo else 0) + 1, **campos)
+        )
+
+    def publicar(self, task_id: str, **campos: Any) -> int:
+        _validar_campos(campos)
+
+        def construir(previo):
+            previo = previo or ProgressRecord(task_id=task_id)
+            return replace(previo, seq=previo.seq + 1, **campos)
+
+        return self._escribir(task_id, construir)
+
+    def obtener(self, task_id: str) -> ProgressRecord | None:
+        _, record = self._buscar(task_id)
+        if record is None or self._expirado(record, time.time()):
+            return None
+        return record
+
+
+# --------------------------------------------------------------------------- #
+# Configuración
+# --------------------------------------------------------------------------- #
+BACKENDS = {
+    "memory": MemoryProgressStore,
+    "sqlite": SQLiteProgressStore,
+    "shm": SharedMemoryProgressStore,
+}
+
+_store: ProgressStore | None = None
+_store_lock = threading.Lock()
+
+
+def crear_progress_store(config: Dict[str, Any]) -> ProgressStore:
+    """
+    Construye un store desde un dict como settings.PROGRESS_STORE:
+        {'BACKEND': 'sqlite', 'TTL': 86400, 'MAX_ENTRIES': 1000, 'OPTIONS': {'path': ...}}
+    """
+    backend = config.get("BACKEND", "sqlite")
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de progreso desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[backend](
+        ttl=config.get("TTL", 24 * 3600),
+        max_entradas=config.get("MAX_ENTRIES", 1000),
+        **config.get("OPTIONS", {}),
+    )
+
+
+def get_progress_store() -> ProgressStore:
+    """Store del proceso, configurado con settings.PROGRESS_STORE"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = crear_progress_store(settings.PROGRESS_STORE)
+        return _store
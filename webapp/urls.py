@@ -1,14 +1,22 @@
 """
 URLs de la aplicación web de cuentos infantiles
 """
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
+
+# Bajo ASGI se usan las variantes async de las vistas de generación y progreso
+v = views_async if settings.ASYNC_VIEWS else views
 
 app_name = 'webapp'
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('generar/', views.generar_video, name='generar_video'),
+    path('', v.index, name='index'),
+    path('generar/', v.generar_video, name='generar_video'),
+    path('reintentar/<str:task_id>/', views.reintentar, name='reintentar'),
     path('resultado/<str:video_id>/', views.resultado, name='resultado'),
-    path('api/progreso/<str:task_id>/', views.progreso_api, name='progreso_api'),
+    path('preview/<str:nombre>', views.preview, name='preview'),
+    path('progreso/<str:task_id>/', views.progreso, name='progreso'),
+    path('api/progreso/<str:task_id>/', v.progreso_api, name='progreso_api'),
+    path('api/progreso/<str:task_id>/stream/', v.progreso_stream, name='progreso_stream'),
 ]
@@ -4,35 +4,92 @@ Integra con los pipelines existentes sin modificarlos
 """
 
 import json
+import re
+import threading
 import uuid
 from pathlib import Path
 import logging
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.conf import settings
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 
 # Importar los pipelines existentes (sin modificar tu código)
-from pipelines import Pipeline1Guion, Pipeline2Audio, Pipeline3Imagen, Pipeline4Video
+from pipelines import RunManifest, RunReport
+from pipelines.registry import get_registry
+from pipelines.renditions import leer_indice, elegir_rendition
+from pipelines.previews import PATRON_NOMBRE, leer_previews
+
+from .admission import AdmisionRechazada, clave_cliente, get_admission_controller
+from .progress import get_progress_store, ESTADOS_FINALES
 
 # Importar el agente educativo
 from agents import EduAgent
-import json
-import os
-import uuid
-from pathlib import Path
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
-from django.conf import settings
-from django.views.decorators.csrf import csrf_exempt
 
-# Importar los pipelines existentes (sin modificar tu código)
-from pipelines import Pipeline1Guion, Pipeline2Audio, Pipeline3Imagen, Pipeline4Video
 
+# Cada cuánto se manda un comentario SSE para que proxies no corten la conexión
+SSE_HEARTBEAT = 15
+# Tope de duración de una conexión SSE (el navegador reconecta solo con Last-Event-ID)
+SSE_MAX_DURACION = 300
+# Bajo WSGI no se mantienen conexiones abiertas: la página sondea cada tanto
+PROGRESO_SONDEO_MS = 2000
+
+# Entre leer el estado de un run y marcarlo 'processing' no puede colarse otro reintento
+_reintentos_lock = threading.Lock()
+
+# Pósters y miniaturas llevan el hash de su imagen en el nombre: nunca cambian
+PREVIEW_CACHE_SEGUNDOS = 365 * 24 * 3600
 
-# Almacenamiento temporal del progreso (en producción usar Redis/DB)
-PROGRESS_STORAGE = {}
+
+# Videos de ejemplo pre-generados
+EJEMPLOS = [
+    {
+        'id': 'compartir',
+        'titulo': 'La Importancia de Compartir',
+        'descripcion': 'Aprende por qué compartir con los demás nos hace felices',
+        'video_id': 'video_3a6c25c5',  # ID del video para usar con la vista resultado (sin .mp4)
+        'duracion': '8 min',
+    },
+    {
+        'id': 'extranos',
+        'titulo': 'No Hablar con Extraños',
+        'descripcion': 'Aprende a estar seguro y protegido',
+        'video_id': 'ejemplo_extranos',
+        'duracion': '7 min',
+    },
+    {
+        'id': 'honesto',
+        'titulo': 'Ser Honesto Siempre',
+        'descripcion': 'La verdad siempre es el mejor camino',
+        'video_id': 'ejemplo_honesto',
+        'duracion': '8 min',
+    },
+    {
+        'id': 'ambiente',
+        'titulo': 'Cuidar el Medio Ambiente',
+        'descripcion': 'Pequeñas acciones para un planeta mejor',
+        'video_id': 'ejemplo_ambiente',
+        'duracion': '9 min',
+    },
+]
+
+
+def _previews_urls(video_id):
+    """URLs del póster y la miniatura de un video (ver pipelines/previews.py), o None"""
+    previews = leer_previews(settings.MEDIA_ROOT / f"{video_id}.mp4")
+    if previews is None:
+        return None
+    return {
+        tamano: {formato: reverse('webapp:preview', kwargs={'nombre': previews[tamano][formato]}) for formato in ('webp', 'jpg')}
+        for tamano in ('poster', 'thumb')
+    }
+
+
+def _ejemplos():
+    """Videos de ejemplo con su miniatura (la que Pipeline 4 generó para cada video)"""
+    return [{**ejemplo, 'previews': _previews_urls(ejemplo['video_id'])} for ejemplo in EJEMPLOS]
 
 
 def index(request):
@@ -57,44 +114,8 @@ def index(request):
         agent = EduAgent()
         sugerencias = agent.obtener_sugerencias(n=5)
     
-    # Videos de ejemplo pre-generados
-    ejemplos = [
-        {
-            'id': 'compartir',
-            'titulo': 'La Importancia de Compartir',
-            'descripcion': 'Aprende por qué compartir con los demás nos hace felices',
-            'thumbnail': 'ejemplos/compartir_thumb.jpg',
-            'video_id': 'video_3a6c25c5',  # ID del video para usar con la vista resultado (sin .mp4)
-            'duracion': '8 min',
-        },
-        {
-            'id': 'extranos',
-            'titulo': 'No Hablar con Extraños',
-            'descripcion': 'Aprende a estar seguro y protegido',
-            'thumbnail': 'ejemplos/extranos_thumb.jpg',
-            'video_id': 'ejemplo_extranos',
-            'duracion': '7 min',
-        },
-        {
-            'id': 'honesto',
-            'titulo': 'Ser Honesto Siempre',
-            'descripcion': 'La verdad siempre es el mejor camino',
-            'thumbnail': 'ejemplos/honesto_thumb.jpg',
-            'video_id': 'ejemplo_honesto',
-            'duracion': '8 min',
-        },
-        {
-            'id': 'ambiente',
-            'titulo': 'Cuidar el Medio Ambiente',
-            'descripcion': 'Pequeñas acciones para un planeta mejor',
-            'thumbnail': 'ejemplos/ambiente_thumb.jpg',
-            'video_id': 'ejemplo_ambiente',
-            'duracion': '9 min',
-        },
-    ]
-    
     return render(request, 'index.html', {
-        'ejemplos': ejemplos,
+        'ejemplos': _ejemplos(),
         'sugerencias': sugerencias
     })
 
@@ -114,6 +135,13 @@ def generar_video(request):
     if not moraleja:
         return redirect('webapp:index')
     
+    # Cuota por usuario/IP: se cobra antes de gastar en la validación
+    prioritario = request.user.is_authenticated
+    try:
+        get_admission_controller().verificar(clave_cliente(request, request.user), prioritario)
+    except AdmisionRechazada as e:
+        return _rechazo(request, e)
+    
     # 🆕 VALIDACIÓN ÉTICA con el agente
     agent = EduAgent(request.user.perfil if request.user.is_authenticated and hasattr(request.user, 'perfil') else None)
     validacion = agent.validar_moraleja(moraleja)
@@ -131,75 +159,186 @@ def generar_video(request):
     if request.user.is_authenticated and hasattr(request.user, 'perfil'):
         agent.marcar_video_generado(moraleja)
     
-    # Generar ID único para esta tarea
+    # Generar ID único para esta tarea (también es el run_id del manifiesto)
     task_id = str(uuid.uuid4())[:8]
-    video_id = f"video_{task_id}"
+    manifest = RunManifest.crear(moraleja, run_id=task_id, base_dir=settings.RUNS_ROOT)
     
-    # Inicializar progreso
-    PROGRESS_STORAGE[task_id] = {
-        'step': 'Iniciando...',
-        'progress': 0,
-        'video_id': video_id,
-        'moraleja': moraleja,
-        'status': 'processing'
-    }
+    try:
+        _lanzar(manifest, prioritario)
+    except AdmisionRechazada as e:
+        return _rechazo(request, e, task_id=task_id)
+    return redirect('webapp:progreso', task_id=task_id)
+
+
+@csrf_exempt
+def reintentar(request, task_id):
+    """Reanuda un run fallido: solo se regeneran las etapas y escenas que faltan"""
+    
+    if request.method != 'POST':
+        return redirect('webapp:index')
+    
+    try:
+        manifest = RunManifest.cargar(task_id, base_dir=settings.RUNS_ROOT)
+    except FileNotFoundError:
+        return render(request, 'error.html', {
+            'error_message': 'No se encontró la generación a reintentar.'
+        })
+    
+    prioritario = request.user.is_authenticated
+    with _reintentos_lock:
+        # Un run que sigue corriendo no se relanza: serían dos workers sobre el mismo
+        # directorio, manifiesto y archivos de salida
+        estado = get_progress_store().obtener(task_id)
+        if estado is not None and estado.status not in ESTADOS_FINALES:
+            return render(request, 'error.html', {
+                'error_title': 'Generación en curso',
+                'error_message': 'Esta generación todavía se está procesando; espera a que termine antes de reintentar.',
+            }, status=409)
+        try:
+            get_admission_controller().verificar(clave_cliente(request, request.user), prioritario)
+            _lanzar(manifest, prioritario)
+        except AdmisionRechazada as e:
+            return _rechazo(request, e, task_id=task_id)
+    return redirect('webapp:progreso', task_id=task_id)
+
+
+def _rechazo(request, error, task_id=None):
+    """Respuesta 429 con Retry-After cuando el control de admisión no deja pasar"""
+    response = render(request, 'error.html', {
+        'error_title': 'Demasiadas solicitudes',
+        'error_message': f"{error.motivo} (en unos {max(1, error.retry_after // 60)} min)",
+        'task_id': task_id,
+    }, status=429)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def _lanzar(manifest, prioritario=False):
+    """
+    Publica el progreso inicial y encola la generación en segundo plano.
     
+    Raises:
+        AdmisionRechazada: Si la cola está llena (el run queda en error y se puede reintentar)
+    """
+    store = get_progress_store()
+    store.iniciar(
+        manifest.run_id,
+        step='En cola...',
+        progress=0,
+        status='processing',
+        video_id=f"video_{manifest.run_id}",
+        moraleja=manifest.moraleja,
+    )
     try:
-        # PIPELINE 1: Guion
-        PROGRESS_STORAGE[task_id].update({'step': 'Generando guion...', 'progress': 10})
-        pipeline1 = Pipeline1Guion()
-        guion_path = f"guion_{task_id}.json"
-        guion = pipeline1.generar(moraleja, output_path=guion_path)
+        get_admission_controller().enviar(_ejecutar_pipelines, manifest, prioritario=prioritario)
+    except AdmisionRechazada as e:
+        store.publicar(manifest.run_id, status='error', step='Rechazado', error=e.motivo)
+        raise
+
+
+def _ejecutar_pipelines(manifest):
+    """Ejecuta (o reanuda) los 4 pipelines para un run, publicando el progreso en el store"""
+    
+    # Tiempos por etapa/escena/llamada externa -> <run>/report.json
+    reporte = RunReport(manifest.run_id)
+    try:
+        with reporte.activo():
+            _ejecutar_pipelines_run(manifest)
+    except Exception:
+        logging.getLogger(__name__).exception(f"Falló la generación del run {manifest.run_id}")
+    finally:
+        reporte.guardar(manifest.dir / "report.json")
+
+
+def _avance(task_id, etapa, texto, desde, hasta):
+    """Callback on_progreso(hechas, total) que publica el avance de una etapa por escena"""
+    store = get_progress_store()
+    
+    def on_progreso(hechas, total):
+        store.publicar(
+            task_id,
+            step=f"{texto} ({hechas}/{total})",
+            progress=desde + (hasta - desde) * hechas // max(total, 1),
+            etapa=etapa,
+            hechas=hechas,
+            total=total,
+        )
+    
+    return on_progreso
+
+
+def _ejecutar_pipelines_run(manifest):
+    store = get_progress_store()
+    task_id = manifest.run_id
+    moraleja = manifest.moraleja
+    video_id = f"video_{task_id}"
+    # Instancias compartidas por todo el proceso (clientes y configs ya cargados)
+    registro = get_registry()
+    
+    try:
+        # PIPELINE 1: Guion (en memoria; el checkpoint queda en el directorio del run)
+        store.publicar(task_id, step='Generando guion...', progress=5, etapa='guion', hechas=0, total=0)
+        pipeline1 = registro.get('guion')
+        guion = pipeline1.generar(moraleja, manifest=manifest)
         
-        # PIPELINE 2: Audio (placeholder por ahora)
-        PROGRESS_STORAGE[task_id].update({'step': 'Generando voces...', 'progress': 30})
-        pipeline2 = Pipeline2Audio()
-        audio_files = pipeline2.generar(guion_path=guion_path)
+        # PIPELINE 2: Audio
+        store.publicar(task_id, step='Generando voces...', progress=10, etapa='audio', hechas=0, total=0)
+        pipeline2 = registro.get('audio')
+        audio_files = pipeline2.generar(
+            guion, manifest=manifest,
+            on_progreso=_avance(task_id, 'audio', 'Generando voces...', 10, 40)
+        )
         
-        # PIPELINE 3: Imágenes (placeholder por ahora)
-        PROGRESS_STORAGE[task_id].update({'step': 'Generando imágenes...', 'progress': 60})
-        pipeline3 = Pipeline3Imagen()
-        image_files = pipeline3.generar(guion_path=guion_path)
+        # Plan de render: si el video excede los límites del job, se corta antes de las imágenes
+        pipeline4 = registro.get('video')
+        plan = pipeline4.planificar(guion, manifest=manifest)
         
-        # PIPELINE 4: Video
-        PROGRESS_STORAGE[task_id].update({'step': 'Ensamblando video...', 'progress': 90})
-        pipeline4 = Pipeline4Video()
-        video_path = pipeline4.generar(guion_path=guion_path, output_name=f"{video_id}.mp4")
+        # PIPELINE 3: Imágenes
+        store.publicar(task_id, step='Generando imágenes...', progress=40, etapa='imagen', hechas=0, total=0)
+        pipeline3 = registro.get('imagen')
+        image_files = pipeline3.generar(
+            guion, manifest=manifest,
+            on_progreso=_avance(task_id, 'imagen', 'Generando imágenes...', 40, 70)
+        )
         
-        # Completado
-        PROGRESS_STORAGE[task_id].update({
-            'step': 'Completado',
-            'progress': 100,
-            'status': 'completed',
-            'video_path': video_path
-        })
+        # PIPELINE 4: Video (progreso por cuadros codificados)
+        store.publicar(task_id, step='Ensamblando video...', progress=70, etapa='video', hechas=0, total=0)
+        video_path = pipeline4.generar(
+            guion, output_name=f"{video_id}.mp4", manifest=manifest, plan=plan,
+            on_progreso=_avance(task_id, 'video', 'Ensamblando video...', 70, 99)
+        )
         
         # Guardar metadata del video
         metadata = {
             'moraleja': moraleja,
-            'titulo': guion.get('guion', {}).get('metadata', {}).get('titulo', 'Sin título'),
-            'duracion': guion.get('guion', {}).get('metadata', {}).get('duracion_estimada', 'N/A'),
-            'num_escenas': len(guion.get('guion', {}).get('escenas', [])),
+            'titulo': guion.metadata.titulo,
+            'duracion': guion.metadata.duracion_estimada or 'N/A',
+            'num_escenas': len(guion.escenas),
         }
         
         metadata_path = settings.MEDIA_ROOT / f"{video_id}_metadata.json"
         with open(metadata_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         
+        # Completado
+        store.publicar(
+            task_id,
+            step='Completado',
+            progress=100,
+            status='completed',
+            resultado_url=reverse('webapp:resultado', kwargs={'video_id': video_id}),
+        )
+        
     except Exception as e:
-        PROGRESS_STORAGE[task_id].update({
-            'step': 'Error',
-            'progress': 0,
-            'status': 'error',
-            'error': str(e)
-        })
-        return render(request, 'error.html', {'error': str(e)})
-    
-    return redirect('webapp:resultado', video_id=video_id)
+        store.publicar(task_id, step='Error', status='error', error=str(e))
+        raise
 
 
 def resultado(request, video_id):
-    """Muestra el video generado"""
+    """
+    Muestra el video generado. Si se generó en varias calidades, entrega la pedida con
+    ?calidad=360p, la más chica si el navegador manda Save-Data, o si no la más alta.
+    """
     
     video_path = settings.MEDIA_ROOT / f"{video_id}.mp4"
     metadata_path = settings.MEDIA_ROOT / f"{video_id}_metadata.json"
@@ -215,20 +354,104 @@ def resultado(request, video_id):
         with open(metadata_path, 'r', encoding='utf-8') as f:
             metadata = json.load(f)
     
+    # Subtítulos (Pipeline 4 los escribe al lado del video)
+    subtitulos_url = None
+    if (settings.MEDIA_ROOT / f"{video_id}.vtt").exists():
+        subtitulos_url = f'/media/{video_id}.vtt'
+    
+    # Renditions (Pipeline 4 con escalera): <video_id>.renditions.json
+    video_url = f'/media/{video_id}.mp4'
+    calidades = []
+    calidad = None
+    indice = leer_indice(video_path)
+    if indice is not None:
+        elegida = elegir_rendition(
+            indice,
+            calidad=request.GET.get('calidad'),
+            ahorro_datos=request.headers.get('Save-Data', '').lower() == 'on',
+        )
+        video_url = f"/media/{elegida['archivo']}"
+        calidad = elegida['nombre']
+        calidades = [r['nombre'] for r in indice['renditions']]
+    
     return render(request, 'result.html', {
         'video_id': video_id,
-        'video_url': f'/media/{video_id}.mp4',
+        'video_url': video_url,
+        'subtitulos_url': subtitulos_url,
+        'previews': _previews_urls(video_id),
+        'calidad': calidad,
+        'calidades': calidades,
         'metadata': metadata
     })
 
 
+def preview(request, nombre):
+    """Póster o miniatura de un video, con cache de un año (el nombre cambia si cambia la imagen)"""
+    
+    if not re.match(PATRON_NOMBRE, nombre):
+        raise Http404('Preview no encontrado')
+    path = settings.MEDIA_ROOT / nombre
+    if not path.exists():
+        raise Http404('Preview no encontrado')
+    
+    response = FileResponse(open(path, 'rb'), content_type='image/webp' if nombre.endswith('.webp') else 'image/jpeg')
+    response['Cache-Control'] = f'public, max-age={PREVIEW_CACHE_SEGUNDOS}, immutable'
+    return response
+
+
+def progreso(request, task_id):
+    """Página que muestra el progreso de una generación (se suscribe al stream SSE)"""
+    
+    estado = get_progress_store().obtener(task_id)
+    if estado is None:
+        return render(request, 'error.html', {
+            'error_message': 'No se encontró la generación solicitada.'
+        })
+    
+    return render(request, 'progreso.html', {
+        'task_id': task_id,
+        'estado': estado.to_dict(),
+        # SSE solo bajo ASGI; con workers sync cada conexión abierta ocuparía un hilo
+        'sse': settings.ASYNC_VIEWS,
+        'sondeo_ms': PROGRESO_SONDEO_MS,
+    })
+
+
 def progreso_api(request, task_id):
-    """API para consultar el progreso de una tarea"""
+    """API para consultar el progreso de una tarea (snapshot)"""
     
-    progress = PROGRESS_STORAGE.get(task_id, {
+    progress = get_progress_store().obtener(task_id)
+    
+    return JsonResponse(progress.to_dict() if progress else {
         'step': 'Desconocido',
         'progress': 0,
         'status': 'not_found'
     })
+
+
+def progreso_stream(request, task_id):
+    """
+    Progreso en formato SSE para el despliegue sync (WSGI): manda el snapshot, si
+    cambió desde Last-Event-ID, y cierra la respuesta.
+    
+    Con workers sync una conexión abierta ocupa un hilo hasta SSE_MAX_DURACION y unas
+    pocas pestañas agotan el pool, así que acá no se espera: un EventSource reconecta
+    solo a los `retry` ms, lo que equivale a sondear (la página de progreso sondea
+    progreso_api directamente). Bajo ASGI esta ruta usa views_async.progreso_stream,
+    que sí mantiene la conexión abierta.
+    """
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        desde = 0
+    
+    estado = get_progress_store().obtener(task_id)
+    eventos = [f"retry: {PROGRESO_SONDEO_MS}\n\n"]
+    if estado is None:
+        eventos.append("event: not_found\ndata: {}\n\n")
+    elif estado.seq > desde:
+        eventos.append(f"id: {estado.seq}\ndata: {json.dumps(estado.to_dict(), ensure_ascii=False)}\n\n")
     
-    return JsonResponse(progress)
+    response = HttpResponse("".join(eventos), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
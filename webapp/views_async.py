@@ -0,0 +1,160 @@
+"""
+Variantes async (ASGI) de las vistas de generación.
+
+Las llamadas a Deepseek (validación ética y sugerencias) usan httpx sin bloquear el
+event loop, el ORM pasa por sync_to_async y los pipelines siguen corriendo en el
+pool del control de admisión (webapp/admission.py). Así un solo proceso ASGI aguanta miles de conexiones de
+progreso abiertas y validaciones concurrentes.
+
+Se activan con ASYNC_VIEWS=1 (config/asgi.py lo define por defecto).
+"""
+
+import json
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.views.decorators.csrf import csrf_exempt
+
+from pipelines import RunManifest
+
+from .admission import AdmisionRechazada, clave_cliente, get_admission_controller
+from .progress import get_progress_store, ESTADOS_FINALES
+from .views import SSE_HEARTBEAT, SSE_MAX_DURACION, _lanzar, _rechazo, _ejemplos
+
+from agents import EduAgent
+
+
+def _perfil(user):
+    """Perfil del usuario logueado o None (accede al ORM: llamar vía sync_to_async)"""
+    if user.is_authenticated:
+        return getattr(user, 'perfil', None)
+    return None
+
+
+def _registrar_mostradas(agent, sugerencias):
+    for sug in sugerencias:
+        agent.registrar_interaccion(
+            moraleja=sug['moraleja'],
+            razon=sug['razon'],
+            valores=sug['valores'],
+            seleccionada=False
+        )
+
+
+async def index(request):
+    """Página principal con input y ejemplos de videos"""
+
+    perfil = await sync_to_async(_perfil)(await request.auser())
+    agent = EduAgent(perfil)
+    sugerencias = await agent.obtener_sugerencias_async(n=5)
+
+    # Registrar que se mostraron estas sugerencias
+    if perfil is not None:
+        await sync_to_async(_registrar_mostradas)(agent, sugerencias)
+
+    return await sync_to_async(render)(request, 'index.html', {
+        'ejemplos': await sync_to_async(_ejemplos)(),
+        'sugerencias': sugerencias
+    })
+
+
+@csrf_exempt
+async def generar_video(request):
+    """Genera un video usando los pipelines existentes"""
+
+    if request.method != 'POST':
+        return redirect('webapp:index')
+
+    moraleja = request.POST.get('moraleja', '').strip()
+    user = await request.auser()
+
+    if not moraleja:
+        return redirect('webapp:index')
+
+    # Cuota por usuario/IP: se cobra antes de gastar en la validación
+    prioritario = user.is_authenticated
+    try:
+        get_admission_controller().verificar(clave_cliente(request, user), prioritario)
+    except AdmisionRechazada as e:
+        return await sync_to_async(_rechazo)(request, e)
+
+    # 🆕 VALIDACIÓN ÉTICA con el agente (sin bloquear el event loop)
+    perfil = await sync_to_async(_perfil)(user)
+    agent = EduAgent(perfil)
+    validacion = await agent.validar_moraleja_async(moraleja)
+
+    if not validacion.get('es_valida', False):
+        return await sync_to_async(render)(request, 'error.html', {
+            'error_title': 'Contenido No Apropiado',
+            'error_message': validacion.get('razon', 'Esta moraleja no es apropiada para contenido infantil.'),
+            'error_type': 'filtro_etico',
+            'valores_detectados': validacion.get('valores_detectados', []),
+            'nivel': validacion.get('nivel_apropiado', 'rechazado')
+        })
+
+    # Registrar que el usuario seleccionó esta moraleja
+    if perfil is not None:
+        await sync_to_async(agent.marcar_video_generado)(moraleja)
+
+    # Crear el manifiesto y encolar: los pipelines corren en el pool de admisión
+    task_id = str(uuid.uuid4())[:8]
+
+    def crear_y_lanzar():
+        manifest = RunManifest.crear(moraleja, run_id=task_id, base_dir=settings.RUNS_ROOT)
+        _lanzar(manifest, prioritario)
+
+    try:
+        await sync_to_async(crear_y_lanzar, thread_sensitive=False)()
+    except AdmisionRechazada as e:
+        return await sync_to_async(_rechazo)(request, e, task_id=task_id)
+    return redirect('webapp:progreso', task_id=task_id)
+
+
+async def progreso_api(request, task_id):
+    """API para consultar el progreso de una tarea (snapshot)"""
+
+    progress = await sync_to_async(get_progress_store().obtener, thread_sensitive=False)(task_id)
+
+    return JsonResponse(progress.to_dict() if progress else {
+        'step': 'Desconocido',
+        'progress': 0,
+        'status': 'not_found'
+    })
+
+
+async def progreso_stream(request, task_id):
+    """
+    Stream SSE del progreso (igual que views.progreso_stream), pero cada conexión es
+    una corrutina esperando en el event loop en vez de un hilo bloqueado.
+    """
+    store = get_progress_store()
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        desde = 0
+
+    async def eventos():
+        yield "retry: 2000\n\n"
+        inicio = time.monotonic()
+        visto = desde
+        while time.monotonic() - inicio < SSE_MAX_DURACION:
+            estado = await store.esperar_async(task_id, visto, timeout=SSE_HEARTBEAT)
+            if estado is None:
+                yield "event: not_found\ndata: {}\n\n"
+                return
+            if estado.seq > visto:
+                visto = estado.seq
+                yield f"id: {estado.seq}\ndata: {json.dumps(estado.to_dict(), ensure_ascii=False)}\n\n"
+                if estado.status in ESTADOS_FINALES:
+                    return
+            else:
+                yield ": heartbeat\n\n"
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # que nginx no acumule los eventos
+    return response